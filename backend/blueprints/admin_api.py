@@ -501,6 +501,107 @@ def get_system_stats():
         return jsonify({'success': False, 'error': '获取系统状态失败'}), 500
 
 
+@admin_bp.route('/stats/llm', methods=['GET'])
+@admin_required
+@log_api_request("获取LLM调用统计")
+def get_llm_stats():
+    """获取LLM调用统计（连接池、响应缓存、服务商路由的延迟/熔断状态、执行器排队情况、文章生成策略对比、预生成命中率）"""
+    try:
+        from services.llm_transport import get_llm_transport
+        from services.llm_cache import get_llm_cache
+        from services.llm_router import get_llm_router
+        from services.llm_executor import get_llm_executor, get_llm_stream_executor
+        from services.ai_service import get_article_strategy_stats
+        from services.article_prefetch import get_article_prefetcher
+        from config import get_config
+
+        config = get_config()
+        return jsonify({
+            'success': True,
+            'data': {
+                'pid': os.getpid(),
+                'transport': get_llm_transport().get_stats(),
+                'cache': get_llm_cache().get_stats(),
+                'router': get_llm_router(config).get_stats() if config.LLM_ROUTER_ENABLED else None,
+                'executor': get_llm_executor(config).get_stats(),
+                'stream_executor': get_llm_stream_executor(config).get_stats(),
+                'generation': get_article_strategy_stats().get_stats(),
+                'prefetch': get_article_prefetcher(config).get_stats()
+            }
+        })
+
+    except Exception as e:
+        logger.error(f"获取LLM调用统计失败: {str(e)}")
+        return jsonify({'success': False, 'error': '获取LLM调用统计失败'}), 500
+
+
+@admin_bp.route('/stats/redis', methods=['GET'])
+@admin_required
+@log_api_request("获取Redis连接池统计")
+def get_redis_stats():
+    """获取当前进程各Redis连接池（队列/缓存/订阅）的连接上限、已建连接数和使用中连接数，以及任务事件SSE连接数"""
+    try:
+        from config import get_redis_pool_stats
+        from services.task_events import get_task_event_stream
+
+        return jsonify({
+            'success': True,
+            'data': {
+                'pid': os.getpid(),
+                'pools': get_redis_pool_stats(),
+                'task_events': get_task_event_stream().get_stats()
+            }
+        })
+
+    except Exception as e:
+        logger.error(f"获取Redis连接池统计失败: {str(e)}")
+        return jsonify({'success': False, 'error': '获取Redis连接池统计失败'}), 500
+
+
+@admin_bp.route('/stats/workers', methods=['GET'])
+@admin_required
+@log_api_request("获取发布Worker统计")
+def get_worker_stats():
+    """获取RQ Worker自动伸缩状态与最近的伸缩决策，以及各Worker进程的浏览器会话复用统计"""
+    try:
+        from config import get_redis_client
+        from services.worker_autoscaler import get_autoscaler_status
+        from services.browser_sessions import get_browser_session_reports
+
+        redis_client = get_redis_client('cache')
+        return jsonify({
+            'success': True,
+            'data': {
+                'autoscalers': get_autoscaler_status(redis_client),
+                'browser_sessions': get_browser_session_reports(redis_client)
+            }
+        })
+
+    except Exception as e:
+        logger.error(f"获取发布Worker统计失败: {str(e)}")
+        return jsonify({'success': False, 'error': '获取发布Worker统计失败'}), 500
+
+
+@admin_bp.route('/stats/tokens', methods=['GET'])
+@admin_required
+@log_api_request("获取token用量统计")
+def get_token_stats():
+    """获取token用量统计（按日期、用户、模型、提示词模板聚合，以及每日预算）"""
+    try:
+        from services.token_accounting import get_token_accountant
+        from config import get_config
+
+        days = min(max(request.args.get('days', 7, type=int), 1), 90)
+        return jsonify({
+            'success': True,
+            'data': get_token_accountant(get_config()).get_stats(days=days)
+        })
+
+    except Exception as e:
+        logger.error(f"获取token用量统计失败: {str(e)}")
+        return jsonify({'success': False, 'error': '获取token用量统计失败'}), 500
+
+
 # ============================================================================
 # 工作流管理 API
 # ============================================================================
@@ -1267,6 +1368,37 @@ def cleanup_expired_tasks():
         return jsonify({'success': False, 'error': '清理过期任务失败'}), 500
 
 
+@admin_bp.route('/tasks/backfill-fingerprints', methods=['POST'])
+@admin_required
+@log_api_request("回填文章指纹")
+def backfill_fingerprints():
+    """
+    为已有文章和发布历史建立近似重复检测指纹（提交到后台队列执行，可重复执行）
+    """
+    data = request.json or {}
+    batch_size = min(max(int(data.get('batch_size', 500)), 50), 5000)
+
+    try:
+        from services.task_queue_manager import get_task_manager
+        from services.duplicate_index import run_backfill_job
+        manager = get_task_manager()
+        job = manager.default_queue.enqueue(
+            run_backfill_job,
+            kwargs={'batch_size': batch_size},
+            job_timeout='2h',
+            result_ttl=86400
+        )
+
+        return jsonify({
+            'success': True,
+            'data': {'job_id': job.id, 'batch_size': batch_size}
+        })
+
+    except Exception as e:
+        logger.error(f"提交指纹回填任务失败: {str(e)}")
+        return jsonify({'success': False, 'error': '提交指纹回填任务失败'}), 500
+
+
 @admin_bp.route('/tasks/stats', methods=['GET'])
 @admin_required
 @log_api_request("获取任务统计")
@@ -89,12 +89,9 @@ def upload_file():
 @login_required
 @log_api_request("分析公司信息")
 def analyze_company():
-    """公司分析"""
-    from services.ai_service import AIService
-    from services.workflow_service import WorkflowService
-    from services.prompt_template_service import PromptTemplateService
-    from services.analysis_prompt_service import AnalysisPromptService
-    from services.ai_service_v2 import AIServiceV2
+    """公司分析（async=true时提交后台任务，立即返回job_id）"""
+    from services.generation_jobs import run_analysis, GenerationInputError
+    from services.token_accounting import TokenBudgetExceeded
 
     user = get_current_user()
     data = request.json
@@ -102,206 +99,265 @@ def analyze_company():
     if not data.get('company_name'):
         return jsonify({'error': '请输入公司名称'}), 400
 
-    try:
-        # 获取用户选择的AI模型
-        ai_model = data.get('ai_model')
-        if ai_model:
-            logger.info(f'User selected AI model: {ai_model}')
-
-        # 检查是否使用新的三模块提示词系统
-        analysis_prompt_id = data.get('analysis_prompt_id')
-
-        if analysis_prompt_id:
-            # 使用新的三模块系统
-            logger.info(f'Using V2 analysis prompt: {analysis_prompt_id}')
-
-            # 获取分析提示词
-            analysis_prompt = AnalysisPromptService.get_prompt(analysis_prompt_id)
-            if not analysis_prompt:
-                return jsonify({'error': f'分析提示词不存在: {analysis_prompt_id}'}), 404
-
-            # 使用AIServiceV2进行分析
-            ai_service_v2 = AIServiceV2(config)
-            company_info = {
-                'company_name': data.get('company_name'),
-                'company_desc': data.get('company_desc', ''),
-                'uploaded_text': data.get('uploaded_text', '')
-            }
-            # 传递AI模型参数
-            analysis = ai_service_v2.analyze_with_prompt(company_info, analysis_prompt, model=ai_model)
+    if data.get('async'):
+        return _enqueue_generation_job(user.id, 'analysis', data)
 
-            # 更新使用统计
-            AnalysisPromptService.increment_usage(analysis_prompt_id)
+    try:
+        result = run_analysis(user.id, data)
+        return jsonify({'success': True, **result})
 
-        else:
-            # 兼容旧系统
-            ai_service = AIService(config)
+    except GenerationInputError as e:
+        return jsonify({'error': str(e)}), e.status_code
+    except TokenBudgetExceeded as e:
+        return jsonify({'error': str(e)}), 429
+    except Exception as e:
+        logger.error(f'Analysis failed: {e}', exc_info=True)
+        return jsonify({'error': str(e)}), 500
 
-            # 检查是否使用旧模板
-            template_id = data.get('template_id')
-            template = None
-            if template_id:
-                template = PromptTemplateService.get_template(template_id)
-                if not template:
-                    return jsonify({'error': f'模板不存在: {template_id}'}), 404
-                logger.info(f'Using template: {template["name"]} (ID: {template_id})')
-
-            # 使用模板或默认方法进行分析
-            if template:
-                company_info = {
-                    'company_name': data.get('company_name'),
-                    'company_desc': data.get('company_desc', ''),
-                    'uploaded_text': data.get('uploaded_text', '')
-                }
-                analysis = ai_service.analyze_company_with_template(company_info, template, model=ai_model)
-            else:
-                analysis = ai_service.analyze_company(
-                    company_name=data.get('company_name'),
-                    company_desc=data.get('company_desc', ''),
-                    uploaded_text=data.get('uploaded_text', ''),
-                    model=ai_model
-                )
 
-        # 保存工作流（包含新的prompt IDs）
-        workflow_service = WorkflowService()
-        workflow_data = {
-            'company_name': data.get('company_name'),
-            'company_desc': data.get('company_desc'),
-            'uploaded_text': data.get('uploaded_text', ''),
-            'uploaded_filename': data.get('uploaded_filename', ''),
-            'template_id': data.get('template_id'),
-            'analysis': analysis,
-            'current_step': 2
-        }
+@api_bp.route('/generate_articles', methods=['POST'])
+@login_required
+@log_api_request("生成推广文章")
+def generate_articles():
+    """生成文章（async=true时提交后台任务，每完成一篇通过事件流推送）"""
+    from services.generation_jobs import run_article_generation, GenerationInputError
+    from services.token_accounting import TokenBudgetExceeded
 
-        # 添加新的三模块提示词ID
-        if analysis_prompt_id:
-            workflow_data['analysis_prompt_id'] = analysis_prompt_id
-        if data.get('article_prompt_id'):
-            workflow_data['article_prompt_id'] = data.get('article_prompt_id')
-        if data.get('platform_style_prompt_id'):
-            workflow_data['platform_style_prompt_id'] = data.get('platform_style_prompt_id')
+    user = get_current_user()
+    data = request.json
 
-        workflow = workflow_service.save_workflow(
-            user_id=user.id,
-            workflow_id=data.get('workflow_id'),
-            data=workflow_data
-        )
+    if data.get('async'):
+        return _enqueue_generation_job(user.id, 'articles', data)
 
-        logger.info(f'Analysis completed for: {data.get("company_name")}')
+    try:
+        saved_articles = run_article_generation(user.id, data)
         return jsonify({
             'success': True,
-            'analysis': analysis,
-            'company_name': data.get('company_name'),
-            'workflow_id': workflow['workflow']['id']
+            'articles': saved_articles
         })
 
+    except GenerationInputError as e:
+        return jsonify({'error': str(e)}), e.status_code
+    except TokenBudgetExceeded as e:
+        return jsonify({'error': str(e)}), 429
     except Exception as e:
-        logger.error(f'Analysis failed: {e}', exc_info=True)
+        logger.error(f'Article generation failed: {e}', exc_info=True)
         return jsonify({'error': str(e)}), 500
 
 
-@api_bp.route('/generate_articles', methods=['POST'])
+def _enqueue_generation_job(user_id: int, kind: str, data: dict):
+    """提交后台生成任务，返回202和任务查询地址"""
+    from services.task_queue_manager import get_task_manager
+
+    result = get_task_manager().enqueue_generation_job(user_id, kind, data)
+    if not result['success']:
+        return jsonify({'error': result['error']}), 500
+
+    job_id = result['job_id']
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status_url': f'/api/generation_jobs/{job_id}',
+        'events_url': f'/api/generation_jobs/{job_id}/events'
+    }), 202
+
+
+@api_bp.route('/generation_jobs/<job_id>', methods=['GET'])
 @login_required
-@log_api_request("生成推广文章")
-def generate_articles():
-    """生成文章"""
+def get_generation_job(job_id):
+    """查询后台生成任务状态和结果"""
+    from services.generation_jobs import get_generation_job_store
+
+    user = get_current_user()
+    try:
+        job = get_generation_job_store().get(job_id)
+    except Exception as e:
+        logger.error(f'Failed to get generation job {job_id}: {e}', exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+    if not job or job['user_id'] != user.id:
+        return jsonify({'error': '任务不存在'}), 404
+
+    return jsonify({'success': True, 'job': job})
+
+
+@api_bp.route('/generation_jobs/<job_id>/events', methods=['GET'])
+@login_required
+def stream_generation_job_events(job_id):
+    """
+    后台生成任务事件流（SSE）
+    支持 Last-Event-ID 请求头或 last_event_id 参数断线续传
+    """
+    from flask import Response, stream_with_context
+    from services.sse_connections import get_sse_limiter
+    from services.generation_jobs import get_generation_job_store
+
+    user = get_current_user()
+    store = get_generation_job_store()
+    job = store.get(job_id)
+    if not job or job['user_id'] != user.id:
+        return jsonify({'error': '任务不存在'}), 404
+
+    try:
+        last_id = int(request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or 0)
+    except ValueError:
+        last_id = 0
+
+    limiter = get_sse_limiter(config)
+    if not limiter.try_acquire():
+        return _sse_busy_response()
+
+    def generate():
+        try:
+            for event in store.listen(job_id, last_id):
+                if event is None:
+                    yield ': keepalive\n\n'
+                    continue
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            logger.error(f'Generation job event stream error: {e}', exc_info=True)
+            yield f"event: error\ndata: {json.dumps({'error': str(e)}, ensure_ascii=False)}\n\n"
+
+    return limiter.attach(Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    ))
+
+
+def _sse_busy_response():
+    """当前进程SSE连接已满（见 services.sse_connections）"""
+    response = jsonify({'success': False, 'error': '实时推送连接已满，请稍后重试或使用状态查询接口'})
+    response.headers['Retry-After'] = '10'
+    return response, 503
+
+
+@api_bp.route('/generate_articles/stream', methods=['POST'])
+@login_required
+@log_api_request("流式生成推广文章")
+def generate_articles_stream():
+    """
+    流式生成文章（SSE）
+
+    请求参数与 /generate_articles 相同，响应为 text/event-stream：
+    start / delta / title / paragraph / article / error 事件按文章index推送，
+    全部完成并保存后推送 done 事件（包含保存后的文章列表）
+    """
+    from flask import Response, stream_with_context
+    from services.sse_connections import get_sse_limiter
     from services.ai_service import AIService
     from services.workflow_service import WorkflowService
     from services.prompt_template_service import PromptTemplateService
     from services.article_prompt_service import ArticlePromptService
     from services.platform_style_service import PlatformStyleService
     from services.ai_service_v2 import AIServiceV2
+    from services.token_accounting import get_token_accountant, usage_scope, TokenBudgetExceeded
 
     user = get_current_user()
-    data = request.json
+    data = request.json or {}
+
+    company_name = data.get('company_name')
+    article_count = data.get('article_count', 3)
+    article_prompt_id = data.get('article_prompt_id')
+    platform_style_prompt_id = data.get('platform_style_prompt_id')
+    template_id = data.get('template_id')
+    workflow_id = data.get('workflow_id')
 
     try:
-        # 检查是否使用新的三模块提示词系统
-        article_prompt_id = data.get('article_prompt_id')
-        platform_style_prompt_id = data.get('platform_style_prompt_id')
+        get_token_accountant(config).check_budget(user.id)
 
+        # 与同步接口一致的提示词选择逻辑，先构建好每篇文章的请求参数
         if article_prompt_id:
-            # 使用新的三模块系统
-            logger.info(f'Using V2 article prompt: {article_prompt_id}')
-
-            # 获取文章提示词
+            logger.info(f'Streaming with V2 article prompt: {article_prompt_id}')
             article_prompt = ArticlePromptService.get_prompt(article_prompt_id)
             if not article_prompt:
                 return jsonify({'error': f'文章提示词不存在: {article_prompt_id}'}), 404
 
-            # 获取平台风格提示词（如果指定）
             platform_style = None
             if platform_style_prompt_id:
                 platform_style = PlatformStyleService.get_style(platform_style_prompt_id)
-                if platform_style:
-                    logger.info(f'Using platform style: {platform_style["name"]} ({platform_style["platform"]})')
-
-            # 使用AIServiceV2生成文章
-            ai_service_v2 = AIServiceV2(config)
-            articles = ai_service_v2.generate_articles_with_prompts(
-                company_name=data.get('company_name'),
-                analysis=data.get('analysis'),
-                article_prompt=article_prompt,
-                article_count=data.get('article_count', 3),
-                platform_style=platform_style
-            )
-
-            # 更新使用统计
-            ArticlePromptService.increment_usage(article_prompt_id)
-            if platform_style_prompt_id:
-                PlatformStyleService.increment_usage(platform_style_prompt_id)
 
+            ai_service = AIServiceV2(config)
+            specs = ai_service.build_article_specs_with_prompt(
+                company_name, data.get('analysis'), article_prompt,
+                article_count, platform_style
+            )
         else:
-            # 兼容旧系统
-            ai_service = AIService(config)
-
-            # 检查是否使用旧模板
-            template_id = data.get('template_id')
             template = None
             if template_id:
                 template = PromptTemplateService.get_template(template_id)
-                if template:
-                    logger.info(f'Using template for article generation: {template["name"]} (ID: {template_id})')
-
-            # 使用模板或默认方法生成文章
-            if template:
-                articles = ai_service.generate_articles_with_template(
-                    company_name=data.get('company_name'),
-                    analysis=data.get('analysis'),
-                    template=template,
-                    article_count=data.get('article_count', 3)
-                )
-            else:
-                articles = ai_service.generate_articles(
-                    company_name=data.get('company_name'),
-                    analysis=data.get('analysis'),
-                    article_count=data.get('article_count', 3)
-                )
 
-        # 保存文章到数据库
-        saved_articles = articles
-        if data.get('workflow_id'):
-            workflow_service = WorkflowService()
-            saved_articles = workflow_service.save_articles(
-                user_id=user.id,
-                workflow_id=data.get('workflow_id'),
-                articles=articles
+            ai_service = AIService(config)
+            specs = ai_service.build_article_specs(
+                company_name, data.get('analysis'), article_count, template
             )
+    except TokenBudgetExceeded as e:
+        return jsonify({'error': str(e)}), 429
+    except Exception as e:
+        logger.error(f'Article streaming setup failed: {e}', exc_info=True)
+        return jsonify({'error': str(e)}), 500
 
-            # 如果使用了旧模板，记录使用情况
-            if data.get('template_id'):
-                PromptTemplateService.increment_usage_count(data.get('template_id'))
+    if article_prompt_id:
+        usage_template = f'article_prompt:{article_prompt_id}'
+    else:
+        usage_template = f'prompt_template:{template_id}' if template_id else ''
 
-        logger.info(f'Generated and saved {len(saved_articles)} articles for {data.get("company_name")}')
-        return jsonify({
-            'success': True,
-            'articles': saved_articles
-        })
+    limiter = get_sse_limiter(config)
+    if not limiter.try_acquire():
+        return _sse_busy_response()
 
-    except Exception as e:
-        logger.error(f'Article generation failed: {e}', exc_info=True)
-        return jsonify({'error': str(e)}), 500
+    def sse(event_type, payload):
+        return f"event: {event_type}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+    def generate():
+        articles = {}
+        try:
+            with usage_scope(user_id=user.id, template=usage_template):
+                for event in ai_service.stream_articles(company_name, specs):
+                    if event['type'] == 'article':
+                        articles[event['index']] = event['article']
+                    yield sse(event['type'], event)
+
+            ordered = [articles[i] for i in sorted(articles)]
+
+            # 更新使用统计
+            if article_prompt_id:
+                ArticlePromptService.increment_usage(article_prompt_id)
+                if platform_style_prompt_id:
+                    PlatformStyleService.increment_usage(platform_style_prompt_id)
+
+            # 保存文章到数据库
+            saved_articles = ordered
+            if workflow_id:
+                saved_articles = WorkflowService().save_articles(
+                    user_id=user.id,
+                    workflow_id=workflow_id,
+                    articles=ordered
+                )
+                if template_id and not article_prompt_id:
+                    PromptTemplateService.increment_usage_count(template_id)
+
+            logger.info(f'Streamed and saved {len(saved_articles)}/{len(specs)} articles for {company_name}')
+            yield sse('done', {'type': 'done', 'success': True, 'articles': saved_articles})
+
+        except GeneratorExit:
+            logger.info(f'Article streaming for {company_name} closed by client')
+            raise
+        except Exception as e:
+            logger.error(f'Article streaming failed: {e}', exc_info=True)
+            yield sse('done', {'type': 'done', 'success': False, 'error': str(e)})
+
+    return limiter.attach(Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    ))
 
 
 @api_bp.route('/models', methods=['GET'])
@@ -626,8 +682,8 @@ def import_accounts():
 @login_required
 @log_api_request("发布文章到知乎")
 def publish_to_zhihu():
-    """发布到知乎（异步任务队列版本）"""
-    from services.task_queue_manager import get_task_manager
+    """发布到知乎（异步任务队列版本，可选 scheduled_at 定时发布、priority 优先级）"""
+    from services.task_queue_manager import get_task_manager, parse_schedule_options
 
     user = get_current_user()
     data = request.json
@@ -637,6 +693,11 @@ def publish_to_zhihu():
         return jsonify({'error': '缺少文章标题'}), 400
     if not data.get('content'):
         return jsonify({'error': '缺少文章内容'}), 400
+    try:
+        options = parse_schedule_options(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    options.pop('spread_minutes', None)
 
     # 获取article_id (如果前端传了就用，没传就用0表示临时文章)
     article_id = data.get('article_id')
@@ -652,7 +713,9 @@ def publish_to_zhihu():
             article_title=data.get('title'),
             article_content=data.get('content'),
             platform='zhihu',
-            article_id=article_id
+            article_id=article_id,
+            allow_duplicate=bool(data.get('allow_duplicate')),
+            **options
         )
 
         if result['success']:
@@ -661,11 +724,12 @@ def publish_to_zhihu():
                 'success': True,
                 'task_id': result['task_id'],
                 'status': result['status'],
-                'message': '发布任务已创建，正在后台处理'
+                'scheduled_at': result.get('scheduled_at'),
+                'message': result['message'] if result.get('scheduled_at') else '发布任务已创建，正在后台处理'
             })
         else:
             logger.error(f'Failed to create task: {result.get("error")}')
-            return jsonify(result), 400
+            return jsonify(result), 409 if result.get('duplicates') else 400
 
     except Exception as e:
         logger.error(f'Publish to Zhihu failed: {e}', exc_info=True)
@@ -679,8 +743,8 @@ def publish_to_zhihu():
 @login_required
 @log_api_request("批量发布文章到知乎")
 def publish_to_zhihu_batch():
-    """批量发布到知乎（异步）"""
-    from services.task_queue_manager import get_task_manager
+    """批量发布到知乎（异步，可选 scheduled_at / priority / spread_minutes 错开发布）"""
+    from services.task_queue_manager import get_task_manager, parse_schedule_options
 
     user = get_current_user()
     data = request.json
@@ -696,6 +760,10 @@ def publish_to_zhihu_batch():
     if not articles:
         logger.warning('[发布流程-API] 文章列表为空，返回错误')
         return jsonify({'error': '缺少文章列表'}), 400
+    try:
+        options = parse_schedule_options(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
     # 记录每篇文章的标题（前30字符）
     for idx, article in enumerate(articles, 1):
@@ -710,7 +778,9 @@ def publish_to_zhihu_batch():
         result = task_manager.create_batch_tasks(
             user_id=user.id,
             articles=articles,
-            platform='zhihu'
+            platform='zhihu',
+            allow_duplicate=bool(data.get('allow_duplicate')),
+            **options
         )
 
         logger.info(f'[发布流程-API] 批量任务创建完成: 成功 {result["success_count"]}/{result["total"]}')
@@ -778,6 +848,7 @@ def get_publish_tasks():
     status = request.args.get('status')
     limit = int(request.args.get('limit', 20))
     offset = int(request.args.get('offset', 0))
+    cursor = request.args.get('cursor')
 
     try:
         task_manager = get_task_manager()
@@ -785,7 +856,8 @@ def get_publish_tasks():
             user_id=user.id,
             status=status,
             limit=limit,
-            offset=offset
+            offset=offset,
+            cursor=cursor
         )
 
         return jsonify(result)
@@ -798,6 +870,53 @@ def get_publish_tasks():
         }), 500
 
 
+@api_bp.route('/publish_tasks/events', methods=['GET'])
+@login_required
+def stream_publish_task_events():
+    """
+    当前用户的发布任务状态事件流（SSE），取代轮询任务状态
+    支持 Last-Event-ID 请求头或 last_event_id 参数断线续传；收到sync事件时客户端应重新拉取一次任务状态
+    """
+    from flask import Response, stream_with_context
+    from services.sse_connections import get_sse_limiter
+    from services.task_events import get_task_event_stream
+
+    user_id = get_current_user().id
+    stream = get_task_event_stream()
+    if stream.redis is None:
+        return jsonify({'success': False, 'error': '任务事件推送不可用'}), 503
+
+    try:
+        last_id = int(request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or 0)
+    except ValueError:
+        last_id = 0
+
+    # 连接已满时返回503，页面退回轮询
+    limiter = get_sse_limiter(config)
+    if not limiter.try_acquire():
+        return _sse_busy_response()
+
+    def generate():
+        try:
+            for event in stream.listen(user_id, last_id):
+                if event is None:
+                    yield ': keepalive\n\n'
+                    continue
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            logger.error(f'Publish task event stream error: {e}', exc_info=True)
+            yield f"event: error\ndata: {json.dumps({'error': str(e)}, ensure_ascii=False)}\n\n"
+
+    return limiter.attach(Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    ))
+
+
 @api_bp.route('/publish_task/<task_id>/cancel', methods=['POST'])
 @login_required
 @log_api_request("取消发布任务")
@@ -1332,6 +1451,45 @@ def get_publish_history():
         return jsonify({'error': str(e)}), 500
 
 
+@api_bp.route('/articles/duplicate_check', methods=['POST'])
+@login_required
+@log_api_request("文章近似重复检查")
+def check_article_duplicates():
+    """
+    检查文章是否与当前用户已发布的内容近似重复
+
+    请求体: {"content": "...", "platform": "zhihu"(可选), "scope": "platform"|"all"(可选),
+             "include_articles": false(可选，同时检查已生成未发布的文章)}
+    """
+    from services.duplicate_index import get_duplicate_index
+
+    user = get_current_user()
+    data = request.json or {}
+    content = data.get('content')
+    if not content:
+        return jsonify({'success': False, 'error': '缺少文章内容'}), 400
+
+    try:
+        index = get_duplicate_index(config)
+        sources = ('publish', 'article') if data.get('include_articles') else ('publish',)
+        duplicates = index.find_similar(
+            content,
+            platform=data.get('platform') if data.get('scope', 'platform') == 'platform' else None,
+            user_id=user.id,
+            sources=sources,
+            limit=min(int(data.get('limit', 5)), 20)
+        )
+        return jsonify({
+            'success': True,
+            'is_duplicate': bool(duplicates),
+            'duplicates': duplicates
+        })
+
+    except Exception as e:
+        logger.error(f'Duplicate check failed: {e}', exc_info=True)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @api_bp.route('/articles/history', methods=['GET'])
 @login_required
 @log_api_request("获取用户文章归档")
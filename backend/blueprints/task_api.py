@@ -9,7 +9,7 @@ import os
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from services.task_queue_manager import get_task_manager
+from services.task_queue_manager import get_task_manager, parse_schedule_options
 from logger_config import setup_logger, log_api_request
 from auth import login_required
 
@@ -31,7 +31,10 @@ def create_task():
         "title": "文章标题",
         "content": "文章内容",
         "platform": "zhihu",  // 可选，默认zhihu
-        "article_id": 123     // 可选
+        "article_id": 123,    // 可选
+        "allow_duplicate": false,  // 可选，跳过近似重复检查
+        "scheduled_at": "2024-01-01T09:30:00",  // 可选，定时发布时间
+        "priority": 0  // 可选，大于0的任务插队
     }
 
     返回:
@@ -39,6 +42,7 @@ def create_task():
         "success": true,
         "task_id": "uuid",
         "status": "queued",
+        "scheduled_at": "2024-01-01T09:30:00",  // 定时任务才有
         "message": "任务已创建并入队"
     }
     """
@@ -58,6 +62,15 @@ def create_task():
                 'error': '缺少content字段'
             }), 400
 
+        try:
+            options = parse_schedule_options(data)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        options.pop('spread_minutes', None)
+
         # 获取用户ID
         user_id = session.get('user_id')
 
@@ -68,11 +81,16 @@ def create_task():
             article_title=data['title'],
             article_content=data['content'],
             platform=data.get('platform', 'zhihu'),
-            article_id=data.get('article_id')
+            article_id=data.get('article_id'),
+            allow_duplicate=bool(data.get('allow_duplicate')),
+            **options
         )
 
         if result['success']:
-            return jsonify(result), 201
+            # 重复提交返回已有任务，不是新建
+            return jsonify(result), 200 if result.get('duplicate_request') else 201
+        elif result.get('duplicates'):
+            return jsonify(result), 409
         else:
             return jsonify(result), 400
 
@@ -106,7 +124,11 @@ def create_batch_tasks():
                 "article_id": 2
             }
         ],
-        "platform": "zhihu"  // 可选，默认zhihu
+        "platform": "zhihu",  // 可选，默认zhihu
+        "allow_duplicate": false,  // 可选，跳过近似重复检查
+        "scheduled_at": "2024-01-01T09:30:00",  // 可选，第一篇的发布时间
+        "priority": 0,  // 可选，大于0的任务插队
+        "spread_minutes": 120  // 可选，把这批任务均匀分布在这段时间(分钟)内发布
     }
 
     返回:
@@ -134,6 +156,14 @@ def create_batch_tasks():
                 'error': 'articles必须是数组'
             }), 400
 
+        try:
+            options = parse_schedule_options(data)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+
         # 获取用户ID
         user_id = session.get('user_id')
 
@@ -142,7 +172,9 @@ def create_batch_tasks():
         result = manager.create_batch_tasks(
             user_id=user_id,
             articles=data['articles'],
-            platform=data.get('platform', 'zhihu')
+            platform=data.get('platform', 'zhihu'),
+            allow_duplicate=bool(data.get('allow_duplicate')),
+            **options
         )
 
         return jsonify(result), 201
@@ -220,6 +252,7 @@ def get_task_list():
     - status: 任务状态过滤（pending/queued/running/success/failed/cancelled）
     - limit: 返回数量，默认20
     - offset: 偏移量，默认0
+    - cursor: 翻页游标（上一页返回的next_cursor），提供时忽略offset
 
     返回:
     {
@@ -231,8 +264,10 @@ def get_task_list():
             "queued": 5,
             "running": 3,
             "success": 80,
-            "failed": 2
-        }
+            "failed": 2,
+            "cancelled": 0
+        },
+        "next_cursor": "123"
     }
     """
     try:
@@ -240,6 +275,7 @@ def get_task_list():
         status = request.args.get('status')
         limit = int(request.args.get('limit', 20))
         offset = int(request.args.get('offset', 0))
+        cursor = request.args.get('cursor')
 
         # 验证参数
         if limit > 100:
@@ -254,7 +290,8 @@ def get_task_list():
             user_id=user_id,
             status=status,
             limit=limit,
-            offset=offset
+            offset=offset,
+            cursor=cursor
         )
 
         return jsonify(result)
@@ -3,6 +3,7 @@
 集中管理所有配置项，提高可维护性
 """
 import os
+import threading
 from pathlib import Path
 
 # 加载.env文件
@@ -51,7 +52,7 @@ class Config:
 
     # 千问API配置 - 必须通过环境变量或.env文件设置
     QIANWEN_API_KEY = os.environ.get('QIANWEN_API_KEY', '')
-    QIANWEN_API_BASE = 'https://dashscope.aliyuncs.com/compatible-mode/v1'
+    QIANWEN_API_BASE = os.environ.get('QIANWEN_API_BASE', 'https://dashscope.aliyuncs.com/compatible-mode/v1')
     QIANWEN_CHAT_URL = f'{QIANWEN_API_BASE}/chat/completions'
     QIANWEN_MODEL = 'qwen-plus'
 
@@ -95,6 +96,131 @@ class Config:
     # 默认使用的AI模型
     DEFAULT_AI_MODEL = os.environ.get('DEFAULT_AI_MODEL', 'qwen-plus')
 
+    # LLM HTTP连接池配置（每个服务商主机一个连接池，进程内共享）
+    LLM_HTTP_POOL_MAXSIZE = int(os.environ.get('LLM_HTTP_POOL_MAXSIZE', 10))
+    LLM_HTTP_KEEPALIVE_SECONDS = int(os.environ.get('LLM_HTTP_KEEPALIVE_SECONDS', 60))
+
+    # LLM响应缓存配置（进程内LRU + Redis共享缓存）
+    LLM_CACHE_ENABLED = os.environ.get('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+    LLM_CACHE_LOCAL_MAXSIZE = int(os.environ.get('LLM_CACHE_LOCAL_MAXSIZE', 256))
+    # 各调用场景的缓存时间(秒)，未列出的场景不缓存
+    LLM_CACHE_TTLS = {
+        'analysis': 24 * 3600,   # 公司分析
+        'platforms': 6 * 3600,   # 平台推荐
+    }
+    # 温度高于该值的调用不缓存（文章生成需要多样性）
+    LLM_CACHE_MAX_TEMPERATURE = 0.75
+
+    # 多服务商路由配置（熔断、故障切换、对冲请求）
+    LLM_ROUTER_ENABLED = os.environ.get('LLM_ROUTER_ENABLED', 'false').lower() == 'true'
+    LLM_ROUTER_FAILURE_THRESHOLD = int(os.environ.get('LLM_ROUTER_FAILURE_THRESHOLD', 5))  # 连续失败次数
+    LLM_ROUTER_RESET_TIMEOUT = int(os.environ.get('LLM_ROUTER_RESET_TIMEOUT', 30))  # 熔断冷却时间(秒)
+    LLM_ROUTER_HEDGE_ENABLED = os.environ.get('LLM_ROUTER_HEDGE_ENABLED', 'false').lower() == 'true'
+    LLM_ROUTER_HEDGE_MIN_SAMPLES = 20  # 首选服务商至少积累多少延迟样本才开始对冲
+
+    # LLM并发执行配置（进程内有界线程池 + Redis全局并发许可）
+    LLM_EXECUTOR_MAX_WORKERS = int(os.environ.get('LLM_EXECUTOR_MAX_WORKERS', 8))
+    LLM_EXECUTOR_MAX_PENDING = int(os.environ.get('LLM_EXECUTOR_MAX_PENDING', 64))  # 排队+执行中的任务上限
+    # 流式生成（SSE）使用独立的线程池，每篇文章在整个输出期间占用一个线程
+    LLM_STREAM_MAX_WORKERS = int(os.environ.get('LLM_STREAM_MAX_WORKERS', 4))
+    LLM_STREAM_MAX_PENDING = int(os.environ.get('LLM_STREAM_MAX_PENDING', 32))
+    # 全部进程合计的同时在途请求上限（服务商并发配额），0表示不限制
+    LLM_GLOBAL_CONCURRENCY = {
+        'qianwen': int(os.environ.get('QIANWEN_MAX_CONCURRENCY', 20)),
+        'zhipu': int(os.environ.get('ZHIPU_MAX_CONCURRENCY', 20)),
+    }
+
+    # 文章生成策略: fanout 每篇一次调用；batched 一次调用生成多篇（JSON输出，失败的文章回退为单篇调用）
+    ARTICLE_GENERATION_STRATEGY = os.environ.get('ARTICLE_GENERATION_STRATEGY', 'fanout')
+    ARTICLE_BATCH_SIZE = int(os.environ.get('ARTICLE_BATCH_SIZE', 3))  # 每次调用生成的文章数
+    ARTICLE_BATCH_MAX_TOKENS = 8000  # 单次批量调用的max_tokens上限
+    ARTICLE_BATCH_TIMEOUT = 180  # 单次批量调用超时(秒)
+    ARTICLE_BATCH_MIN_CONTENT_CHARS = 200  # 批量结果中正文少于该字数视为不合格
+
+    # 上传资料摘要配置（超过阈值的资料先分块提炼要点再合并为简报，简报按内容哈希缓存）
+    UPLOAD_SUMMARY_ENABLED = os.environ.get('UPLOAD_SUMMARY_ENABLED', 'true').lower() == 'true'
+    UPLOAD_SUMMARY_THRESHOLD_TOKENS = int(os.environ.get('UPLOAD_SUMMARY_THRESHOLD_TOKENS', 6000))  # 低于该值原文直接使用
+    UPLOAD_SUMMARY_CHUNK_TOKENS = 3000  # 每块的token上限
+    UPLOAD_SUMMARY_CHUNK_CHARS = 500  # 每块要点的字数上限
+    UPLOAD_SUMMARY_BRIEF_CHARS = 2000  # 最终简报的字数上限
+    UPLOAD_SUMMARY_CACHE_TTL = 7 * 24 * 3600  # 简报缓存时间(秒)
+
+    # token用量统计与每日预算（0表示不限制）
+    TOKEN_DAILY_BUDGET_PER_USER = int(os.environ.get('TOKEN_DAILY_BUDGET_PER_USER', 0))
+    TOKEN_DAILY_BUDGET_GLOBAL = int(os.environ.get('TOKEN_DAILY_BUDGET_GLOBAL', 0))
+    TOKEN_USAGE_FLUSH_INTERVAL = int(os.environ.get('TOKEN_USAGE_FLUSH_INTERVAL', 60))  # Redis累加值写入数据库的间隔(秒)
+
+    # 分析后预生成文章（流水线模式，默认关闭；请求参数 prefetch_articles 可单独开启）
+    ARTICLE_PREFETCH_ENABLED = os.environ.get('ARTICLE_PREFETCH_ENABLED', 'false').lower() == 'true'
+    ARTICLE_PREFETCH_TTL = 1800  # 草稿保留时间(秒)
+    ARTICLE_PREFETCH_WAIT = 120  # 生成请求到达时草稿仍在生成中，最多等待的时间(秒)
+    ARTICLE_PREFETCH_WORKERS = 2  # 每个进程同时进行的预生成任务数
+    ARTICLE_PREFETCH_STALE = 60  # 生成中的草稿超过该时间(秒)没有心跳，视为已中断不再等待
+
+    # 发布前近似重复检测（SimHash）：block 拒绝 / warn 只记录日志（默认） / off 关闭
+    DUPLICATE_CHECK_MODE = os.environ.get('DUPLICATE_CHECK_MODE', 'warn')
+    DUPLICATE_SIMHASH_DISTANCE = 3  # 汉明距离不超过该值视为重复（最大3）
+    DUPLICATE_MIN_CHARS = 50  # 正文少于该字数不参与检测
+
+    # 发布任务按用户公平调度（默认关闭）：任务先进入用户子队列，由分发器按权重轮流投递到RQ队列
+    PUBLISH_FAIR_SCHEDULING = os.environ.get('PUBLISH_FAIR_SCHEDULING', 'false').lower() == 'true'
+    PUBLISH_USER_MAX_IN_FLIGHT = int(os.environ.get('PUBLISH_USER_MAX_IN_FLIGHT', 3))  # 每用户同时在RQ队列/执行中的任务上限
+    # 按用户角色分配的调度权重（权重越大分到的发布份额越多）
+    PUBLISH_ROLE_WEIGHTS = {
+        'guest': 1,
+        'user': 1,
+        'admin': 2,
+    }
+    PUBLISH_TASK_STATS_CACHE_TTL = 5  # 用户任务状态统计的缓存时间(秒)，状态变化时立即失效
+    PUBLISH_TASK_EVENT_LOG_SIZE = 200  # 每个用户保留的最近任务状态事件数（SSE断线续传）
+
+    # 每个Web worker进程同时保持的SSE连接数上限；每个连接占用一个gunicorn线程，应不超过 GUNICORN_THREADS 的一半
+    SSE_MAX_STREAMS_PER_WORKER = int(os.environ.get('SSE_MAX_STREAMS_PER_WORKER', 4))
+    # 任务状态与RQ同步：每批任务数，以及增量同步（每分钟运行）每次最多处理的批数
+    PUBLISH_SYNC_BATCH_SIZE = int(os.environ.get('PUBLISH_SYNC_BATCH_SIZE', 500))
+    PUBLISH_SYNC_MAX_BATCHES = int(os.environ.get('PUBLISH_SYNC_MAX_BATCHES', 20))
+    # 定时发布：同一用户同一平台的非优先任务按该间隔(秒)错开发布，新任务排在已排期任务之后（0为不自动错开）
+    PUBLISH_BATCH_INTERVAL = int(os.environ.get('PUBLISH_BATCH_INTERVAL', 0))
+    PUBLISH_MAX_SCHEDULE_DAYS = 30  # 定时发布时间最多提前的天数
+    # 幂等创建：相同内容（同一用户、平台，归一化标题+正文）的任务进行中或在该时间(秒)内发布成功时，重复提交返回已有任务
+    PUBLISH_IDEMPOTENCY_TTL = int(os.environ.get('PUBLISH_IDEMPOTENCY_TTL', 600))
+    # 浏览器会话复用：SimpleWorker进程内按平台账号保留已登录的浏览器，连续的发布任务直接复用
+    PUBLISH_BROWSER_REUSE = os.environ.get('PUBLISH_BROWSER_REUSE', 'true').lower() == 'true'
+    PUBLISH_BROWSER_MAX_USES = 20  # 每个浏览器会话最多执行的任务数，之后重启浏览器
+    PUBLISH_BROWSER_MAX_AGE = 3600  # 浏览器会话最长保留时间(秒)
+    PUBLISH_BROWSER_MAX_IDLE = 600  # 空闲超过该时间(秒)的浏览器会话关闭
+
+    # RQ Worker：监听的队列与Worker类（SimpleWorker不fork，浏览器会话才能跨任务复用）
+    RQ_WORKER_QUEUES = os.environ.get('RQ_WORKER_QUEUES', 'default generation user:1 user:2 user:3 user:4 user:5').split()
+    RQ_WORKER_CLASS = os.environ.get('RQ_WORKER_CLASS', 'rq.worker.SimpleWorker')
+    # Worker自动伸缩：按队列积压和任务等待时间在上下限之间增减Worker，主机CPU/内存紧张时不再扩容
+    RQ_AUTOSCALE_MIN_WORKERS = int(os.environ.get('RQ_AUTOSCALE_MIN_WORKERS', 1))
+    RQ_AUTOSCALE_MAX_WORKERS = int(os.environ.get('RQ_AUTOSCALE_MAX_WORKERS', 6))
+    RQ_AUTOSCALE_JOBS_PER_WORKER = 2  # 每个空闲Worker对应的排队任务数
+    RQ_AUTOSCALE_MAX_JOB_WAIT = 60  # 最早排队的任务等待超过该时间(秒)时多扩容一个Worker
+    RQ_AUTOSCALE_INTERVAL = 10  # 检查间隔(秒)
+    RQ_AUTOSCALE_SCALE_DOWN_DELAY = 300  # 需求持续低于现有Worker数该时间(秒)后才缩容
+    RQ_AUTOSCALE_MAX_CPU_PERCENT = 85  # CPU使用率超过该值时不扩容
+    RQ_AUTOSCALE_MIN_FREE_MEMORY_MB = 1024  # 可用内存低于该值(MB)时不扩容（每个Chrome约占300-500MB）
+    RQ_AUTOSCALE_DRAIN_TIMEOUT = 900  # 缩容时等待Worker完成当前任务的最长时间(秒)，超时后强制结束
+
+    # Redis连接配置：进程内按用途共享有界连接池，所有Redis使用方通过 get_redis_client 获取客户端
+    REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+    REDIS_POOLS = {
+        # RQ队列、公平调度（RQ需要bytes模式）
+        'queue': {'decode_responses': False, 'max_connections': int(os.environ.get('REDIS_QUEUE_MAX_CONNECTIONS', 20)),
+                  'socket_timeout': 10},
+        # 限流、缓存、计数等短命令（超时短，Redis不可用时快速降级）
+        'cache': {'decode_responses': True, 'max_connections': int(os.environ.get('REDIS_CACHE_MAX_CONNECTIONS', 50)),
+                  'socket_timeout': 1},
+        # 订阅（SSE推送期间一直占用连接，单独成池，避免占满缓存连接池）
+        'pubsub': {'decode_responses': True, 'max_connections': int(os.environ.get('REDIS_PUBSUB_MAX_CONNECTIONS', 100)),
+                   'socket_timeout': None},
+    }
+    REDIS_CONNECT_TIMEOUT = 1  # 建立连接超时(秒)
+    REDIS_POOL_TIMEOUT = 2  # 连接池耗尽时等待空闲连接的时间(秒)，超时抛出连接错误
+    REDIS_HEALTH_CHECK_INTERVAL = 30  # 连接空闲超过该时间(秒)后，再次使用前先PING检查
+
     # 日志配置
     LOG_LEVEL = os.environ.get('LOG_LEVEL', 'DEBUG')
     LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s'
@@ -231,3 +357,90 @@ def get_config(env=None):
     if env is None:
         env = os.environ.get('FLASK_ENV', 'default')
     return config.get(env, config['default'])
+
+
+# 按用途共享的Redis连接池（进程内单例）
+_redis_pools = {}
+_redis_pools_lock = threading.Lock()
+
+
+def _redis_setting(config, name):
+    """读取Redis连接配置项，配置对象缺少该项时使用Config中的默认值"""
+    return getattr(config, name, getattr(Config, name))
+
+
+def get_redis_pool(purpose='cache', config=None):
+    """
+    获取指定用途的Redis连接池（单例，首次调用时按配置创建）
+
+    Args:
+        purpose: 连接池用途，queue（bytes模式，供RQ使用）/ cache（字符串模式）/ pubsub（订阅）
+        config: 配置对象（首次创建时读取连接参数）
+
+    Returns:
+        redis.BlockingConnectionPool实例
+    """
+    pool = _redis_pools.get(purpose)
+    if pool is None:
+        with _redis_pools_lock:
+            pool = _redis_pools.get(purpose)
+            if pool is None:
+                import redis
+
+                if config is None:
+                    config = get_config()
+                options = _redis_setting(config, 'REDIS_POOLS').get(purpose)
+                if options is None:
+                    raise ValueError(f"未知的Redis连接池用途: {purpose}")
+                pool = redis.BlockingConnectionPool.from_url(
+                    _redis_setting(config, 'REDIS_URL'),
+                    max_connections=options['max_connections'],
+                    timeout=_redis_setting(config, 'REDIS_POOL_TIMEOUT'),
+                    decode_responses=options['decode_responses'],
+                    socket_timeout=options['socket_timeout'],
+                    socket_connect_timeout=_redis_setting(config, 'REDIS_CONNECT_TIMEOUT'),
+                    health_check_interval=_redis_setting(config, 'REDIS_HEALTH_CHECK_INTERVAL')
+                )
+                _redis_pools[purpose] = pool
+    return pool
+
+
+def get_redis_client(purpose='cache', config=None):
+    """
+    获取共享连接池上的Redis客户端（客户端本身很轻，连接来自按用途共享的连接池）
+
+    Args:
+        purpose: 连接池用途，queue / cache / pubsub
+        config: 配置对象（首次创建连接池时读取连接参数）
+
+    Returns:
+        redis.Redis实例
+    """
+    import redis
+
+    return redis.Redis(connection_pool=get_redis_pool(purpose, config))
+
+
+def get_redis_pool_stats():
+    """
+    获取各Redis连接池的使用情况
+
+    Returns:
+        {用途: {max_connections, created, in_use, idle, utilization, ...}}
+    """
+    stats = {}
+    for purpose, pool in list(_redis_pools.items()):
+        # 只读快照，不加锁（统计值允许瞬时误差）
+        created = len(pool._connections)
+        idle = sum(1 for connection in list(pool.pool.queue) if connection is not None)
+        kwargs = pool.connection_kwargs
+        stats[purpose] = {
+            'address': f"{kwargs.get('host', kwargs.get('path', ''))}:{kwargs.get('port', '')}/{kwargs.get('db', 0)}",
+            'decode_responses': kwargs.get('decode_responses', False),
+            'max_connections': pool.max_connections,
+            'created': created,
+            'in_use': created - idle,
+            'idle': idle,
+            'utilization': round((created - idle) / pool.max_connections, 3) if pool.max_connections else 0
+        }
+    return stats
@@ -24,7 +24,9 @@ if workers > 8:
 worker_class = "sync"
 
 # 每个 worker 的线程数
-threads = 2
+# SSE接口（任务状态推送、生成任务进度、流式生成）在连接期间占用一个线程，
+# 每个 worker 最多同时保持 SSE_MAX_STREAMS_PER_WORKER 个SSE连接（默认4），其余线程处理普通请求
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
 
 # 超时时间(秒)
 timeout = 120
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+为发布任务表添加内容哈希字段和未结束任务的唯一索引（幂等创建）
+"""
+import sys
+import os
+# 添加父目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import inspect, text
+from models import PublishTask, engine
+
+
+def migrate():
+    """添加 publish_tasks.content_hash 字段并创建唯一索引（已存在时跳过）"""
+    try:
+        existing = {column['name'] for column in inspect(engine).get_columns('publish_tasks')}
+        if 'content_hash' in existing:
+            print('字段 content_hash 已存在，跳过')
+        else:
+            print('添加字段 content_hash...')
+            with engine.begin() as conn:
+                conn.execute(text('ALTER TABLE publish_tasks ADD COLUMN content_hash VARCHAR(64)'))
+
+        for index in PublishTask.__table__.indexes:
+            if index.name == 'uq_publish_tasks_active_content':
+                print(f'创建索引 {index.name}...')
+                index.create(bind=engine, checkfirst=True)
+        print('[SUCCESS] 数据库迁移完成')
+        return True
+    except Exception as e:
+        print(f'\n[ERROR] 迁移失败: {e}')
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+if __name__ == '__main__':
+    print('=' * 60)
+    print('发布任务幂等创建 - 数据库迁移')
+    print('=' * 60)
+    success = migrate()
+    print('=' * 60)
+    sys.exit(0 if success else 1)
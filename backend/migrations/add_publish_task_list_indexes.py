@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+为发布任务表添加列表翻页和状态统计用的联合索引
+"""
+import sys
+import os
+# 添加父目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from models import PublishTask, engine
+
+# 早期按 (created_at, id) 翻页时建立的索引，改为按 id 翻页后不再使用
+OBSOLETE_INDEXES = ('idx_publish_tasks_user_created', 'idx_publish_tasks_user_status')
+
+
+def create_indexes():
+    """创建 publish_tasks 联合索引（已存在时跳过），并删除不再使用的旧索引"""
+    try:
+        for index in PublishTask.__table__.indexes:
+            if index.name in ('idx_publish_tasks_user_id', 'idx_publish_tasks_user_status_id'):
+                print(f'创建索引 {index.name}...')
+                index.create(bind=engine, checkfirst=True)
+        with engine.begin() as conn:
+            for name in OBSOLETE_INDEXES:
+                print(f'删除旧索引 {name}...')
+                conn.execute(text(f'DROP INDEX IF EXISTS {name}'))
+        print('[SUCCESS] 数据库迁移完成')
+        return True
+    except Exception as e:
+        print(f'\n[ERROR] 迁移失败: {e}')
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+if __name__ == '__main__':
+    print('=' * 60)
+    print('发布任务列表索引 - 数据库迁移')
+    print('=' * 60)
+    success = create_indexes()
+    print('=' * 60)
+    sys.exit(0 if success else 1)
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+为发布任务表添加定时发布时间和优先级字段
+"""
+import sys
+import os
+# 添加父目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import inspect, text
+from models import engine
+
+
+COLUMNS = [
+    ('scheduled_at', 'TIMESTAMP NULL'),
+    ('priority', 'INTEGER DEFAULT 0'),
+]
+
+
+def add_columns():
+    """添加 publish_tasks.scheduled_at / priority 字段（已存在时跳过）"""
+    try:
+        existing = {column['name'] for column in inspect(engine).get_columns('publish_tasks')}
+        with engine.begin() as conn:
+            for name, definition in COLUMNS:
+                if name in existing:
+                    print(f'字段 {name} 已存在，跳过')
+                    continue
+                print(f'添加字段 {name}...')
+                conn.execute(text(f'ALTER TABLE publish_tasks ADD COLUMN {name} {definition}'))
+        print('[SUCCESS] 数据库迁移完成')
+        return True
+    except Exception as e:
+        print(f'\n[ERROR] 迁移失败: {e}')
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+if __name__ == '__main__':
+    print('=' * 60)
+    print('发布任务定时发布字段 - 数据库迁移')
+    print('=' * 60)
+    success = add_columns()
+    print('=' * 60)
+    sys.exit(0 if success else 1)
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+创建文章内容指纹表（近似重复检测）
+"""
+import sys
+import os
+# 添加父目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import ContentFingerprint, engine
+
+
+def create_tables():
+    """创建 content_fingerprints 表（已存在时跳过）"""
+    try:
+        print('创建 content_fingerprints 表...')
+        ContentFingerprint.__table__.create(bind=engine, checkfirst=True)
+        print('[SUCCESS] 数据库迁移完成')
+        print('已有数据请执行 scripts/backfill_duplicate_index.py 建立指纹')
+        return True
+    except Exception as e:
+        print(f'\n[ERROR] 迁移失败: {e}')
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+if __name__ == '__main__':
+    print('=' * 60)
+    print('近似重复检测 - 数据库迁移')
+    print('=' * 60)
+    success = create_tables()
+    print('=' * 60)
+    sys.exit(0 if success else 1)
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+创建LLM token用量日汇总表
+"""
+import sys
+import os
+# 添加父目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import TokenUsage, engine
+
+
+def create_tables():
+    """创建 token_usage 表（已存在时跳过）"""
+    try:
+        print('创建 token_usage 表...')
+        TokenUsage.__table__.create(bind=engine, checkfirst=True)
+        print('[SUCCESS] 数据库迁移完成')
+        return True
+    except Exception as e:
+        print(f'\n[ERROR] 迁移失败: {e}')
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+if __name__ == '__main__':
+    print('=' * 60)
+    print('token用量统计 - 数据库迁移')
+    print('=' * 60)
+    success = create_tables()
+    print('=' * 60)
+    sys.exit(0 if success else 1)
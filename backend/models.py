@@ -4,7 +4,7 @@
 统一的 SQLAlchemy ORM 模型定义
 整合了核心业务模型和提示词系统模型
 """
-from sqlalchemy import create_engine, Column, Integer, String, Text, Boolean, TIMESTAMP, ForeignKey, JSON, Float, func
+from sqlalchemy import create_engine, Column, Integer, BigInteger, String, Text, Boolean, TIMESTAMP, ForeignKey, JSON, Float, func, UniqueConstraint, Index, event, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
 from datetime import datetime
@@ -241,6 +241,14 @@ class PublishHistory(Base):
 class PublishTask(Base):
     """发布任务表（RQ队列任务）"""
     __tablename__ = 'publish_tasks'
+    __table_args__ = (
+        # 任务列表按 id 游标翻页；按状态过滤的列表和状态统计走第二个索引
+        Index('idx_publish_tasks_user_id', 'user_id', 'id'),
+        Index('idx_publish_tasks_user_status_id', 'user_id', 'status', 'id'),
+        # 幂等创建：同一用户同一平台相同内容的未结束任务只能有一个
+        Index('uq_publish_tasks_active_content', 'user_id', 'platform', 'content_hash', unique=True,
+              sqlite_where=text("status IN ('pending', 'queued', 'running') AND content_hash IS NOT NULL")),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     task_id = Column(String(100), unique=True, nullable=False, index=True)
@@ -255,6 +263,9 @@ class PublishTask(Base):
     error_message = Column(Text, nullable=True)
     retry_count = Column(Integer, default=0)
     max_retries = Column(Integer, default=3)
+    scheduled_at = Column(TIMESTAMP, nullable=True)  # 定时发布时间（为空表示创建后立即发布）
+    priority = Column(Integer, default=0)  # 优先级，大于0的任务插到队首
+    content_hash = Column(String(64), nullable=True)  # 归一化标题+正文的SHA-256（幂等创建）
     created_at = Column(TIMESTAMP, server_default=func.now(), index=True)
     started_at = Column(TIMESTAMP, nullable=True)
     completed_at = Column(TIMESTAMP, nullable=True)
@@ -278,6 +289,8 @@ class PublishTask(Base):
             'error_message': self.error_message,
             'retry_count': self.retry_count,
             'max_retries': self.max_retries,
+            'scheduled_at': self.scheduled_at.isoformat() if self.scheduled_at else None,
+            'priority': self.priority or 0,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'started_at': self.started_at.isoformat() if self.started_at else None,
             'completed_at': self.completed_at.isoformat() if self.completed_at else None,
@@ -285,6 +298,75 @@ class PublishTask(Base):
         }
 
 
+class TokenUsage(Base):
+    """LLM token用量日汇总表（按 日期/用户/服务商/模型/提示词模板 聚合）"""
+    __tablename__ = 'token_usage'
+    __table_args__ = (
+        UniqueConstraint('date', 'user_id', 'provider', 'model', 'template', name='uq_token_usage_key'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    date = Column(String(10), nullable=False, index=True)  # YYYY-MM-DD
+    user_id = Column(Integer, nullable=False, default=0, index=True)  # 0表示无用户归属（后台调用）
+    provider = Column(String(50), nullable=False)
+    model = Column(String(100), nullable=False)
+    template = Column(String(100), nullable=False, default='')  # 如 article_prompt:3，空表示默认提示词
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
+    calls = Column(Integer, default=0)
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
+
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'date': self.date,
+            'user_id': self.user_id,
+            'provider': self.provider,
+            'model': self.model,
+            'template': self.template,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'total_tokens': (self.prompt_tokens or 0) + (self.completion_tokens or 0),
+            'calls': self.calls
+        }
+
+
+class ContentFingerprint(Base):
+    """文章内容指纹表（SimHash，用于发布前近似重复检测）"""
+    __tablename__ = 'content_fingerprints'
+    __table_args__ = (
+        UniqueConstraint('source', 'source_id', name='uq_content_fingerprint_source'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    source = Column(String(20), nullable=False)  # article / publish
+    source_id = Column(Integer, nullable=False)  # articles.id 或 publish_history.id
+    user_id = Column(Integer, index=True)
+    platform = Column(String(50))  # 平台代码，文章为空
+    title = Column(String(500))
+    simhash = Column(BigInteger, nullable=False)  # 64位SimHash（有符号存储）
+    # SimHash按16位分段，汉明距离<=3的指纹至少有一段相同
+    band0 = Column(Integer, nullable=False, index=True)
+    band1 = Column(Integer, nullable=False, index=True)
+    band2 = Column(Integer, nullable=False, index=True)
+    band3 = Column(Integer, nullable=False, index=True)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+
+
+@event.listens_for(Article, 'after_insert')
+def _index_article_fingerprint(mapper, connection, target):
+    """新文章写入指纹"""
+    from services.duplicate_index import index_on_insert
+    index_on_insert(connection, 'article', target)
+
+
+@event.listens_for(PublishHistory, 'after_insert')
+def _index_publish_fingerprint(mapper, connection, target):
+    """发布成功的记录写入指纹"""
+    from services.duplicate_index import index_on_insert
+    index_on_insert(connection, 'publish', target)
+
+
 # ============================================================================
 # 提示词系统模型
 # ============================================================================
@@ -631,7 +713,8 @@ from models_prompt_template import (
 # 导出所有模型
 __all__ = [
     'Base', 'engine', 'SessionLocal', 'get_db_session',
-    'User', 'Workflow', 'Article', 'PlatformAccount', 'PublishHistory', 'PublishTask',
+    'User', 'Workflow', 'Article', 'PlatformAccount', 'PublishHistory', 'PublishTask', 'TokenUsage',
+    'ContentFingerprint',
     'AnalysisPrompt', 'ArticlePrompt', 'PlatformStylePrompt', 'PromptCombinationLog',
     'PromptTemplateCategory', 'PromptTemplate', 'PromptTemplateUsageLog',
     'PromptTemplateAuditLog', 'PromptExampleLibrary',
@@ -17,6 +17,12 @@ from .base_publisher import (
     NetworkException
 )
 from .config import get_platform_config
+from services.page_waits import (
+    StepTimer, wait_for_dom, wait_for_element, wait_for_page_ready, wait_for_url_change, wait_until
+)
+
+# 文章发布后的地址特征
+ARTICLE_URL_MARK = 'article/details'
 
 
 class CSDNPublisher(BasePlatformPublisher):
@@ -41,6 +47,9 @@ class CSDNPublisher(BasePlatformPublisher):
         self.write_url = self.config['write_url']
         self.timeout = self.config['timeout']
 
+        # 最近一次发布各步骤的耗时 {'total_seconds', 'steps'}
+        self.last_timings = None
+
         # 初始化浏览器
         self._init_browser()
 
@@ -76,34 +85,27 @@ class CSDNPublisher(BasePlatformPublisher):
 
             # 1. 访问登录页面
             self.driver.get(self.login_url)
-            time.sleep(2)
 
             # 2. 切换到密码登录tab
             try:
-                password_tab = self.driver.ele('text:密码登录', timeout=5)
+                password_tab = wait_for_element(self.driver, 'text:密码登录', timeout=5)
                 if password_tab:
                     password_tab.click()
-                    time.sleep(1)
             except Exception:
                 self.logger.warning('未找到密码登录切换按钮，尝试直接输入')
 
-            # 3. 输入账号密码
+            # 3. 输入账号密码（切换tab后等待输入框出现）
             try:
-                username_input = self.driver.ele('#username', timeout=5)
-                if not username_input:
-                    username_input = self.driver.ele('@@placeholder=手机号/邮箱', timeout=5)
-
-                password_input = self.driver.ele('#password', timeout=5)
-                if not password_input:
-                    password_input = self.driver.ele('@@type=password', timeout=5)
+                username_input = wait_for_element(self.driver, ['#username', '@@placeholder=手机号/邮箱'],
+                                                  timeout=5, displayed=True)
+                password_input = wait_for_element(self.driver, ['#password', '@@type=password'],
+                                                  timeout=5, displayed=True)
 
                 if not username_input or not password_input:
                     raise LoginFailedException('未找到用户名或密码输入框')
 
                 username_input.input(username)
-                time.sleep(0.5)
                 password_input.input(password)
-                time.sleep(0.5)
 
                 self.logger.info('账号密码已输入')
             except Exception as e:
@@ -122,11 +124,10 @@ class CSDNPublisher(BasePlatformPublisher):
 
             # 5. 点击登录按钮
             try:
-                login_btn = self.driver.ele('text:登 录', timeout=5)
-                if not login_btn:
-                    login_btn = self.driver.ele('.btn-login', timeout=5)
+                login_btn = wait_for_element(self.driver, ['text:登 录', '.btn-login'], timeout=5)
 
                 if login_btn:
+                    login_url = self.driver.url
                     login_btn.click()
                     self.logger.info('已点击登录按钮')
                 else:
@@ -134,8 +135,8 @@ class CSDNPublisher(BasePlatformPublisher):
             except Exception as e:
                 raise LoginFailedException(f'点击登录按钮失败: {e}')
 
-            # 6. 等待登录完成
-            time.sleep(3)
+            # 6. 等待登录完成（跳转离开登录页）
+            wait_for_url_change(self.driver, login_url, timeout=10)
 
             # 7. 验证登录状态
             if self.is_logged_in():
@@ -209,10 +210,12 @@ class CSDNPublisher(BasePlatformPublisher):
             # 3. 释放滑块
             time.sleep(0.2)
 
-            # 4. 检查验证结果
-            time.sleep(1)
-            success_ele = self.driver.ele('.nc_iconfont nc-lang-cnt nc-success', timeout=2)
-            if success_ele or not self.driver.ele('.nc_iconfont btn_slide', timeout=1):
+            # 4. 等待验证结果（出现成功标识或滑块消失）
+            verified = wait_until(
+                lambda: (wait_for_element(self.driver, '.nc_iconfont nc-lang-cnt nc-success', timeout=0)
+                         or not wait_for_element(self.driver, '.nc_iconfont btn_slide', timeout=0)),
+                timeout=3, description='滑动验证结果')
+            if verified:
                 self.logger.info('滑动验证码验证成功')
                 return True, '滑动验证成功'
             else:
@@ -247,13 +250,9 @@ class CSDNPublisher(BasePlatformPublisher):
             # 如果当前不在CSDN域名下，先访问首页
             if 'csdn.net' not in current_url:
                 self.driver.get('https://www.csdn.net')
-                time.sleep(1)
 
             # 检查是否有用户头像或用户菜单
-            user_avatar = self.driver.ele('.toolbar-user-avatar', timeout=2)
-            user_menu = self.driver.ele('.toolbar-menu-item user', timeout=2)
-
-            if user_avatar or user_menu:
+            if wait_for_element(self.driver, ['.toolbar-user-avatar', '.toolbar-menu-item user'], timeout=3):
                 self.logger.info('检测到用户已登录')
                 return True
 
@@ -291,77 +290,73 @@ class CSDNPublisher(BasePlatformPublisher):
         Returns:
             (是否成功, 消息, 文章URL)
         """
+        timer = StepTimer('csdn')
+        self.last_timings = timer.to_dict()
         try:
             # 检查登录状态
-            if not self.is_logged_in():
-                raise PublishFailedException('未登录，请先登录')
+            with timer.step('检查登录'):
+                if not self.is_logged_in():
+                    raise PublishFailedException('未登录，请先登录')
 
             self.logger.info(f'开始发布文章: {title}')
 
             # 1. 打开写作页面
-            self.driver.get(self.write_url)
-            time.sleep(3)
+            with timer.step('打开写作页'):
+                self.driver.get(self.write_url)
+                wait_for_page_ready(self.driver, timeout=10)
 
             # 2. 切换到Markdown编辑器
             try:
-                markdown_btn = self.driver.ele('text:Markdown编辑器', timeout=3)
+                markdown_btn = wait_for_element(self.driver, 'text:Markdown编辑器', timeout=3)
                 if markdown_btn:
                     markdown_btn.click()
-                    time.sleep(1)
             except Exception:
                 self.logger.info('已在Markdown编辑器模式')
 
             # 3. 输入标题
             try:
-                title_input = self.driver.ele('#txtTitle', timeout=5)
-                if not title_input:
-                    title_input = self.driver.ele('@@placeholder=请输入文章标题', timeout=5)
+                with timer.step('输入标题'):
+                    title_input = wait_for_element(self.driver, ['#txtTitle', '@@placeholder=请输入文章标题'], timeout=10)
+                    if not title_input:
+                        raise PublishFailedException('未找到标题输入框')
 
-                if title_input:
                     title_input.clear()
                     title_input.input(title)
-                    time.sleep(0.5)
-                    self.logger.info('标题已输入')
-                else:
-                    raise PublishFailedException('未找到标题输入框')
+                self.logger.info('标题已输入')
             except Exception as e:
                 raise PublishFailedException(f'输入标题失败: {e}')
 
             # 4. 输入内容
             try:
-                # CSDN使用CodeMirror编辑器
-                content_area = self.driver.ele('.CodeMirror-code', timeout=5)
-                if not content_area:
-                    content_area = self.driver.ele('#content', timeout=5)
+                with timer.step('输入正文'):
+                    # CSDN使用CodeMirror编辑器
+                    content_area = wait_for_element(self.driver, ['.CodeMirror-code', '#content'], timeout=5)
+                    if not content_area:
+                        raise PublishFailedException('未找到内容编辑区域')
 
-                if content_area:
                     # 点击编辑区域获取焦点
                     content_area.click()
-                    time.sleep(0.5)
 
-                    # 使用JavaScript设置内容（更可靠）
+                    # 使用JavaScript设置内容（更可靠），等待编辑器中的内容生效
                     js_code = f"""
                     var editor = document.querySelector('.CodeMirror').CodeMirror;
                     editor.setValue({repr(content)});
                     """
                     self.driver.run_js(js_code)
-                    time.sleep(1)
-
-                    self.logger.info('文章内容已输入')
-                else:
-                    raise PublishFailedException('未找到内容编辑区域')
+                    wait_for_dom(self.driver, "return document.querySelector('.CodeMirror').CodeMirror"
+                                              ".getValue().length > 0;", timeout=3)
+                self.logger.info('文章内容已输入')
             except Exception as e:
                 raise PublishFailedException(f'输入内容失败: {e}')
 
-            # 5. 点击发布按钮
+            # 5. 点击发布按钮（等待发布设置弹窗中的确定按钮出现）
             try:
-                publish_btn = self.driver.ele('text:发布文章', timeout=5)
-                if not publish_btn:
-                    publish_btn = self.driver.ele('.btn-publish', timeout=5)
+                publish_btn = wait_for_element(self.driver, ['text:发布文章', '.btn-publish'], timeout=5)
 
                 if publish_btn:
-                    publish_btn.click()
-                    time.sleep(2)
+                    with timer.step('打开发布设置'):
+                        publish_btn.click()
+                        wait_for_element(self.driver, ['text:确定', '.btn-confirm'], timeout=5)
                     self.logger.info('已点击发布按钮')
                 else:
                     raise PublishFailedException('未找到发布按钮')
@@ -370,38 +365,37 @@ class CSDNPublisher(BasePlatformPublisher):
 
             # 6. 设置文章属性（分类、标签、类型）
             try:
-                # 设置文章类型（原创/转载/翻译）
-                article_type = kwargs.get('article_type', 'original')
-                self._set_article_type(article_type)
-
-                # 设置分类
-                category = kwargs.get('category', '其他')
-                self._set_category(category)
-
-                # 设置标签
-                tags = kwargs.get('tags', [])
-                if tags:
-                    self._add_tags(tags)
-
-                time.sleep(1)
+                with timer.step('设置文章属性'):
+                    # 设置文章类型（原创/转载/翻译）
+                    article_type = kwargs.get('article_type', 'original')
+                    self._set_article_type(article_type)
+
+                    # 设置分类
+                    category = kwargs.get('category', '其他')
+                    self._set_category(category)
+
+                    # 设置标签
+                    tags = kwargs.get('tags', [])
+                    if tags:
+                        self._add_tags(tags)
             except Exception as e:
                 self.logger.warning(f'设置文章属性失败: {e}，继续发布')
 
             # 7. 确认发布
             try:
-                confirm_btn = self.driver.ele('text:确定', timeout=5)
-                if not confirm_btn:
-                    confirm_btn = self.driver.ele('.btn-confirm', timeout=5)
+                confirm_btn = wait_for_element(self.driver, ['text:确定', '.btn-confirm'], timeout=5)
 
                 if confirm_btn:
                     confirm_btn.click()
-                    time.sleep(3)
                     self.logger.info('已确认发布')
             except Exception as e:
                 self.logger.warning(f'确认发布失败: {e}')
 
             # 8. 获取文章URL
-            article_url = self.get_article_url_after_publish()
+            with timer.step('等待发布完成'):
+                article_url = self.get_article_url_after_publish()
+            self.last_timings = timer.to_dict()
+            self.logger.info(f'步骤耗时: {timer.summary()}')
 
             if article_url:
                 self.logger.info(f'文章发布成功: {article_url}')
@@ -411,9 +405,11 @@ class CSDNPublisher(BasePlatformPublisher):
                 return True, '发布成功（未获取到URL）', None
 
         except PublishFailedException as e:
+            self.last_timings = timer.to_dict()
             self.logger.error(f'发布失败: {e}')
             return False, str(e), None
         except Exception as e:
+            self.last_timings = timer.to_dict()
             self.logger.error(f'发布异常: {e}')
             return False, f'发布异常: {e}', None
 
@@ -432,11 +428,10 @@ class CSDNPublisher(BasePlatformPublisher):
             }
 
             type_text = type_mapping.get(article_type, '原创')
-            type_btn = self.driver.ele(f'text:{type_text}', timeout=3)
+            type_btn = wait_for_element(self.driver, f'text:{type_text}', timeout=3)
 
             if type_btn:
                 type_btn.click()
-                time.sleep(0.5)
                 self.logger.info(f'已设置文章类型: {type_text}')
         except Exception as e:
             self.logger.warning(f'设置文章类型失败: {e}')
@@ -450,19 +445,15 @@ class CSDNPublisher(BasePlatformPublisher):
         """
         try:
             # 点击分类下拉框
-            category_select = self.driver.ele('.select-category', timeout=3)
-            if not category_select:
-                category_select = self.driver.ele('text:请选择分类', timeout=3)
+            category_select = wait_for_element(self.driver, ['.select-category', 'text:请选择分类'], timeout=3)
 
             if category_select:
                 category_select.click()
-                time.sleep(0.5)
 
-                # 选择分类选项
-                category_option = self.driver.ele(f'text:{category}', timeout=3)
+                # 选择分类选项（等待下拉列表展开）
+                category_option = wait_for_element(self.driver, f'text:{category}', timeout=3, displayed=True)
                 if category_option:
                     category_option.click()
-                    time.sleep(0.5)
                     self.logger.info(f'已设置分类: {category}')
                 else:
                     self.logger.warning(f'未找到分类: {category}')
@@ -481,17 +472,14 @@ class CSDNPublisher(BasePlatformPublisher):
             tags = tags[:3]
 
             for tag in tags:
-                tag_input = self.driver.ele('.tag-input', timeout=3)
-                if not tag_input:
-                    tag_input = self.driver.ele('@@placeholder=请输入标签', timeout=3)
+                tag_input = wait_for_element(self.driver, ['.tag-input', '@@placeholder=请输入标签'], timeout=3)
 
                 if tag_input:
                     tag_input.input(tag)
-                    time.sleep(0.3)
-
-                    # 按Enter确认
+                    # 等待标签联想请求返回后按Enter确认
+                    wait_for_page_ready(self.driver, timeout=2, quiet_ms=300)
                     tag_input.input('\n')
-                    time.sleep(0.3)
+                    wait_for_page_ready(self.driver, timeout=2, quiet_ms=300)
 
                     self.logger.info(f'已添加标签: {tag}')
         except Exception as e:
@@ -505,26 +493,30 @@ class CSDNPublisher(BasePlatformPublisher):
             文章URL，如果获取失败返回None
         """
         try:
-            time.sleep(2)
+            # 等待跳转到文章页，或出现带文章链接的成功提示
+            def published():
+                if ARTICLE_URL_MARK in self.driver.url:
+                    return self.driver.url
+                return wait_for_element(self.driver, '.success-link', timeout=0)
+
+            outcome = wait_until(published, timeout=10, description='文章发布完成')
 
             # 方法1: 从当前URL获取
-            current_url = self.driver.url
-            if 'article/details' in current_url:
-                self.logger.info(f'从当前URL获取: {current_url}')
-                return current_url
+            if isinstance(outcome, str):
+                self.logger.info(f'从当前URL获取: {outcome}')
+                return outcome
 
             # 方法2: 从成功提示中获取
-            success_link = self.driver.ele('.success-link', timeout=3)
-            if success_link:
-                article_url = success_link.attr('href')
+            if outcome:
+                article_url = outcome.attr('href')
                 if article_url:
                     self.logger.info(f'从成功提示获取: {article_url}')
                     return article_url
 
-            # 方法3: 等待页面跳转
-            time.sleep(3)
-            current_url = self.driver.url
-            if 'article/details' in current_url:
+            # 方法3: 成功提示中没有链接时等待页面跳转
+            current_url = wait_for_url_change(self.driver, '', timeout=5,
+                                              condition=lambda url: ARTICLE_URL_MARK in url)
+            if current_url:
                 self.logger.info(f'等待跳转后获取: {current_url}')
                 return current_url
 
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+为已有文章和发布历史回填近似重复检测指纹
+按ID分批读取，已索引的记录跳过，可中断后重复执行
+
+用法:
+    cd backend && python scripts/backfill_duplicate_index.py [--batch-size 500]
+"""
+import sys
+import os
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import ContentFingerprint, engine
+from services.duplicate_index import get_duplicate_index
+from config import get_config
+
+
+def main():
+    parser = argparse.ArgumentParser(description='回填文章指纹')
+    parser.add_argument('--batch-size', type=int, default=500, help='每批读取的记录数')
+    args = parser.parse_args()
+
+    ContentFingerprint.__table__.create(bind=engine, checkfirst=True)
+
+    def progress(stats):
+        print(f"  文章 {stats['articles']}  发布记录 {stats['publish']}  跳过 {stats['skipped']}", flush=True)
+
+    result = get_duplicate_index(get_config()).backfill(batch_size=args.batch_size, progress=progress)
+    if not result['success']:
+        print(f"[ERROR] 回填失败: {result['error']}")
+        return 1
+    print(f"[SUCCESS] 回填完成: 文章 {result['articles']}，发布记录 {result['publish']}，"
+          f"跳过 {result['skipped']}，耗时 {result['seconds']}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+生成链路端到端吞吐基准
+使用本地 LLM 桩服务（scripts/llm_stub_server.py）按指定并发驱动分析、文章生成、V2提示词生成、
+流式生成以及 Flask 接口，输出吞吐、p50/p95/p99 延迟、线程数和连接数
+
+用法:
+    # 进程内启动桩服务，压测服务层
+    cd backend && python scripts/benchmark_generation.py --concurrency 16 --requests 64 --latency-ms 800
+
+    # 注入故障
+    cd backend && python scripts/benchmark_generation.py --scenarios articles --error-rate 0.05 --hang-rate 0.01
+
+    # 压测运行中的应用接口（应用需配置 QIANWEN_API_BASE 指向桩服务，见 llm_stub_server.py）
+    cd backend && python scripts/benchmark_generation.py --scenarios http --stub-url http://127.0.0.1:18080/v1 \\
+        --base-url http://127.0.0.1:5000 --username bench --password ******
+"""
+import sys
+import os
+import json
+import time
+import logging
+import argparse
+import itertools
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from llm_stub_server import add_stub_arguments, stub_from_args
+from config import Config
+from services.ai_service import AIService
+from services.ai_service_v2 import AIServiceV2
+from services.llm_cache import LLMResponseCache
+from services.llm_transport import get_llm_transport
+from services.llm_executor import get_llm_executor, get_llm_stream_executor
+from services.token_accounting import TokenAccountant
+
+SCENARIOS = ('analyze', 'articles', 'v2', 'stream', 'http')
+
+ANALYSIS = '公司专注于企业级AI应用，核心产品覆盖智能客服、知识库问答和流程自动化，客户以中小企业为主。' * 20
+
+ARTICLE_PROMPT = {
+    'id': 0,
+    'name': '基准文章提示词',
+    'version': 'bench',
+    'system_prompt': '你是一名熟悉企业服务行业的自媒体作者。',
+    'user_template': '请为{{company_name}}撰写一篇推广文章，角度：{{angle}}。\n分析结果：\n{{analysis}}\n'
+                     '直接返回标题和正文：\n标题：[这里是标题]\n正文：\n[这里是正文内容]',
+    'default_angles': ['技术创新', '行业应用', '用户价值', '市场趋势', '案例分析'],
+    'temperature': 0.8,
+    'max_tokens': 3000
+}
+
+
+def make_config(chat_url: str, args) -> Config:
+    """基于应用配置，把千问请求指向桩服务"""
+
+    class BenchConfig(Config):
+        DEFAULT_AI_PROVIDER = 'qianwen'
+        QIANWEN_API_KEY = 'stub'
+        QIANWEN_API_BASE = chat_url.rsplit('/chat/completions', 1)[0]
+        QIANWEN_CHAT_URL = chat_url
+        LLM_CACHE_ENABLED = False
+        LLM_ROUTER_ENABLED = False
+        # 全局并发许可依赖Redis，这里只测单进程
+        LLM_GLOBAL_CONCURRENCY = {}
+        LLM_EXECUTOR_MAX_WORKERS = args.executor_workers
+        LLM_EXECUTOR_MAX_PENDING = args.executor_pending
+        LLM_STREAM_MAX_WORKERS = args.stream_workers
+        LLM_HTTP_POOL_MAXSIZE = args.pool_size
+        ARTICLE_GENERATION_STRATEGY = args.strategy
+        TOKEN_USAGE_FLUSH_INTERVAL = 0
+
+    return BenchConfig()
+
+
+def make_service(cls, config):
+    """创建服务实例（不使用缓存，用量只在进程内累计）"""
+    service = cls(config)
+    service.cache = LLMResponseCache(None, enabled=False)
+    service.accountant = TokenAccountant(None)
+    return service
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """最近秩百分位"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def executor_delta(before: Dict, after: Dict) -> Dict:
+    """执行器在本场景内的任务数和平均排队时间（执行器统计是累计值）"""
+    started_before = before['completed'] + before['running']
+    started_after = after['completed'] + after['running']
+    started = started_after - started_before
+    wait_ms = after['avg_wait_ms'] * started_after - before['avg_wait_ms'] * started_before
+    return {
+        'tasks': after['submitted'] - before['submitted'],
+        'avg_wait_ms': round(wait_ms / started, 2) if started else 0.0
+    }
+
+
+class StubStats:
+    """通过 /stats 接口读取桩服务统计（进程内和外部桩服务相同）"""
+
+    def __init__(self, base_url: str):
+        self.root = base_url.rsplit('/v1', 1)[0]
+
+    def reset(self):
+        requests.post(f'{self.root}/stats/reset', timeout=5)
+
+    def get(self) -> Dict:
+        return requests.get(f'{self.root}/stats', timeout=5).json()
+
+
+class HTTPScenario:
+    """压测运行中的应用：每个工作线程一个登录会话，依次调用 /api/analyze 和 /api/generate_articles"""
+
+    def __init__(self, base_url: str, username: str, password: str, article_count: int, timeout: float):
+        self.base_url = base_url.rstrip('/')
+        self.username = username
+        self.password = password
+        self.article_count = article_count
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            response = session.post(f'{self.base_url}/api/auth/login', timeout=self.timeout,
+                                    json={'username': self.username, 'password': self.password})
+            if response.status_code != 200:
+                raise RuntimeError(f'登录失败: HTTP {response.status_code}')
+            self._local.session = session
+        return session
+
+    def __call__(self, i: int):
+        session = self._session()
+        response = session.post(f'{self.base_url}/api/analyze', timeout=self.timeout,
+                                json={'company_name': f'基准公司{i}', 'company_desc': '企业AI服务商'})
+        if response.status_code != 200:
+            raise RuntimeError(f'analyze HTTP {response.status_code}')
+        result = response.json()
+        response = session.post(f'{self.base_url}/api/generate_articles', timeout=self.timeout, json={
+            'workflow_id': result['workflow_id'],
+            'company_name': result['company_name'],
+            'analysis': result['analysis'],
+            'article_count': self.article_count
+        })
+        if response.status_code != 200:
+            raise RuntimeError(f'generate_articles HTTP {response.status_code}')
+
+
+def run_scenario(name: str, op: Callable[[int], None], concurrency: int, total: int,
+                 stub: StubStats, in_process: bool) -> Dict:
+    """
+    以固定并发执行 total 次操作
+
+    Returns:
+        {scenario, ops, ok, errors, seconds, throughput, p50_ms, p95_ms, p99_ms, max_ms,
+         peak_threads, llm_requests, stub_peak_in_flight, stub_connections, client_new_connections}
+    """
+    stub.reset()
+    transport = get_llm_transport()
+    transport.metrics.reset()
+    # 流式生成在独立的线程池中执行
+    executor = get_llm_stream_executor() if name == 'stream' else get_llm_executor()
+    executor_before = executor.get_stats()
+
+    latencies: List[float] = []
+    errors = Counter()
+    lock = threading.Lock()
+    counter = itertools.count()
+    done = threading.Event()
+    peak_threads = [threading.active_count()]
+
+    def sample_threads():
+        while not done.wait(0.05):
+            peak_threads[0] = max(peak_threads[0], threading.active_count())
+
+    def worker():
+        while True:
+            i = next(counter)
+            if i >= total:
+                return
+            start = time.perf_counter()
+            try:
+                op(i)
+            except Exception as e:
+                with lock:
+                    errors[f'{type(e).__name__}: {str(e)[:60]}'] += 1
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    sampler = threading.Thread(target=sample_threads, daemon=True)
+    sampler.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='bench') as pool:
+        for future in [pool.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    seconds = time.perf_counter() - start
+    done.set()
+    sampler.join()
+
+    latencies.sort()
+    stub_stats = stub.get()
+    client_hosts = transport.metrics.snapshot()
+    return {
+        'scenario': name,
+        'ops': total,
+        'ok': len(latencies),
+        'errors': dict(errors),
+        'seconds': round(seconds, 3),
+        'throughput': round(len(latencies) / seconds, 2) if seconds else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'max_ms': round(latencies[-1] * 1000, 1) if latencies else 0.0,
+        'peak_threads': peak_threads[0],
+        'llm_requests': stub_stats['requests'],
+        'llm_status': stub_stats['status'],
+        'llm_injected': stub_stats['injected'],
+        'stub_peak_in_flight': stub_stats['peak_in_flight'],
+        'stub_connections': stub_stats['connections_opened'],
+        'stub_peak_connections': stub_stats['peak_connections'],
+        # 只有服务层场景的请求经过本进程的连接池
+        'client_new_connections': sum(h['pool_misses'] for h in client_hosts.values()) if in_process else None,
+        'executor': executor_delta(executor_before, executor.get_stats()) if in_process else None
+    }
+
+
+def print_results(results: List[Dict]):
+    print('=' * 118)
+    print(f'{"场景":<10}{"完成/总数":>10}{"吞吐(次/s)":>12}{"p50(ms)":>10}{"p95(ms)":>10}{"p99(ms)":>10}'
+          f'{"max(ms)":>10}{"LLM请求":>9}{"峰值并发":>9}{"桩连接":>8}{"新建连接":>9}{"峰值线程":>9}')
+    print('-' * 118)
+    for r in results:
+        new_connections = '-' if r['client_new_connections'] is None else r['client_new_connections']
+        print(f'{r["scenario"]:<10}{r["ok"]:>5}/{r["ops"]:<4}{r["throughput"]:>12}{r["p50_ms"]:>10}{r["p95_ms"]:>10}'
+              f'{r["p99_ms"]:>10}{r["max_ms"]:>10}{r["llm_requests"]:>9}{r["stub_peak_in_flight"]:>9}'
+              f'{r["stub_connections"]:>8}{new_connections:>9}{r["peak_threads"]:>9}')
+    print('=' * 118)
+    for r in results:
+        if r['errors'] or r['llm_injected']:
+            print(f'{r["scenario"]}: 注入故障 {r["llm_injected"]}，LLM状态码 {r["llm_status"]}')
+            for error, count in r['errors'].items():
+                print(f'    {count:>4} x {error}')
+        if r['executor'] and r['executor']['tasks']:
+            print(f'{r["scenario"]}: 执行器任务 {r["executor"]["tasks"]}，平均排队 {r["executor"]["avg_wait_ms"]}ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生成链路端到端吞吐基准')
+    parser.add_argument('--scenarios', default='analyze,articles,v2,stream',
+                        help=f'逗号分隔，可选 {",".join(SCENARIOS)}')
+    parser.add_argument('--concurrency', type=int, default=8, help='并发请求数')
+    parser.add_argument('--requests', type=int, default=32, help='每个场景的操作次数')
+    parser.add_argument('--article-count', type=int, default=3, help='每次生成的文章数')
+    parser.add_argument('--strategy', choices=AIService.ARTICLE_STRATEGIES, default='fanout', help='文章生成策略')
+    parser.add_argument('--executor-workers', type=int, default=Config.LLM_EXECUTOR_MAX_WORKERS)
+    parser.add_argument('--executor-pending', type=int, default=Config.LLM_EXECUTOR_MAX_PENDING)
+    parser.add_argument('--stream-workers', type=int, default=Config.LLM_STREAM_MAX_WORKERS, help='流式生成线程数')
+    parser.add_argument('--pool-size', type=int, default=Config.LLM_HTTP_POOL_MAXSIZE, help='每主机连接池大小')
+    parser.add_argument('--stub-url', help='使用已启动的桩服务（API base，如 http://127.0.0.1:18080/v1）')
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000', help='http场景的应用地址')
+    parser.add_argument('--username', help='http场景的登录用户名')
+    parser.add_argument('--password', help='http场景的登录密码')
+    parser.add_argument('--timeout', type=float, default=300, help='http场景的请求超时(秒)')
+    parser.add_argument('--json', help='结果另存为JSON文件')
+    parser.add_argument('--verbose', action='store_true', help='输出服务日志')
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f'未知场景: {", ".join(sorted(unknown))}')
+    if 'http' in scenarios and not (args.username and args.password):
+        parser.error('http场景需要 --username 和 --password')
+    if not args.verbose:
+        logging.disable(logging.ERROR)
+
+    stub_server = None
+    if args.stub_url:
+        base_url = args.stub_url.rstrip('/')
+    else:
+        stub_server = stub_from_args(args).start()
+        base_url = stub_server.base_url
+    stub = StubStats(base_url)
+
+    config = make_config(f'{base_url}/chat/completions', args)
+    service = make_service(AIService, config)
+    service_v2 = make_service(AIServiceV2, config)
+    count = args.article_count
+
+    def stream_op(i):
+        name = f'基准公司{i}'
+        articles = [event for event in service.stream_articles(name, service.build_article_specs(name, ANALYSIS, count))
+                    if event['type'] == 'article']
+        if len(articles) < count:
+            raise RuntimeError(f'流式生成只完成 {len(articles)}/{count} 篇')
+
+    def articles_op(generate):
+        def op(i):
+            articles = generate(i)
+            if len(articles) < count:
+                raise RuntimeError(f'只生成 {len(articles)}/{count} 篇')
+        return op
+
+    ops = {
+        'analyze': lambda i: service.analyze_company(f'基准公司{i}', '企业AI服务商'),
+        'articles': articles_op(lambda i: service.generate_articles(
+            f'基准公司{i}', ANALYSIS, article_count=count, strategy=args.strategy)),
+        'v2': articles_op(lambda i: service_v2.generate_articles_with_prompts(
+            f'基准公司{i}', ANALYSIS, ARTICLE_PROMPT, article_count=count, strategy=args.strategy)),
+        'stream': stream_op,
+    }
+    if 'http' in scenarios:
+        ops['http'] = HTTPScenario(args.base_url, args.username, args.password, count, args.timeout)
+
+    print(f'LLM桩服务: {base_url}  延迟 {args.latency_ms}ms ({args.latency_dist}, jitter={args.jitter})')
+    print(f'并发 {args.concurrency}，每场景 {args.requests} 次，每次 {count} 篇（{args.strategy}），'
+          f'执行器 {args.executor_workers} 线程，连接池 {args.pool_size}')
+
+    results = []
+    try:
+        for name in scenarios:
+            print(f'运行 {name} ...', flush=True)
+            results.append(run_scenario(name, ops[name], args.concurrency, args.requests, stub,
+                                        in_process=name != 'http'))
+    finally:
+        if stub_server:
+            stub_server.stop()
+
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'results': results}, f, ensure_ascii=False, indent=2)
+        print(f'结果已保存: {args.json}')
+
+
+if __name__ == '__main__':
+    main()
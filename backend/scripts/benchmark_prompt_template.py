@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+提示词模板渲染微基准
+对比原 render_prompt_template（逐变量 str.replace + 临时构建正则）与编译模板引擎
+
+用法:
+    cd backend && python scripts/benchmark_prompt_template.py [--iterations 2000]
+"""
+import sys
+import os
+import re
+import time
+import argparse
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.prompt_template_engine import PromptTemplateEngine, CompiledTemplate
+
+TEMPLATE = '''
+请为"{{company_name}}"撰写一篇推广文章，文章角度：{{angle}}，时间背景：{{current_year}}年。
+
+{% if analysis %}以下是前期分析结果，请以此为依据：
+{{analysis}}
+{% endif %}
+{% if keywords %}需要自然融入的关键词：{keywords}{% endif %}
+{% if target_audience %}目标读者：{{target_audience}}{% endif %}
+
+【写作规范】
+1. 篇幅：{{min_words}}-{{max_words}}字
+2. 不要使用Markdown格式，不要使用AI套话
+3. 像真人发帖：带个人视角和真实感受，语言口语化
+4. 标题吸引眼球但不夸张
+
+{% if platform %}发布平台：{{platform}}，请符合该平台的写作习惯。{% endif %}
+直接返回标题和正文：
+标题：[这里是标题]
+正文：
+[这里是正文内容]
+'''
+
+VARIABLES = {
+    'company_name': '示例科技有限公司',
+    'angle': '行业应用',
+    'analysis': '公司专注于企业级AI应用，核心产品覆盖智能客服、知识库问答和流程自动化。' * 40,
+    'keywords': '人工智能、降本增效、私有化部署',
+    'target_audience': '中小企业IT负责人',
+    'min_words': 800,
+    'max_words': 1500,
+    'platform': '',
+    'company_desc': '企业AI服务商',
+    'uploaded_text': '',
+}
+
+
+def legacy_render(template_str, variables):
+    """原 AIService.render_prompt_template 实现（基准对照）"""
+    result = template_str
+    variables = {"year": str(datetime.now().year), "current_year": str(datetime.now().year), **variables}
+    for key, value in variables.items():
+        result = result.replace(f'{{{{{key}}}}}', str(value or ''))
+        result = result.replace(f'{{{key}}}', str(value or ''))
+        if_pattern = f'{{%\\s*if\\s+{key}\\s*%}}(.*?){{%\\s*endif\\s*%}}'
+        if value:
+            result = re.sub(if_pattern, r'\1', result, flags=re.DOTALL)
+        else:
+            result = re.sub(if_pattern, '', result, flags=re.DOTALL)
+    result = re.sub(r'\{\{[a-zA-Z_][a-zA-Z0-9_]*\}\}', '', result)
+    result = re.sub(r'\{[a-zA-Z_][a-zA-Z0-9_]*\}', '', result)
+    return result.strip()
+
+
+def bench(name, func, iterations):
+    # 预热
+    for _ in range(min(50, iterations)):
+        func()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    elapsed = time.perf_counter() - start
+    per_call_us = elapsed / iterations * 1e6
+    print(f'{name:<28} {per_call_us:>10.1f} us/次')
+    return per_call_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description='提示词模板渲染微基准')
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    engine = PromptTemplateEngine()
+    cache_key = ('article_prompt', 1, '1.0', 'user_template')
+    year = str(datetime.now().year)
+
+    legacy_output = legacy_render(TEMPLATE, VARIABLES)
+    engine_output = engine.render(TEMPLATE, VARIABLES, cache_key)
+    assert legacy_output == engine_output, '渲染结果不一致'
+
+    print('=' * 60)
+    print(f'模板 {len(TEMPLATE)} 字符，变量 {len(VARIABLES)} 个，迭代 {args.iterations} 次')
+    print('=' * 60)
+    legacy = bench('旧渲染器', lambda: legacy_render(TEMPLATE, VARIABLES), args.iterations)
+    cold = bench('编译+渲染(无缓存)',
+                 lambda: CompiledTemplate(TEMPLATE).render({'year': year, 'current_year': year, **VARIABLES}),
+                 args.iterations)
+    cached = bench('编译缓存命中', lambda: engine.render(TEMPLATE, VARIABLES, cache_key), args.iterations)
+    print('-' * 60)
+    print(f'无缓存加速 {legacy / cold:.1f}x，缓存命中加速 {legacy / cached:.1f}x')
+    print(f'缓存统计: {engine.get_stats()}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+用户限流器基准
+对比旧实现（每次检查4~6次Redis往返、先查后写）与当前Lua脚本实现（一次往返、原子）的
+acquire/release 吞吐，以及多线程争抢同一用户时是否超发
+
+用法（需要本地Redis，默认使用db 15，结束后删除测试key）:
+    cd backend && python scripts/benchmark_rate_limiter.py
+    cd backend && python scripts/benchmark_rate_limiter.py --threads 16 --ops 20000 --redis-url redis://127.0.0.1:6379/15
+"""
+import sys
+import os
+import json
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import redis
+from services.user_rate_limiter import UserRateLimiter
+
+# 测试用户ID从这里开始，避免与真实用户的限流key冲突
+USER_BASE = 900000000
+
+
+class LegacyUserRateLimiter(UserRateLimiter):
+    """旧实现：分别检查并发和滑动窗口，再单独写入（逐条命令往返，非原子）"""
+
+    def check_rate_limit(self, user_id: int):
+        key = self._get_rate_key(user_id)
+        current_time = time.time()
+        self.redis.zremrangebyscore(key, 0, current_time - self.window_size)
+        current_count = self.redis.zcard(key)
+        allowed = current_count < self.max_tasks_per_minute
+        if allowed:
+            self.redis.zadd(key, {str(current_time): current_time})
+            self.redis.expire(key, self.window_size * 2)
+        return allowed, current_count
+
+    def acquire(self, user_id: int) -> bool:
+        concurrent_allowed, _ = self.check_concurrent_limit(user_id)
+        if not concurrent_allowed:
+            return False
+        rate_allowed, _ = self.check_rate_limit(user_id)
+        if not rate_allowed:
+            return False
+        key = self._get_concurrent_key(user_id)
+        self.redis.incr(key)
+        self.redis.expire(key, 3600)
+        return True
+
+    def release(self, user_id: int):
+        key = self._get_concurrent_key(user_id)
+        if int(self.redis.get(key) or 0) > 0:
+            self.redis.decr(key)
+
+
+def throughput(limiter: UserRateLimiter, threads: int, ops: int, users: int) -> Dict:
+    """不触发限制时的 acquire+release 吞吐"""
+    limiter.max_tasks_per_minute = ops * 10
+    limiter.max_concurrent_tasks = ops * 10
+    per_thread = ops // threads
+
+    def run(index):
+        user_id = USER_BASE + index % users
+        for _ in range(per_thread):
+            limiter.acquire(user_id)
+            limiter.release(user_id)
+
+    began = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(run, range(threads)))
+    elapsed = time.perf_counter() - began
+    return {
+        'ops': per_thread * threads,
+        'seconds': round(elapsed, 3),
+        'acquire_release_per_sec': round(per_thread * threads / elapsed, 1)
+    }
+
+
+def contention(limiter: UserRateLimiter, threads: int, attempts: int, user_id: int) -> Dict:
+    """多线程同时为同一用户申请，统计实际获得的令牌数（不应超过并发上限）"""
+    barrier = threading.Barrier(threads)
+
+    def run(_):
+        barrier.wait()
+        return sum(1 for _ in range(attempts) if limiter.acquire(user_id))
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        granted = sum(pool.map(run, range(threads)))
+    limit = min(limiter.max_concurrent_tasks, limiter.max_tasks_per_minute)
+    return {'granted': granted, 'limit': limit, 'over_admitted': max(granted - limit, 0)}
+
+
+def cleanup(client: redis.Redis, users: int):
+    """删除测试用户的限流key"""
+    keys = []
+    for user_id in range(USER_BASE, USER_BASE + users + 2):
+        keys += [f"ratelimit:user:{user_id}:concurrent", f"ratelimit:user:{user_id}:rate"]
+    client.delete(*keys)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='用户限流器基准')
+    parser.add_argument('--redis-url', default='redis://localhost:6379/15', help='Redis地址（会写入测试key）')
+    parser.add_argument('--threads', type=int, default=8, help='并发线程数')
+    parser.add_argument('--ops', type=int, default=10000, help='acquire+release 总次数')
+    parser.add_argument('--users', type=int, default=50, help='吞吐测试的用户数')
+    parser.add_argument('--contention-rounds', type=int, default=5, help='争抢测试的轮数')
+    parser.add_argument('--json', action='store_true', help='以JSON输出结果')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    client = redis.Redis.from_url(args.redis_url, decode_responses=True, max_connections=args.threads * 2)
+    client.ping()
+
+    results = {}
+    try:
+        for name, cls in (('legacy', LegacyUserRateLimiter), ('lua', UserRateLimiter)):
+            cleanup(client, args.users)
+            results[name] = {'throughput': throughput(cls(client), args.threads, args.ops, args.users)}
+
+            over_admitted = 0
+            for _ in range(args.contention_rounds):
+                cleanup(client, args.users)
+                result = contention(cls(client), args.threads, 5, USER_BASE + args.users + 1)
+                over_admitted = max(over_admitted, result['over_admitted'])
+            results[name]['contention'] = {
+                'threads': args.threads,
+                'rounds': args.contention_rounds,
+                'limit': result['limit'],
+                'max_over_admitted': over_admitted
+            }
+    finally:
+        cleanup(client, args.users)
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+
+    for name, result in results.items():
+        stats = result['throughput']
+        print(f"{name:<8} {stats['acquire_release_per_sec']:>10} acquire+release/s "
+              f"({stats['ops']} 次, {args.threads} 线程, {stats['seconds']}s), "
+              f"争抢超发最多 {result['contention']['max_over_admitted']} 个 (上限 {result['contention']['limit']})")
+    speedup = results['lua']['throughput']['acquire_release_per_sec'] / results['legacy']['throughput']['acquire_release_per_sec']
+    print(f"Lua实现吞吐为旧实现的 {speedup:.1f} 倍")
+
+
+if __name__ == '__main__':
+    main()
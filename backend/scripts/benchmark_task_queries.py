@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+任务列表查询基准
+在独立的SQLite文件中生成指定数量的发布任务（默认100万条，其中一个重度用户占30%），
+对比旧实现（1次count + 5次按状态count + OFFSET翻页）与当前实现（GROUP BY统计 + 游标翻页）
+的首页轮询延迟和深翻页延迟
+
+用法:
+    cd backend && python scripts/benchmark_task_queries.py
+    cd backend && python scripts/benchmark_task_queries.py --rows 200000 --pages 200 --json
+
+    # 使用Redis统计缓存（需要本地Redis）
+    cd backend && python scripts/benchmark_task_queries.py --stats-cache
+"""
+import sys
+import os
+import json
+import time
+import random
+import logging
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+from typing import Callable, Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+import models
+from models import PublishTask
+from services.task_queue_manager import TaskQueueManager
+from services.task_stats_cache import TaskStatsCache
+
+STATUSES = ['success'] * 80 + ['failed'] * 10 + ['cancelled'] * 5 + ['queued'] * 3 + ['pending', 'running']
+
+
+def seed(engine, rows: int, users: int, heavy_share: float, batch_size: int = 50000):
+    """生成任务数据（表中已有同样数量的数据时跳过）"""
+    PublishTask.__table__.create(bind=engine, checkfirst=True)
+    with engine.connect() as conn:
+        existing = conn.execute(text('SELECT COUNT(*) FROM publish_tasks')).scalar()
+    if existing == rows:
+        print(f'使用已有数据: {existing} 条')
+        return
+    if existing:
+        raise SystemExit(f'{engine.url.database} 中已有 {existing} 条任务，与 --rows 不一致，请换一个 --db')
+
+    rng = random.Random(42)
+    start = datetime.now() - timedelta(days=180)
+    step = 180 * 86400 / rows
+    insert = PublishTask.__table__.insert()
+    began = time.time()
+    with engine.begin() as conn:
+        for offset in range(0, rows, batch_size):
+            batch = []
+            for i in range(offset, min(offset + batch_size, rows)):
+                # 用户1是重度用户，其余任务在其他用户之间均匀分布
+                user_id = 1 if rng.random() < heavy_share else rng.randint(2, users)
+                created_at = start + timedelta(seconds=int(i * step))
+                batch.append({
+                    'task_id': f'bench-{i}',
+                    'user_id': user_id,
+                    'article_title': f'基准任务{i}',
+                    'article_content': '正文',
+                    'platform': 'zhihu',
+                    'status': rng.choice(STATUSES),
+                    'created_at': created_at,
+                    'updated_at': created_at
+                })
+            conn.execute(insert, batch)
+            print(f'  已写入 {min(offset + batch_size, rows)}/{rows}', end='\r')
+    print(f'\n生成 {rows} 条任务用时 {time.time() - began:.1f}s')
+
+
+def legacy_get_user_tasks(user_id: int, status=None, limit: int = 20, offset: int = 0) -> Dict:
+    """旧实现：总数count + 每个状态一次count + OFFSET翻页"""
+    db = models.get_db_session()
+    try:
+        query = db.query(PublishTask).filter(PublishTask.user_id == user_id)
+        if status:
+            query = query.filter(PublishTask.status == status)
+        total = query.count()
+        tasks = query.order_by(PublishTask.created_at.desc()).limit(limit).offset(offset).all()
+        stats = {
+            name: db.query(PublishTask).filter(
+                PublishTask.user_id == user_id,
+                PublishTask.status == name
+            ).count()
+            for name in ('pending', 'queued', 'running', 'success', 'failed')
+        }
+        return {'success': True, 'total': total, 'tasks': [task.to_dict() for task in tasks], 'stats': stats}
+    finally:
+        db.close()
+
+
+def measure(func: Callable, repeat: int) -> Dict:
+    """重复调用并统计延迟(毫秒)"""
+    latencies = []
+    for _ in range(repeat):
+        began = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - began) * 1000)
+    latencies.sort()
+    return {
+        'p50_ms': round(latencies[len(latencies) // 2], 2),
+        'p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 2),
+        'max_ms': round(latencies[-1], 2)
+    }
+
+
+def cursor_at(engine, user_id: int, position: int):
+    """取重度用户倒序第 position 条任务对应的游标（不计时）"""
+    with engine.connect() as conn:
+        row = conn.execute(text(
+            'SELECT id FROM publish_tasks WHERE user_id = :user_id '
+            'ORDER BY id DESC LIMIT 1 OFFSET :offset'
+        ), {'user_id': user_id, 'offset': position - 1}).first()
+    return str(row[0]) if row is not None else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='任务列表查询基准')
+    parser.add_argument('--db', default=os.path.join(tempfile.gettempdir(), 'topn_bench_publish_tasks.db'),
+                        help='基准数据库文件（不要指向正式数据库）')
+    parser.add_argument('--rows', type=int, default=1000000, help='任务总数')
+    parser.add_argument('--users', type=int, default=500, help='用户数')
+    parser.add_argument('--heavy-share', type=float, default=0.3, help='重度用户(ID=1)的任务占比')
+    parser.add_argument('--limit', type=int, default=20, help='每页任务数')
+    parser.add_argument('--repeat', type=int, default=50, help='首页轮询的重复次数')
+    parser.add_argument('--deep-pages', default='10,100,1000,10000', help='深翻页测试的页码，逗号分隔')
+    parser.add_argument('--stats-cache', action='store_true', help='使用本地Redis统计缓存')
+    parser.add_argument('--json', action='store_true', help='以JSON输出结果')
+    parser.add_argument('--verbose', action='store_true', help='输出服务日志')
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.WARNING)
+
+    if os.path.abspath(args.db) == os.path.abspath(models.DB_PATH):
+        raise SystemExit('--db 不能指向正式数据库')
+
+    engine = create_engine(f'sqlite:///{args.db}', connect_args={'check_same_thread': False})
+    seed(engine, args.rows, args.users, args.heavy_share)
+    # 服务层通过 get_db_session 访问数据库，指向基准数据库
+    models.SessionLocal.configure(bind=engine)
+
+    manager = TaskQueueManager()
+    if args.stats_cache:
+        from config import get_redis_client
+        manager.stats_cache = TaskStatsCache(get_redis_client('cache'), ttl=5)
+    else:
+        manager.stats_cache = TaskStatsCache(None)
+
+    with engine.connect() as conn:
+        counts = dict(conn.execute(text(
+            'SELECT user_id, COUNT(*) FROM publish_tasks WHERE user_id IN (1, 2) GROUP BY user_id'
+        )).all())
+
+    results = {'rows': args.rows, 'user_tasks': {str(k): v for k, v in counts.items()}, 'scenarios': {}}
+    for user_id, label in ((1, 'heavy_user'), (2, 'normal_user')):
+        for status in (None, 'failed'):
+            name = f'{label}_first_page' + (f'_{status}' if status else '')
+            results['scenarios'][name] = {
+                'legacy': measure(lambda: legacy_get_user_tasks(user_id, status, args.limit), args.repeat),
+                'current': measure(lambda: manager.get_user_tasks(user_id, status, args.limit), args.repeat)
+            }
+
+    # 深翻页：重度用户直接跳到第N页（统计部分两边相同，差异来自OFFSET扫描）
+    deep = results['scenarios']['heavy_user_deep_paging'] = {}
+    for page in (int(page) for page in args.deep_pages.split(',')):
+        cursor = cursor_at(engine, 1, (page - 1) * args.limit) if page > 1 else None
+        if page > 1 and cursor is None:
+            break
+        offset = (page - 1) * args.limit
+        legacy_page = legacy_get_user_tasks(1, None, args.limit, offset)
+        current_page = manager.get_user_tasks(1, None, args.limit, cursor=cursor)
+        deep[f'page_{page}'] = {
+            'legacy': measure(lambda: legacy_get_user_tasks(1, None, args.limit, offset), max(args.repeat // 5, 3)),
+            'current': measure(lambda: manager.get_user_tasks(1, None, args.limit, cursor=cursor),
+                               max(args.repeat // 5, 3)),
+            'same_page': [task['id'] for task in legacy_page['tasks']] == [task['id'] for task in current_page['tasks']]
+        }
+
+    # 两种实现的统计结果应一致
+    legacy = legacy_get_user_tasks(1, None, args.limit)
+    current = manager.get_user_tasks(1, None, args.limit)
+    results['consistent'] = (
+        all(legacy['stats'][name] == current['stats'][name] for name in legacy['stats'])
+        and [task['id'] for task in legacy['tasks']] == [task['id'] for task in current['tasks']]
+    )
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+
+    print(f"\n任务总数: {args.rows}, 重度用户任务数: {counts.get(1)}, 普通用户任务数: {counts.get(2)}")
+    print(f"{'场景':<36}{'实现':<10}{'p50(ms)':>10}{'p95(ms)':>10}{'max(ms)':>10}")
+    for name, scenario in results['scenarios'].items():
+        if name == 'heavy_user_deep_paging':
+            continue
+        for impl, stats in scenario.items():
+            print(f"{name:<36}{impl:<10}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['max_ms']:>10}")
+    print(f"\n深翻页（重度用户，每页{args.limit}条）")
+    for page, stats in results['scenarios']['heavy_user_deep_paging'].items():
+        print(f"  {page:<12} legacy p50 {stats['legacy']['p50_ms']}ms, current p50 {stats['current']['p50_ms']}ms, "
+              f"同一页: {stats['same_page']}")
+    print(f"\n结果一致: {results['consistent']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文章清理吞吐基准
+对比旧版 remove_markdown_and_ai_traces（逐条正则 + 逐个 str.replace）与 TextScrubber
+
+用法:
+    cd backend && python scripts/benchmark_text_scrubber.py [--articles 200] [--chars 3000]
+"""
+import sys
+import os
+import re
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.text_scrubber import AI_PHRASES, scrub_text, scrub_many
+
+SENTENCES = [
+    '这家公司专注于企业级AI应用，核心产品覆盖智能客服、知识库问答和流程自动化。',
+    '我上个月试用了一下，整体体验比预期好不少，尤其是夜间的自动回复。',
+    '对于中小企业来说，部署成本和维护成本往往比功能本身更重要。',
+    '他们的团队大多来自一线互联网公司，对高并发场景比较有经验。',
+    '客户反馈里提到最多的是响应速度，其次是对行业术语的理解。',
+]
+MARKDOWN = ['\n## 小标题\n', '**重点内容**', '\n- 列表项\n', '\n1. 编号项\n', '`代码`', '\n> 引用\n', '\n\n\n']
+
+
+def legacy_scrub(text):
+    """旧版实现（基准对照）"""
+    text = re.sub(r'#{1,6}\s+', '', text)
+    text = re.sub(r'\*\*([^*]+)\*\*', r'\1', text)
+    text = re.sub(r'\*([^*]+)\*', r'\1', text)
+    text = re.sub(r'__([^_]+)__', r'\1', text)
+    text = re.sub(r'_([^_]+)_', r'\1', text)
+    text = re.sub(r'^\s*[-*+]\s+', '', text, flags=re.MULTILINE)
+    text = re.sub(r'^\s*\d+\.\s+', '', text, flags=re.MULTILINE)
+    text = re.sub(r'\[([^\]]+)\]\([^)]+\)', r'\1', text)
+    text = re.sub(r'!\[([^\]]*)\]\([^)]+\)', '', text)
+    text = re.sub(r'```[\s\S]*?```', '', text)
+    text = re.sub(r'`([^`]+)`', r'\1', text)
+    text = re.sub(r'^\s*>\s+', '', text, flags=re.MULTILINE)
+    text = re.sub(r'^[-*_]{3,}\s*$', '', text, flags=re.MULTILINE)
+    for phrase in AI_PHRASES:
+        text = text.replace(phrase, '')
+    text = re.sub(r'\n{3,}', '\n\n', text)
+    text = '\n'.join(line.strip() for line in text.split('\n'))
+    return text.strip()
+
+
+def make_article(rng, chars, markdown_ratio):
+    parts = []
+    length = 0
+    while length < chars:
+        if rng.random() < 0.15:
+            part = rng.choice(AI_PHRASES)
+        elif rng.random() < markdown_ratio:
+            part = rng.choice(MARKDOWN)
+        else:
+            part = rng.choice(SENTENCES)
+        parts.append(part)
+        length += len(part)
+    return ''.join(parts)
+
+
+def bench(name, func, texts, repeat):
+    func(texts[:5])
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(texts)
+    elapsed = (time.perf_counter() - start) / repeat
+    total_chars = sum(len(t) for t in texts)
+    print(f'{name:<24} {elapsed * 1000:>9.1f} ms  {total_chars / elapsed / 1e6:>7.2f} M字/秒')
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='文章清理吞吐基准')
+    parser.add_argument('--articles', type=int, default=200)
+    parser.add_argument('--chars', type=int, default=3000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    for label, markdown_ratio in (('纯文本', 0.0), ('含Markdown', 0.2)):
+        texts = [make_article(rng, args.chars, markdown_ratio) for _ in range(args.articles)]
+        assert [legacy_scrub(t) for t in texts] == scrub_many(texts), '清理结果不一致'
+
+        print('=' * 60)
+        print(f'{label}: {args.articles} 篇 × 约{args.chars} 字')
+        print('=' * 60)
+        legacy = bench('旧实现（逐篇）', lambda ts: [legacy_scrub(t) for t in ts], texts, args.repeat)
+        single = bench('TextScrubber（逐篇）', lambda ts: [scrub_text(t) for t in ts], texts, args.repeat)
+        batch = bench('scrub_many', scrub_many, texts, args.repeat)
+        print(f'加速: 逐篇 {legacy / single:.1f}x，批量 {legacy / batch:.1f}x\n')
+
+
+if __name__ == '__main__':
+    main()
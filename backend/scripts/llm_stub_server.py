@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地 OpenAI 兼容 LLM 桩服务
+模拟 /chat/completions 的普通与流式(SSE)响应，可配置响应延迟分布和故障注入，用于压测生成链路而不消耗真实API额度
+
+用法:
+    cd backend && python scripts/llm_stub_server.py --port 18080 --latency-ms 800 --latency-dist lognormal
+
+    # 让应用把千问请求发到桩服务
+    QIANWEN_API_BASE=http://127.0.0.1:18080/v1 QIANWEN_API_KEY=stub python app.py
+
+    GET  /stats        请求数、状态码分布、注入的故障数、连接数和并发峰值
+    POST /stats/reset  清空统计
+"""
+import sys
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+SENTENCES = [
+    '这家公司专注于企业级AI应用，核心产品覆盖智能客服、知识库问答和流程自动化。',
+    '我上个月试用了一下，整体体验比预期好不少，尤其是夜间的自动回复。',
+    '对于中小企业来说，部署成本和维护成本往往比功能本身更重要。',
+    '他们的团队大多来自一线互联网公司，对高并发场景比较有经验。',
+    '客户反馈里提到最多的是响应速度，其次是对行业术语的理解。',
+    '在价格方面，基础版按坐席收费，专业版提供私有化部署选项。',
+    '从行业趋势看，大模型落地最先发生在客服和营销这类高频场景。',
+    '如果只看功能列表很难区分厂商，真正的差距在于交付和服务。',
+]
+
+LATENCY_DISTRIBUTIONS = ('fixed', 'uniform', 'normal', 'lognormal')
+
+# 批量生成提示词中的文章数量（见 AIService._build_batch_article_messages）
+_BATCH_COUNT = re.compile(r'共(\d+)项')
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数（中文按字，其他按4字符一个token）"""
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return len(text) - ascii_chars + ascii_chars // 4
+
+
+class LLMStubServer:
+    """
+    OpenAI 兼容的 chat completions 桩服务
+
+    每个请求先按延迟分布等待（模拟首字节延迟），流式请求再按 stream_chunk_ms 逐块推送。
+    故障注入按概率依次判定：error 返回错误状态码，disconnect 直接断开连接，
+    hang 先挂起 hang_seconds 再正常响应（用于触发客户端超时），truncate 流式输出到一半断开。
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency_ms: float = 500,
+                 latency_dist: str = 'lognormal', jitter: float = 0.3, completion_chars: int = 1200,
+                 stream_chunk_chars: int = 20, stream_chunk_ms: float = 10,
+                 error_rate: float = 0.0, error_codes: Optional[List[int]] = None,
+                 disconnect_rate: float = 0.0, hang_rate: float = 0.0, hang_seconds: float = 30,
+                 truncate_rate: float = 0.0, seed: Optional[int] = None):
+        """
+        初始化桩服务
+
+        Args:
+            host: 监听地址
+            port: 监听端口（0表示随机端口）
+            latency_ms: 首字节延迟（fixed/uniform/normal为均值，lognormal为中位数）
+            latency_dist: 延迟分布 fixed / uniform / normal / lognormal
+            jitter: 分布离散程度（uniform为±比例，normal为标准差/均值，lognormal为sigma）
+            completion_chars: 每篇文章正文的字数
+            stream_chunk_chars: 流式响应每块的字数
+            stream_chunk_ms: 流式响应块间隔(毫秒)
+            error_rate: 返回错误状态码的概率
+            error_codes: 错误状态码，随机选取（默认 429/500/503）
+            disconnect_rate: 不响应直接断开连接的概率
+            hang_rate: 挂起 hang_seconds 后再响应的概率
+            hang_seconds: 挂起时间(秒)
+            truncate_rate: 流式响应中途断开的概率
+            seed: 随机种子
+        """
+        if latency_dist not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f'不支持的延迟分布: {latency_dist}')
+        self.latency_ms = latency_ms
+        self.latency_dist = latency_dist
+        self.jitter = jitter
+        self.completion_chars = completion_chars
+        self.stream_chunk_chars = max(1, stream_chunk_chars)
+        self.stream_chunk_ms = stream_chunk_ms
+        self.error_rate = error_rate
+        self.error_codes = error_codes or [429, 500, 503]
+        self.disconnect_rate = disconnect_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.truncate_rate = truncate_rate
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._reset_counters()
+
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    # ------------------------------------------------------------------ 统计
+
+    def _reset_counters(self):
+        self._stats = {
+            'requests': 0,
+            'streamed': 0,
+            'prompt_tokens': 0,
+            'completion_tokens': 0,
+            'connections_opened': 0,
+            'connections_open': 0,
+            'peak_connections': 0,
+            'in_flight': 0,
+            'peak_in_flight': 0,
+        }
+        self._status = Counter()
+        self._injected = Counter()
+
+    def _incr(self, field: str, amount: int = 1, peak: Optional[str] = None):
+        with self._lock:
+            self._stats[field] += amount
+            if peak:
+                self._stats[peak] = max(self._stats[peak], self._stats[field])
+
+    def get_stats(self) -> Dict:
+        """获取统计快照"""
+        with self._lock:
+            return {
+                **self._stats,
+                'status': {str(code): count for code, count in self._status.items()},
+                'injected': dict(self._injected)
+            }
+
+    def reset_stats(self):
+        """清空统计（保留当前打开的连接数和进行中的请求数）"""
+        with self._lock:
+            open_connections = self._stats['connections_open']
+            in_flight = self._stats['in_flight']
+            self._reset_counters()
+            self._stats['connections_open'] = self._stats['peak_connections'] = open_connections
+            self._stats['in_flight'] = self._stats['peak_in_flight'] = in_flight
+
+    # ------------------------------------------------------------------ 行为
+
+    def _random(self) -> float:
+        with self._lock:
+            return self._rng.random()
+
+    def sample_latency(self) -> float:
+        """按配置的分布采样一次首字节延迟(秒)"""
+        mean = self.latency_ms / 1000
+        with self._lock:
+            if self.latency_dist == 'fixed':
+                value = mean
+            elif self.latency_dist == 'uniform':
+                value = self._rng.uniform(mean * (1 - self.jitter), mean * (1 + self.jitter))
+            elif self.latency_dist == 'normal':
+                value = self._rng.gauss(mean, mean * self.jitter)
+            else:
+                value = mean * self._rng.lognormvariate(0, self.jitter)
+        return max(0.0, value)
+
+    def _choose_fault(self, stream: bool) -> Optional[str]:
+        roll = self._random()
+        for fault, rate in (('error', self.error_rate), ('disconnect', self.disconnect_rate),
+                            ('hang', self.hang_rate), ('truncate', self.truncate_rate if stream else 0.0)):
+            if roll < rate:
+                return fault
+            roll -= rate
+        return None
+
+    def _article_text(self, index: int) -> tuple:
+        """构造第index篇文章的 (标题, 正文)"""
+        body = []
+        length = 0
+        i = index
+        while length < self.completion_chars:
+            sentence = SENTENCES[i % len(SENTENCES)]
+            body.append(sentence)
+            length += len(sentence)
+            i += 3
+            if len(body) % 4 == 0:
+                body.append('\n')
+        return f'聊聊这家公司的第{index + 1}个观察', ''.join(body)
+
+    def build_completion(self, messages: List[Dict]) -> str:
+        """
+        按请求内容构造返回文本：批量生成请求返回JSON文章数组，其他请求返回“标题/正文”格式
+        """
+        prompt = messages[-1].get('content', '') if messages else ''
+        match = _BATCH_COUNT.search(prompt) if '"articles"' in prompt else None
+        if match:
+            articles = []
+            for i in range(int(match.group(1))):
+                title, body = self._article_text(i)
+                articles.append({'angle': f'角度{i + 1}', 'title': title, 'content': body})
+            return json.dumps({'articles': articles}, ensure_ascii=False)
+        title, body = self._article_text(len(prompt) % len(SENTENCES))
+        return f'标题：{title}\n正文：\n{body}'
+
+    # ------------------------------------------------------------------ HTTP
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                stub._incr('connections_opened')
+                stub._incr('connections_open', peak='peak_connections')
+
+            def finish(self):
+                try:
+                    super().finish()
+                finally:
+                    stub._incr('connections_open', -1)
+
+            def _send_json(self, status: int, payload: Dict, headers: Optional[Dict] = None):
+                body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+                with stub._lock:
+                    stub._status[status] += 1
+
+            def do_GET(self):
+                if self.path.rstrip('/') == '/stats':
+                    self._send_json(200, stub.get_stats())
+                else:
+                    self._send_json(404, {'error': {'message': 'not found'}})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                raw = self.rfile.read(length) if length else b''
+                path = self.path.rstrip('/')
+                if path == '/stats/reset':
+                    stub.reset_stats()
+                    self._send_json(200, {'success': True})
+                    return
+                if not path.endswith('/chat/completions'):
+                    self._send_json(404, {'error': {'message': 'not found'}})
+                    return
+
+                stub._incr('in_flight', peak='peak_in_flight')
+                try:
+                    self._handle_completion(raw)
+                finally:
+                    stub._incr('in_flight', -1)
+
+            def _handle_completion(self, raw: bytes):
+                try:
+                    request = json.loads(raw or b'{}')
+                except ValueError:
+                    self._send_json(400, {'error': {'message': 'invalid json'}})
+                    return
+
+                stub._incr('requests')
+                stream = bool(request.get('stream'))
+                fault = stub._choose_fault(stream)
+                if fault:
+                    with stub._lock:
+                        stub._injected[fault] += 1
+
+                time.sleep(stub.hang_seconds if fault == 'hang' else stub.sample_latency())
+
+                if fault == 'disconnect':
+                    self.close_connection = True
+                    return
+                if fault == 'error':
+                    status = stub.error_codes[int(stub._random() * len(stub.error_codes))]
+                    self._send_json(status, {'error': {'message': f'injected error {status}', 'code': status}},
+                                    headers={'Retry-After': '1'} if status == 429 else None)
+                    return
+
+                messages = request.get('messages', [])
+                content = stub.build_completion(messages)
+                usage = {
+                    'prompt_tokens': sum(estimate_tokens(m.get('content', '')) for m in messages),
+                    'completion_tokens': estimate_tokens(content)
+                }
+                usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+                stub._incr('prompt_tokens', usage['prompt_tokens'])
+                stub._incr('completion_tokens', usage['completion_tokens'])
+                model = request.get('model', 'stub-model')
+
+                if not stream:
+                    self._send_json(200, {
+                        'id': f'stub-{time.time_ns()}',
+                        'object': 'chat.completion',
+                        'model': model,
+                        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content},
+                                     'finish_reason': 'stop'}],
+                        'usage': usage
+                    })
+                    return
+
+                stub._incr('streamed')
+                include_usage = bool((request.get('stream_options') or {}).get('include_usage'))
+                self._stream(content, model, usage if include_usage else None, truncate=fault == 'truncate')
+
+            def _stream(self, content: str, model: str, usage: Optional[Dict], truncate: bool):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                with stub._lock:
+                    stub._status[200] += 1
+                self.close_connection = True
+
+                size = stub.stream_chunk_chars
+                chunks = [content[i:i + size] for i in range(0, len(content), size)]
+                if truncate:
+                    chunks = chunks[:len(chunks) // 2]
+                try:
+                    for text in chunks:
+                        event = {'object': 'chat.completion.chunk', 'model': model,
+                                 'choices': [{'index': 0, 'delta': {'content': text}, 'finish_reason': None}]}
+                        self.wfile.write(f'data: {json.dumps(event, ensure_ascii=False)}\n\n'.encode('utf-8'))
+                        self.wfile.flush()
+                        if stub.stream_chunk_ms:
+                            time.sleep(stub.stream_chunk_ms / 1000)
+                    if truncate:
+                        return
+                    if usage:
+                        event = {'object': 'chat.completion.chunk', 'model': model, 'choices': [], 'usage': usage}
+                        self.wfile.write(f'data: {json.dumps(event)}\n\n'.encode('utf-8'))
+                    self.wfile.write(b'data: [DONE]\n\n')
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    # 客户端提前断开
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    # ------------------------------------------------------------------ 生命周期
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    @property
+    def base_url(self) -> str:
+        """OpenAI 兼容的 API base（配置到 *_API_BASE）"""
+        return f'http://{self._server.server_address[0]}:{self.port}/v1'
+
+    @property
+    def chat_url(self) -> str:
+        """chat completions 地址（配置到 *_CHAT_URL）"""
+        return f'{self.base_url}/chat/completions'
+
+    def start(self) -> 'LLMStubServer':
+        """在后台线程中启动服务"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name='llm-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """在当前线程中运行服务"""
+        self._server.serve_forever()
+
+    def stop(self):
+        """停止服务"""
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser):
+    """添加桩服务参数（基准脚本复用）"""
+    group = parser.add_argument_group('LLM桩服务')
+    group.add_argument('--latency-ms', type=float, default=500, help='首字节延迟(毫秒)')
+    group.add_argument('--latency-dist', choices=LATENCY_DISTRIBUTIONS, default='lognormal', help='延迟分布')
+    group.add_argument('--jitter', type=float, default=0.3, help='延迟离散程度')
+    group.add_argument('--completion-chars', type=int, default=1200, help='每篇文章正文字数')
+    group.add_argument('--stream-chunk-chars', type=int, default=20, help='流式每块字数')
+    group.add_argument('--stream-chunk-ms', type=float, default=10, help='流式块间隔(毫秒)')
+    group.add_argument('--error-rate', type=float, default=0.0, help='返回错误状态码的概率')
+    group.add_argument('--error-codes', default='429,500,503', help='注入的错误状态码')
+    group.add_argument('--disconnect-rate', type=float, default=0.0, help='直接断开连接的概率')
+    group.add_argument('--hang-rate', type=float, default=0.0, help='挂起后再响应的概率')
+    group.add_argument('--hang-seconds', type=float, default=30, help='挂起时间(秒)')
+    group.add_argument('--truncate-rate', type=float, default=0.0, help='流式响应中途断开的概率')
+    group.add_argument('--seed', type=int, default=None, help='随机种子')
+
+
+def stub_from_args(args, host: str = '127.0.0.1', port: int = 0) -> LLMStubServer:
+    """按命令行参数创建桩服务"""
+    return LLMStubServer(
+        host=host,
+        port=port,
+        latency_ms=args.latency_ms,
+        latency_dist=args.latency_dist,
+        jitter=args.jitter,
+        completion_chars=args.completion_chars,
+        stream_chunk_chars=args.stream_chunk_chars,
+        stream_chunk_ms=args.stream_chunk_ms,
+        error_rate=args.error_rate,
+        error_codes=[int(code) for code in args.error_codes.split(',') if code.strip()],
+        disconnect_rate=args.disconnect_rate,
+        hang_rate=args.hang_rate,
+        hang_seconds=args.hang_seconds,
+        truncate_rate=args.truncate_rate,
+        seed=args.seed
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地 OpenAI 兼容 LLM 桩服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=18080)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    stub = stub_from_args(args, host=args.host, port=args.port)
+    print(f'LLM桩服务已启动: {stub.chat_url}')
+    print(f'  延迟 {args.latency_ms}ms ({args.latency_dist}, jitter={args.jitter})，'
+          f'错误率 {args.error_rate}，断开率 {args.disconnect_rate}，挂起率 {args.hang_rate}')
+    print(f'  应用配置: QIANWEN_API_BASE={stub.base_url} QIANWEN_API_KEY=stub')
+    try:
+        stub.serve_forever()
+    except KeyboardInterrupt:
+        print(f'\n统计: {json.dumps(stub.get_stats(), ensure_ascii=False)}')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+RQ Worker自动伸缩进程
+按队列积压在 RQ_AUTOSCALE_MIN_WORKERS - RQ_AUTOSCALE_MAX_WORKERS 之间启动或排空 rq worker，取代固定数量的Worker
+
+使用方法:
+    # 前台运行（Ctrl+C 排空所有Worker后退出）
+    python scripts/rq_autoscaler.py
+
+    # 指定上下限
+    python scripts/rq_autoscaler.py --min 2 --max 8
+
+    # 只执行一次检查并打印决策（不保留启动的Worker，用于排查）
+    python scripts/rq_autoscaler.py --once
+
+    # 后台运行
+    ./start_rq_workers.sh auto
+"""
+
+import sys
+import os
+import json
+import argparse
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='RQ Worker自动伸缩')
+    parser.add_argument('--min', type=int, dest='min_workers', help='Worker数下限（默认 RQ_AUTOSCALE_MIN_WORKERS）')
+    parser.add_argument('--max', type=int, dest='max_workers', help='Worker数上限（默认 RQ_AUTOSCALE_MAX_WORKERS）')
+    parser.add_argument('--once', action='store_true', help='只采集指标并打印伸缩决策，不启动Worker')
+    args = parser.parse_args()
+
+    from services.worker_autoscaler import create_autoscaler
+
+    autoscaler = create_autoscaler(min_workers=args.min_workers, max_workers=args.max_workers)
+
+    if args.once:
+        metrics = autoscaler.collect_metrics()
+        decision = autoscaler.decide(metrics, 0)
+        decision.update(metrics)
+        print(json.dumps(decision, ensure_ascii=False, indent=2))
+        return 0
+
+    autoscaler.run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
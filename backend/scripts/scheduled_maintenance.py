@@ -12,10 +12,14 @@
 
     # 通过cron每天凌晨2点执行一次
     0 2 * * * cd /home/u_topn/TOP_N/backend && /home/u_topn/TOP_N/venv/bin/python scripts/scheduled_maintenance.py >> /tmp/maintenance.log 2>&1
+
+    # 只做增量任务状态同步（从上次的游标继续，每次处理有限批数），适合每分钟执行
+    * * * * * cd /home/u_topn/TOP_N/backend && /home/u_topn/TOP_N/venv/bin/python scripts/scheduled_maintenance.py --sync-only >> /tmp/maintenance.log 2>&1
 """
 
 import sys
 import os
+import argparse
 
 # 添加项目路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -31,8 +35,41 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def log_sync_result(sync: dict):
+    """打印任务状态同步结果"""
+    logger.info(f"  [状态同步] 检查: {sync.get('checked_count', 0)} ({sync.get('batches', 0)} 批), "
+                f"同步: {sync.get('synced_count', 0)}, 错误: {sync.get('error_count', 0)}, "
+                f"耗时: {sync.get('duration_ms', 0)}ms, 游标: {sync.get('cursor', 0)}")
+
+
+def sync_only():
+    """只执行增量任务状态同步"""
+    try:
+        from services.task_queue_manager import run_task_status_sync
+
+        result = run_task_status_sync()
+        if not result.get('success'):
+            logger.error(f"增量状态同步失败: {result.get('error')}")
+            return 1
+        log_sync_result(result)
+        dispatch = result.get('fair_dispatch', {})
+        if dispatch.get('released') or dispatch.get('dispatched'):
+            logger.info(f"  [定时发布] 释放: {dispatch.get('released', 0)}, 分发: {dispatch.get('dispatched', 0)}")
+        return 0
+
+    except Exception as e:
+        logger.error(f"增量状态同步失败: {e}", exc_info=True)
+        return 1
+
+
 def main():
     """执行定时维护任务"""
+    parser = argparse.ArgumentParser(description='定时任务维护')
+    parser.add_argument('--sync-only', action='store_true', help='只执行增量任务状态同步（并释放到期的定时任务）')
+    args = parser.parse_args()
+    if args.sync_only:
+        return sync_only()
+
     logger.info("=" * 60)
     logger.info(f"定时维护任务开始执行: {datetime.now().isoformat()}")
     logger.info("=" * 60)
@@ -48,8 +85,7 @@ def main():
 
         if 'results' in result:
             # 同步结果
-            sync = result['results'].get('sync', {})
-            logger.info(f"  [状态同步] 同步: {sync.get('synced_count', 0)}, 错误: {sync.get('error_count', 0)}")
+            log_sync_result(result['results'].get('sync', {}))
 
             # Redis清理结果
             redis = result['results'].get('redis_cleanup', {})
@@ -27,8 +27,8 @@ for i in {1..4}; do
     (
         cd backend
         rq worker \
-            default user:1 user:2 user:3 user:4 user:5 \
-            --url redis://localhost:6379/0 \
+            default generation user:1 user:2 user:3 user:4 user:5 \
+            --url "${REDIS_URL:-redis://localhost:6379/0}" \
             --name worker-$i \
             --with-scheduler \
             2>&1 | while IFS= read -r line; do
@@ -9,79 +9,208 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from logger_config import setup_logger, log_service_call
 import requests
-from typing import Dict, List, Optional
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from services.llm_transport import get_llm_transport
+from services.llm_cache import get_llm_cache, LLMResponseCache
+from services.llm_router import get_llm_router
+from services.llm_executor import get_llm_executor, get_llm_stream_executor
+from services.prompt_template_engine import get_prompt_template_engine, template_cache_key
+from services.text_scrubber import scrub_text
+from services.document_summarizer import DocumentSummarizer
+from services.token_accounting import get_token_accountant, current_usage_scope, usage_scope, TokenBudgetExceeded
+import json
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional
+from concurrent.futures import as_completed
 
 logger = setup_logger(__name__)
 
 
 def remove_markdown_and_ai_traces(text):
     """移除Markdown格式和AI生成痕迹,使文章更像人类撰写"""
-    import re
-
-    # 移除Markdown标题
-    text = re.sub(r'#{1,6}\s+', '', text)
-
-    # 移除Markdown粗体和斜体，保留内容
-    text = re.sub(r'\*\*([^*]+)\*\*', r'\1', text)
-    text = re.sub(r'\*([^*]+)\*', r'\1', text)
-    text = re.sub(r'__([^_]+)__', r'\1', text)
-    text = re.sub(r'_([^_]+)_', r'\1', text)
-
-    # 移除Markdown列表符号
-    text = re.sub(r'^\s*[-*+]\s+', '', text, flags=re.MULTILINE)
-    text = re.sub(r'^\s*\d+\.\s+', '', text, flags=re.MULTILINE)
-
-    # 移除Markdown链接，保留链接文字
-    text = re.sub(r'\[([^\]]+)\]\([^)]+\)', r'\1', text)
-    text = re.sub(r'!\[([^\]]*)\]\([^)]+\)', '', text)
-
-    # 移除Markdown代码块
-    text = re.sub(r'```[\s\S]*?```', '', text)
-    text = re.sub(r'`([^`]+)`', r'\1', text)
-
-    # 移除Markdown引用和分割线
-    text = re.sub(r'^\s*>\s+', '', text, flags=re.MULTILINE)
-    text = re.sub(r'^[-*_]{3,}\s*$', '', text, flags=re.MULTILINE)
-
-    # 移除AI生成常用套话和模式
-    ai_phrases = [
-        # 开头套话
-        '综上所述', '总的来说', '总而言之', '总结起来',
-        '值得一提的是', '需要指出的是', '需要注意的是', '值得注意的是',
-        '众所周知', '不言而喻', '显而易见',
-        # 过渡词
-        '首先，', '其次，', '再次，', '最后，', '此外，', '另外，',
-        '因此，', '所以，', '然而，', '但是，', '不过，',
-        '与此同时，', '同时，', '进一步地，', '更重要的是，',
-        # AI常用表达
-        '让我们', '我们可以看到', '我们需要', '我们应该',
-        '在这个过程中', '在这种情况下', '在此基础上',
-        '从某种程度上说', '从本质上讲', '归根结底',
-        '毫无疑问', '毋庸置疑', '不可否认',
-        '换句话说', '也就是说', '具体来说',
-        # 结尾套话
-        '希望本文对您有所帮助', '希望这篇文章能够帮助到你',
-        '以上就是', '如有疑问，欢迎',
-        '感谢阅读', '欢迎在评论区留言', '欢迎留言讨论',
-    ]
-    for phrase in ai_phrases:
-        text = text.replace(phrase, '')
-
-    # 移除连续多个换行符
-    text = re.sub(r'\n{3,}', '\n\n', text)
-
-    # 移除行首行尾多余空格
-    text_lines = text.split('\n')
-    text_lines = [line.strip() for line in text_lines]
-    text = '\n'.join(text_lines)
-
-    return text.strip()
+    return scrub_text(text)
+
+
+class ArticleStreamAssembler:
+    """
+    流式文章组装器
+    按行消费模型输出的增量文本，解析标题，并对已完成的段落增量执行去Markdown/AI痕迹清理
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self.raw_parts = []
+        self.title = ''
+        self.body_started = False
+
+    def feed(self, chunk: str) -> List[Dict]:
+        """
+        输入一段增量文本
+
+        Args:
+            chunk: 模型返回的增量文本
+
+        Returns:
+            事件列表 [{'type': 'title'|'paragraph', ...}]
+        """
+        self.raw_parts.append(chunk)
+        self.buffer += chunk
+        events = []
+        while '\n' in self.buffer:
+            line, self.buffer = self.buffer.split('\n', 1)
+            events.extend(self._process_line(line))
+        return events
+
+    def finish(self) -> List[Dict]:
+        """处理缓冲区中剩余的最后一行"""
+        events = self._process_line(self.buffer) if self.buffer else []
+        self.buffer = ''
+        return events
+
+    @property
+    def content(self) -> str:
+        """已接收的完整原始文本"""
+        return ''.join(self.raw_parts)
+
+    def _process_line(self, line: str) -> List[Dict]:
+        line = line.strip()
+        if not line:
+            return []
+        if not self.title and line.startswith('标题：'):
+            self.title = line.replace('标题：', '').strip()
+            return [{'type': 'title', 'title': self.title}]
+        if line.startswith('正文：'):
+            self.body_started = True
+            return []
+        paragraph = remove_markdown_and_ai_traces(line)
+        if not paragraph:
+            return []
+        return [{'type': 'paragraph', 'text': paragraph}]
+
+
+# 当前生成过程的用量计量器（随执行器任务传递到工作线程）
+_usage_meter: ContextVar = ContextVar('llm_usage_meter', default=None)
+
+
+class UsageMeter:
+    """累计一次文章生成过程中的API调用次数和token用量"""
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.articles = 0
+        self.fallback_articles = 0
+        self._lock = threading.Lock()
+
+    def add(self, usage: Optional[Dict]):
+        usage = usage or {}
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += usage.get('prompt_tokens', 0)
+            self.completion_tokens += usage.get('completion_tokens', 0)
+
+
+class ArticleStrategyStats:
+    """
+    按文章生成策略统计耗时和token用量
+    用于对比 fanout（每篇一次调用）和 batched（一次调用生成多篇）两种策略
+    """
+
+    def __init__(self):
+        self._stats: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def measure(self, strategy: str):
+        """
+        统计一次生成过程
+
+        用法:
+            with stats.measure('batched') as meter:
+                ...
+                meter.articles = len(articles)
+        """
+        meter = UsageMeter()
+        token = _usage_meter.set(meter)
+        start = time.perf_counter()
+        try:
+            yield meter
+        finally:
+            _usage_meter.reset(token)
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                stats = self._stats.setdefault(strategy, {
+                    'runs': 0, 'articles': 0, 'calls': 0, 'fallback_articles': 0,
+                    'prompt_tokens': 0, 'completion_tokens': 0, 'seconds': 0.0
+                })
+                stats['runs'] += 1
+                stats['articles'] += meter.articles
+                stats['calls'] += meter.calls
+                stats['fallback_articles'] += meter.fallback_articles
+                stats['prompt_tokens'] += meter.prompt_tokens
+                stats['completion_tokens'] += meter.completion_tokens
+                stats['seconds'] += elapsed
+
+    def get_stats(self) -> Dict:
+        """
+        获取各策略的统计
+
+        Returns:
+            {strategy: {runs, articles, calls, avg_seconds, tokens_per_article, ...}}
+        """
+        with self._lock:
+            snapshot = {name: dict(stats) for name, stats in self._stats.items()}
+        result = {}
+        for name, stats in snapshot.items():
+            articles = stats['articles']
+            result[name] = {
+                'runs': stats['runs'],
+                'articles': articles,
+                'calls': stats['calls'],
+                'fallback_articles': stats['fallback_articles'],
+                'avg_seconds': round(stats['seconds'] / stats['runs'], 2) if stats['runs'] else 0.0,
+                'prompt_tokens_per_article': round(stats['prompt_tokens'] / articles, 1) if articles else 0.0,
+                'tokens_per_article': round((stats['prompt_tokens'] + stats['completion_tokens']) / articles, 1) if articles else 0.0
+            }
+        return result
+
+
+# 全局策略统计实例
+_strategy_stats = ArticleStrategyStats()
+
+# 单篇文章完成时的回调（后台任务用于推送部分结果）
+_article_listener: ContextVar = ContextVar('article_listener', default=None)
+
+
+@contextmanager
+def article_listener(callback: Callable[[Dict], None]):
+    """
+    在当前上下文内监听文章生成进度，每生成一篇文章调用一次 callback(article)
+
+    article 包含 index 字段（文章序号）
+    """
+    token = _article_listener.set(callback)
+    try:
+        yield
+    finally:
+        _article_listener.reset(token)
+
+
+def get_article_strategy_stats() -> ArticleStrategyStats:
+    """获取全局文章生成策略统计实例"""
+    return _strategy_stats
 
 
 class AIService:
     """AI服务类，支持智谱AI和千问API"""
 
+    # 文章生成策略: fanout 每篇文章一次调用；batched 一次调用生成多篇（JSON结构化输出）
+    ARTICLE_STRATEGIES = ('fanout', 'batched')
+
     def __init__(self, config):
         """
         初始化AI服务
@@ -107,9 +236,115 @@ class AIService:
             self.chat_url = config.QIANWEN_CHAT_URL
             self.model = config.QIANWEN_MODEL
             logger.info('Using Qianwen AI as default provider')
+        # 进程内共享的连接池传输层（所有AIService实例复用同一组连接）
+        self.transport = get_llm_transport(config)
+        # 进程内共享的响应缓存
+        self.cache = get_llm_cache(config)
+        # 多服务商路由（熔断/故障切换/对冲），默认关闭
+        self.router = get_llm_router(config) if getattr(config, 'LLM_ROUTER_ENABLED', False) else None
+        # 进程内共享的有界执行器（含跨进程的全局并发许可）
+        self.executor = get_llm_executor(config)
+        # 流式生成使用独立的小线程池，长时间的SSE输出不占用共享执行器
+        self.stream_executor = get_llm_stream_executor(config)
+        # 上传资料过长时先做map-reduce摘要
+        self.summarizer = DocumentSummarizer(self, config)
+        # token用量统计和每日预算
+        self.accountant = get_token_accountant(config)
+    def _resolve_provider(self, model: Optional[str] = None) -> tuple:
+        """
+        根据model参数动态选择provider和API配置
+        Args:
+            model: 指定使用的模型（可选，默认使用self.model）
+        Returns:
+            (api_key, chat_url, provider, actual_model) 元组
+        """
+        # 使用传入的model参数，如果没有则使用默认的self.model
+        actual_model = model if model else self.model
+        api_key = self.api_key
+        chat_url = self.chat_url
+        current_provider = self.provider
+        if model and hasattr(self.config, 'SUPPORTED_MODELS'):
+            model_config = self.config.SUPPORTED_MODELS.get(model)
+            if model_config:
+                model_provider = model_config.get('provider')
+                if model_provider == 'qianwen':
+                    # 使用千问API
+                    api_key = self.config.QIANWEN_API_KEY
+                    chat_url = self.config.QIANWEN_CHAT_URL
+                    current_provider = 'qianwen'
+                    logger.info(f'Switched to Qianwen provider for model: {model}')
+                elif model_provider == 'zhipu':
+                    # 使用智谱API
+                    api_key = self.config.ZHIPU_API_KEY
+                    chat_url = self.config.ZHIPU_CHAT_URL
+                    current_provider = 'zhipu'
+                    logger.info(f'Switched to Zhipu provider for model: {model}')
+        return api_key, chat_url, current_provider, actual_model
+    def _route_candidates(self, primary: Dict) -> List[Dict]:
+        """
+        构建路由候选列表：首选服务商 + 已配置密钥的其他服务商（使用其默认模型）
+        Args:
+            primary: 首选候选 {provider, model, api_key, chat_url}
+        Returns:
+            按优先级排列的候选列表
+        """
+        candidates = [primary]
+        providers = {
+            'qianwen': (getattr(self.config, 'QIANWEN_API_KEY', ''), getattr(self.config, 'QIANWEN_CHAT_URL', ''),
+                        getattr(self.config, 'QIANWEN_MODEL', '')),
+            'zhipu': (getattr(self.config, 'ZHIPU_API_KEY', ''), getattr(self.config, 'ZHIPU_CHAT_URL', ''),
+                      getattr(self.config, 'ZHIPU_MODEL', '')),
+        }
+        for provider, (api_key, chat_url, model) in providers.items():
+            if provider != primary['provider'] and api_key and chat_url:
+                candidates.append({'provider': provider, 'model': model,
+                                   'api_key': api_key, 'chat_url': chat_url})
+        return candidates
+    def _post_chat(self, candidate: Dict, messages: List[Dict], temperature: float,
+                   max_tokens: int, timeout: int) -> Dict:
+        """
+        向指定服务商发送一次chat completions请求
+        Args:
+            candidate: 服务商候选 {provider, model, api_key, chat_url}
+            messages: 消息列表
+            temperature: 温度参数
+            max_tokens: 最大token数
+            timeout: 超时时间(秒)
+        Returns:
+            响应JSON
+        """
+        headers = {
+            'Authorization': f"Bearer {candidate['api_key']}",
+            'Content-Type': 'application/json'
+        }
+        payload = {
+            'model': candidate['model'],
+            'messages': messages,
+            'temperature': temperature,
+            'max_tokens': max_tokens
+        }
+        with self.executor.provider_slot(candidate['provider']):
+            response = self.transport.post(candidate['chat_url'], headers=headers,
+                                           json=payload, timeout=timeout)
+            response.raise_for_status()
+            return response.json()
+    def _discarded_usage_recorder(self) -> Callable[[Dict, Dict], None]:
+        """
+        记录对冲中落败请求的token用量（落败请求同样计费）
+
+        回调在路由器线程中执行，先取出当前用量归属，执行时恢复
+        """
+        scope = current_usage_scope()
+
+        def record(candidate: Dict, result: Dict):
+            with usage_scope(user_id=scope.get('user_id'), template=scope.get('template')):
+                self.accountant.record(candidate['provider'], candidate['model'], result.get('usage'))
+
+        return record
     @log_service_call("AI API调用")
     def _call_api(self, messages: List[Dict], temperature: float = 0.7,
-                  max_tokens: int = 2000, timeout: int = 60, model: Optional[str] = None) -> Optional[str]:
+                  max_tokens: int = 2000, timeout: int = 60, model: Optional[str] = None,
+                  cache_scope: Optional[str] = None) -> Optional[str]:
         """
         调用千问API
         Args:
@@ -118,56 +353,124 @@ class AIService:
             max_tokens: 最大token数
             timeout: 超时时间(秒)
             model: 指定使用的模型（可选，默认使用self.model）
+            cache_scope: 缓存场景（见 LLM_CACHE_TTLS），None表示不使用缓存
         Returns:
             API返回的文本内容，失败返回None
         """
         try:
-            # 使用传入的model参数，如果没有则使用默认的self.model
-            actual_model = model if model else self.model
-            # 根据model参数动态选择provider和API配置
-            api_key = self.api_key
-            chat_url = self.chat_url
-            current_provider = self.provider
-            if model and hasattr(self.config, 'SUPPORTED_MODELS'):
-                model_config = self.config.SUPPORTED_MODELS.get(model)
-                if model_config:
-                    model_provider = model_config.get('provider')
-                    if model_provider == 'qianwen':
-                        # 使用千问API
-                        api_key = self.config.QIANWEN_API_KEY
-                        chat_url = self.config.QIANWEN_CHAT_URL
-                        current_provider = 'qianwen'
-                        logger.info(f'Switched to Qianwen provider for model: {model}')
-                    elif model_provider == 'zhipu':
-                        # 使用智谱API
-                        api_key = self.config.ZHIPU_API_KEY
-                        chat_url = self.config.ZHIPU_CHAT_URL
-                        current_provider = 'zhipu'
-                        logger.info(f'Switched to Zhipu provider for model: {model}')
-            headers = {
-                'Authorization': f'Bearer {api_key}',
-                'Content-Type': 'application/json'
-            }
-            payload = {
-                'model': actual_model,
-                'messages': messages,
-                'temperature': temperature,
-                'max_tokens': max_tokens
-            }
+            api_key, chat_url, current_provider, actual_model = self._resolve_provider(model)
+            cache_ttl = self.cache.get_ttl(cache_scope, temperature)
+            cache_key = None
+            if cache_ttl:
+                cache_key = LLMResponseCache.make_key(current_provider, actual_model, messages,
+                                                      temperature, max_tokens)
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    logger.info(f'LLM cache hit ({cache_scope}) for model: {actual_model}'
+                                + (f" (served by {cached['served_by']})" if cached.get('served_by') else ''))
+                    return cached['content']
+            self.accountant.check_budget(current_usage_scope().get('user_id'))
             logger.info(f'Calling {current_provider.upper()} API with model: {actual_model} (requested: {model}, default: {self.model})')
-            response = requests.post(chat_url, headers=headers,
-                                   json=payload, timeout=timeout)
-            response.raise_for_status()
-            result = response.json()
+            primary = {'provider': current_provider, 'model': actual_model,
+                       'api_key': api_key, 'chat_url': chat_url}
+            if self.router:
+                served_by, result = self.router.execute(
+                    self._route_candidates(primary),
+                    lambda candidate: self._post_chat(candidate, messages, temperature, max_tokens, timeout),
+                    on_discarded=self._discarded_usage_recorder()
+                )
+            else:
+                served_by, result = primary, self._post_chat(primary, messages, temperature, max_tokens, timeout)
             content = result['choices'][0]['message']['content'].strip()
-            logger.info(f'{current_provider.upper()} API call successful with model: {actual_model}')
+            logger.info(f"{served_by['provider'].upper()} API call successful with model: {served_by['model']}")
+            meter = _usage_meter.get()
+            if meter is not None:
+                meter.add(result.get('usage'))
+            # 故障切换或对冲后，用量归属实际返回结果的服务商/模型；
+            # 缓存同时写入请求的模型（相同请求再次命中，不再重复调用计费，值中记录实际模型）和实际模型
+            self.accountant.record(served_by['provider'], served_by['model'], result.get('usage'))
+            if cache_ttl:
+                if (served_by['provider'], served_by['model']) == (current_provider, actual_model):
+                    self.cache.set(cache_key, content, result.get('usage'), cache_ttl)
+                else:
+                    self.cache.set(cache_key, content, result.get('usage'), cache_ttl,
+                                   served_by=f"{served_by['provider']}/{served_by['model']}")
+                    self.cache.set(
+                        LLMResponseCache.make_key(served_by['provider'], served_by['model'], messages,
+                                                  temperature, max_tokens),
+                        content, result.get('usage'), cache_ttl
+                    )
             return content
+        except TokenBudgetExceeded as e:
+            logger.warning(f'LLM call rejected: {e}')
+            raise
         except requests.exceptions.RequestException as e:
             logger.error(f'API request failed: {e}', exc_info=True)
             raise
         except Exception as e:
             logger.error(f'Unexpected error in API call: {e}', exc_info=True)
             raise
+    def _stream_api(self, messages: List[Dict], temperature: float = 0.7,
+                    max_tokens: int = 2000, timeout: int = 60,
+                    model: Optional[str] = None) -> Iterator[str]:
+        """
+        以流式方式调用chat completions接口（stream: true）
+        Args:
+            messages: 消息列表
+            temperature: 温度参数
+            max_tokens: 最大token数
+            timeout: 超时时间(秒)，作用于建连和两次数据块之间的间隔
+            model: 指定使用的模型（可选，默认使用self.model）
+        Yields:
+            模型增量输出的文本片段
+        """
+        api_key, chat_url, current_provider, actual_model = self._resolve_provider(model)
+        headers = {
+            'Authorization': f'Bearer {api_key}',
+            'Content-Type': 'application/json',
+            'Accept': 'text/event-stream'
+        }
+        payload = {
+            'model': actual_model,
+            'messages': messages,
+            'temperature': temperature,
+            'max_tokens': max_tokens,
+            'stream': True,
+            # 要求在最后一个数据块中返回usage
+            'stream_options': {'include_usage': True}
+        }
+        self.accountant.check_budget(current_usage_scope().get('user_id'))
+        logger.info(f'Streaming {current_provider.upper()} API with model: {actual_model}')
+        usage = None
+        # 流式请求在整个输出期间都占用一个全局并发许可
+        with self.stream_executor.provider_slot(current_provider):
+            response = self.transport.post(chat_url, headers=headers, json=payload,
+                                           timeout=timeout, stream=True)
+            try:
+                response.raise_for_status()
+                # 按bytes读取再以UTF-8解码，避免requests对text/event-stream误判编码
+                for raw_line in response.iter_lines():
+                    if not raw_line:
+                        continue
+                    line = raw_line.decode('utf-8', errors='replace')
+                    if not line.startswith('data:'):
+                        continue
+                    data = line[5:].strip()
+                    if data == '[DONE]':
+                        break
+                    chunk = json.loads(data)
+                    if chunk.get('usage'):
+                        usage = chunk['usage']
+                    choices = chunk.get('choices') or []
+                    if not choices:
+                        continue
+                    delta = choices[0].get('delta', {}).get('content')
+                    if delta:
+                        yield delta
+            finally:
+                response.close()
+        self.accountant.record(current_provider, actual_model, usage)
+        logger.info(f'{current_provider.upper()} streaming call finished with model: {actual_model}')
     @log_service_call("分析公司信息")
     def analyze_company(self, company_name: str, company_desc: str,
                        uploaded_text: str = '', model: Optional[str] = None) -> str:
@@ -185,6 +488,7 @@ class AIService:
         """
         # 构建提示词
         info_text = f"公司/产品名称：{company_name}\n描述信息：{company_desc}"
+        uploaded_text = self.summarizer.condense(uploaded_text, model=model)
         if uploaded_text:
             info_text += f"\n\n补充资料：\n{uploaded_text}"
         prompt = f'''
@@ -203,22 +507,19 @@ class AIService:
             {'role': 'user', 'content': prompt}
         ]
         logger.info(f'Analyzing company: {company_name}, model: {model or "default"}')
-        return self._call_api(messages, temperature=0.7, max_tokens=2000, model=model)
-    def _generate_single_article(self, company_name: str, analysis: str,
-                                angle: str, index: int, total: int) -> Dict:
+        return self._call_api(messages, temperature=0.7, max_tokens=2000, model=model,
+                              cache_scope='analysis')
+    def _build_article_messages(self, company_name: str, analysis: str, angle: str) -> List[Dict]:
         """
-        生成单篇文章（用于并发调用）
+        构建单篇文章生成的消息列表
         Args:
             company_name: 公司/产品名称
             analysis: 分析结果
             angle: 文章角度
-            index: 文章序号
-            total: 总文章数
         Returns:
-            文章字典
+            消息列表
         """
-        try:
-            prompt = f'''
+        prompt = f'''
 为"{company_name}"撰写一篇推广文章，文章角度：{angle}
 
 分析结果：
@@ -246,10 +547,26 @@ class AIService:
 正文：
 [这里是正文内容]
 '''
-            messages = [
-                {'role': 'system', 'content': '你是资深互联网内容创作者。你的文章读起来像真人博客，不像AI生成。你从不用Markdown格式，也不用AI套话。写作风格口语化、接地气。'},
-                {'role': 'user', 'content': prompt}
-            ]
+        messages = [
+            {'role': 'system', 'content': '你是资深互联网内容创作者。你的文章读起来像真人博客，不像AI生成。你从不用Markdown格式，也不用AI套话。写作风格口语化、接地气。'},
+            {'role': 'user', 'content': prompt}
+        ]
+        return messages
+    def _generate_single_article(self, company_name: str, analysis: str,
+                                angle: str, index: int, total: int) -> Dict:
+        """
+        生成单篇文章（用于并发调用）
+        Args:
+            company_name: 公司/产品名称
+            analysis: 分析结果
+            angle: 文章角度
+            index: 文章序号
+            total: 总文章数
+        Returns:
+            文章字典
+        """
+        try:
+            messages = self._build_article_messages(company_name, analysis, angle)
             logger.info(f'Generating article {index+1}/{total} ({angle}) for {company_name}')
             content = self._call_api(messages, temperature=0.8, max_tokens=3000)
             # 解析标题和正文
@@ -270,13 +587,14 @@ class AIService:
             return None
     @log_service_call("生成推广文章")
     def generate_articles(self, company_name: str, analysis: str,
-                         article_count: int = 3) -> List[Dict]:
+                         article_count: int = 3, strategy: Optional[str] = None) -> List[Dict]:
         """
         基于分析结果并发生成推广文章
         Args:
             company_name: 公司/产品名称
             analysis: 分析结果
             article_count: 要生成的文章数量
+            strategy: 生成策略 fanout/batched（可选，默认使用 ARTICLE_GENERATION_STRATEGY）
         Returns:
             文章列表，每篇文章包含title和content
         Raises:
@@ -290,30 +608,312 @@ class AIService:
             "市场趋势",
             "案例分析"
         ]
-        # 使用线程池并发生成文章
-        articles = []
-        with ThreadPoolExecutor(max_workers=article_count) as executor:
-            # 提交所有任务
-            future_to_index = {}
-            for i in range(article_count):
-                angle = angles[i % len(angles)]
-                future = executor.submit(
-                    self._generate_single_article,
-                    company_name, analysis, angle, i, article_count
+        articles = self._generate_articles_with_strategy(
+            company_name,
+            [angles[i % len(angles)] for i in range(article_count)],
+            generate_one=lambda angle, i: self._generate_single_article(
+                company_name, analysis, angle, i, article_count),
+            build_messages=lambda angle: self._build_article_messages(company_name, analysis, angle),
+            temperature=0.8,
+            max_tokens=3000,
+            strategy=strategy
+        )
+        logger.info(f'Successfully generated {len(articles)}/{article_count} articles')
+        return articles
+    def _resolve_article_strategy(self, strategy: Optional[str] = None) -> str:
+        """确定文章生成策略（参数优先，其次配置，未知取值回退到fanout）"""
+        strategy = strategy or getattr(self.config, 'ARTICLE_GENERATION_STRATEGY', 'fanout')
+        if strategy not in self.ARTICLE_STRATEGIES:
+            logger.warning(f'Unknown article generation strategy: {strategy}, using fanout')
+            strategy = 'fanout'
+        return strategy
+    def _generate_articles_with_strategy(self, company_name: str, angles: List[str],
+                                         generate_one: Callable[[str, int], Optional[Dict]],
+                                         build_messages: Callable[[str], List[Dict]],
+                                         temperature: float, max_tokens: int,
+                                         strategy: Optional[str] = None) -> List[Dict]:
+        """
+        按策略生成多篇文章
+        Args:
+            company_name: 公司/产品名称
+            angles: 每篇文章的角度（列表下标即文章序号）
+            generate_one: 单篇生成函数 (angle, index) -> 文章字典（含index）或None
+            build_messages: 单篇文章消息构建函数 angle -> 消息列表（batched策略以此为基础）
+            temperature: 温度参数
+            max_tokens: 单篇文章的最大token数
+            strategy: 生成策略（可选）
+        Returns:
+            按序号排列的文章列表
+        """
+        strategy = self._resolve_article_strategy(strategy)
+        with get_article_strategy_stats().measure(strategy) as meter:
+            if strategy == 'batched':
+                articles = self._generate_articles_batched(
+                    company_name, angles, generate_one, build_messages, temperature, max_tokens, meter
                 )
-                future_to_index[future] = i
-            # 收集结果
-            for future in as_completed(future_to_index):
-                article = future.result()
-                if article:
-                    articles.append(article)
+            else:
+                articles = self._fan_out_articles(list(enumerate(angles)), generate_one)
+            meter.articles = len(articles)
         # 按索引排序以保持顺序
-        articles.sort(key=lambda x: x['index'])
+        articles.sort(key=lambda x: x.get('index', 0))
         # 移除索引字段
         for article in articles:
             article.pop('index', None)
-        logger.info(f'Successfully generated {len(articles)}/{article_count} articles')
         return articles
+    def _fan_out_articles(self, jobs: List[tuple],
+                          generate_one: Callable[[str, int], Optional[Dict]]) -> List[Dict]:
+        """提交到进程内共享的有界执行器，每篇文章一次调用并发生成"""
+        articles = []
+        futures = [self.executor.submit(generate_one, angle, index) for index, angle in jobs]
+        # 收集结果
+        for future in as_completed(futures):
+            article = future.result()
+            if article:
+                articles.append(article)
+                self._notify_article(article)
+        return articles
+    def _notify_article(self, article: Dict):
+        """通知文章生成监听器（监听器异常不影响生成）"""
+        listener = _article_listener.get()
+        if listener is None:
+            return
+        try:
+            listener(dict(article))
+        except Exception as e:
+            logger.warning(f'Article listener failed: {e}')
+    def _generate_articles_batched(self, company_name: str, angles: List[str],
+                                   generate_one: Callable[[str, int], Optional[Dict]],
+                                   build_messages: Callable[[str], List[Dict]],
+                                   temperature: float, max_tokens: int,
+                                   meter: UsageMeter) -> List[Dict]:
+        """
+        一次调用生成多篇文章（分析结果只发送一次），解析失败的文章回退为单篇调用
+        文章按 ARTICLE_BATCH_SIZE 分组，各组并发请求
+        """
+        batch_size = max(1, getattr(self.config, 'ARTICLE_BATCH_SIZE', 3))
+        groups = [list(range(i, min(i + batch_size, len(angles))))
+                  for i in range(0, len(angles), batch_size)]
+        futures = [
+            self.executor.submit(self._generate_article_batch, company_name, angles, group,
+                                 build_messages, temperature, max_tokens)
+            for group in groups
+        ]
+        articles = []
+        for future in as_completed(futures):
+            for article in future.result():
+                articles.append(article)
+                self._notify_article(article)
+        # 批量结果缺失或不合格的文章逐篇重新生成（在调用线程中等待，避免占用执行器线程互相等待）
+        generated = {article['index'] for article in articles}
+        missing = [(i, angle) for i, angle in enumerate(angles) if i not in generated]
+        if missing:
+            logger.warning(f'Batched generation returned {len(generated)}/{len(angles)} valid articles, '
+                           f'falling back to per-article calls for {len(missing)}')
+            meter.fallback_articles += len(missing)
+            articles.extend(self._fan_out_articles(missing, generate_one))
+        return articles
+    def _generate_article_batch(self, company_name: str, angles: List[str], indices: List[int],
+                                build_messages: Callable[[str], List[Dict]],
+                                temperature: float, max_tokens: int) -> List[Dict]:
+        """
+        一次调用生成一组文章
+        Args:
+            company_name: 公司/产品名称
+            angles: 全部文章角度
+            indices: 本组文章的序号
+            build_messages: 单篇文章消息构建函数
+            temperature: 温度参数
+            max_tokens: 单篇文章的最大token数
+        Returns:
+            通过校验的文章列表（含index），失败时返回空列表
+        """
+        group_angles = [angles[i] for i in indices]
+        try:
+            messages = self._build_batch_article_messages(build_messages, group_angles)
+            logger.info(f'Generating {len(indices)} articles in one call for {company_name}')
+            content = self._call_api(
+                messages,
+                temperature=temperature,
+                max_tokens=min(max_tokens * len(indices), getattr(self.config, 'ARTICLE_BATCH_MAX_TOKENS', 8000)),
+                timeout=getattr(self.config, 'ARTICLE_BATCH_TIMEOUT', 180)
+            )
+        except Exception as e:
+            logger.error(f'Batched article generation failed ({", ".join(group_angles)}): {e}', exc_info=True)
+            return []
+        articles = []
+        for index, angle, item in zip(indices, group_angles, self._parse_batch_articles(content)):
+            article = self._validate_batch_article(item, angle, index)
+            if article:
+                articles.append(article)
+        return articles
+    def _build_batch_article_messages(self, build_messages: Callable[[str], List[Dict]],
+                                      angles: List[str]) -> List[Dict]:
+        """在单篇文章消息的基础上，追加多篇文章的角度列表和JSON输出格式要求"""
+        messages = [dict(m) for m in build_messages('、'.join(angles))]
+        angle_lines = '\n'.join(f'{i + 1}. {angle}' for i, angle in enumerate(angles))
+        messages[-1]['content'] += f'''
+
+【输出格式 - 以此为准，覆盖上面的返回格式要求】
+请按下面{len(angles)}个角度分别撰写{len(angles)}篇互相独立的文章，每篇都要满足上面的写作要求：
+{angle_lines}
+
+只返回一个JSON对象，不要输出任何其他文字：
+{{"articles": [{{"angle": "文章角度", "title": "标题", "content": "正文，段落之间用\\n分隔"}}]}}
+articles数组按上面的角度顺序排列，共{len(angles)}项。
+'''
+        return messages
+    def _parse_batch_articles(self, content: str) -> List[Dict]:
+        """
+        解析批量生成的JSON结果
+        逐个解码articles数组中的对象，输出被截断时保留已完整输出的文章
+        Args:
+            content: API返回的内容
+        Returns:
+            文章对象列表（未校验）
+        """
+        start = content.find('"articles"')
+        start = content.find('[', start if start >= 0 else 0)
+        if start < 0:
+            return []
+        decoder = json.JSONDecoder()
+        items = []
+        pos = start + 1
+        while True:
+            while pos < len(content) and content[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= len(content) or content[pos] == ']':
+                break
+            try:
+                item, pos = decoder.raw_decode(content, pos)
+            except json.JSONDecodeError:
+                logger.warning(f'Batched article output truncated or malformed after {len(items)} articles')
+                break
+            items.append(item)
+        return items
+    def _validate_batch_article(self, item, angle: str, index: int) -> Optional[Dict]:
+        """校验批量结果中的单篇文章，不合格返回None"""
+        if not isinstance(item, dict):
+            return None
+        title = item.get('title')
+        body = item.get('content')
+        if not isinstance(title, str) or not isinstance(body, str):
+            return None
+        title = title.strip()
+        body = remove_markdown_and_ai_traces(body)
+        min_chars = getattr(self.config, 'ARTICLE_BATCH_MIN_CONTENT_CHARS', 200)
+        if not title or len(title) >= 100 or len(body) < min_chars:
+            logger.warning(f'Batched article {index+1} ({angle}) failed validation')
+            return None
+        return {
+            'title': title,
+            'content': body,
+            'type': angle,
+            'index': index
+        }
+    def build_article_specs(self, company_name: str, analysis: str, article_count: int = 3,
+                            template: Optional[Dict] = None) -> List[Dict]:
+        """
+        构建每篇文章的生成参数（供流式生成使用）
+        Args:
+            company_name: 公司/产品名称
+            analysis: 分析结果
+            article_count: 文章数量
+            template: 旧版提示词模板（可选）
+        Returns:
+            [{angle, messages, temperature, max_tokens}, ...]
+        """
+        angles = [
+            "技术创新",
+            "行业应用",
+            "用户价值",
+            "市场趋势",
+            "案例分析"
+        ]
+        generation_prompts = (template or {}).get('prompts', {}).get('article_generation', {})
+        ai_config = (template or {}).get('ai_config', {})
+        specs = []
+        for i in range(article_count):
+            angle = angles[i % len(angles)]
+            if generation_prompts:
+                messages = self._build_template_article_messages(
+                    company_name, analysis, angle, generation_prompts,
+                    template_cache_key('prompt_template', template, 'article_generation')
+                )
+                specs.append({
+                    'angle': angle,
+                    'messages': messages,
+                    'temperature': ai_config.get('temperature', 0.8),
+                    'max_tokens': ai_config.get('max_tokens', 3000)
+                })
+            else:
+                specs.append({
+                    'angle': angle,
+                    'messages': self._build_article_messages(company_name, analysis, angle),
+                    'temperature': 0.8,
+                    'max_tokens': 3000
+                })
+        return specs
+    def _stream_single_article(self, company_name: str, spec: Dict, index: int,
+                               events: queue.Queue, stop: threading.Event):
+        """流式生成单篇文章，并把事件写入队列（用于并发调用）"""
+        angle = spec['angle']
+        assembler = ArticleStreamAssembler()
+        try:
+            events.put({'type': 'start', 'index': index, 'angle': angle})
+            for delta in self._stream_api(spec['messages'],
+                                          temperature=spec['temperature'],
+                                          max_tokens=spec['max_tokens']):
+                if stop.is_set():
+                    # 客户端已断开，放弃剩余输出
+                    logger.info(f'Streaming article {index+1} ({angle}) aborted by consumer')
+                    return
+                events.put({'type': 'delta', 'index': index, 'text': delta})
+                for event in assembler.feed(delta):
+                    events.put({**event, 'index': index})
+            for event in assembler.finish():
+                events.put({**event, 'index': index})
+            # 完整文本再走一遍与非流式一致的解析和清理，保证最终结果相同
+            content = assembler.content.strip()
+            title, body = self._parse_article(content)
+            if body:
+                body = remove_markdown_and_ai_traces(body)
+            article = {
+                'title': title or f'{company_name} - {angle}相关内容',
+                'content': body or content,
+                'type': angle
+            }
+            events.put({'type': 'article', 'index': index, 'article': article})
+            logger.info(f'Streamed article {index+1} ({angle}) generated successfully')
+        except Exception as e:
+            logger.error(f'Failed to stream article {index+1} ({angle}): {e}', exc_info=True)
+            events.put({'type': 'error', 'index': index, 'error': str(e)})
+        finally:
+            events.put({'type': '_finished', 'index': index})
+    def stream_articles(self, company_name: str, specs: List[Dict]) -> Iterator[Dict]:
+        """
+        并发流式生成多篇文章
+        Args:
+            company_name: 公司/产品名称
+            specs: 每篇文章的生成参数（见 build_article_specs）
+        Yields:
+            事件字典，type 取值: start / delta / title / paragraph / article / error
+        """
+        events = queue.Queue()
+        stop = threading.Event()
+        pending = len(specs)
+        if not pending:
+            return
+        for i, spec in enumerate(specs):
+            self.stream_executor.submit(self._stream_single_article, company_name, spec, i, events, stop)
+        try:
+            while pending:
+                event = events.get()
+                if event['type'] == '_finished':
+                    pending -= 1
+                    continue
+                yield event
+        finally:
+            stop.set()
     def _parse_article(self, content: str) -> tuple:
         """
         解析文章内容，提取标题和正文
@@ -371,7 +971,7 @@ class AIService:
             {'role': 'user', 'content': prompt}
         ]
         logger.info(f'Recommending platforms for {company_name}')
-        content = self._call_api(messages, temperature=0.6, max_tokens=1000)
+        content = self._call_api(messages, temperature=0.6, max_tokens=1000, cache_scope='platforms')
         # 解析推荐结果
         platforms = self._parse_platforms(content)
         return platforms
@@ -408,36 +1008,18 @@ class AIService:
                 'reason': '\n'.join(current_reason).strip()
             })
         return platforms
-    def render_prompt_template(self, template_str: str, variables: Dict) -> str:
+    def render_prompt_template(self, template_str: str, variables: Dict,
+                               cache_key: Optional[tuple] = None) -> str:
         """
         渲染提示词模板，替换变量
         Args:
             template_str: 模板字符串，使用{{variable}}格式
             variables: 变量字典
+            cache_key: 编译缓存键（见 template_cache_key），None时按模板内容缓存
         Returns:
             渲染后的提示词
         """
-        import re
-        from datetime import datetime
-        result = template_str
-        # 添加常用默认变量
-        variables = {"year": str(datetime.now().year), "current_year": str(datetime.now().year), **variables}
-        for key, value in variables.items():
-            # 支持 {{variable}} 格式
-            result = result.replace(f'{{{{{key}}}}}', str(value or ''))
-            # 支持 {variable} 单大括号格式
-            result = result.replace(f'{{{key}}}', str(value or ''))
-            # 支持 {% if variable %} 简单条件
-            if_pattern = f'{{%\s*if\s+{key}\s*%}}(.*?){{%\s*endif\s*%}}'
-            if value:
-                result = re.sub(if_pattern, r'\1', result, flags=re.DOTALL)
-            else:
-                result = re.sub(if_pattern, '', result, flags=re.DOTALL)
-
-        # 清理剩余未定义的占位符
-        result = re.sub(r'\{\{[a-zA-Z_][a-zA-Z0-9_]*\}\}', '', result)
-        result = re.sub(r'\{[a-zA-Z_][a-zA-Z0-9_]*\}', '', result)
-        return result.strip()
+        return get_prompt_template_engine().render(template_str, variables, cache_key)
     @log_service_call("使用模板分析公司")
     def analyze_company_with_template(self, company_info: Dict, template: Dict, model: Optional[str] = None) -> str:
         """
@@ -465,8 +1047,9 @@ class AIService:
             {
                 'company_name': company_info.get('company_name', ''),
                 'company_desc': company_info.get('company_desc', ''),
-                'uploaded_text': company_info.get('uploaded_text', '')
-            }
+                'uploaded_text': self.summarizer.condense(company_info.get('uploaded_text', ''), model=model)
+            },
+            cache_key=template_cache_key('prompt_template', template, 'analysis')
         )
         # 使用模板中的AI配置
         ai_config = template.get('ai_config', {})
@@ -479,11 +1062,13 @@ class AIService:
             messages,
             temperature=ai_config.get('temperature', 0.7),
             max_tokens=ai_config.get('max_tokens', 2000),
-            model=model
+            model=model,
+            cache_scope='analysis'
         )
     @log_service_call("使用模板生成文章")
     def generate_articles_with_template(self, company_name: str, analysis: str,
-                                       template: Dict, article_count: int = 3) -> List[Dict]:
+                                       template: Dict, article_count: int = 3,
+                                       strategy: Optional[str] = None) -> List[Dict]:
         """
         使用指定模板生成文章
         Args:
@@ -491,6 +1076,7 @@ class AIService:
             analysis: 分析结果
             template: 模板字典
             article_count: 文章数量
+            strategy: 生成策略 fanout/batched（可选）
         Returns:
             文章列表
         """
@@ -498,7 +1084,7 @@ class AIService:
         generation_prompts = template.get('prompts', {}).get('article_generation', {})
         if not generation_prompts:
             # 如果没有generation提示词，使用默认方法
-            return self.generate_articles(company_name, analysis, article_count)
+            return self.generate_articles(company_name, analysis, article_count, strategy=strategy)
         # 定义文章角度
         angles = [
             "技术创新",
@@ -509,48 +1095,47 @@ class AIService:
         ]
         # AI配置
         ai_config = template.get('ai_config', {})
-        # 使用线程池并发生成文章
-        articles = []
-        with ThreadPoolExecutor(max_workers=article_count) as executor:
-            future_to_index = {}
-            for i in range(article_count):
-                angle = angles[i % len(angles)]
-                future = executor.submit(
-                    self._generate_single_article_with_template,
-                    company_name, analysis, angle, i, article_count,
-                    generation_prompts, ai_config
-                )
-                future_to_index[future] = i
-            # 收集结果
-            for future in as_completed(future_to_index):
-                article = future.result()
-                if article:
-                    articles.append(article)
-        # 按索引排序
-        articles.sort(key=lambda x: x.get('index', 0))
-        # 移除索引字段
-        for article in articles:
-            article.pop('index', None)
+        cache_key = template_cache_key('prompt_template', template, 'article_generation')
+        articles = self._generate_articles_with_strategy(
+            company_name,
+            [angles[i % len(angles)] for i in range(article_count)],
+            generate_one=lambda angle, i: self._generate_single_article_with_template(
+                company_name, analysis, angle, i, article_count, generation_prompts, ai_config, cache_key),
+            build_messages=lambda angle: self._build_template_article_messages(
+                company_name, analysis, angle, generation_prompts, cache_key),
+            temperature=ai_config.get('temperature', 0.8),
+            max_tokens=ai_config.get('max_tokens', 3000),
+            strategy=strategy
+        )
         logger.info(f'Successfully generated {len(articles)}/{article_count} articles using template')
         return articles
+    def _build_template_article_messages(self, company_name: str, analysis: str,
+                                         angle: str, generation_prompts: Dict,
+                                         cache_key: Optional[tuple] = None) -> List[Dict]:
+        """使用模板构建单篇文章生成的消息列表"""
+        # 渲染用户提示词
+        user_prompt = self.render_prompt_template(
+            generation_prompts.get('user_template', ''),
+            {
+                'company_name': company_name,
+                'analysis': analysis,
+                'angle': angle
+            },
+            cache_key=cache_key
+        )
+        return [
+            {'role': 'system', 'content': generation_prompts.get('system', '')},
+            {'role': 'user', 'content': user_prompt}
+        ]
     def _generate_single_article_with_template(self, company_name: str, analysis: str,
                                               angle: str, index: int, total: int,
-                                              generation_prompts: Dict, ai_config: Dict) -> Dict:
+                                              generation_prompts: Dict, ai_config: Dict,
+                                              cache_key: Optional[tuple] = None) -> Dict:
         """使用模板生成单篇文章"""
         try:
-            # 渲染用户提示词
-            user_prompt = self.render_prompt_template(
-                generation_prompts.get('user_template', ''),
-                {
-                    'company_name': company_name,
-                    'analysis': analysis,
-                    'angle': angle
-                }
+            messages = self._build_template_article_messages(
+                company_name, analysis, angle, generation_prompts, cache_key
             )
-            messages = [
-                {'role': 'system', 'content': generation_prompts.get('system', '')},
-                {'role': 'user', 'content': user_prompt}
-            ]
             logger.info(f'Generating article {index+1}/{total} ({angle}) using template')
             content = self._call_api(
                 messages,
@@ -8,12 +8,13 @@ import logging
 import sys
 import os
 from typing import Dict, List, Optional
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import as_completed
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from logger_config import setup_logger, log_service_call
 
 from services.ai_service import AIService, remove_markdown_and_ai_traces
+from services.prompt_template_engine import template_cache_key
 
 logger = setup_logger(__name__)
 
@@ -41,8 +42,9 @@ class AIServiceV2(AIService):
             {
                 'company_name': company_info.get('company_name', ''),
                 'company_desc': company_info.get('company_desc', ''),
-                'uploaded_text': company_info.get('uploaded_text', '')
-            }
+                'uploaded_text': self.summarizer.condense(company_info.get('uploaded_text', ''), model=model)
+            },
+            cache_key=template_cache_key('analysis_prompt', analysis_prompt, 'user_template')
         )
 
         messages = [
@@ -56,29 +58,30 @@ class AIServiceV2(AIService):
             messages,
             temperature=analysis_prompt.get('temperature', 0.7),
             max_tokens=analysis_prompt.get('max_tokens', 2000),
-            model=model
+            model=model,
+            cache_scope='analysis'
         )
 
-    def generate_article_with_prompt(
+    def _build_article_prompt_messages(
         self,
         company_name: str,
         analysis: str,
         angle: str,
         article_prompt: Dict,
         platform_style: Optional[Dict] = None
-    ) -> Dict:
+    ) -> List[Dict]:
         """
-        使用文章提示词生成单篇文章（可选择在此阶段应用平台风格）
+        使用文章提示词构建单篇文章生成的消息列表
 
         Args:
             company_name: 公司名称
             analysis: 分析结果
             angle: 文章角度
             article_prompt: 文章提示词字典
-            platform_style: 平台风格字典（可选，如果apply_stage='generation'）
+            platform_style: 平台风格字典（可选）
 
         Returns:
-            文章字典 {title, content, type}
+            消息列表
         """
         # 渲染用户提示词
         user_prompt = self.render_prompt_template(
@@ -87,7 +90,8 @@ class AIServiceV2(AIService):
                 'company_name': company_name,
                 'analysis': analysis,
                 'angle': angle
-            }
+            },
+            cache_key=template_cache_key('article_prompt', article_prompt, 'user_template')
         )
 
         # 基础系统提示词
@@ -103,6 +107,33 @@ class AIServiceV2(AIService):
             {'role': 'user', 'content': user_prompt}
         ]
 
+        return messages
+
+    def generate_article_with_prompt(
+        self,
+        company_name: str,
+        analysis: str,
+        angle: str,
+        article_prompt: Dict,
+        platform_style: Optional[Dict] = None
+    ) -> Dict:
+        """
+        使用文章提示词生成单篇文章（可选择在此阶段应用平台风格）
+
+        Args:
+            company_name: 公司名称
+            analysis: 分析结果
+            angle: 文章角度
+            article_prompt: 文章提示词字典
+            platform_style: 平台风格字典（可选，如果apply_stage='generation'）
+
+        Returns:
+            文章字典 {title, content, type}
+        """
+        messages = self._build_article_prompt_messages(
+            company_name, analysis, angle, article_prompt, platform_style
+        )
+
         logger.info(f"Generating article with prompt: {article_prompt['name']}, angle: {angle}")
 
         content = self._call_api(
@@ -132,7 +163,8 @@ class AIServiceV2(AIService):
         analysis: str,
         article_prompt: Dict,
         article_count: int = 3,
-        platform_style: Optional[Dict] = None
+        platform_style: Optional[Dict] = None,
+        strategy: Optional[str] = None
     ) -> List[Dict]:
         """
         使用文章提示词并发生成多篇文章
@@ -143,6 +175,7 @@ class AIServiceV2(AIService):
             article_prompt: 文章提示词字典
             article_count: 文章数量
             platform_style: 平台风格（可选）
+            strategy: 生成策略 fanout/batched（可选）
 
         Returns:
             文章列表
@@ -152,35 +185,59 @@ class AIServiceV2(AIService):
         if not angles:
             angles = ["技术创新", "行业应用", "用户价值", "市场趋势", "案例分析"]
 
-        # 使用线程池并发生成文章
-        articles = []
-        with ThreadPoolExecutor(max_workers=min(article_count, 5)) as executor:
-            future_to_index = {}
-            for i in range(article_count):
-                angle = angles[i % len(angles)]
-                future = executor.submit(
-                    self._generate_single_article_v2,
-                    company_name, analysis, angle, i, article_count,
-                    article_prompt, platform_style
-                )
-                future_to_index[future] = i
-
-            # 收集结果
-            for future in as_completed(future_to_index):
-                article = future.result()
-                if article:
-                    articles.append(article)
-
-        # 按索引排序
-        articles.sort(key=lambda x: x.get('index', 0))
-
-        # 移除索引字段
-        for article in articles:
-            article.pop('index', None)
+        articles = self._generate_articles_with_strategy(
+            company_name,
+            [angles[i % len(angles)] for i in range(article_count)],
+            generate_one=lambda angle, i: self._generate_single_article_v2(
+                company_name, analysis, angle, i, article_count, article_prompt, platform_style),
+            build_messages=lambda angle: self._build_article_prompt_messages(
+                company_name, analysis, angle, article_prompt, platform_style),
+            temperature=article_prompt.get('temperature', 0.8),
+            max_tokens=article_prompt.get('max_tokens', 3000),
+            strategy=strategy
+        )
 
         logger.info(f"Successfully generated {len(articles)}/{article_count} articles")
         return articles
 
+    def build_article_specs_with_prompt(
+        self,
+        company_name: str,
+        analysis: str,
+        article_prompt: Dict,
+        article_count: int = 3,
+        platform_style: Optional[Dict] = None
+    ) -> List[Dict]:
+        """
+        构建每篇文章的生成参数（供流式生成使用）
+
+        Args:
+            company_name: 公司名称
+            analysis: 分析结果
+            article_prompt: 文章提示词字典
+            article_count: 文章数量
+            platform_style: 平台风格（可选）
+
+        Returns:
+            [{angle, messages, temperature, max_tokens}, ...]
+        """
+        angles = article_prompt.get('default_angles', [])
+        if not angles:
+            angles = ["技术创新", "行业应用", "用户价值", "市场趋势", "案例分析"]
+
+        specs = []
+        for i in range(article_count):
+            angle = angles[i % len(angles)]
+            specs.append({
+                'angle': angle,
+                'messages': self._build_article_prompt_messages(
+                    company_name, analysis, angle, article_prompt, platform_style
+                ),
+                'temperature': article_prompt.get('temperature', 0.8),
+                'max_tokens': article_prompt.get('max_tokens', 3000)
+            })
+        return specs
+
     def _generate_single_article_v2(
         self,
         company_name: str,
@@ -239,7 +296,8 @@ class AIServiceV2(AIService):
                 'title': title,
                 'content': content,
                 'platform': platform_style['platform']
-            }
+            },
+            cache_key=template_cache_key('platform_style', platform_style, 'user_template')
         )
 
         messages = [
@@ -289,29 +347,26 @@ class AIServiceV2(AIService):
         Returns:
             转换后的文章列表
         """
-        converted_articles = []
-
-        with ThreadPoolExecutor(max_workers=min(len(articles), 5)) as executor:
-            future_to_index = {}
-            for i, article in enumerate(articles):
-                future = executor.submit(
-                    self.convert_article_style,
-                    article['title'],
-                    article['content'],
-                    platform_style
-                )
-                future_to_index[future] = i
-
-            # 收集结果
-            results = [None] * len(articles)
-            for future in as_completed(future_to_index):
-                index = future_to_index[future]
-                result = future.result()
-                if result:
-                    results[index] = result
-
-            # 过滤None值
-            converted_articles = [r for r in results if r is not None]
+        future_to_index = {}
+        for i, article in enumerate(articles):
+            future = self.executor.submit(
+                self.convert_article_style,
+                article['title'],
+                article['content'],
+                platform_style
+            )
+            future_to_index[future] = i
+
+        # 收集结果
+        results = [None] * len(articles)
+        for future in as_completed(future_to_index):
+            index = future_to_index[future]
+            result = future.result()
+            if result:
+                results[index] = result
+
+        # 过滤None值
+        converted_articles = [r for r in results if r is not None]
 
         logger.info(f"Successfully converted {len(converted_articles)}/{len(articles)} articles")
         return converted_articles
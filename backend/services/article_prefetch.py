@@ -0,0 +1,320 @@
+"""
+文章预生成模块
+分析完成后在后台按默认角度预先生成文章草稿并按工作流保存；生成请求参数一致时直接返回草稿，
+提示词/模板/分析内容变化时淘汰草稿
+"""
+import sys
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import setup_logger
+from services.token_accounting import usage_scope, get_token_accountant
+import redis
+
+logger = setup_logger(__name__)
+
+# 决定生成结果的请求参数，任一变化都使草稿失效
+DRAFT_PARAM_KEYS = ('company_name', 'analysis', 'article_count', 'article_prompt_id',
+                    'platform_style_prompt_id', 'template_id', 'strategy')
+
+# 引用的提示词/模板的版本（version + updated_at），由调用方加载后放入生成参数；提示词被编辑后草稿失效
+PROMPT_VERSIONS_KEY = 'prompt_versions'
+
+# 仅当键中的token与当前草稿一致时才写入（草稿被淘汰或重新调度后，旧的后台结果丢弃）
+_STORE_IF_CURRENT_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current and cjson.decode(current)['token'] == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+    return 1
+end
+return 0
+"""
+
+
+def draft_fingerprint(data: Dict) -> str:
+    """
+    计算生成参数指纹
+
+    Args:
+        data: /api/generate_articles 的请求参数（或分析请求参数 + 分析结果），
+              可包含 prompt_versions（引用的提示词/模板版本）
+
+    Returns:
+        指纹字符串
+    """
+    params = {key: data.get(key) for key in DRAFT_PARAM_KEYS + (PROMPT_VERSIONS_KEY,)}
+    params['article_count'] = int(params['article_count'] or 3)
+    for key in ('article_prompt_id', 'platform_style_prompt_id', 'template_id'):
+        params[key] = str(params[key]) if params[key] else None
+    raw = json.dumps(params, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class ArticlePrefetcher:
+    """
+    文章草稿预生成器
+
+    Redis结构:
+        prefetch:workflow:{id}  JSON {user_id, fingerprint, token, status: running/ready/failed, heartbeat, articles}
+    Redis不可用时退化为进程内存储（仅在同一进程内命中）
+
+    生成中的草稿定期刷新heartbeat；执行生成的进程退出（如RQ Worker的子进程）后心跳停止，
+    超过stale_after秒没有心跳的草稿视为已中断，生成请求不再等待
+    """
+
+    KEY_PREFIX = 'prefetch:workflow:'
+    # Redis出错后暂停访问的时间(秒)
+    REDIS_RETRY_INTERVAL = 30
+
+    def __init__(self, redis_client: Optional[redis.Redis] = None, ttl: int = 1800,
+                 wait_timeout: float = 120, max_workers: int = 2, stale_after: float = 60):
+        """
+        初始化预生成器
+
+        Args:
+            redis_client: Redis客户端（decode_responses=True），为None时只使用进程内存储
+            ttl: 草稿保留时间(秒)
+            wait_timeout: 生成请求到达时草稿仍在生成中，最多等待的时间(秒)
+            max_workers: 同时进行的预生成任务数
+            stale_after: 生成中的草稿超过该时间(秒)没有心跳视为已中断
+        """
+        self.redis = redis_client
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout
+        self.stale_after = stale_after
+        self.heartbeat_interval = stale_after / 4
+        # 预生成任务在独立线程池中等待结果，不占用LLM执行器的工作线程
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='article-prefetch')
+        self._store_script = redis_client.register_script(_STORE_IF_CURRENT_SCRIPT) if redis_client else None
+        self._redis_down_until = 0.0
+        self._local: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._stats = {'scheduled': 0, 'ready': 0, 'failed': 0, 'hits': 0, 'misses': 0,
+                       'evicted': 0, 'discarded': 0}
+
+    def _incr(self, field: str):
+        with self._lock:
+            self._stats[field] += 1
+
+    def _redis_available(self) -> bool:
+        return self.redis is not None and time.time() >= self._redis_down_until
+
+    def _mark_redis_error(self, action: str, error: Exception):
+        logger.warning(f"{action}失败，{self.REDIS_RETRY_INTERVAL}秒内只使用进程内存储: {error}")
+        self._redis_down_until = time.time() + self.REDIS_RETRY_INTERVAL
+
+    def _load(self, key: str) -> Optional[Dict]:
+        if self._redis_available():
+            try:
+                raw = self.redis.get(key)
+                return json.loads(raw) if raw else None
+            except Exception as e:
+                self._mark_redis_error('读取文章草稿', e)
+        with self._lock:
+            entry = self._local.get(key)
+            if entry and entry['expires_at'] < time.time():
+                del self._local[key]
+                return None
+            return entry['value'] if entry else None
+
+    def _save(self, key: str, value: Dict, token: Optional[str] = None) -> bool:
+        """写入草稿；指定token时仅当当前草稿token一致才写入"""
+        raw = json.dumps(value, ensure_ascii=False, default=str)
+        if self._redis_available():
+            try:
+                if token is None:
+                    self.redis.setex(key, self.ttl, raw)
+                    return True
+                return bool(self._store_script(keys=[key], args=[token, raw, self.ttl]))
+            except Exception as e:
+                self._mark_redis_error('写入文章草稿', e)
+        with self._lock:
+            current = self._local.get(key)
+            if token is not None and (not current or current['value'].get('token') != token):
+                return False
+            self._local[key] = {'value': value, 'expires_at': time.time() + self.ttl}
+            return True
+
+    def _delete(self, key: str):
+        if self._redis_available():
+            try:
+                self.redis.delete(key)
+            except Exception as e:
+                self._mark_redis_error('删除文章草稿', e)
+        with self._lock:
+            self._local.pop(key, None)
+
+    def schedule(self, user_id: int, workflow_id: int, data: Dict,
+                 generate: Callable[[Dict], List[Dict]], template: str = '',
+                 enqueue: Optional[Callable[[str, Dict, Dict, str], None]] = None) -> bool:
+        """
+        调度后台预生成（覆盖该工作流已有的草稿）
+
+        Args:
+            user_id: 用户ID
+            workflow_id: 工作流ID
+            data: 生成参数（与 /api/generate_articles 的请求参数相同）
+            generate: 生成函数 generate(data) -> 文章列表
+            template: token统计用的提示词模板标识
+            enqueue: 投递到其他进程执行 enqueue(key, entry, data, template)，由执行方调用run；
+                     未提供时在本进程的线程池中执行
+
+        Returns:
+            是否已调度
+        """
+        key = f"{self.KEY_PREFIX}{workflow_id}"
+        token = uuid.uuid4().hex
+        entry = {'user_id': user_id, 'fingerprint': draft_fingerprint(data),
+                 'token': token, 'status': 'running', 'heartbeat': time.time(), 'articles': None}
+        self._save(key, entry)
+        try:
+            if enqueue is not None:
+                enqueue(key, entry, dict(data), template)
+            else:
+                self._pool.submit(self.run, key, entry, dict(data), generate, template)
+        except Exception as e:
+            logger.warning(f'Article prefetch not scheduled: {e}')
+            self._delete(key)
+            return False
+        self._incr('scheduled')
+        logger.info(f'Article prefetch scheduled for workflow {workflow_id}')
+        return True
+
+    def run(self, key: str, entry: Dict, data: Dict, generate: Callable[[Dict], List[Dict]], template: str = ''):
+        """
+        执行预生成并写回草稿（线程池或投递的后台任务中调用）
+
+        Args:
+            key: 草稿键
+            entry: schedule 写入的草稿
+            data: 生成参数
+            generate: 生成函数
+            template: token统计用的提示词模板标识
+        """
+        current = self._load(key)
+        if not current or current.get('token') != entry['token']:
+            # 排队期间草稿已被淘汰、判定为中断或重新调度
+            self._incr('discarded')
+            return
+
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(key, entry, stop), daemon=True)
+        heartbeat.start()
+        try:
+            with usage_scope(user_id=entry['user_id'], template=template):
+                get_token_accountant().check_budget(entry['user_id'])
+                articles = generate(data)
+            result = dict(entry, status='ready' if articles else 'failed', articles=articles or None)
+        except Exception as e:
+            logger.warning(f'Article prefetch failed for {key}: {e}')
+            result = dict(entry, status='failed')
+        finally:
+            stop.set()
+            heartbeat.join()
+        if self._save(key, result, token=entry['token']):
+            self._incr(result['status'])
+        else:
+            # 生成期间草稿被淘汰或重新调度
+            self._incr('discarded')
+
+    def _heartbeat(self, key: str, entry: Dict, stop: threading.Event):
+        """生成期间定期刷新心跳，草稿被淘汰后停止"""
+        while not stop.wait(self.heartbeat_interval):
+            if not self._save(key, dict(entry, heartbeat=time.time()), token=entry['token']):
+                return
+
+    def take(self, user_id: int, workflow_id: int, data: Dict) -> Optional[List[Dict]]:
+        """
+        取出与请求参数一致的草稿（取出后删除，再次生成会重新调用模型）
+
+        草稿仍在生成中时等待其完成（最多wait_timeout秒），心跳中断时不再等待；参数不一致时淘汰草稿
+
+        Args:
+            user_id: 用户ID
+            workflow_id: 工作流ID
+            data: /api/generate_articles 的请求参数
+
+        Returns:
+            文章列表，没有可用草稿时返回None
+        """
+        key = f"{self.KEY_PREFIX}{workflow_id}"
+        entry = self._load(key)
+        if not entry or entry.get('user_id') != user_id:
+            return None
+        if entry['fingerprint'] != draft_fingerprint(data):
+            logger.info(f'Article drafts for workflow {workflow_id} do not match request, evicting')
+            self.evict(workflow_id)
+            self._incr('misses')
+            return None
+
+        deadline = time.time() + self.wait_timeout
+        while entry and entry['status'] == 'running' and time.time() < deadline:
+            if time.time() - entry.get('heartbeat', 0) > self.stale_after:
+                # 执行生成的进程已退出；删除草稿，之后完成的结果（如果有）也会被丢弃
+                logger.warning(f'Article prefetch for workflow {workflow_id} stopped heartbeating, regenerating')
+                self._delete(key)
+                entry = None
+                break
+            time.sleep(0.2)
+            entry = self._load(key)
+        if not entry or entry['status'] != 'ready':
+            self._incr('misses')
+            return None
+
+        self._delete(key)
+        self._incr('hits')
+        logger.info(f'Using {len(entry["articles"])} prefetched articles for workflow {workflow_id}')
+        return entry['articles']
+
+    def evict(self, workflow_id: int):
+        """淘汰工作流的草稿（生成中的结果完成后也会被丢弃）"""
+        self._delete(f"{self.KEY_PREFIX}{workflow_id}")
+        self._incr('evicted')
+
+    def get_stats(self) -> Dict:
+        """获取预生成统计（当前进程）"""
+        with self._lock:
+            stats = dict(self._stats)
+        consumed = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / consumed, 4) if consumed else 0.0
+        return stats
+
+
+# 全局预生成器实例
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_article_prefetcher(config=None) -> ArticlePrefetcher:
+    """
+    获取全局文章预生成器实例(单例模式)
+
+    Args:
+        config: 配置对象（首次创建时读取参数）
+
+    Returns:
+        ArticlePrefetcher实例
+    """
+    global _prefetcher
+
+    if _prefetcher is None:
+        with _prefetcher_lock:
+            if _prefetcher is None:
+                from config import get_redis_client
+                redis_client = get_redis_client('cache', config)
+                _prefetcher = ArticlePrefetcher(
+                    redis_client=redis_client,
+                    ttl=getattr(config, 'ARTICLE_PREFETCH_TTL', 1800),
+                    wait_timeout=getattr(config, 'ARTICLE_PREFETCH_WAIT', 120),
+                    max_workers=getattr(config, 'ARTICLE_PREFETCH_WORKERS', 2),
+                    stale_after=getattr(config, 'ARTICLE_PREFETCH_STALE', 60)
+                )
+
+    return _prefetcher
@@ -0,0 +1,313 @@
+"""
+发布浏览器会话池
+在Worker进程内为每个平台账号保持一个已登录的浏览器，连续的发布任务直接复用，省去启动Chrome、加载Cookie和登录检查的时间。
+会话使用 max_uses 次、存在超过 max_age 秒、空闲超过 max_idle 秒、复用前健康检查失败或发布失败后关闭，下次重新启动。
+
+只有不fork的Worker（rq.worker.SimpleWorker）在同一进程中执行后续任务；默认的fork模式下每个任务在新的子进程中执行，
+会话用完即关闭，与不复用时相同
+
+Redis结构:
+    browser_sessions:{hostname}:{pid}  进程的会话统计(JSON)，每次任务结束时更新，进程退出后过期
+"""
+import sys
+import os
+import json
+import time
+import atexit
+import socket
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+STATS_KEY_PREFIX = 'browser_sessions:'
+
+# 浏览器对象需要提供 close()，复用前调用 check_session() 检查浏览器可用且仍为登录状态
+Opener = Callable[[], Tuple[Any, Optional[Dict]]]
+
+
+class BrowserSession:
+    """一个平台账号的浏览器会话"""
+
+    def __init__(self, platform: str, account: str, browser: Any, startup_seconds: float):
+        self.platform = platform
+        self.account = account
+        self.browser = browser
+        self.startup_seconds = startup_seconds
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.uses = 0
+        self.saved_seconds = 0.0
+        self.in_use = False
+        # 本次任务是否复用了已有会话
+        self.reused = False
+
+    def to_dict(self) -> Dict:
+        now = time.time()
+        return {
+            'platform': self.platform,
+            'account': self.account,
+            'uses': self.uses,
+            'reused': self.reused,
+            'startup_seconds': round(self.startup_seconds, 2),
+            'saved_seconds': round(self.saved_seconds, 1),
+            'age_seconds': round(now - self.created_at),
+            'idle_seconds': 0 if self.in_use else round(now - self.last_used)
+        }
+
+
+class BrowserSessionManager:
+    """按 (平台, 账号) 复用浏览器会话"""
+
+    # 空闲会话检查间隔(秒)
+    IDLE_CHECK_INTERVAL = 60
+
+    def __init__(self, max_uses: int = 20, max_age: int = 3600, max_idle: int = 600, enabled: bool = True,
+                 redis_client=None):
+        """
+        初始化会话池
+
+        Args:
+            max_uses: 每个会话最多执行的任务数，之后关闭重建（释放浏览器累积的内存）
+            max_age: 会话最长存在时间(秒)
+            max_idle: 空闲超过该时间(秒)的会话关闭，空闲时不占用Chrome
+            enabled: 是否复用会话（关闭时每个任务用完即关闭）
+            redis_client: 上报会话统计的Redis客户端（decode_responses=True），为None时不上报
+        """
+        self.max_uses = max(1, max_uses)
+        self.max_age = max_age
+        self.max_idle = max_idle
+        self.enabled = enabled
+        self.redis = redis_client
+        self._sessions: Dict[Tuple[str, str], BrowserSession] = {}
+        self._lock = threading.RLock()
+        self._reaper: Optional[threading.Thread] = None
+        self._reuse_supported: Optional[bool] = None
+        self.stats = {'created': 0, 'reused': 0, 'recycled': 0, 'health_check_failed': 0, 'saved_seconds': 0.0}
+        atexit.register(self.close_all)
+
+    def reuse_supported(self) -> bool:
+        """
+        当前进程是否会执行后续任务：RQ中登记的Worker进程就是当前进程（SimpleWorker）时才复用会话，
+        fork出的子进程执行完任务即退出，留下的浏览器无人关闭
+        """
+        if self._reuse_supported is None:
+            try:
+                from rq import get_current_job
+                from rq.worker import Worker
+
+                job = get_current_job()
+                worker = Worker.find_by_key(Worker.redis_worker_namespace_prefix + job.worker_name,
+                                            connection=job.connection) if job and job.worker_name else None
+                self._reuse_supported = worker is not None and worker.pid == os.getpid()
+            except Exception as e:
+                logger.debug(f"无法确认Worker类型，不复用浏览器会话: {e}")
+                self._reuse_supported = False
+            logger.info(f"浏览器会话复用: {'启用' if self.enabled and self._reuse_supported else '未启用'} "
+                        f"(enabled={self.enabled}, 同进程执行任务={self._reuse_supported})")
+        return self._reuse_supported
+
+    def acquire(self, platform: str, account: str, opener: Opener) -> Tuple[Optional[BrowserSession], Optional[Dict]]:
+        """
+        获取账号的浏览器会话：有可用的已登录会话时直接复用（复用前做健康检查），否则调用opener启动并登录
+
+        Args:
+            platform: 平台
+            account: 账号
+            opener: 启动浏览器并登录，返回 (浏览器, None) 或 (None, 错误结果)
+
+        Returns:
+            (会话, None) 或 (None, opener返回的错误结果)
+        """
+        key = (platform, account)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None:
+                if session.in_use or self._expired(session):
+                    # 同一账号的会话正在使用（多线程调用）时不共享；过期的会话关闭
+                    session = None if session.in_use else self._discard(key, '已过期')
+                else:
+                    session.in_use = True
+
+        if session is not None:
+            began = time.perf_counter()
+            if session.browser.check_session():
+                check_seconds = time.perf_counter() - began
+                session.reused = True
+                session.saved_seconds += max(0.0, session.startup_seconds - check_seconds)
+                with self._lock:
+                    self.stats['reused'] += 1
+                    self.stats['saved_seconds'] += max(0.0, session.startup_seconds - check_seconds)
+                logger.info(f"复用{platform}浏览器会话: {account}, 第{session.uses + 1}次使用, "
+                            f"健康检查 {check_seconds:.1f}秒 (新启动需 {session.startup_seconds:.1f}秒)")
+                return session, None
+            logger.warning(f"{platform}浏览器会话健康检查失败，重新启动: {account}")
+            with self._lock:
+                self.stats['health_check_failed'] += 1
+                session.in_use = False
+                self._discard(key, '健康检查失败')
+
+        began = time.perf_counter()
+        browser, error = opener()
+        if error is not None:
+            return None, error
+        session = BrowserSession(platform, account, browser, time.perf_counter() - began)
+        session.in_use = True
+        with self._lock:
+            self.stats['created'] += 1
+            if self.enabled and self.reuse_supported() and key not in self._sessions:
+                self._sessions[key] = session
+                self._start_reaper()
+        logger.info(f"启动{platform}浏览器会话: {account}, 耗时 {session.startup_seconds:.1f}秒")
+        return session, None
+
+    def release(self, session: BrowserSession, healthy: bool = True):
+        """
+        任务结束后归还会话：不复用、已用满、已过期或本次发布失败（页面状态未知）时关闭
+
+        Args:
+            session: acquire返回的会话
+            healthy: 本次使用是否正常结束
+        """
+        key = (session.platform, session.account)
+        with self._lock:
+            session.uses += 1
+            session.last_used = time.time()
+            session.in_use = False
+            pooled = self._sessions.get(key) is session
+            if pooled and healthy and not self._expired(session):
+                logger.info(f"保留{session.platform}浏览器会话: {session.account}, 已使用{session.uses}次, "
+                            f"累计节省 {session.saved_seconds:.1f}秒")
+            elif pooled:
+                self._discard(key, '发布失败' if not healthy else '已用满或过期')
+            else:
+                self._close(session)
+        self._report()
+
+    def close_all(self):
+        """关闭所有会话（进程退出时）"""
+        with self._lock:
+            for key in list(self._sessions):
+                self._discard(key, '进程退出')
+
+    def _expired(self, session: BrowserSession) -> bool:
+        now = time.time()
+        return (session.uses >= self.max_uses or now - session.created_at > self.max_age
+                or now - session.last_used > self.max_idle)
+
+    def _discard(self, key: Tuple[str, str], reason: str) -> None:
+        """从池中移除并关闭会话（调用方持有锁）"""
+        session = self._sessions.pop(key, None)
+        if session is not None:
+            self.stats['recycled'] += 1
+            logger.info(f"关闭{session.platform}浏览器会话: {session.account}, 原因: {reason}, "
+                        f"共使用{session.uses}次, 节省 {session.saved_seconds:.1f}秒")
+            self._close(session)
+        return None
+
+    @staticmethod
+    def _close(session: BrowserSession):
+        try:
+            session.browser.close()
+        except Exception as e:
+            logger.warning(f"关闭浏览器失败: {e}")
+
+    def _start_reaper(self):
+        """启动空闲会话回收线程（调用方持有锁）"""
+        if self._reaper is None:
+            self._reaper = threading.Thread(target=self._reap_idle, name='browser-session-reaper', daemon=True)
+            self._reaper.start()
+
+    def _reap_idle(self):
+        """定期关闭空闲或过期的会话，池为空时退出"""
+        while True:
+            time.sleep(self.IDLE_CHECK_INTERVAL)
+            with self._lock:
+                for key, session in list(self._sessions.items()):
+                    if not session.in_use and self._expired(session):
+                        self._discard(key, '空闲超时')
+                if not self._sessions:
+                    self._reaper = None
+                    break
+            self._report()
+
+    def get_stats(self) -> Dict:
+        """当前进程的会话统计"""
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'enabled': self.enabled and bool(self._reuse_supported),
+                'created': self.stats['created'],
+                'reused': self.stats['reused'],
+                'recycled': self.stats['recycled'],
+                'health_check_failed': self.stats['health_check_failed'],
+                'saved_seconds': round(self.stats['saved_seconds'], 1),
+                'sessions': [session.to_dict() for session in self._sessions.values()]
+            }
+
+    def _report(self):
+        """把会话统计写入Redis，供管理后台汇总各Worker进程（失败时忽略）"""
+        if self.redis is None:
+            return
+        try:
+            self.redis.set(f"{STATS_KEY_PREFIX}{socket.gethostname()}:{os.getpid()}",
+                           json.dumps(self.get_stats(), ensure_ascii=False),
+                           ex=self.max_idle + 2 * self.IDLE_CHECK_INTERVAL)
+        except Exception as e:
+            logger.debug(f"上报浏览器会话统计失败: {e}")
+
+
+def get_browser_session_reports(redis_client) -> list:
+    """
+    汇总各Worker进程上报的浏览器会话统计
+
+    Args:
+        redis_client: Redis客户端（decode_responses=True）
+
+    Returns:
+        [{'host', 'pid', 'created', 'reused', 'saved_seconds', 'sessions', ...}, ...]
+    """
+    reports = []
+    for key in redis_client.scan_iter(match=f"{STATS_KEY_PREFIX}*", count=100):
+        raw = redis_client.get(key)
+        if raw:
+            reports.append(dict(json.loads(raw), host=key[len(STATS_KEY_PREFIX):].rsplit(':', 1)[0]))
+    return sorted(reports, key=lambda report: (report['host'], report['pid']))
+
+
+# 全局会话池实例
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_browser_session_manager(config=None) -> BrowserSessionManager:
+    """
+    获取Worker进程的浏览器会话池(单例模式)
+
+    Args:
+        config: 配置对象（首次创建时读取参数）
+
+    Returns:
+        BrowserSessionManager实例
+    """
+    global _manager
+
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                if config is None:
+                    from config import get_config
+                    config = get_config()
+                from config import get_redis_client
+                _manager = BrowserSessionManager(
+                    max_uses=getattr(config, 'PUBLISH_BROWSER_MAX_USES', 20),
+                    max_age=getattr(config, 'PUBLISH_BROWSER_MAX_AGE', 3600),
+                    max_idle=getattr(config, 'PUBLISH_BROWSER_MAX_IDLE', 600),
+                    enabled=getattr(config, 'PUBLISH_BROWSER_REUSE', True),
+                    redis_client=get_redis_client('cache', config)
+                )
+
+    return _manager
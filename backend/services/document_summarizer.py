@@ -0,0 +1,220 @@
+"""
+上传资料摘要模块
+大文档按token预算切块，经共享LLM执行器并行提炼要点（map），再合并为一份简报（reduce）；
+简报按文件内容哈希缓存，同一份资料重复分析不再调用模型
+"""
+import sys
+import os
+import re
+import hashlib
+from typing import List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+_NON_ASCII = re.compile(r'[^\x00-\x7f]')
+_SENTENCE_END = re.compile(r'(?<=[。！？；!?;])')
+
+# 提示词变更时递增，使旧简报缓存失效
+PROMPT_VERSION = 1
+
+MAP_SYSTEM_PROMPT = '你是一个专业的商业资料整理助手，擅长从长文档中提炼关键事实。'
+MAP_PROMPT = '''以下是一份公司/产品资料的第{index}/{total}部分：
+{chunk}
+
+请提炼这部分中与公司/产品有关的关键事实（业务范围、产品与服务、技术特点、客户与案例、数据指标、资质荣誉等）：
+1. 保留具体的数字、名称和时间
+2. 用简洁的要点列出，不要评价和推测
+3. 不超过{limit}字；没有相关内容时只回复"无"'''
+
+REDUCE_PROMPT = '''以下是从一份公司/产品资料中分段提炼的要点：
+{summaries}
+
+请合并为一份完整的资料简报：
+1. 去除重复内容，相同主题的信息归到一起
+2. 保留具体的数字、名称和时间
+3. 不要添加资料中没有的信息
+4. 不超过{limit}字'''
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算文本token数（中文约1字1个token，英文约4个字符1个token）
+
+    Args:
+        text: 文本
+
+    Returns:
+        估算的token数
+    """
+    non_ascii = len(_NON_ASCII.findall(text))
+    return non_ascii + (len(text) - non_ascii + 3) // 4
+
+
+def split_into_chunks(text: str, max_tokens: int) -> List[str]:
+    """
+    按token预算切分文本，优先在段落边界切分，段落过长时按句子切分，句子过长时按长度硬切
+
+    Args:
+        text: 原始文本
+        max_tokens: 每块的token上限
+
+    Returns:
+        文本块列表
+    """
+    pieces = []
+    for paragraph in text.split('\n'):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if estimate_tokens(paragraph) <= max_tokens:
+            pieces.append(paragraph)
+            continue
+        for sentence in _SENTENCE_END.split(paragraph):
+            # 单句超限时按字符数硬切（按最坏情况1字1个token）
+            while estimate_tokens(sentence) > max_tokens:
+                pieces.append(sentence[:max_tokens])
+                sentence = sentence[max_tokens:]
+            if sentence:
+                pieces.append(sentence)
+
+    chunks = []
+    current = []
+    current_tokens = 0
+    for piece in pieces:
+        tokens = estimate_tokens(piece) + 1
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append('\n'.join(current))
+            current = []
+            current_tokens = 0
+        current.append(piece)
+        current_tokens += tokens
+    if current:
+        chunks.append('\n'.join(current))
+    return chunks
+
+
+class DocumentSummarizer:
+    """上传资料的map-reduce摘要器"""
+
+    CACHE_KEY_PREFIX = 'docbrief:'
+
+    def __init__(self, ai_service, config):
+        """
+        初始化摘要器
+
+        Args:
+            ai_service: AIService实例（复用其API调用、执行器和缓存）
+            config: 配置对象
+        """
+        self.ai_service = ai_service
+        self.enabled = getattr(config, 'UPLOAD_SUMMARY_ENABLED', True)
+        self.threshold_tokens = getattr(config, 'UPLOAD_SUMMARY_THRESHOLD_TOKENS', 6000)
+        self.chunk_tokens = getattr(config, 'UPLOAD_SUMMARY_CHUNK_TOKENS', 3000)
+        self.chunk_summary_chars = getattr(config, 'UPLOAD_SUMMARY_CHUNK_CHARS', 500)
+        self.brief_chars = getattr(config, 'UPLOAD_SUMMARY_BRIEF_CHARS', 2000)
+        self.cache_ttl = getattr(config, 'UPLOAD_SUMMARY_CACHE_TTL', 7 * 24 * 3600)
+        self.max_reduce_rounds = 3
+
+    def cache_key(self, text: str, model: Optional[str] = None) -> str:
+        """简报缓存键：内容哈希 + 模型 + 提示词版本"""
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        return f"{self.CACHE_KEY_PREFIX}v{PROMPT_VERSION}:{model or self.ai_service.model}:{digest}"
+
+    def condense(self, text: str, model: Optional[str] = None) -> str:
+        """
+        返回适合放入分析提示词的资料文本：短文本原样返回，长文本返回摘要简报
+
+        Args:
+            text: 上传文件提取的文本
+            model: 指定使用的AI模型（可选）
+
+        Returns:
+            原文或简报
+        """
+        if not text or not self.enabled or estimate_tokens(text) <= self.threshold_tokens:
+            return text
+
+        cache = self.ai_service.cache
+        key = self.cache_key(text, model)
+        cached = cache.get(key) if cache.enabled else None
+        if cached is not None:
+            logger.info(f'Document brief cache hit ({len(text)} chars)')
+            return cached['content']
+
+        try:
+            brief = self._map_reduce(text, model)
+        except Exception as e:
+            logger.error(f'Document summarization error: {e}', exc_info=True)
+            brief = ''
+        if brief:
+            if cache.enabled:
+                cache.set(key, brief, None, self.cache_ttl)
+            return brief
+
+        # 全部摘要失败时截取开头部分，保证提示词不超出上下文
+        logger.warning('Document summarization failed, truncating uploaded text')
+        return split_into_chunks(text, self.threshold_tokens)[0]
+
+    def _map_reduce(self, text: str, model: Optional[str]) -> str:
+        chunks = split_into_chunks(text, self.chunk_tokens)
+        logger.info(f'Summarizing uploaded document: {len(text)} chars, {len(chunks)} chunks')
+        summaries = self._summarize_all(chunks, model)
+        if not summaries:
+            return ''
+        if len(summaries) == 1:
+            return summaries[0]
+
+        # 要点合计仍超出单次预算时分组逐层合并
+        for _ in range(self.max_reduce_rounds):
+            joined = self._join(summaries)
+            if estimate_tokens(joined) <= self.chunk_tokens:
+                break
+            groups = split_into_chunks(joined, self.chunk_tokens)
+            summaries = self._summarize_all(groups, model) or summaries
+            if len(summaries) == 1:
+                return summaries[0]
+
+        messages = [
+            {'role': 'system', 'content': MAP_SYSTEM_PROMPT},
+            {'role': 'user', 'content': REDUCE_PROMPT.format(summaries=self._join(summaries),
+                                                             limit=self.brief_chars)}
+        ]
+        try:
+            return self.ai_service._call_api(messages, temperature=0.3, max_tokens=self.brief_chars * 2,
+                                             model=model) or ''
+        except Exception as e:
+            logger.warning(f'Document brief reduce failed, using chunk summaries: {e}')
+            return self._join(summaries)
+
+    def _summarize_all(self, chunks: List[str], model: Optional[str]) -> List[str]:
+        """并行提炼各块要点（调用方线程等待，不占用执行器线程）"""
+        futures = [
+            self.ai_service.executor.submit(self._summarize_chunk, chunk, i + 1, len(chunks), model)
+            for i, chunk in enumerate(chunks)
+        ]
+        summaries = []
+        for future in futures:
+            try:
+                summary = future.result()
+            except Exception as e:
+                logger.warning(f'Chunk summarization failed: {e}')
+                continue
+            if summary and summary.strip() != '无':
+                summaries.append(summary.strip())
+        return summaries
+
+    def _summarize_chunk(self, chunk: str, index: int, total: int, model: Optional[str]) -> Optional[str]:
+        messages = [
+            {'role': 'system', 'content': MAP_SYSTEM_PROMPT},
+            {'role': 'user', 'content': MAP_PROMPT.format(index=index, total=total, chunk=chunk,
+                                                          limit=self.chunk_summary_chars)}
+        ]
+        return self.ai_service._call_api(messages, temperature=0.3,
+                                         max_tokens=self.chunk_summary_chars * 2, model=model)
+
+    @staticmethod
+    def _join(summaries: List[str]) -> str:
+        return '\n\n'.join(f'【第{i + 1}部分】\n{s}' for i, s in enumerate(summaries))
@@ -0,0 +1,405 @@
+"""
+文章近似重复检测
+对文章正文计算64位SimHash，按16位分4段建立数据库索引：汉明距离不超过3的两篇文章
+至少有一段完全相同，查询只需按4个段值做索引查找，再逐个计算汉明距离
+"""
+import sys
+import os
+import re
+import time
+import hashlib
+import threading
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+SIMHASH_BITS = 64
+BAND_COUNT = 4
+BAND_BITS = SIMHASH_BITS // BAND_COUNT
+SHINGLE_SIZE = 4
+
+# 归一化时去掉空白、标点和Markdown符号，只保留文字和数字
+_NON_WORD = re.compile(r'[\W_]+', re.UNICODE)
+
+# 发布历史中保存的是平台显示名称，统一为发布任务使用的平台代码
+PLATFORM_ALIASES = {'知乎': 'zhihu', 'CSDN': 'csdn', '简书': 'jianshu'}
+
+
+def normalize_platform(platform: Optional[str]) -> Optional[str]:
+    """平台名称统一为平台代码"""
+    if not platform:
+        return None
+    return PLATFORM_ALIASES.get(platform, platform.lower())
+
+
+def simhash(text: str) -> int:
+    """
+    计算文本的64位SimHash（字符4-gram，按出现次数加权）
+
+    Args:
+        text: 文本
+
+    Returns:
+        无符号64位整数
+    """
+    normalized = _NON_WORD.sub('', text or '').lower()
+    if len(normalized) < SHINGLE_SIZE:
+        shingles = Counter([normalized]) if normalized else Counter()
+    else:
+        shingles = Counter(normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1))
+
+    # 先按字节位置累计权重，再展开到64位，比逐位移位快数倍
+    byte_weights = [[0] * 256 for _ in range(8)]
+    total = 0
+    for shingle, weight in shingles.items():
+        total += weight
+        for position, byte in enumerate(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest()):
+            byte_weights[position][byte] += weight
+
+    # 每一位上哈希为1的权重之和超过总权重的一半则该位为1
+    bit_weights = [0] * SIMHASH_BITS
+    for position, weights in enumerate(byte_weights):
+        base = (7 - position) * 8
+        for byte, weight in enumerate(weights):
+            if weight:
+                for k in range(8):
+                    if byte >> k & 1:
+                        bit_weights[base + k] += weight
+
+    result = 0
+    for bit, weight in enumerate(bit_weights):
+        if weight * 2 > total:
+            result |= 1 << bit
+    return result
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """两个SimHash的汉明距离"""
+    return bin(a ^ b).count('1')
+
+
+def split_bands(value: int) -> List[int]:
+    """把64位SimHash拆成4个16位段"""
+    mask = (1 << BAND_BITS) - 1
+    return [(value >> (i * BAND_BITS)) & mask for i in range(BAND_COUNT)]
+
+
+def to_signed(value: int) -> int:
+    """无符号64位整数转为有符号（数据库BIGINT存储）"""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def to_unsigned(value: int) -> int:
+    """有符号64位整数转回无符号"""
+    return value + (1 << 64) if value < 0 else value
+
+
+def fingerprint_values(source: str, source_id: int, user_id: Optional[int], platform: Optional[str],
+                       title: Optional[str], content: str) -> Dict:
+    """
+    构建 content_fingerprints 表的一行
+
+    Args:
+        source: 来源 article / publish
+        source_id: 来源表中的ID
+        user_id: 用户ID
+        platform: 平台
+        title: 标题
+        content: 正文
+
+    Returns:
+        列值字典
+    """
+    value = simhash(content)
+    row = {
+        'source': source,
+        'source_id': source_id,
+        'user_id': user_id,
+        'platform': normalize_platform(platform),
+        'title': (title or '')[:500],
+        'simhash': to_signed(value)
+    }
+    for i, band in enumerate(split_bands(value)):
+        row[f'band{i}'] = band
+    return row
+
+
+class DuplicateIndex:
+    """基于SimHash分段索引的近似重复检测"""
+
+    def __init__(self, session_factory: Optional[Callable] = None, max_distance: int = 3,
+                 min_chars: int = 50, mode: str = 'warn'):
+        """
+        初始化索引
+
+        Args:
+            session_factory: 数据库会话工厂（默认 models.get_db_session）
+            max_distance: 汉明距离不超过该值视为近似重复（分4段时最大为3）
+            min_chars: 正文少于该字数不参与检测
+            mode: 发布前检查方式 block 拒绝 / warn 只记录日志 / off 不检查
+        """
+        if session_factory is None:
+            from models import get_db_session
+            session_factory = get_db_session
+        self.session_factory = session_factory
+        self.max_distance = min(max_distance, BAND_COUNT - 1)
+        self.min_chars = min_chars
+        self.mode = mode
+
+    def find_similar(self, content: str, platform: Optional[str] = None, user_id: Optional[int] = None,
+                     sources: Iterable[str] = ('publish',), exclude: Optional[tuple] = None,
+                     limit: int = 5) -> List[Dict]:
+        """
+        查找与正文近似重复的已索引文章
+
+        Args:
+            content: 正文
+            platform: 只查该平台的记录（可选）
+            user_id: 只查该用户的记录（可选）
+            sources: 来源范围，默认只查已发布内容
+            exclude: 排除的记录 (source, source_id)
+            limit: 最多返回条数
+
+        Returns:
+            按距离排序的列表 [{source, source_id, user_id, platform, title, distance, similarity}]
+        """
+        if not content or len(content) < self.min_chars:
+            return []
+        return self.lookup(simhash(content), platform=platform, user_id=user_id,
+                           sources=sources, exclude=exclude, limit=limit)
+
+    def lookup(self, value: int, platform: Optional[str] = None, user_id: Optional[int] = None,
+               sources: Iterable[str] = ('publish',), exclude: Optional[tuple] = None,
+               limit: int = 5) -> List[Dict]:
+        """
+        按SimHash查找近似重复记录（参数同 find_similar）
+
+        只用4个段值做索引查找；来源/平台/用户在内存中过滤，避免数据库改用其他索引而退化为范围扫描
+        """
+        from sqlalchemy import or_
+        from models import ContentFingerprint as F
+
+        bands = split_bands(value)
+        platform = normalize_platform(platform)
+        sources = set(sources or ())
+
+        session = self.session_factory()
+        try:
+            candidates = session.query(
+                F.source, F.source_id, F.user_id, F.platform, F.title, F.simhash
+            ).filter(or_(*[getattr(F, f'band{i}') == band for i, band in enumerate(bands)])).all()
+        finally:
+            session.close()
+
+        matches = []
+        for source, source_id, row_user_id, row_platform, title, row_hash in candidates:
+            if sources and source not in sources:
+                continue
+            if platform and row_platform != platform:
+                continue
+            if user_id is not None and row_user_id != user_id:
+                continue
+            if exclude and (source, source_id) == tuple(exclude):
+                continue
+            distance = hamming_distance(value, to_unsigned(row_hash))
+            if distance <= self.max_distance:
+                matches.append({
+                    'source': source,
+                    'source_id': source_id,
+                    'user_id': row_user_id,
+                    'platform': row_platform,
+                    'title': title,
+                    'distance': distance,
+                    'similarity': round(1 - distance / SIMHASH_BITS, 4)
+                })
+        matches.sort(key=lambda m: m['distance'])
+        return matches[:limit]
+
+    @staticmethod
+    def redact_foreign(matches: List[Dict], user_id: int) -> List[Dict]:
+        """
+        隐藏其他用户记录的标题和ID（跨用户的近似重复只提示存在，不暴露对方内容）
+
+        Args:
+            matches: find_similar 的结果
+            user_id: 当前用户ID
+
+        Returns:
+            结果列表，其他用户的记录只保留平台和相似度，own 标记是否为当前用户的记录
+        """
+        redacted = []
+        for match in matches:
+            if match['user_id'] == user_id:
+                redacted.append(dict(match, own=True))
+            else:
+                redacted.append({'platform': match['platform'], 'distance': match['distance'],
+                                 'similarity': match['similarity'], 'own': False})
+        return redacted
+
+    def remove_workflow_articles(self, session, workflow_id: int):
+        """
+        删除工作流下文章的指纹（文章被批量删除前调用，与删除在同一事务中）
+
+        Args:
+            session: 数据库会话
+            workflow_id: 工作流ID
+        """
+        from sqlalchemy import select
+        from models import Article, ContentFingerprint
+
+        article_ids = select(Article.id).where(Article.workflow_id == workflow_id)
+        session.query(ContentFingerprint).filter(
+            ContentFingerprint.source == 'article',
+            ContentFingerprint.source_id.in_(article_ids)
+        ).delete(synchronize_session=False)
+
+    def backfill(self, batch_size: int = 500, progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """
+        为已有文章和发布历史建立指纹（按ID分批流式读取，已索引的记录跳过，可重复执行）
+
+        Args:
+            batch_size: 每批读取的记录数
+            progress: 每批完成后的回调 progress(stats)
+
+        Returns:
+            {'success': bool, 'articles': int, 'publish': int, 'skipped': int, 'seconds': float}
+        """
+        from models import Article, Workflow, PublishHistory, ContentFingerprint
+
+        start = time.time()
+        stats = {'articles': 0, 'publish': 0, 'skipped': 0}
+        sources = [
+            ('article', 'articles',
+             lambda s: s.query(Article.id, Workflow.user_id, Article.title, Article.content)
+             .join(Workflow, Article.workflow_id == Workflow.id),
+             Article.id, lambda row: (row[0], row[1], None, row[2], row[3])),
+            ('publish', 'publish',
+             lambda s: s.query(PublishHistory.id, PublishHistory.user_id, PublishHistory.platform,
+                               PublishHistory.article_title, PublishHistory.article_content)
+             .filter(PublishHistory.status == 'success'),
+             PublishHistory.id, lambda row: tuple(row)),
+        ]
+
+        session = self.session_factory()
+        try:
+            for source, stat_key, base_query, id_column, unpack in sources:
+                last_id = 0
+                while True:
+                    rows = base_query(session).filter(id_column > last_id) \
+                        .order_by(id_column).limit(batch_size).all()
+                    if not rows:
+                        break
+                    last_id = rows[-1][0]
+                    ids = [row[0] for row in rows]
+                    indexed = {
+                        source_id for (source_id,) in session.query(ContentFingerprint.source_id).filter(
+                            ContentFingerprint.source == source, ContentFingerprint.source_id.in_(ids))
+                    }
+                    values = []
+                    for row in rows:
+                        source_id, user_id, platform, title, content = unpack(row)
+                        if source_id in indexed or not content or len(content) < self.min_chars:
+                            stats['skipped'] += 1
+                            continue
+                        values.append(fingerprint_values(source, source_id, user_id, platform, title, content))
+                    if values:
+                        session.execute(ContentFingerprint.__table__.insert(), values)
+                        session.commit()
+                    stats[stat_key] += len(values)
+                    if progress:
+                        progress(dict(stats))
+                    # 只保留当前批次的对象，避免会话中累积
+                    session.expunge_all()
+
+            stats['seconds'] = round(time.time() - start, 2)
+            logger.info(f"指纹回填完成: {stats}")
+            return {'success': True, **stats}
+
+        except Exception as e:
+            session.rollback()
+            logger.error(f"指纹回填失败: {e}", exc_info=True)
+            return {'success': False, 'error': str(e), **stats}
+        finally:
+            session.close()
+
+
+# 写入失败（如未执行迁移）后暂停建索引的时间(秒)
+_INDEX_RETRY_INTERVAL = 300
+_index_disabled_until = 0.0
+
+
+def index_on_insert(connection, source: str, target):
+    """
+    Article / PublishHistory 插入后同步写入指纹（models中的after_insert事件调用，与插入在同一事务中）
+
+    Args:
+        connection: 当前事务的数据库连接
+        source: article / publish
+        target: 刚插入的ORM对象
+    """
+    global _index_disabled_until
+    from sqlalchemy import select
+    from models import Workflow, ContentFingerprint
+
+    if time.time() < _index_disabled_until:
+        return
+    try:
+        if source == 'article':
+            content = target.content
+            user_id = connection.execute(
+                select(Workflow.user_id).where(Workflow.id == target.workflow_id)
+            ).scalar()
+            platform, title = None, target.title
+        else:
+            if target.status != 'success':
+                return
+            content = target.article_content
+            user_id, platform, title = target.user_id, target.platform, target.article_title
+        if not content or len(content) < get_duplicate_index().min_chars:
+            return
+        connection.execute(ContentFingerprint.__table__.insert(),
+                           fingerprint_values(source, target.id, user_id, platform, title, content))
+    except Exception as e:
+        _index_disabled_until = time.time() + _INDEX_RETRY_INTERVAL
+        logger.warning(f"写入文章指纹失败，{_INDEX_RETRY_INTERVAL}秒内暂停建索引: {e}")
+
+
+def run_backfill_job(batch_size: int = 500) -> Dict:
+    """指纹回填任务入口（RQ Worker或脚本调用）"""
+    return get_duplicate_index().backfill(batch_size=batch_size)
+
+
+# 全局索引实例
+_duplicate_index = None
+_index_lock = threading.Lock()
+
+
+def get_duplicate_index(config=None) -> DuplicateIndex:
+    """
+    获取全局近似重复索引实例(单例模式)
+
+    Args:
+        config: 配置对象（首次创建时读取参数，未提供时使用全局配置）
+
+    Returns:
+        DuplicateIndex实例
+    """
+    global _duplicate_index
+
+    if _duplicate_index is None:
+        with _index_lock:
+            if _duplicate_index is None:
+                if config is None:
+                    from config import get_config
+                    config = get_config()
+                _duplicate_index = DuplicateIndex(
+                    max_distance=getattr(config, 'DUPLICATE_SIMHASH_DISTANCE', 3),
+                    min_chars=getattr(config, 'DUPLICATE_MIN_CHARS', 50),
+                    mode=getattr(config, 'DUPLICATE_CHECK_MODE', 'warn')
+                )
+
+    return _duplicate_index
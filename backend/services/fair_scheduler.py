@@ -0,0 +1,547 @@
+"""
+发布任务公平调度器
+任务先进入用户子队列，分发器按用户权重（stride调度）轮流把任务投递到RQ队列，
+每个用户同时在RQ队列/执行中的任务数在分发时受限，避免单个用户的大批量任务饿死其他用户。
+定时发布的任务先进入按发布时间排序的定时索引，到期后再进入用户子队列（未启用公平调度时直接入RQ队列）；
+优先级大于0的任务插到子队列队首，投递到RQ时也放在队首
+
+Redis结构:
+    fairq:user:{user_id}   用户子队列(list)，元素为 {"task_id", "task_db_id", "enqueued_at", "priority"} JSON
+    fairq:active           有待分发任务的用户(zset)，score为虚拟时间(pass)，每分发一个任务增加 1/权重
+    fairq:vtime            已分发任务的最大虚拟时间，新加入的用户从这里开始，不能攒积分
+    fairq:weights          用户权重(hash)
+    fairq:stats:{user_id}  用户分发统计(hash): dispatched 分发数, wait_total 累计等待秒数
+    fairq:scheduled        定时任务索引(zset)，member为任务ID，score为发布时间戳
+    fairq:scheduled:items  定时任务详情(hash)，任务ID -> {"task_id", "task_db_id", "user_id", "priority", "weight"} JSON
+    ratelimit:user:{user_id}:concurrent  在途任务数，与限流器共用，Worker执行结束时释放
+"""
+import sys
+import os
+import json
+import time
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import setup_logger
+import redis
+from rq import Queue
+
+logger = setup_logger(__name__)
+
+KEY_PREFIX = 'fairq'
+SCHEDULED_KEY = f'{KEY_PREFIX}:scheduled'
+SCHEDULED_ITEMS_KEY = f'{KEY_PREFIX}:scheduled:items'
+IN_FLIGHT_KEY = 'ratelimit:user:{}:concurrent'
+IN_FLIGHT_TTL = 3600
+
+# 追加任务到用户子队列；用户不在活跃集合中时以当前虚拟时间加入
+# ARGV: 用户ID, 权重, 插到队首的任务数n, 任务JSON...（前n个按顺序插到队首，其余追加到队尾）
+SUBMIT_SCRIPT = """
+local front = tonumber(ARGV[3])
+for i = 3 + front, 4, -1 do
+    redis.call('LPUSH', KEYS[1], ARGV[i])
+end
+if #ARGV > 3 + front then
+    redis.call('RPUSH', KEYS[1], unpack(ARGV, 4 + front))
+end
+redis.call('HSET', KEYS[3], ARGV[1], ARGV[2])
+if not redis.call('ZSCORE', KEYS[2], ARGV[1]) then
+    redis.call('ZADD', KEYS[2], redis.call('GET', KEYS[4]) or '0', ARGV[1])
+end
+return redis.call('LLEN', KEYS[1])
+"""
+
+# 从一个用户的子队列弹出一个任务并推进其虚拟时间；用户达到在途上限返回 {-1}，子队列为空返回 {0}（移出活跃集合）
+# KEYS: 活跃集合, 权重, 虚拟时间, 用户子队列, 用户在途计数  ARGV: 用户ID, 在途上限, 在途计数过期时间
+POP_SCRIPT = """
+if tonumber(redis.call('GET', KEYS[5]) or '0') >= tonumber(ARGV[2]) then
+    return {-1}
+end
+local item = redis.call('LPOP', KEYS[4])
+if not item then
+    redis.call('ZREM', KEYS[1], ARGV[1])
+    return {0}
+end
+redis.call('INCR', KEYS[5])
+redis.call('EXPIRE', KEYS[5], ARGV[3])
+local vtime = tonumber(redis.call('GET', KEYS[3]) or '0')
+local pass = tonumber(redis.call('ZSCORE', KEYS[1], ARGV[1]) or vtime)
+if pass > vtime then
+    redis.call('SET', KEYS[3], tostring(pass))
+end
+if redis.call('LLEN', KEYS[4]) == 0 then
+    redis.call('ZREM', KEYS[1], ARGV[1])
+else
+    local weight = tonumber(redis.call('HGET', KEYS[2], ARGV[1]) or '1')
+    redis.call('ZADD', KEYS[1], tostring(pass + 1 / weight), ARGV[1])
+end
+return {1, item}
+"""
+
+# 取出到期的定时任务（按发布时间顺序），返回任务详情JSON列表
+RELEASE_SCRIPT = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+local out = {}
+for _, task_id in ipairs(ids) do
+    local item = redis.call('HGET', KEYS[2], task_id)
+    redis.call('ZREM', KEYS[1], task_id)
+    redis.call('HDEL', KEYS[2], task_id)
+    if item then
+        table.insert(out, item)
+    end
+end
+return out
+"""
+
+
+class FairScheduler:
+    """发布任务公平调度器"""
+
+    def __init__(self, redis_client: redis.Redis, queue_name: str = 'default',
+                 max_in_flight: int = 3, role_weights: Dict = None, enabled: bool = False):
+        """
+        初始化调度器
+
+        Args:
+            redis_client: Redis客户端（bytes模式，与RQ共用）
+            queue_name: 任务最终投递的RQ队列
+            max_in_flight: 每用户同时在RQ队列/执行中的任务上限
+            role_weights: 用户角色到调度权重的映射
+            enabled: 是否启用公平调度（关闭时任务直接入RQ队列）
+        """
+        self.redis = redis_client
+        self.queue = Queue(queue_name, connection=redis_client)
+        self.max_in_flight = max(1, max_in_flight)
+        self.role_weights = role_weights or {}
+        self.enabled = enabled
+
+        self._submit_script = redis_client.register_script(SUBMIT_SCRIPT)
+        self._pop_script = redis_client.register_script(POP_SCRIPT)
+        self._release_script = redis_client.register_script(RELEASE_SCRIPT)
+
+        logger.info(f"发布公平调度器初始化: enabled={enabled}, max_in_flight={self.max_in_flight}, "
+                    f"weights={self.role_weights}")
+
+    def _user_key(self, user_id) -> str:
+        return f"{KEY_PREFIX}:user:{user_id}"
+
+    def _stats_key(self, user_id) -> str:
+        return f"{KEY_PREFIX}:stats:{user_id}"
+
+    def weight_for_role(self, role: str) -> float:
+        """获取用户角色对应的调度权重（未配置的角色为1）"""
+        weight = self.role_weights.get(role or 'user', 1)
+        return weight if weight > 0 else 1
+
+    def submit(self, user_id: int, tasks: List[Dict], weight: float = 1) -> int:
+        """
+        把任务追加到用户子队列（不分发），优先级大于0的任务按优先级从高到低插到队首
+
+        Args:
+            user_id: 用户ID
+            tasks: [{'task_id': str, 'task_db_id': int, 'priority': int(可选)}, ...]
+            weight: 用户调度权重
+
+        Returns:
+            用户子队列当前长度
+        """
+        if not tasks:
+            return 0
+        now = time.time()
+        urgent = sorted((task for task in tasks if task.get('priority', 0) > 0), key=lambda task: -task['priority'])
+        normal = [task for task in tasks if task.get('priority', 0) <= 0]
+        items = [json.dumps({'task_id': task['task_id'], 'task_db_id': task['task_db_id'], 'enqueued_at': now,
+                             'priority': task.get('priority', 0)})
+                 for task in urgent + normal]
+        depth = self._submit_script(
+            keys=[self._user_key(user_id), f"{KEY_PREFIX}:active", f"{KEY_PREFIX}:weights", f"{KEY_PREFIX}:vtime"],
+            args=[user_id, weight, len(urgent), *items]
+        )
+        logger.info(f"用户{user_id}的{len(tasks)}个任务进入子队列, 当前排队: {depth}")
+        return depth
+
+    def schedule(self, user_id: int, tasks: List[Dict], weight: float = 1) -> int:
+        """
+        把定时任务加入定时索引，到发布时间后由 release_due 放入子队列（或直接入RQ队列）
+
+        Args:
+            user_id: 用户ID
+            tasks: [{'task_id': str, 'task_db_id': int, 'scheduled_at': 时间戳, 'priority': int(可选)}, ...]
+            weight: 用户调度权重
+
+        Returns:
+            定时索引中的任务总数
+        """
+        if not tasks:
+            return 0
+        pipe = self.redis.pipeline()
+        pipe.hset(SCHEDULED_ITEMS_KEY, mapping={
+            task['task_id']: json.dumps({'task_id': task['task_id'], 'task_db_id': task['task_db_id'],
+                                         'user_id': user_id, 'priority': task.get('priority', 0),
+                                         'weight': weight})
+            for task in tasks
+        })
+        pipe.zadd(SCHEDULED_KEY, {task['task_id']: task['scheduled_at'] for task in tasks})
+        pipe.zcard(SCHEDULED_KEY)
+        total = pipe.execute()[-1]
+        self._schedule_release(min(task['scheduled_at'] for task in tasks))
+        logger.info(f"用户{user_id}的{len(tasks)}个任务加入定时索引, 最早发布时间: "
+                    f"{datetime.fromtimestamp(min(task['scheduled_at'] for task in tasks)):%Y-%m-%d %H:%M:%S}, "
+                    f"定时任务总数: {total}")
+        return total
+
+    def unschedule(self, task_id: str) -> bool:
+        """
+        从定时索引移除尚未到期的任务
+
+        Returns:
+            是否移除成功（False表示任务已到期释放或不存在）
+        """
+        pipe = self.redis.pipeline()
+        pipe.zrem(SCHEDULED_KEY, task_id)
+        pipe.hdel(SCHEDULED_ITEMS_KEY, task_id)
+        return pipe.execute()[0] > 0
+
+    def release_due(self, max_jobs: int = 500) -> int:
+        """
+        把到期的定时任务放入各用户子队列（未启用公平调度时直接入RQ队列），出错时放回定时索引
+
+        Args:
+            max_jobs: 每次从定时索引取出的任务数
+
+        Returns:
+            释放的任务数
+        """
+        released = 0
+        try:
+            while True:
+                batch = [json.loads(item) for item in self._release_script(
+                    keys=[SCHEDULED_KEY, SCHEDULED_ITEMS_KEY], args=[time.time(), max_jobs])]
+                if not batch:
+                    break
+                released += self._release(batch)
+                if len(batch) < max_jobs:
+                    break
+
+            if released:
+                logger.info(f"释放 {released} 个到期的定时发布任务")
+                # 安排下一次释放
+                upcoming = self.redis.zrange(SCHEDULED_KEY, 0, 0, withscores=True)
+                if upcoming:
+                    self._schedule_release(upcoming[0][1])
+        except Exception as e:
+            logger.error(f"释放定时任务失败: {e}", exc_info=True)
+        return released
+
+    def _release(self, items: List[Dict]) -> int:
+        """释放一批到期任务，返回成功释放的数量"""
+        if not self.enabled:
+            # 直接入RQ队列，同时占用在途名额（定时任务创建时只占用了速率名额）
+            try:
+                pipe = self.redis.pipeline()
+                self.queue.enqueue_many(self.prepare_jobs(items), pipeline=pipe)
+                for user_id in {item['user_id'] for item in items}:
+                    pipe.incrby(IN_FLIGHT_KEY.format(user_id), sum(1 for item in items if item['user_id'] == user_id))
+                    pipe.expire(IN_FLIGHT_KEY.format(user_id), IN_FLIGHT_TTL)
+                pipe.execute()
+                return len(items)
+            except Exception as e:
+                logger.error(f"定时任务入RQ队列失败，放回定时索引: {e}", exc_info=True)
+                self._reschedule(items)
+                return 0
+
+        released = 0
+        for user_id in sorted({item['user_id'] for item in items}):
+            user_items = [item for item in items if item['user_id'] == user_id]
+            try:
+                self.submit(user_id, user_items, user_items[0].get('weight', 1))
+                released += len(user_items)
+            except Exception as e:
+                logger.error(f"用户{user_id}的定时任务进入子队列失败，放回定时索引: {e}", exc_info=True)
+                self._reschedule(user_items)
+        return released
+
+    def _reschedule(self, items: List[Dict]):
+        """释放失败时把任务放回定时索引（立即到期，下次分发时重试）"""
+        try:
+            now = time.time()
+            pipe = self.redis.pipeline()
+            pipe.hset(SCHEDULED_ITEMS_KEY, mapping={item['task_id']: json.dumps(item) for item in items})
+            pipe.zadd(SCHEDULED_KEY, {item['task_id']: now for item in items})
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"定时任务放回定时索引失败: {e}", exc_info=True)
+
+    def _schedule_release(self, due: float):
+        """
+        在发布时间安排一次RQ定时任务触发释放（Worker需以 --with-scheduler 运行，维护任务和每次分发也会释放到期任务）。
+        任务ID由发布时间决定，多处安排同一时间的释放只保留一个
+        """
+        try:
+            self.queue.enqueue_at(datetime.fromtimestamp(due, tz=timezone.utc), release_scheduled_tasks,
+                                  job_id=f"{KEY_PREFIX}-release-{int(due * 1000)}", result_ttl=0)
+        except Exception as e:
+            logger.warning(f"安排定时任务释放失败，等待维护任务释放: {e}")
+
+    @staticmethod
+    def prepare_jobs(items: List[Dict]) -> List:
+        """
+        构造投递到RQ队列的发布任务，优先级大于0的任务放在RQ队列队首（优先级高的在最前）
+
+        Args:
+            items: [{'task_id', 'task_db_id', 'priority'(可选)}, ...]
+
+        Returns:
+            Queue.enqueue_many 的参数
+        """
+        from services.publish_worker import execute_publish_task
+
+        normal = [item for item in items if item.get('priority', 0) <= 0]
+        # 队首任务逐个插到最前，优先级低的先插
+        urgent = sorted((item for item in items if item.get('priority', 0) > 0), key=lambda item: item['priority'])
+        return [
+            Queue.prepare_data(
+                execute_publish_task,
+                kwargs={'task_db_id': item['task_db_id']},
+                job_id=item['task_id'],
+                timeout='10m',  # 任务超时时间10分钟
+                result_ttl=3600,  # 结果保留1小时
+                failure_ttl=86400,  # 失败记录保留24小时
+                at_front=item.get('priority', 0) > 0
+            )
+            for item in normal + urgent
+        ]
+
+    def remove(self, user_id: int, task_id: str) -> bool:
+        """
+        从用户子队列移除尚未分发的任务
+
+        Args:
+            user_id: 用户ID
+            task_id: 任务ID
+
+        Returns:
+            是否移除成功（False表示任务已被分发或不存在）
+        """
+        key = self._user_key(user_id)
+        for raw in self.redis.lrange(key, 0, -1):
+            if json.loads(raw)['task_id'] == task_id:
+                return self.redis.lrem(key, 1, raw) > 0
+        return False
+
+    def waiting_task_ids(self, user_ids) -> set:
+        """
+        获取指定用户子队列中尚未分发的任务ID（这些任务还没有RQ任务，状态同步时不能当作丢失）
+
+        Args:
+            user_ids: 用户ID列表
+
+        Returns:
+            任务ID集合
+        """
+        user_ids = list(user_ids)
+        if not user_ids:
+            return set()
+        pipe = self.redis.pipeline()
+        for user_id in user_ids:
+            pipe.lrange(self._user_key(user_id), 0, -1)
+        return {json.loads(raw)['task_id'] for items in pipe.execute() for raw in items}
+
+    def scheduled_task_ids(self, task_ids) -> set:
+        """
+        获取仍在定时索引中（尚未到发布时间）的任务ID
+
+        Args:
+            task_ids: 任务ID列表
+
+        Returns:
+            任务ID集合
+        """
+        task_ids = list(task_ids)
+        if not task_ids:
+            return set()
+        scores = self.redis.zmscore(SCHEDULED_KEY, task_ids)
+        return {task_id for task_id, score in zip(task_ids, scores) if score is not None}
+
+    def dispatch(self, max_jobs: int = 100) -> Dict:
+        """
+        把各用户子队列中的任务按权重投递到RQ队列，直到所有用户都达到在途上限或队列为空
+
+        先释放到期的定时任务；未启用公平调度时到期任务直接入RQ队列，计入dispatched
+
+        Args:
+            max_jobs: 本次最多分发的任务数
+
+        Returns:
+            {'success': bool, 'dispatched': int, 'released': int, 'error': str}
+        """
+        released = self.release_due()
+        if not self.enabled:
+            return {'success': True, 'dispatched': released, 'released': released}
+
+        picked = self._pick(max_jobs)
+        if not picked:
+            return {'success': True, 'dispatched': 0, 'released': released}
+
+        now = time.time()
+        try:
+            pipe = self.redis.pipeline()
+            self.queue.enqueue_many(self.prepare_jobs([item for _, item in picked]), pipeline=pipe)
+            for user_id, item in picked:
+                pipe.hincrby(self._stats_key(user_id), 'dispatched', 1)
+                pipe.hincrbyfloat(self._stats_key(user_id), 'wait_total', now - item['enqueued_at'])
+            pipe.execute()
+
+        except Exception as e:
+            logger.error(f"分发任务到RQ队列失败，任务放回子队列: {e}", exc_info=True)
+            self._requeue(picked)
+            return {'success': False, 'dispatched': 0, 'released': released, 'error': str(e)}
+
+        logger.info(f"分发 {len(picked)} 个发布任务: " +
+                    ', '.join(f"user{user_id}={sum(1 for uid, _ in picked if uid == user_id)}"
+                              for user_id in sorted({uid for uid, _ in picked})))
+        return {'success': True, 'dispatched': len(picked), 'released': released}
+
+    def _pick(self, max_jobs: int) -> List:
+        """
+        按虚拟时间从小到大挑选未达在途上限的用户，每次弹出一个任务
+
+        每次只读取活跃集合队首的 len(capped)+1 个用户：本轮已确认达到上限的用户之外至少有一个候选，
+        单次挑选的开销与达到上限的用户数有关，与用户总数和排队任务数无关
+
+        Returns:
+            [(user_id, 任务详情), ...]
+        """
+        active_key = f"{KEY_PREFIX}:active"
+        picked = []
+        capped = set()
+        while len(picked) < max_jobs:
+            head = self.redis.zrange(active_key, 0, len(capped))
+            user_id = next((int(uid) for uid in head if int(uid) not in capped), None)
+            if user_id is None:
+                break
+            result = self._pop_script(
+                keys=[active_key, f"{KEY_PREFIX}:weights", f"{KEY_PREFIX}:vtime",
+                      self._user_key(user_id), IN_FLIGHT_KEY.format(user_id)],
+                args=[user_id, self.max_in_flight, IN_FLIGHT_TTL]
+            )
+            if result[0] == -1:
+                capped.add(user_id)
+            elif result[0] == 1:
+                picked.append((user_id, json.loads(result[1])))
+        return picked
+
+    def _requeue(self, picked: List):
+        """投递失败时把任务放回各自子队列的队首，并归还在途名额"""
+        try:
+            vtime = self.redis.get(f"{KEY_PREFIX}:vtime") or 0
+            pipe = self.redis.pipeline()
+            for user_id, item in reversed(picked):
+                pipe.lpush(self._user_key(user_id), json.dumps(item))
+            for user_id in {uid for uid, _ in picked}:
+                count = sum(1 for uid, _ in picked if uid == user_id)
+                pipe.zadd(f"{KEY_PREFIX}:active", {user_id: float(vtime)}, nx=True)
+                pipe.decrby(IN_FLIGHT_KEY.format(user_id), count)
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"任务放回子队列失败: {e}", exc_info=True)
+
+    def get_scheduled_stats(self) -> Dict:
+        """
+        获取定时索引的统计
+
+        Returns:
+            {'count': 定时任务数, 'next_due_in_seconds': 最近一个任务距发布时间的秒数}
+        """
+        pipe = self.redis.pipeline()
+        pipe.zcard(SCHEDULED_KEY)
+        pipe.zrange(SCHEDULED_KEY, 0, 0, withscores=True)
+        count, upcoming = pipe.execute()
+        return {
+            'count': count,
+            'next_due_in_seconds': round(max(0.0, upcoming[0][1] - time.time()), 1) if upcoming else None
+        }
+
+    def get_user_queue_stats(self) -> List[Dict]:
+        """
+        获取各用户子队列的统计
+
+        Returns:
+            [{'user_id', 'weight', 'depth', 'in_flight', 'oldest_wait_seconds',
+              'avg_wait_seconds', 'dispatched'}, ...]，按排队数从多到少
+        """
+        weights = self.redis.hgetall(f"{KEY_PREFIX}:weights")
+        user_ids = sorted(int(user_id) for user_id in weights)
+        if not user_ids:
+            return []
+
+        pipe = self.redis.pipeline()
+        for user_id in user_ids:
+            pipe.llen(self._user_key(user_id))
+            pipe.lindex(self._user_key(user_id), 0)
+            pipe.get(IN_FLIGHT_KEY.format(user_id))
+            pipe.hgetall(self._stats_key(user_id))
+        values = pipe.execute()
+
+        now = time.time()
+        stats = []
+        for index, user_id in enumerate(user_ids):
+            depth, oldest, in_flight, dispatch_stats = values[index * 4:index * 4 + 4]
+            dispatched = int(dispatch_stats.get(b'dispatched', 0))
+            wait_total = float(dispatch_stats.get(b'wait_total', 0))
+            stats.append({
+                'user_id': user_id,
+                'weight': float(weights[str(user_id).encode()]),
+                'depth': depth,
+                'in_flight': int(in_flight or 0),
+                'oldest_wait_seconds': round(now - json.loads(oldest)['enqueued_at'], 1) if oldest else 0,
+                'avg_wait_seconds': round(wait_total / dispatched, 1) if dispatched else 0,
+                'dispatched': dispatched
+            })
+        return sorted(stats, key=lambda item: item['depth'], reverse=True)
+
+
+# 全局调度器实例
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_fair_scheduler(redis_client: redis.Redis = None, config=None) -> FairScheduler:
+    """
+    获取全局公平调度器实例(单例模式)
+
+    Args:
+        redis_client: Redis客户端（bytes模式）
+        config: 配置对象（首次创建时读取调度参数）
+
+    Returns:
+        FairScheduler实例
+    """
+    global _scheduler
+
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                if redis_client is None:
+                    from config import get_redis_client
+                    redis_client = get_redis_client('queue', config)
+                if config is None:
+                    from config import get_config
+                    config = get_config()
+                _scheduler = FairScheduler(
+                    redis_client,
+                    max_in_flight=getattr(config, 'PUBLISH_USER_MAX_IN_FLIGHT', 3),
+                    role_weights=getattr(config, 'PUBLISH_ROLE_WEIGHTS', None),
+                    enabled=getattr(config, 'PUBLISH_FAIR_SCHEDULING', False)
+                )
+
+    return _scheduler
+
+
+def release_scheduled_tasks() -> Dict:
+    """
+    释放到期定时任务并分发的入口函数（由RQ定时任务在发布时间调用）
+    """
+    return get_fair_scheduler().dispatch()
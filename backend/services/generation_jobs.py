@@ -0,0 +1,598 @@
+"""
+内容生成后台任务
+分析和文章生成可以在请求线程中同步执行，也可以作为RQ任务在Worker中执行；
+后台任务的进度和部分结果通过Redis pub/sub推送，并写入事件日志供断线重连回放
+"""
+import sys
+import os
+import json
+import time
+import threading
+from typing import Dict, Iterator, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import setup_logger
+from services.token_accounting import usage_scope, get_token_accountant
+import redis
+
+logger = setup_logger(__name__)
+
+
+class GenerationInputError(Exception):
+    """请求参数错误或引用的提示词不存在"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _run_analysis(user_id: int, data: Dict) -> Dict:
+    """执行公司分析并保存工作流"""
+    from config import get_config
+    from services.ai_service import AIService
+    from services.workflow_service import WorkflowService
+    from services.prompt_template_service import PromptTemplateService
+    from services.analysis_prompt_service import AnalysisPromptService
+    from services.ai_service_v2 import AIServiceV2
+
+    config = get_config()
+    if not data.get('company_name'):
+        raise GenerationInputError('请输入公司名称')
+
+    # 获取用户选择的AI模型
+    ai_model = data.get('ai_model')
+    if ai_model:
+        logger.info(f'User selected AI model: {ai_model}')
+
+    company_info = {
+        'company_name': data.get('company_name'),
+        'company_desc': data.get('company_desc', ''),
+        'uploaded_text': data.get('uploaded_text', '')
+    }
+
+    # 检查是否使用新的三模块提示词系统
+    analysis_prompt_id = data.get('analysis_prompt_id')
+
+    if analysis_prompt_id:
+        # 使用新的三模块系统
+        logger.info(f'Using V2 analysis prompt: {analysis_prompt_id}')
+
+        analysis_prompt = AnalysisPromptService.get_prompt(analysis_prompt_id)
+        if not analysis_prompt:
+            raise GenerationInputError(f'分析提示词不存在: {analysis_prompt_id}', 404)
+
+        analysis = AIServiceV2(config).analyze_with_prompt(company_info, analysis_prompt, model=ai_model)
+
+        # 更新使用统计
+        AnalysisPromptService.increment_usage(analysis_prompt_id)
+
+    else:
+        # 兼容旧系统
+        ai_service = AIService(config)
+
+        # 检查是否使用旧模板
+        template_id = data.get('template_id')
+        template = None
+        if template_id:
+            template = PromptTemplateService.get_template(template_id)
+            if not template:
+                raise GenerationInputError(f'模板不存在: {template_id}', 404)
+            logger.info(f'Using template: {template["name"]} (ID: {template_id})')
+
+        # 使用模板或默认方法进行分析
+        if template:
+            analysis = ai_service.analyze_company_with_template(company_info, template, model=ai_model)
+        else:
+            analysis = ai_service.analyze_company(
+                company_name=data.get('company_name'),
+                company_desc=data.get('company_desc', ''),
+                uploaded_text=data.get('uploaded_text', ''),
+                model=ai_model
+            )
+
+    # 保存工作流（包含新的prompt IDs）
+    workflow_data = {
+        'company_name': data.get('company_name'),
+        'company_desc': data.get('company_desc'),
+        'uploaded_text': data.get('uploaded_text', ''),
+        'uploaded_filename': data.get('uploaded_filename', ''),
+        'template_id': data.get('template_id'),
+        'analysis': analysis,
+        'current_step': 2
+    }
+
+    # 添加新的三模块提示词ID
+    if analysis_prompt_id:
+        workflow_data['analysis_prompt_id'] = analysis_prompt_id
+    if data.get('article_prompt_id'):
+        workflow_data['article_prompt_id'] = data.get('article_prompt_id')
+    if data.get('platform_style_prompt_id'):
+        workflow_data['platform_style_prompt_id'] = data.get('platform_style_prompt_id')
+
+    workflow = WorkflowService().save_workflow(
+        user_id=user_id,
+        workflow_id=data.get('workflow_id'),
+        data=workflow_data
+    )
+
+    # 流水线模式：分析完成后立即在后台按默认角度预生成文章
+    if data.get('prefetch_articles', getattr(config, 'ARTICLE_PREFETCH_ENABLED', False)):
+        _schedule_article_prefetch(user_id, workflow['workflow']['id'], data, analysis)
+
+    logger.info(f'Analysis completed for: {data.get("company_name")}')
+    return {
+        'analysis': analysis,
+        'company_name': data.get('company_name'),
+        'workflow_id': workflow['workflow']['id']
+    }
+
+
+def generate_article_drafts(data: Dict) -> List[Dict]:
+    """
+    按请求参数选择提示词并生成文章（不保存，预生成也使用此函数）
+
+    Args:
+        data: /api/generate_articles 的请求参数
+
+    Returns:
+        文章列表
+
+    Raises:
+        GenerationInputError: 提示词不存在
+    """
+    from config import get_config
+    from services.ai_service import AIService
+    from services.prompt_template_service import PromptTemplateService
+    from services.article_prompt_service import ArticlePromptService
+    from services.platform_style_service import PlatformStyleService
+    from services.ai_service_v2 import AIServiceV2
+
+    config = get_config()
+
+    # 检查是否使用新的三模块提示词系统
+    article_prompt_id = data.get('article_prompt_id')
+    platform_style_prompt_id = data.get('platform_style_prompt_id')
+
+    if article_prompt_id:
+        # 使用新的三模块系统
+        logger.info(f'Using V2 article prompt: {article_prompt_id}')
+
+        article_prompt = ArticlePromptService.get_prompt(article_prompt_id)
+        if not article_prompt:
+            raise GenerationInputError(f'文章提示词不存在: {article_prompt_id}', 404)
+
+        # 获取平台风格提示词（如果指定）
+        platform_style = None
+        if platform_style_prompt_id:
+            platform_style = PlatformStyleService.get_style(platform_style_prompt_id)
+            if platform_style:
+                logger.info(f'Using platform style: {platform_style["name"]} ({platform_style["platform"]})')
+
+        return AIServiceV2(config).generate_articles_with_prompts(
+            company_name=data.get('company_name'),
+            analysis=data.get('analysis'),
+            article_prompt=article_prompt,
+            article_count=data.get('article_count', 3),
+            platform_style=platform_style,
+            strategy=data.get('strategy')
+        )
+
+    # 兼容旧系统
+    ai_service = AIService(config)
+
+    # 检查是否使用旧模板
+    template_id = data.get('template_id')
+    template = None
+    if template_id:
+        template = PromptTemplateService.get_template(template_id)
+        if template:
+            logger.info(f'Using template for article generation: {template["name"]} (ID: {template_id})')
+
+    # 使用模板或默认方法生成文章
+    if template:
+        return ai_service.generate_articles_with_template(
+            company_name=data.get('company_name'),
+            analysis=data.get('analysis'),
+            template=template,
+            article_count=data.get('article_count', 3),
+            strategy=data.get('strategy')
+        )
+    return ai_service.generate_articles(
+        company_name=data.get('company_name'),
+        analysis=data.get('analysis'),
+        article_count=data.get('article_count', 3),
+        strategy=data.get('strategy')
+    )
+
+
+def _run_article_generation(user_id: int, data: Dict) -> List[Dict]:
+    """生成文章并保存到工作流（有参数一致的预生成草稿时直接使用）"""
+    from config import get_config
+    from services.workflow_service import WorkflowService
+    from services.prompt_template_service import PromptTemplateService
+    from services.article_prompt_service import ArticlePromptService
+    from services.platform_style_service import PlatformStyleService
+    from services.article_prefetch import get_article_prefetcher
+
+    articles = None
+    if data.get('workflow_id'):
+        articles = get_article_prefetcher(get_config()).take(
+            user_id, data.get('workflow_id'), dict(data, prompt_versions=_prompt_versions(data))
+        )
+    if articles is None:
+        articles = generate_article_drafts(data)
+
+    # 更新使用统计
+    article_prompt_id = data.get('article_prompt_id')
+    platform_style_prompt_id = data.get('platform_style_prompt_id')
+    if article_prompt_id:
+        ArticlePromptService.increment_usage(article_prompt_id)
+        if platform_style_prompt_id:
+            PlatformStyleService.increment_usage(platform_style_prompt_id)
+
+    # 保存文章到数据库
+    saved_articles = articles
+    if data.get('workflow_id'):
+        saved_articles = WorkflowService().save_articles(
+            user_id=user_id,
+            workflow_id=data.get('workflow_id'),
+            articles=articles
+        )
+
+        # 如果使用了旧模板，记录使用情况
+        if data.get('template_id'):
+            PromptTemplateService.increment_usage_count(data.get('template_id'))
+
+    logger.info(f'Generated and saved {len(saved_articles)} articles for {data.get("company_name")}')
+    return saved_articles
+
+
+def _template_label(data: Dict, prompt_field: str, prompt_kind: str) -> str:
+    """token统计用的提示词模板标识"""
+    if data.get(prompt_field):
+        return f'{prompt_kind}:{data[prompt_field]}'
+    if data.get('template_id'):
+        return f"prompt_template:{data['template_id']}"
+    return ''
+
+
+def _prompt_versions(data: Dict) -> Dict:
+    """生成参数引用的提示词/模板的版本（预生成草稿指纹用，提示词被编辑后updated_at变化）"""
+    from services.prompt_template_service import PromptTemplateService
+    from services.article_prompt_service import ArticlePromptService
+    from services.platform_style_service import PlatformStyleService
+
+    loaders = {
+        'article_prompt_id': ArticlePromptService.get_prompt,
+        'platform_style_prompt_id': PlatformStyleService.get_prompt,
+        'template_id': lambda template_id: PromptTemplateService.get_template(template_id, include_prompts=False)
+    }
+    versions = {}
+    for field, load in loaders.items():
+        if data.get(field):
+            prompt = load(data[field]) or {}
+            versions[field] = [prompt.get('version'), prompt.get('updated_at')]
+    return versions
+
+
+def _schedule_article_prefetch(user_id: int, workflow_id: int, data: Dict, analysis: str):
+    """调度文章预生成（参数与之后的生成请求一致时才会被使用）"""
+    from config import get_config
+    from services.article_prefetch import get_article_prefetcher, DRAFT_PARAM_KEYS
+
+    draft_params = {key: data.get(key) for key in DRAFT_PARAM_KEYS}
+    draft_params['analysis'] = analysis
+    draft_params['prompt_versions'] = _prompt_versions(draft_params)
+    try:
+        get_article_prefetcher(get_config()).schedule(
+            user_id, workflow_id, draft_params, generate_article_drafts,
+            template=_template_label(draft_params, 'article_prompt_id', 'article_prompt'),
+            enqueue=_prefetch_enqueuer()
+        )
+    except Exception as e:
+        logger.warning(f'Failed to schedule article prefetch: {e}')
+
+
+def _prefetch_enqueuer():
+    """
+    在RQ任务中调度预生成时，返回把预生成投递为独立RQ任务的函数
+
+    Worker默认fork子进程执行任务，任务结束后子进程退出，线程池中的预生成会随之中断；
+    在请求线程中（同步模式）返回None，使用进程内线程池
+    """
+    from rq import Queue, get_current_job
+
+    job = get_current_job()
+    if job is None:
+        return None
+    queue = Queue(job.origin, connection=job.connection)
+
+    def enqueue(key: str, entry: Dict, params: Dict, template: str):
+        queue.enqueue(execute_article_prefetch_job, args=(key, entry, params, template),
+                      job_timeout='15m', result_ttl=0, failure_ttl=86400)
+
+    return enqueue
+
+
+def execute_article_prefetch_job(key: str, entry: Dict, data: Dict, template: str = ''):
+    """执行文章预生成（RQ Worker调用，由分析任务投递）"""
+    from config import get_config
+    from services.article_prefetch import get_article_prefetcher
+
+    get_article_prefetcher(get_config()).run(key, entry, data, generate_article_drafts, template)
+
+
+def run_analysis(user_id: int, data: Dict) -> Dict:
+    """
+    执行公司分析并保存工作流
+
+    Args:
+        user_id: 用户ID
+        data: /api/analyze 的请求参数
+
+    Returns:
+        {'analysis': str, 'company_name': str, 'workflow_id': int}
+
+    Raises:
+        GenerationInputError: 参数错误或提示词不存在
+        TokenBudgetExceeded: 超出每日token预算
+    """
+    from config import get_config
+
+    with usage_scope(user_id=user_id, template=_template_label(data, 'analysis_prompt_id', 'analysis_prompt')):
+        get_token_accountant(get_config()).check_budget(user_id)
+        return _run_analysis(user_id, data)
+
+
+def run_article_generation(user_id: int, data: Dict) -> List[Dict]:
+    """
+    生成文章并保存到工作流
+
+    Args:
+        user_id: 用户ID
+        data: /api/generate_articles 的请求参数
+
+    Returns:
+        文章列表（指定workflow_id时为保存后的文章）
+
+    Raises:
+        GenerationInputError: 提示词不存在
+        TokenBudgetExceeded: 超出每日token预算
+    """
+    from config import get_config
+
+    with usage_scope(user_id=user_id, template=_template_label(data, 'article_prompt_id', 'article_prompt')):
+        get_token_accountant(get_config()).check_budget(user_id)
+        return _run_article_generation(user_id, data)
+
+
+class GenerationJobStore:
+    """
+    后台生成任务的状态和事件存储
+
+    Redis结构:
+        genjob:{job_id}          Hash  user_id / kind / status / progress / seq / result / error
+        genjob:{job_id}:events   List  事件日志（JSON），第n个事件的id为n
+        genjob:{job_id}:channel  pub/sub频道，实时推送事件
+    """
+
+    KEY_TTL = 24 * 3600
+    TERMINAL_EVENTS = ('done',)
+
+    def __init__(self, redis_client: redis.Redis, pubsub_client: Optional[redis.Redis] = None):
+        self.redis = redis_client
+        # 订阅在推送期间一直占用连接，可使用单独连接池的客户端
+        self.pubsub_client = pubsub_client or redis_client
+
+    @staticmethod
+    def _key(job_id: str) -> str:
+        return f"genjob:{job_id}"
+
+    def create(self, job_id: str, user_id: int, kind: str):
+        """登记新任务"""
+        key = self._key(job_id)
+        pipe = self.redis.pipeline()
+        pipe.hset(key, mapping={
+            'user_id': user_id,
+            'kind': kind,
+            'status': 'queued',
+            'progress': 0,
+            'seq': 0,
+            'created_at': time.time()
+        })
+        pipe.expire(key, self.KEY_TTL)
+        pipe.execute()
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """
+        获取任务状态
+
+        Returns:
+            {user_id, kind, status, progress, result, error}，任务不存在返回None
+        """
+        data = self.redis.hgetall(self._key(job_id))
+        if not data:
+            return None
+        return {
+            'job_id': job_id,
+            'user_id': int(data['user_id']),
+            'kind': data.get('kind'),
+            'status': data.get('status'),
+            'progress': int(data.get('progress', 0)),
+            'result': json.loads(data['result']) if data.get('result') else None,
+            'error': data.get('error')
+        }
+
+    def publish(self, job_id: str, event_type: str, payload: Optional[Dict] = None,
+                status: Optional[str] = None, progress: Optional[int] = None) -> Dict:
+        """
+        发布事件（写入事件日志并推送到频道）
+
+        Args:
+            job_id: 任务ID
+            event_type: 事件类型 status / article / done
+            payload: 事件内容
+            status: 同时更新的任务状态（可选）
+            progress: 同时更新的进度百分比（可选）
+
+        Returns:
+            事件字典（含自增id）
+        """
+        key = self._key(job_id)
+        seq = self.redis.hincrby(key, 'seq', 1)
+        event = {'id': seq, 'type': event_type, **(payload or {})}
+        if status is not None:
+            event['status'] = status
+        if progress is not None:
+            event['progress'] = progress
+        message = json.dumps(event, ensure_ascii=False, default=str)
+
+        updates = {}
+        if status is not None:
+            updates['status'] = status
+        if progress is not None:
+            updates['progress'] = progress
+
+        pipe = self.redis.pipeline()
+        if updates:
+            pipe.hset(key, mapping=updates)
+        pipe.rpush(f"{key}:events", message)
+        pipe.expire(f"{key}:events", self.KEY_TTL)
+        pipe.publish(f"{key}:channel", message)
+        pipe.execute()
+        return event
+
+    def finish(self, job_id: str, result: Dict):
+        """任务成功完成"""
+        self.redis.hset(self._key(job_id), 'result', json.dumps(result, ensure_ascii=False, default=str))
+        self.publish(job_id, 'done', {'success': True, 'result': result}, status='finished', progress=100)
+
+    def fail(self, job_id: str, error: str):
+        """任务失败"""
+        self.redis.hset(self._key(job_id), 'error', error)
+        self.publish(job_id, 'done', {'success': False, 'error': error}, status='failed')
+
+    def events_since(self, job_id: str, last_id: int = 0) -> List[Dict]:
+        """获取id大于last_id的历史事件"""
+        return [json.loads(m) for m in self.redis.lrange(f"{self._key(job_id)}:events", last_id, -1)]
+
+    def listen(self, job_id: str, last_id: int = 0, keepalive: float = 15) -> Iterator[Optional[Dict]]:
+        """
+        按顺序产出任务事件：先回放last_id之后的历史事件，再实时推送，直到done事件
+
+        Args:
+            job_id: 任务ID
+            last_id: 客户端已收到的最后一个事件id（断线重连时使用）
+            keepalive: 无事件时每隔多少秒产出一次None（用于发送SSE心跳）
+
+        Yields:
+            事件字典，或None（心跳）
+        """
+        pubsub = self.pubsub_client.pubsub(ignore_subscribe_messages=True)
+        # 先订阅再回放，避免回放和订阅之间的事件丢失
+        pubsub.subscribe(f"{self._key(job_id)}:channel")
+        try:
+            pending = self.events_since(job_id, last_id)
+            while True:
+                for event in pending:
+                    if event['id'] <= last_id:
+                        continue
+                    last_id = event['id']
+                    yield event
+                    if event['type'] in self.TERMINAL_EVENTS:
+                        return
+                message = pubsub.get_message(timeout=keepalive)
+                if message is None:
+                    yield None
+                    pending = []
+                    continue
+                event = json.loads(message['data'])
+                # 中间有事件未收到（如重连期间）时从日志补齐
+                pending = self.events_since(job_id, last_id) if event['id'] > last_id + 1 else [event]
+        finally:
+            pubsub.close()
+
+
+# 全局任务存储实例
+_job_store = None
+_job_store_lock = threading.Lock()
+
+
+def get_generation_job_store() -> GenerationJobStore:
+    """
+    获取全局生成任务存储实例(单例模式)
+
+    Returns:
+        GenerationJobStore实例
+    """
+    global _job_store
+
+    if _job_store is None:
+        with _job_store_lock:
+            if _job_store is None:
+                from config import get_redis_client
+                _job_store = GenerationJobStore(get_redis_client('cache'), pubsub_client=get_redis_client('pubsub'))
+
+    return _job_store
+
+
+def execute_analysis_job(job_id: str, user_id: int, data: Dict) -> Dict:
+    """
+    执行分析任务（RQ Worker调用）
+
+    Args:
+        job_id: 任务ID
+        user_id: 用户ID
+        data: /api/analyze 的请求参数
+
+    Returns:
+        执行结果字典
+    """
+    store = get_generation_job_store()
+    store.publish(job_id, 'status', {'step': 'analyze'}, status='running', progress=5)
+    try:
+        result = run_analysis(user_id, data)
+    except Exception as e:
+        logger.error(f'Analysis job {job_id} failed: {e}', exc_info=True)
+        store.fail(job_id, str(e))
+        return {'success': False, 'error': str(e)}
+    store.finish(job_id, result)
+    return {'success': True, 'workflow_id': result['workflow_id']}
+
+
+def execute_article_generation_job(job_id: str, user_id: int, data: Dict) -> Dict:
+    """
+    执行文章生成任务（RQ Worker调用），每完成一篇文章推送一次article事件
+
+    Args:
+        job_id: 任务ID
+        user_id: 用户ID
+        data: /api/generate_articles 的请求参数
+
+    Returns:
+        执行结果字典
+    """
+    from services.ai_service import article_listener
+
+    store = get_generation_job_store()
+    total = max(1, int(data.get('article_count', 3)))
+    completed = {'count': 0}
+    lock = threading.Lock()
+
+    def on_article(article: Dict):
+        with lock:
+            completed['count'] += 1
+            progress = min(95, 5 + completed['count'] * 90 // total)
+        index = article.pop('index', None)
+        store.publish(job_id, 'article', {'index': index, 'article': article}, progress=progress)
+
+    store.publish(job_id, 'status', {'step': 'generate'}, status='running', progress=5)
+    try:
+        with article_listener(on_article):
+            articles = run_article_generation(user_id, data)
+    except Exception as e:
+        logger.error(f'Article generation job {job_id} failed: {e}', exc_info=True)
+        store.fail(job_id, str(e))
+        return {'success': False, 'error': str(e)}
+    store.finish(job_id, {'articles': articles})
+    return {'success': True, 'count': len(articles)}
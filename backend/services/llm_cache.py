@@ -0,0 +1,277 @@
+"""
+LLM响应缓存
+以请求内容哈希为键缓存chat completion结果：进程内LRU一级缓存 + Redis二级缓存（多worker共享）
+"""
+import sys
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import setup_logger
+import redis
+
+logger = setup_logger(__name__)
+
+
+class LocalLRUCache:
+    """带TTL的进程内LRU缓存（线程安全）"""
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Dict, ttl: int):
+        with self._lock:
+            self._data[key] = (time.time() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class LLMResponseCache:
+    """LLM响应缓存（LRU + Redis 两级）"""
+
+    KEY_PREFIX = 'llmcache:'
+    STATS_KEY = 'llmcache:stats'
+    # Redis出错后暂停访问的时间(秒)，避免每次调用都等待连接超时
+    REDIS_RETRY_INTERVAL = 30
+
+    def __init__(self, redis_client: Optional[redis.Redis] = None, local_maxsize: int = 256,
+                 ttls: Optional[Dict[str, int]] = None, max_temperature: float = 0.75,
+                 enabled: bool = True):
+        """
+        初始化缓存
+
+        Args:
+            redis_client: Redis客户端（decode_responses=True），为None时只使用进程内缓存
+            local_maxsize: 进程内LRU容量
+            ttls: 各调用场景的缓存时间(秒)，如 {'analysis': 86400}
+            max_temperature: 温度高于该值的调用不缓存（高随机性生成没有复用价值）
+            enabled: 是否启用缓存
+        """
+        self.redis = redis_client
+        self.local = LocalLRUCache(local_maxsize)
+        self.ttls = ttls or {}
+        self.max_temperature = max_temperature
+        self.enabled = enabled
+
+        self._redis_down_until = 0.0
+        self._lock = threading.Lock()
+        self._stats = {'local_hits': 0, 'redis_hits': 0, 'misses': 0, 'tokens_saved': 0, 'redis_errors': 0}
+
+        logger.info(f"LLM响应缓存初始化: enabled={enabled}, local_maxsize={local_maxsize}, ttls={self.ttls}")
+
+    @staticmethod
+    def make_key(provider: str, model: str, messages: List[Dict],
+                 temperature: float, max_tokens: int) -> str:
+        """
+        生成缓存键（请求内容的SHA-256）
+
+        Args:
+            provider: 服务商
+            model: 模型
+            messages: 消息列表
+            temperature: 温度参数
+            max_tokens: 最大token数
+
+        Returns:
+            缓存键
+        """
+        raw = json.dumps({
+            'provider': provider,
+            'model': model,
+            'messages': messages,
+            'temperature': temperature,
+            'max_tokens': max_tokens
+        }, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get_ttl(self, scope: Optional[str], temperature: float) -> int:
+        """
+        获取调用场景的缓存时间，0表示不缓存
+
+        Args:
+            scope: 调用场景（如 'analysis'），None表示调用方未开启缓存
+            temperature: 温度参数
+
+        Returns:
+            缓存时间(秒)
+        """
+        if not self.enabled or not scope or temperature > self.max_temperature:
+            return 0
+        return int(self.ttls.get(scope, 0))
+
+    def _redis_available(self) -> bool:
+        return self.redis is not None and time.time() >= self._redis_down_until
+
+    def _mark_redis_error(self, action: str, error: Exception):
+        logger.warning(f"{action}失败，{self.REDIS_RETRY_INTERVAL}秒内只使用进程内缓存: {error}")
+        self._redis_down_until = time.time() + self.REDIS_RETRY_INTERVAL
+        with self._lock:
+            self._stats['redis_errors'] += 1
+
+    def _incr(self, field: str, amount: int = 1):
+        with self._lock:
+            self._stats[field] += amount
+        if self._redis_available():
+            try:
+                self.redis.hincrby(self.STATS_KEY, field, amount)
+            except Exception as e:
+                self._mark_redis_error('更新Redis缓存统计', e)
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        读取缓存
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            {'content': str, 'usage': dict} 或 None
+        """
+        value = self.local.get(key)
+        if value is not None:
+            self._incr('local_hits')
+            self._incr('tokens_saved', (value.get('usage') or {}).get('total_tokens', 0))
+            return value
+
+        if self._redis_available():
+            try:
+                raw = self.redis.get(self.KEY_PREFIX + key)
+                if raw:
+                    value = json.loads(raw)
+                    ttl = self.redis.ttl(self.KEY_PREFIX + key)
+                    if ttl and ttl > 0:
+                        self.local.set(key, value, ttl)
+                    self._incr('redis_hits')
+                    self._incr('tokens_saved', (value.get('usage') or {}).get('total_tokens', 0))
+                    return value
+            except Exception as e:
+                # Redis不可用时降级为只用进程内缓存
+                self._mark_redis_error('读取Redis缓存', e)
+
+        self._incr('misses')
+        return None
+
+    def set(self, key: str, content: str, usage: Optional[Dict], ttl: int, served_by: Optional[str] = None):
+        """
+        写入缓存
+
+        Args:
+            key: 缓存键
+            content: 响应文本
+            usage: 响应中的usage块
+            ttl: 缓存时间(秒)
+            served_by: 实际返回结果的 服务商/模型（与缓存键中的不同时记录，如故障切换后）
+        """
+        if ttl <= 0:
+            return
+        value = {'content': content, 'usage': usage or {}}
+        if served_by:
+            value['served_by'] = served_by
+        self.local.set(key, value, ttl)
+        if self._redis_available():
+            try:
+                self.redis.setex(self.KEY_PREFIX + key, ttl, json.dumps(value, ensure_ascii=False))
+            except Exception as e:
+                self._mark_redis_error('写入Redis缓存', e)
+
+    def get_stats(self) -> Dict:
+        """
+        获取缓存统计（本进程 + 全部worker汇总）
+
+        Returns:
+            统计信息字典
+        """
+        with self._lock:
+            local_stats = dict(self._stats)
+        local_stats['local_size'] = len(self.local)
+
+        def with_rate(stats):
+            hits = int(stats.get('local_hits', 0)) + int(stats.get('redis_hits', 0))
+            total = hits + int(stats.get('misses', 0))
+            stats['hit_rate'] = round(hits / total, 4) if total else 0.0
+            return stats
+
+        result = {
+            'enabled': self.enabled,
+            'ttls': self.ttls,
+            'process': with_rate(local_stats)
+        }
+
+        if self.redis is not None:
+            try:
+                shared = self.redis.hgetall(self.STATS_KEY) or {}
+                result['cluster'] = with_rate({k: int(v) for k, v in shared.items()})
+            except Exception as e:
+                result['cluster'] = {'error': str(e)}
+
+        return result
+
+    def clear(self):
+        """清空缓存（进程内缓存 + Redis中的缓存条目）"""
+        self.local.clear()
+        if self.redis is not None:
+            try:
+                for key in self.redis.scan_iter(match=self.KEY_PREFIX + '*', count=500):
+                    self.redis.delete(key)
+            except Exception as e:
+                logger.warning(f"清空Redis缓存失败: {e}")
+
+
+# 全局缓存实例
+_llm_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache(config=None) -> LLMResponseCache:
+    """
+    获取全局LLM响应缓存实例(单例模式)
+
+    Args:
+        config: 配置对象（首次创建时读取缓存参数）
+
+    Returns:
+        LLMResponseCache实例
+    """
+    global _llm_cache
+
+    if _llm_cache is None:
+        with _cache_lock:
+            if _llm_cache is None:
+                from config import get_redis_client
+                redis_client = get_redis_client('cache', config)
+                _llm_cache = LLMResponseCache(
+                    redis_client=redis_client,
+                    local_maxsize=getattr(config, 'LLM_CACHE_LOCAL_MAXSIZE', 256),
+                    ttls=getattr(config, 'LLM_CACHE_TTLS', {}),
+                    max_temperature=getattr(config, 'LLM_CACHE_MAX_TEMPERATURE', 0.75),
+                    enabled=getattr(config, 'LLM_CACHE_ENABLED', True)
+                )
+
+    return _llm_cache
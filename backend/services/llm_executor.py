@@ -0,0 +1,320 @@
+"""
+LLM并发执行器
+进程内共享的有界线程池 + 基于Redis的全局信号量（跨gunicorn worker限制同时进行的LLM请求数）
+"""
+import sys
+import os
+import time
+import uuid
+import threading
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import setup_logger
+import redis
+
+logger = setup_logger(__name__)
+
+
+class RedisSemaphore:
+    """
+    基于Redis有序集合的分布式计数信号量
+
+    每个持有者以 (token, 过期时间) 写入有序集合，过期的持有者（进程崩溃未释放）会被自动清理。
+    """
+
+    # KEYS[1]=信号量key; ARGV: now, lease_expires_at, limit, token
+    ACQUIRE_SCRIPT = """
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+    if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[3]) then
+        redis.call('ZADD', KEYS[1], ARGV[2], ARGV[4])
+        redis.call('EXPIRE', KEYS[1], 3600)
+        return 1
+    end
+    return 0
+    """
+
+    # Redis出错后暂停访问的时间(秒)
+    REDIS_RETRY_INTERVAL = 30
+
+    def __init__(self, redis_client: Optional[redis.Redis], limits: Dict[str, int],
+                 lease_seconds: int = 300, poll_interval: float = 0.05):
+        """
+        初始化信号量
+
+        Args:
+            redis_client: Redis客户端，为None时不做全局限制
+            limits: 各服务商的全局并发上限，如 {'qianwen': 20}；未配置的服务商不限制
+            lease_seconds: 持有租约时长(秒)，超时未释放视为持有者已崩溃
+            poll_interval: 等待时的轮询间隔(秒)
+        """
+        self.redis = redis_client
+        self.limits = limits or {}
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._script = redis_client.register_script(self.ACQUIRE_SCRIPT) if redis_client is not None else None
+        self._redis_down_until = 0.0
+
+    def _key(self, name: str) -> str:
+        return f"llm:semaphore:{name}"
+
+    def acquire(self, name: str, timeout: float = 60) -> Optional[str]:
+        """
+        获取一个许可（阻塞直到成功或超时）
+
+        Args:
+            name: 信号量名称（服务商）
+            timeout: 最长等待时间(秒)
+
+        Returns:
+            许可token；未配置上限或Redis不可用时返回空字符串（放行）
+
+        Raises:
+            TimeoutError: 等待超时
+        """
+        limit = self.limits.get(name)
+        if not limit or self._script is None or time.time() < self._redis_down_until:
+            return ''
+
+        token = uuid.uuid4().hex
+        deadline = time.time() + timeout
+        while True:
+            now = time.time()
+            try:
+                if self._script(keys=[self._key(name)], args=[now, now + self.lease_seconds, limit, token]):
+                    return token
+            except Exception as e:
+                # Redis不可用时放行，避免影响正常业务
+                logger.warning(f"获取LLM全局并发许可失败，{self.REDIS_RETRY_INTERVAL}秒内不做全局限制: {e}")
+                self._redis_down_until = now + self.REDIS_RETRY_INTERVAL
+                return ''
+            if now >= deadline:
+                raise TimeoutError(f"等待{name}全局并发许可超时({timeout}s, 上限{limit})")
+            time.sleep(self.poll_interval)
+
+    def release(self, name: str, token: str):
+        """释放许可"""
+        if not token:
+            return
+        try:
+            self.redis.zrem(self._key(name), token)
+        except Exception as e:
+            logger.warning(f"释放LLM全局并发许可失败（租约到期后自动释放）: {e}")
+
+    def in_flight(self, name: str) -> Optional[int]:
+        """当前全局持有的许可数"""
+        if self._script is None:
+            return None
+        try:
+            key = self._key(name)
+            self.redis.zremrangebyscore(key, '-inf', time.time())
+            return self.redis.zcard(key)
+        except Exception:
+            return None
+
+
+class LLMExecutor:
+    """
+    进程内共享的LLM有界执行器
+
+    所有文章并发生成/风格转换都提交到这里，线程数固定，超过 max_pending 的提交会等待（背压），
+    并记录排队深度和排队等待时间。
+    """
+
+    def __init__(self, max_workers: int = 8, max_pending: int = 64,
+                 semaphore: Optional[RedisSemaphore] = None, acquire_timeout: float = 60,
+                 name: str = 'llm-worker'):
+        """
+        初始化执行器
+
+        Args:
+            max_workers: 工作线程数
+            max_pending: 排队+执行中的任务上限
+            semaphore: 全局并发信号量（可选）
+            acquire_timeout: 等待全局许可/排队名额的超时时间(秒)
+            name: 线程名前缀
+        """
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.semaphore = semaphore
+        self.acquire_timeout = acquire_timeout
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._stats = {
+            'submitted': 0,
+            'completed': 0,
+            'queued': 0,
+            'running': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+            'global_wait_total': 0.0,
+            'global_timeouts': 0
+        }
+
+        logger.info(f"LLM执行器({name})初始化: max_workers={max_workers}, max_pending={max_pending}")
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """
+        提交任务（任务在提交方的contextvars上下文中执行）
+
+        Raises:
+            RuntimeError: 排队名额等待超时
+        """
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise RuntimeError(f"LLM执行队列已满({self.max_pending})")
+
+        submitted_at = time.perf_counter()
+        context = contextvars.copy_context()
+        with self._lock:
+            self._stats['submitted'] += 1
+            self._stats['queued'] += 1
+
+        def run():
+            wait_time = time.perf_counter() - submitted_at
+            with self._lock:
+                self._stats['queued'] -= 1
+                self._stats['running'] += 1
+                self._stats['wait_time_total'] += wait_time
+                self._stats['wait_time_max'] = max(self._stats['wait_time_max'], wait_time)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._stats['running'] -= 1
+                    self._stats['completed'] += 1
+                self._slots.release()
+
+        try:
+            return self._executor.submit(context.run, run)
+        except Exception:
+            with self._lock:
+                self._stats['queued'] -= 1
+            self._slots.release()
+            raise
+
+    @contextmanager
+    def provider_slot(self, provider: str):
+        """
+        在全局信号量保护下执行一次LLM请求
+
+        用法:
+            with executor.provider_slot('qianwen'):
+                response = transport.post(...)
+        """
+        if self.semaphore is None:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            token = self.semaphore.acquire(provider, timeout=self.acquire_timeout)
+        except TimeoutError:
+            with self._lock:
+                self._stats['global_timeouts'] += 1
+            raise
+        with self._lock:
+            self._stats['global_wait_total'] += time.perf_counter() - start
+        try:
+            yield
+        finally:
+            self.semaphore.release(provider, token)
+
+    def get_stats(self) -> Dict:
+        """
+        获取执行器统计
+
+        Returns:
+            {max_workers, queue_depth, running, avg_wait_ms, max_wait_ms, global_in_flight, ...}
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        started = stats['completed'] + stats['running']
+        result = {
+            'max_workers': self.max_workers,
+            'max_pending': self.max_pending,
+            'queue_depth': stats['queued'],
+            'running': stats['running'],
+            'submitted': stats['submitted'],
+            'completed': stats['completed'],
+            'avg_wait_ms': round(stats['wait_time_total'] / started * 1000, 2) if started else 0.0,
+            'max_wait_ms': round(stats['wait_time_max'] * 1000, 2),
+            'global_wait_ms_total': round(stats['global_wait_total'] * 1000, 2),
+            'global_timeouts': stats['global_timeouts']
+        }
+        if self.semaphore is not None:
+            result['global_limits'] = self.semaphore.limits
+            result['global_in_flight'] = {
+                name: self.semaphore.in_flight(name) for name in self.semaphore.limits
+            }
+        return result
+
+
+# 全局执行器实例
+_executor = None
+_stream_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_llm_executor(config=None) -> LLMExecutor:
+    """
+    获取全局LLM执行器实例(单例模式)
+
+    Args:
+        config: 配置对象（首次创建时读取并发参数）
+
+    Returns:
+        LLMExecutor实例
+    """
+    global _executor
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                limits = getattr(config, 'LLM_GLOBAL_CONCURRENCY', {})
+                semaphore = None
+                if limits:
+                    from config import get_redis_client
+                    redis_client = get_redis_client('cache', config)
+                    semaphore = RedisSemaphore(redis_client, limits)
+                _executor = LLMExecutor(
+                    max_workers=getattr(config, 'LLM_EXECUTOR_MAX_WORKERS', 8),
+                    max_pending=getattr(config, 'LLM_EXECUTOR_MAX_PENDING', 64),
+                    semaphore=semaphore
+                )
+
+    return _executor
+
+
+def get_llm_stream_executor(config=None) -> LLMExecutor:
+    """
+    获取流式生成专用的LLM执行器实例(单例模式)
+
+    流式生成的每篇文章在整个输出期间占用一个线程，放在独立的小线程池中，
+    避免几个打开的SSE连接占满共享执行器、阻塞普通文章生成和资料摘要；
+    全局并发许可与共享执行器共用同一个信号量。
+
+    Args:
+        config: 配置对象（首次创建时读取并发参数）
+
+    Returns:
+        LLMExecutor实例
+    """
+    global _stream_executor
+
+    if _stream_executor is None:
+        semaphore = get_llm_executor(config).semaphore
+        with _executor_lock:
+            if _stream_executor is None:
+                _stream_executor = LLMExecutor(
+                    max_workers=getattr(config, 'LLM_STREAM_MAX_WORKERS', 4),
+                    max_pending=getattr(config, 'LLM_STREAM_MAX_PENDING', 32),
+                    semaphore=semaphore,
+                    name='llm-stream'
+                )
+
+    return _stream_executor
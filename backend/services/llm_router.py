@@ -0,0 +1,353 @@
+"""
+LLM服务商路由器
+按服务商/模型统计滚动延迟和错误率，提供熔断和对冲请求（hedged request）
+"""
+import sys
+import os
+import math
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import setup_logger
+import requests
+
+logger = setup_logger(__name__)
+
+
+def is_provider_failure(error: Exception) -> bool:
+    """
+    判断异常是否属于服务商故障（需要计入熔断并切换服务商）
+
+    4xx（429除外）是请求本身的问题，换服务商也无济于事，不计入。
+
+    Args:
+        error: 调用抛出的异常
+
+    Returns:
+        是否为服务商故障
+    """
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        return status >= 500 or status == 429
+    return True
+
+
+class LatencyWindow:
+    """滚动窗口内的延迟和成功率统计"""
+
+    def __init__(self, size: int = 100):
+        self.latencies = deque(maxlen=size)
+        self.outcomes = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, success: bool):
+        with self._lock:
+            if success:
+                self.latencies.append(latency)
+            self.outcomes.append(success)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """获取成功请求延迟的第p百分位（秒），无样本时返回None"""
+        with self._lock:
+            samples = sorted(self.latencies)
+        if not samples:
+            return None
+        index = max(0, math.ceil(p / 100 * len(samples)) - 1)
+        return samples[index]
+
+    @property
+    def sample_count(self) -> int:
+        return len(self.latencies)
+
+    def error_rate(self) -> float:
+        with self._lock:
+            total = len(self.outcomes)
+            failures = sum(1 for ok in self.outcomes if not ok)
+        return failures / total if total else 0.0
+
+    def snapshot(self) -> Dict:
+        p50 = self.percentile(50)
+        p95 = self.percentile(95)
+        return {
+            'samples': len(self.outcomes),
+            'p50_ms': round(p50 * 1000, 1) if p50 is not None else None,
+            'p95_ms': round(p95 * 1000, 1) if p95 is not None else None,
+            'error_rate': round(self.error_rate(), 4)
+        }
+
+
+class CircuitBreaker:
+    """
+    熔断器
+    closed: 正常放行；open: 连续失败达到阈值后拒绝请求；
+    half_open: 冷却时间过后每个冷却周期放行一个探测请求，成功则恢复
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """是否放行请求"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            now = time.time()
+            if now - self.opened_at >= self.reset_timeout:
+                # 放行一个探测请求，并重新计时，避免探测结果未上报时一直卡住
+                self.state = self.HALF_OPEN
+                self.opened_at = now
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"熔断器打开: 连续失败 {self.consecutive_failures} 次")
+                self.state = self.OPEN
+                self.opened_at = time.time()
+
+    def snapshot(self) -> Dict:
+        return {
+            'state': self.state,
+            'consecutive_failures': self.consecutive_failures
+        }
+
+
+class ProviderRouter:
+    """
+    LLM服务商路由器
+
+    候选列表按优先级排列（第一个为首选），路由器跳过熔断中的服务商；
+    首选失败时切换到下一个候选；开启对冲时，首选超过其p95延迟仍未返回
+    则并行向下一个候选发起同样的请求，取先成功的结果。
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 hedge_enabled: bool = False, hedge_min_samples: int = 20,
+                 window_size: int = 100, max_workers: int = 8):
+        """
+        初始化路由器
+
+        Args:
+            failure_threshold: 连续失败多少次后打开熔断器
+            reset_timeout: 熔断器打开后多久放行探测请求(秒)
+            hedge_enabled: 是否开启对冲请求
+            hedge_min_samples: 首选服务商至少有多少个延迟样本才开始对冲
+            window_size: 滚动统计窗口大小
+            max_workers: 对冲请求线程池大小
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.hedge_enabled = hedge_enabled
+        self.hedge_min_samples = hedge_min_samples
+        self.window_size = window_size
+
+        self._windows: Dict[str, LatencyWindow] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='llm-hedge')
+        self._counters = {'requests': 0, 'failovers': 0, 'hedges': 0, 'hedge_wins': 0, 'rejected': 0}
+
+        logger.info(f"LLM路由器初始化: threshold={failure_threshold}, reset={reset_timeout}s, hedge={hedge_enabled}")
+
+    def _window(self, candidate: Dict) -> LatencyWindow:
+        key = f"{candidate['provider']}/{candidate['model']}"
+        with self._lock:
+            if key not in self._windows:
+                self._windows[key] = LatencyWindow(self.window_size)
+            return self._windows[key]
+
+    def _breaker(self, provider: str) -> CircuitBreaker:
+        with self._lock:
+            if provider not in self._breakers:
+                self._breakers[provider] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return self._breakers[provider]
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _attempt(self, candidate: Dict, call: Callable[[Dict], object]):
+        """执行一次调用并记录延迟、成功率和熔断状态"""
+        start = time.perf_counter()
+        try:
+            result = call(candidate)
+        except Exception as e:
+            if is_provider_failure(e):
+                self._window(candidate).record(time.perf_counter() - start, False)
+                self._breaker(candidate['provider']).record_failure()
+            raise
+        self._window(candidate).record(time.perf_counter() - start, True)
+        self._breaker(candidate['provider']).record_success()
+        return result
+
+    def _next_available(self, candidates: List[Dict], start: int) -> Optional[int]:
+        for i in range(start, len(candidates)):
+            if self._breaker(candidates[i]['provider']).allow_request():
+                return i
+        return None
+
+    def execute(self, candidates: List[Dict], call: Callable[[Dict], object],
+                on_discarded: Optional[Callable[[Dict, object], None]] = None) -> Tuple[Dict, object]:
+        """
+        按路由策略执行调用
+
+        Args:
+            candidates: 候选列表 [{'provider': str, 'model': str, ...}]，按优先级排列
+            call: 实际执行请求的函数，参数为候选字典
+            on_discarded: 对冲中落败的请求之后成功返回时的回调 on_discarded(candidate, result)，
+                          在路由器线程池中调用（用于记录落败请求消耗的token）
+
+        Returns:
+            (实际返回结果的候选, call 的返回值)
+
+        Raises:
+            最后一次调用的异常
+        """
+        self._count('requests')
+        primary_index = self._next_available(candidates, 0)
+        if primary_index is None:
+            # 全部熔断时仍尝试首选，避免彻底不可用
+            self._count('rejected')
+            logger.warning("所有服务商均处于熔断状态，仍尝试首选服务商")
+            primary_index = 0
+
+        primary = candidates[primary_index]
+        window = self._window(primary)
+        if (self.hedge_enabled and primary_index + 1 < len(candidates)
+                and window.sample_count >= self.hedge_min_samples):
+            return self._execute_hedged(candidates, primary_index, call, window.percentile(95), on_discarded)
+
+        try:
+            return primary, self._attempt(primary, call)
+        except Exception as e:
+            if not is_provider_failure(e):
+                raise
+            secondary_index = self._next_available(candidates, primary_index + 1)
+            if secondary_index is None:
+                raise
+            secondary = candidates[secondary_index]
+            self._count('failovers')
+            logger.warning(f"{primary['provider']}/{primary['model']} 调用失败，切换到 "
+                           f"{secondary['provider']}/{secondary['model']}: {e}")
+            return secondary, self._attempt(secondary, call)
+
+    def _execute_hedged(self, candidates: List[Dict], primary_index: int, call: Callable[[Dict], object],
+                        hedge_delay: float, on_discarded: Optional[Callable[[Dict, object], None]]):
+        """首选超过p95仍未返回时，并行请求下一个候选"""
+        primary = candidates[primary_index]
+        primary_future = self._executor.submit(self._attempt, primary, call)
+        done, _ = wait([primary_future], timeout=hedge_delay)
+        if done and not primary_future.exception():
+            return primary, primary_future.result()
+        if done and not is_provider_failure(primary_future.exception()):
+            raise primary_future.exception()
+
+        secondary_index = self._next_available(candidates, primary_index + 1)
+        if secondary_index is None:
+            return primary, primary_future.result()
+
+        secondary = candidates[secondary_index]
+        if done:
+            self._count('failovers')
+        else:
+            self._count('hedges')
+            logger.info(f"{primary['provider']}/{primary['model']} 超过p95 ({hedge_delay * 1000:.0f}ms)，"
+                        f"对冲请求 {secondary['provider']}/{secondary['model']}")
+        secondary_future = self._executor.submit(self._attempt, secondary, call)
+
+        owners = {primary_future: primary, secondary_future: secondary}
+        pending = {secondary_future} if done else {primary_future, secondary_future}
+        last_error = primary_future.exception() if done else None
+        while pending:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                if future.exception() is None:
+                    if future is secondary_future and not done:
+                        self._count('hedge_wins')
+                    if on_discarded:
+                        for loser in pending:
+                            loser.add_done_callback(
+                                lambda f, candidate=owners[loser]: self._discarded(f, candidate, on_discarded)
+                            )
+                    return owners[future], future.result()
+                last_error = future.exception()
+        raise last_error
+
+    @staticmethod
+    def _discarded(future, candidate: Dict, on_discarded: Callable[[Dict, object], None]):
+        """落败的对冲请求完成后回调（失败的请求不回调）"""
+        if future.exception() is not None:
+            return
+        try:
+            on_discarded(candidate, future.result())
+        except Exception as e:
+            logger.warning(f"处理落败的对冲请求结果失败: {e}")
+
+    def get_stats(self) -> Dict:
+        """
+        获取路由统计
+
+        Returns:
+            {counters, providers: {provider/model: {p50_ms, p95_ms, error_rate}}, breakers}
+        """
+        with self._lock:
+            windows = dict(self._windows)
+            breakers = dict(self._breakers)
+            counters = dict(self._counters)
+        return {
+            'hedge_enabled': self.hedge_enabled,
+            'counters': counters,
+            'providers': {key: w.snapshot() for key, w in windows.items()},
+            'breakers': {key: b.snapshot() for key, b in breakers.items()}
+        }
+
+
+# 全局路由器实例
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_llm_router(config=None) -> ProviderRouter:
+    """
+    获取全局LLM路由器实例(单例模式)
+
+    Args:
+        config: 配置对象（首次创建时读取路由参数）
+
+    Returns:
+        ProviderRouter实例
+    """
+    global _router
+
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = ProviderRouter(
+                    failure_threshold=getattr(config, 'LLM_ROUTER_FAILURE_THRESHOLD', 5),
+                    reset_timeout=getattr(config, 'LLM_ROUTER_RESET_TIMEOUT', 30),
+                    hedge_enabled=getattr(config, 'LLM_ROUTER_HEDGE_ENABLED', False),
+                    hedge_min_samples=getattr(config, 'LLM_ROUTER_HEDGE_MIN_SAMPLES', 20)
+                )
+
+    return _router
@@ -0,0 +1,273 @@
+"""
+LLM HTTP传输层
+为所有AI服务商提供进程内共享的、带连接池和keep-alive的HTTP客户端
+"""
+import sys
+import os
+import time
+import threading
+from typing import Dict
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import setup_logger
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+logger = setup_logger(__name__)
+
+
+class TransportMetrics:
+    """连接池指标（按服务商主机统计）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, Dict] = {}
+
+    def _host_stats(self, host: str) -> Dict:
+        stats = self._hosts.get(host)
+        if stats is None:
+            stats = {
+                'requests': 0,
+                'new_connections': 0,
+                'connect_time_total': 0.0,
+                'connect_time_max': 0.0,
+                'errors': 0,
+                'idle_resets': 0
+            }
+            self._hosts[host] = stats
+        return stats
+
+    def record_connect(self, host: str, elapsed: float):
+        """记录一次新建连接（连接池未命中）及其建连耗时"""
+        with self._lock:
+            stats = self._host_stats(host)
+            stats['new_connections'] += 1
+            stats['connect_time_total'] += elapsed
+            stats['connect_time_max'] = max(stats['connect_time_max'], elapsed)
+
+    def record_request(self, host: str, success: bool = True):
+        """记录一次请求"""
+        with self._lock:
+            stats = self._host_stats(host)
+            stats['requests'] += 1
+            if not success:
+                stats['errors'] += 1
+
+    def record_idle_reset(self, host: str):
+        """记录一次因空闲超时而重置连接池"""
+        with self._lock:
+            self._host_stats(host)['idle_resets'] += 1
+
+    def snapshot(self) -> Dict:
+        """
+        获取指标快照
+
+        Returns:
+            {host: {requests, pool_hits, pool_misses, hit_rate, avg_connect_ms, ...}}
+        """
+        with self._lock:
+            result = {}
+            for host, stats in self._hosts.items():
+                misses = stats['new_connections']
+                hits = max(stats['requests'] - misses, 0)
+                result[host] = {
+                    'requests': stats['requests'],
+                    'pool_hits': hits,
+                    'pool_misses': misses,
+                    'hit_rate': round(hits / stats['requests'], 4) if stats['requests'] else 0.0,
+                    'avg_connect_ms': round(stats['connect_time_total'] / misses * 1000, 2) if misses else 0.0,
+                    'max_connect_ms': round(stats['connect_time_max'] * 1000, 2),
+                    # 每次命中节省的建连时间按平均建连耗时估算
+                    'saved_connect_ms': round(hits * (stats['connect_time_total'] / misses) * 1000, 2) if misses else 0.0,
+                    'errors': stats['errors'],
+                    'idle_resets': stats['idle_resets']
+                }
+            return result
+
+    def reset(self):
+        """清空指标"""
+        with self._lock:
+            self._hosts.clear()
+
+
+# 全局指标实例（建连计时在urllib3连接对象内部上报，需模块级可见）
+_metrics = TransportMetrics()
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    """记录建连耗时的HTTP连接"""
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        _metrics.record_connect(self.host, time.perf_counter() - start)
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    """记录建连（含TLS握手）耗时的HTTPS连接"""
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        _metrics.record_connect(self.host, time.perf_counter() - start)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _PooledAdapter(HTTPAdapter):
+    """使用计时连接类的连接池适配器"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _TimedHTTPConnectionPool,
+            'https': _TimedHTTPSConnectionPool
+        }
+
+
+class LLMTransport:
+    """
+    LLM HTTP传输层
+
+    每个服务商主机一个 requests.Session + 连接池，进程内所有 AIService 实例共享，
+    避免每次调用都重新建立TCP/TLS连接。
+    """
+
+    def __init__(self, pool_maxsize: int = 10, keepalive_seconds: int = 60):
+        """
+        初始化传输层
+
+        Args:
+            pool_maxsize: 每个主机的最大连接数
+            keepalive_seconds: 连接空闲超过该时间后丢弃重建（避免复用被服务端关闭的连接）
+        """
+        self.pool_maxsize = pool_maxsize
+        self.keepalive_seconds = keepalive_seconds
+        self.metrics = _metrics
+
+        self._sessions: Dict[str, requests.Session] = {}
+        self._last_used: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+        logger.info(f"LLM传输层初始化: pool_maxsize={pool_maxsize}, keepalive={keepalive_seconds}s")
+
+    def _create_session(self) -> requests.Session:
+        """创建带连接池的Session"""
+        session = requests.Session()
+        adapter = _PooledAdapter(
+            pool_connections=1,  # 每个Session只服务一个主机
+            pool_maxsize=self.pool_maxsize,
+            max_retries=0
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({'Connection': 'keep-alive'})
+        return session
+
+    def get_session(self, url: str) -> requests.Session:
+        """
+        获取URL对应主机的共享Session
+
+        Args:
+            url: 请求URL
+
+        Returns:
+            requests.Session实例
+        """
+        host = urlsplit(url).netloc
+        now = time.time()
+
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = self._create_session()
+                self._sessions[host] = session
+                logger.debug(f"为主机 {host} 创建连接池")
+            elif now - self._last_used.get(host, now) > self.keepalive_seconds:
+                # 空闲超时，服务端很可能已经关闭连接，清空连接池
+                for adapter in session.adapters.values():
+                    adapter.poolmanager.clear()
+                self.metrics.record_idle_reset(urlsplit(url).hostname or host)
+                logger.debug(f"主机 {host} 连接空闲超时，已重置连接池")
+            self._last_used[host] = now
+
+        return session
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """
+        发送POST请求（复用连接池）
+
+        Args:
+            url: 请求URL
+            **kwargs: 透传给 requests.Session.post 的参数
+
+        Returns:
+            requests.Response
+        """
+        session = self.get_session(url)
+        hostname = urlsplit(url).hostname or ''
+        try:
+            response = session.post(url, **kwargs)
+        except requests.exceptions.RequestException:
+            self.metrics.record_request(hostname, success=False)
+            raise
+        self.metrics.record_request(hostname, success=response.ok)
+        return response
+
+    def get_stats(self) -> Dict:
+        """
+        获取传输层统计信息
+
+        Returns:
+            统计信息字典
+        """
+        return {
+            'pool_maxsize': self.pool_maxsize,
+            'keepalive_seconds': self.keepalive_seconds,
+            'hosts': self.metrics.snapshot()
+        }
+
+    def close(self):
+        """关闭所有连接池"""
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+            self._last_used.clear()
+
+
+# 全局传输层实例
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_llm_transport(config=None) -> LLMTransport:
+    """
+    获取全局LLM传输层实例(单例模式)
+
+    Args:
+        config: 配置对象（首次创建时读取连接池参数）
+
+    Returns:
+        LLMTransport实例
+    """
+    global _transport
+
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                _transport = LLMTransport(
+                    pool_maxsize=getattr(config, 'LLM_HTTP_POOL_MAXSIZE', 10),
+                    keepalive_seconds=getattr(config, 'LLM_HTTP_KEEPALIVE_SECONDS', 60)
+                )
+
+    return _transport
@@ -0,0 +1,203 @@
+"""
+浏览器页面等待
+发布器按页面状态等待（元素出现、页面加载完成且网络空闲、DOM条件成立、URL变化），条件满足即继续，
+取代固定的 time.sleep：页面快时不空等，页面慢时等到截止时间而不是提前失败。
+
+同时支持 DrissionPage 的 ChromiumPage（ele / run_js）和 Selenium WebDriver（find_elements / execute_script）。
+元素定位符使用 DrissionPage 语法（'css:...'、'text:...'、'#id' 等），Selenium 下只支持 'css:' 定位符。
+
+StepTimer 记录发布流程各步骤的耗时，随发布结果返回并写入任务日志
+"""
+import sys
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+# 轮询间隔(秒)
+POLL_INTERVAL = 0.2
+
+# 页面加载完成且 quiet_ms 毫秒内没有新的资源请求完成，视为网络空闲
+NETWORK_IDLE_JS = """
+if (document.readyState !== 'complete') { return false; }
+const entries = performance.getEntriesByType('resource');
+const last = entries.reduce((latest, entry) => Math.max(latest, entry.responseEnd), 0);
+return performance.now() - last >= %d;
+"""
+
+
+def wait_until(predicate: Callable[[], Any], timeout: float = 10, interval: float = POLL_INTERVAL,
+               description: str = '') -> Any:
+    """
+    轮询直到条件成立
+
+    Args:
+        predicate: 条件函数，返回真值表示成立（抛出异常视为未成立，如页面跳转中元素失效）
+        timeout: 最长等待时间(秒)
+        interval: 轮询间隔(秒)
+        description: 超时日志中的条件描述
+
+    Returns:
+        条件函数返回的真值，超时返回None
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            result = predicate()
+            if result:
+                return result
+        except Exception as e:
+            logger.debug(f"等待条件检查出错（继续等待）: {description} - {e}")
+        if time.monotonic() >= deadline:
+            if description:
+                logger.debug(f"等待超时({timeout}秒): {description}")
+            return None
+        time.sleep(min(interval, max(0.0, deadline - time.monotonic())))
+
+
+def _run_js(page, script: str) -> Any:
+    if hasattr(page, 'run_js'):
+        return page.run_js(script)
+    return page.execute_script(script)
+
+
+def _find(page, locator: str):
+    """立即查找一次元素（不等待），未找到返回None"""
+    if hasattr(page, 'run_js'):
+        element = page.ele(locator, timeout=0)
+        return element or None
+    if not locator.startswith('css:'):
+        raise ValueError(f"Selenium只支持css定位符: {locator}")
+    elements = page.find_elements('css selector', locator[4:])
+    return elements[0] if elements else None
+
+
+def wait_for_element(page, locators: Union[str, Sequence[str]], timeout: float = 10,
+                     displayed: bool = False) -> Optional[Any]:
+    """
+    等待任意一个定位符对应的元素出现
+
+    Args:
+        page: ChromiumPage 或 WebDriver
+        locators: 定位符，或按优先级排列的多个备选定位符
+        timeout: 最长等待时间(秒)
+        displayed: 是否要求元素可见
+
+    Returns:
+        最先出现的元素，超时返回None
+    """
+    if isinstance(locators, str):
+        locators = [locators]
+
+    def find_any():
+        for locator in locators:
+            try:
+                element = _find(page, locator)
+                if element is not None and (not displayed or _is_displayed(element)):
+                    return element
+            except Exception as e:
+                # 某个备选定位符无效或元素在页面刷新中失效时，继续尝试其余定位符
+                logger.debug(f"定位符 '{locator}' 查找出错: {e}")
+        return None
+
+    return wait_until(find_any, timeout, description=f"元素出现 {list(locators)}")
+
+
+def _is_displayed(element) -> bool:
+    if hasattr(element, 'states'):
+        return element.states.is_displayed
+    return element.is_displayed()
+
+
+def wait_for_element_gone(page, locator: str, timeout: float = 10) -> bool:
+    """等待元素消失（如加载遮罩、弹窗关闭），超时返回False"""
+    return bool(wait_until(lambda: _find(page, locator) is None, timeout, description=f"元素消失 {locator}"))
+
+
+def wait_for_dom(page, condition_js: str, timeout: float = 10) -> Any:
+    """
+    等待页面中的JS条件成立
+
+    Args:
+        page: ChromiumPage 或 WebDriver
+        condition_js: 返回条件结果的脚本，如 "return document.querySelector('.editor') !== null"
+        timeout: 最长等待时间(秒)
+
+    Returns:
+        脚本返回的真值，超时返回None
+    """
+    return wait_until(lambda: _run_js(page, condition_js), timeout, description=f"DOM条件 {condition_js[:60]}")
+
+
+def wait_for_page_ready(page, timeout: float = 15, quiet_ms: int = 500) -> bool:
+    """
+    等待页面加载完成且网络空闲（quiet_ms 毫秒内没有资源请求完成）
+
+    长连接、轮询请求较多的页面可能一直达不到空闲，超时返回False，调用方按已加载继续
+
+    Args:
+        page: ChromiumPage 或 WebDriver
+        timeout: 最长等待时间(秒)
+        quiet_ms: 视为空闲的无请求时间(毫秒)
+
+    Returns:
+        是否在超时前空闲
+    """
+    return bool(wait_until(lambda: _run_js(page, NETWORK_IDLE_JS % quiet_ms), timeout,
+                           description=f"页面网络空闲 {quiet_ms}ms"))
+
+
+def wait_for_url_change(page, old_url: str, timeout: float = 10,
+                        condition: Optional[Callable[[str], bool]] = None) -> Optional[str]:
+    """
+    等待页面URL离开 old_url（并满足condition）
+
+    Args:
+        page: ChromiumPage 或 WebDriver
+        old_url: 操作前的URL
+        timeout: 最长等待时间(秒)
+        condition: 新URL需要满足的条件
+
+    Returns:
+        新URL，超时返回None
+    """
+    def changed():
+        url = page.url if hasattr(page, 'run_js') else page.current_url
+        return url if url != old_url and (condition is None or condition(url)) else None
+
+    return wait_until(changed, timeout, description=f"URL离开 {old_url}")
+
+
+class StepTimer:
+    """记录发布流程各步骤的耗时"""
+
+    def __init__(self, name: str = ''):
+        self.name = name
+        self.steps: List[Dict] = []
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def step(self, name: str):
+        """计时一个步骤: with timer.step('输入标题'): ..."""
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps.append({'step': name, 'seconds': round(time.perf_counter() - began, 2)})
+
+    @property
+    def total_seconds(self) -> float:
+        return round(time.perf_counter() - self._started, 2)
+
+    def to_dict(self) -> Dict:
+        return {'total_seconds': self.total_seconds, 'steps': self.steps}
+
+    def summary(self) -> str:
+        """单行摘要，如 '打开创作页 1.2s, 输入标题 0.3s (共 1.5s)'"""
+        parts = ', '.join(f"{step['step']} {step['seconds']}s" for step in self.steps)
+        return f"{parts} (共 {self.total_seconds}s)"
@@ -0,0 +1,222 @@
+"""
+提示词模板引擎
+模板只解析一次，编译为节点列表；按 (模板类型, id, 版本, 字段) 缓存编译结果
+
+支持的语法（与原 render_prompt_template 保持一致）:
+    {{variable}}                      变量
+    {variable}                        变量（单大括号）
+    {% if variable %}...{% endif %}   变量为真时保留块内容（支持嵌套）
+未定义的变量渲染为空字符串，未定义变量的条件块按假处理。
+"""
+import sys
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+# 一次扫描识别全部标记: if / endif / {{var}} / {var}
+_TOKEN_PATTERN = re.compile(
+    r'\{%\s*if\s+(?P<if>[a-zA-Z_][a-zA-Z0-9_]*)\s*%\}'
+    r'|(?P<endif>\{%\s*endif\s*%\})'
+    r'|\{\{(?P<var2>[a-zA-Z_][a-zA-Z0-9_]*)\}\}'
+    r'|\{(?P<var1>[a-zA-Z_][a-zA-Z0-9_]*)\}'
+)
+
+
+class _IfNode:
+    """条件块节点"""
+    __slots__ = ('name', 'tag', 'children')
+
+    def __init__(self, name: str, tag: str):
+        self.name = name
+        self.tag = tag  # 原始标记文本，未闭合时按字面量输出
+        self.children: List = []
+
+
+class _VarNode:
+    """变量节点"""
+    __slots__ = ('name',)
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+class CompiledTemplate:
+    """编译后的模板，节点为 str（字面量）/ _VarNode / _IfNode"""
+
+    def __init__(self, source: str):
+        self.source = source
+        self.nodes = self._compile(source)
+
+    @staticmethod
+    def _compile(source: str) -> List:
+        root: List = []
+        stack: List[_IfNode] = []
+        current = root
+        pos = 0
+        for match in _TOKEN_PATTERN.finditer(source):
+            if match.start() > pos:
+                current.append(source[pos:match.start()])
+            pos = match.end()
+            if match.group('if'):
+                node = _IfNode(match.group('if'), match.group(0))
+                current.append(node)
+                stack.append(node)
+                current = node.children
+            elif match.group('endif'):
+                if stack:
+                    stack.pop()
+                    current = stack[-1].children if stack else root
+                else:
+                    # 多余的endif按字面量保留
+                    current.append(match.group(0))
+            else:
+                current.append(_VarNode(match.group('var2') or match.group('var1')))
+        if pos < len(source):
+            current.append(source[pos:])
+
+        # 未闭合的if按字面量展开到父节点
+        while stack:
+            node = stack.pop()
+            parent = stack[-1].children if stack else root
+            index = next(i for i, n in enumerate(parent) if n is node)
+            parent[index:index + 1] = [node.tag] + node.children
+        return root
+
+    def render(self, variables: Dict) -> str:
+        """
+        渲染模板
+
+        Args:
+            variables: 变量字典
+
+        Returns:
+            渲染结果（去除首尾空白）
+        """
+        parts: List[str] = []
+        self._render_nodes(self.nodes, variables, parts)
+        return ''.join(parts).strip()
+
+    def _render_nodes(self, nodes: List, variables: Dict, parts: List[str]):
+        for node in nodes:
+            if type(node) is str:
+                parts.append(node)
+            elif type(node) is _VarNode:
+                value = variables.get(node.name)
+                parts.append(str(value or ''))
+            elif variables.get(node.name):
+                self._render_nodes(node.children, variables, parts)
+
+
+class PromptTemplateEngine:
+    """
+    提示词模板引擎（编译结果LRU缓存）
+
+    缓存键为 (模板类型, id, 版本, 字段)；同一键下模板内容变化（未升级版本号的编辑）时自动重新编译。
+    没有id的模板按内容缓存。
+    """
+
+    def __init__(self, maxsize: int = 512):
+        self.maxsize = maxsize
+        self._cache: 'OrderedDict[Tuple, CompiledTemplate]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0}
+
+    def compile(self, source: str, cache_key: Optional[Tuple] = None) -> CompiledTemplate:
+        """
+        获取编译后的模板
+
+        Args:
+            source: 模板字符串
+            cache_key: 缓存键，None时按模板内容缓存
+
+        Returns:
+            CompiledTemplate实例
+        """
+        key = cache_key if cache_key is not None else ('source', source)
+        with self._lock:
+            compiled = self._cache.get(key)
+            if compiled is not None and compiled.source == source:
+                self._cache.move_to_end(key)
+                self._stats['hits'] += 1
+                return compiled
+            self._stats['misses'] += 1
+
+        compiled = CompiledTemplate(source)
+        with self._lock:
+            self._cache[key] = compiled
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return compiled
+
+    def render(self, source: str, variables: Dict, cache_key: Optional[Tuple] = None) -> str:
+        """
+        渲染模板（自动加入 year / current_year 默认变量）
+
+        Args:
+            source: 模板字符串
+            variables: 变量字典
+            cache_key: 缓存键（见 template_cache_key）
+
+        Returns:
+            渲染后的文本
+        """
+        year = str(datetime.now().year)
+        return self.compile(source or '', cache_key).render(
+            {'year': year, 'current_year': year, **variables}
+        )
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {'size': len(self._cache), **self._stats}
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+def template_cache_key(kind: str, prompt: Optional[Dict], field: str) -> Optional[Tuple]:
+    """
+    构建编译缓存键
+
+    Args:
+        kind: 模板类型（prompt_template / analysis_prompt / article_prompt / platform_style）
+        prompt: 模板字典（to_dict() 的结果）
+        field: 模板字段（如 user_template、article_generation）
+
+    Returns:
+        缓存键；模板没有id时返回None（按内容缓存）
+    """
+    if not prompt or prompt.get('id') is None:
+        return None
+    return (kind, prompt['id'], prompt.get('version'), field)
+
+
+# 全局模板引擎实例
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_prompt_template_engine() -> PromptTemplateEngine:
+    """
+    获取全局模板引擎实例(单例模式)
+
+    Returns:
+        PromptTemplateEngine实例
+    """
+    global _engine
+
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = PromptTemplateEngine()
+
+    return _engine
@@ -17,6 +17,8 @@ sys.path.insert(0, BACKEND_DIR)
 
 from models import PublishTask, PlatformAccount, PublishHistory, get_db_session
 from services.user_rate_limiter import get_rate_limiter
+from services.task_stats_cache import get_task_stats_cache
+from services.task_events import TaskEventStream, get_task_event_stream
 
 # RQ Worker日志配置 - 确保日志写入统一的日志文件
 def setup_worker_logger():
@@ -184,9 +186,20 @@ def update_task_status(task_db_id: int, updates: Dict, task_log: TaskLogger, max
                 # 更新字段
                 for key, value in updates.items():
                     setattr(task, key, value)
+                task_user_id = task.user_id
+                event = TaskEventStream.task_event(
+                    task.task_id, task.status, progress=task.progress,
+                    result_url=task.result_url, error_message=task.error_message
+                )
 
                 db.commit()
                 task_log.log(f"✓ 状态更新成功")
+
+                # 状态变化后用户的任务统计缓存失效，并推送给用户的SSE连接
+                if 'status' in updates:
+                    get_task_stats_cache().invalidate([task_user_id])
+                if 'status' in updates or 'progress' in updates:
+                    get_task_event_stream().publish(task_user_id, [event])
                 return True
 
         except OperationalError as e:
@@ -330,11 +343,22 @@ def publish_to_zhihu(title: str, content: str, username: str, password: Optional
             content=content,
             password=password,
             topics=None,
-            draft=False
+            draft=False,
+            reuse_session=True
         )
 
         publish_duration = (datetime.now() - publish_start).total_seconds()
 
+        timings = result.get('timings')
+        if timings:
+            task_log.log("  步骤耗时: " + ', '.join(f"{step['step']} {step['seconds']}秒" for step in timings['steps']))
+        session = result.get('browser_session')
+        if session:
+            if session['reused']:
+                task_log.log(f"  复用浏览器会话: 第{session['uses']}次使用, 累计节省启动时间 {session['saved_seconds']:.1f}秒")
+            else:
+                task_log.log(f"  新启动浏览器会话: 启动登录耗时 {session['startup_seconds']:.1f}秒")
+
         if result.get('success'):
             task_log.log(f"✓ 知乎发布成功 (耗时 {publish_duration:.2f}秒)")
             task_log.log(f"  文章URL: {result.get('url')}")
@@ -538,3 +562,12 @@ def execute_publish_task(task_db_id: int) -> Dict:
                 task_log.log("✓ 限流令牌已释放")
             except Exception as e:
                 task_log.log(f"释放限流令牌失败: {e}", 'WARN')
+
+            # 空出的在途名额分发给排队中的任务
+            try:
+                from services.fair_scheduler import get_fair_scheduler
+                result = get_fair_scheduler().dispatch()
+                if result.get('dispatched'):
+                    task_log.log(f"分发排队任务: {result['dispatched']} 个")
+            except Exception as e:
+                task_log.log(f"分发排队任务失败: {e}", 'WARN')
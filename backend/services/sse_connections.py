@@ -0,0 +1,98 @@
+"""
+SSE连接数限制
+gunicorn 的 gthread worker 中，每个SSE连接在整个连接期间占用一个工作线程；
+每个worker进程最多同时保持 SSE_MAX_STREAMS_PER_WORKER 个SSE连接（应不超过 gunicorn threads 的一半），
+其余线程留给普通请求。超出上限时接口返回503：任务状态页面退回轮询，生成任务可改用状态查询接口
+"""
+import sys
+import os
+import threading
+from typing import Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class SSEConnectionLimiter:
+    """当前进程的SSE连接计数"""
+
+    def __init__(self, max_streams: int = 4):
+        """
+        初始化限制器
+
+        Args:
+            max_streams: 当前进程最多同时保持的SSE连接数
+        """
+        self.max_streams = max_streams
+        self._active = 0
+        self._rejected = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        """占用一个连接名额，已满时返回False"""
+        with self._lock:
+            if self._active >= self.max_streams:
+                self._rejected += 1
+                return False
+            self._active += 1
+            return True
+
+    def release(self):
+        """释放连接名额"""
+        with self._lock:
+            self._active = max(0, self._active - 1)
+
+    def attach(self, response):
+        """
+        响应关闭（发送完毕或客户端断开）时释放名额
+
+        Args:
+            response: 流式响应
+
+        Returns:
+            同一个响应
+        """
+        released = threading.Event()
+
+        def release_once():
+            if not released.is_set():
+                released.set()
+                self.release()
+
+        response.call_on_close(release_once)
+        return response
+
+    def get_stats(self) -> Dict:
+        """获取连接统计（当前进程）"""
+        with self._lock:
+            return {'active': self._active, 'max': self.max_streams, 'rejected': self._rejected}
+
+
+# 全局限制器实例
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_sse_limiter(config=None) -> SSEConnectionLimiter:
+    """
+    获取当前进程的SSE连接限制器(单例模式)
+
+    Args:
+        config: 配置对象（首次创建时读取参数，未提供时使用全局配置）
+
+    Returns:
+        SSEConnectionLimiter实例
+    """
+    global _limiter
+
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                if config is None:
+                    from config import get_config
+                    config = get_config()
+                _limiter = SSEConnectionLimiter(getattr(config, 'SSE_MAX_STREAMS_PER_WORKER', 4))
+
+    return _limiter
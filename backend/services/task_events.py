@@ -0,0 +1,303 @@
+"""
+发布任务状态事件推送
+任务状态变化时写入用户的事件日志并推送到用户频道，浏览器通过SSE接收，取代轮询数据库。
+每个进程只用一个订阅连接（模式订阅所有用户频道），再分发给本进程内该用户的SSE连接
+
+Redis结构:
+    taskevents:user:{user_id}:seq      用户事件序号，第n个事件的id为n
+    taskevents:user:{user_id}:log      最近的事件（JSON List，保留最近LOG_SIZE条），用于断线续传
+    taskevents:user:{user_id}:channel  pub/sub频道，实时推送事件
+
+事件类型:
+    task  任务状态变化 {id, type, task_id, status, progress, result_url, error_message}
+    sync  客户端需要重新拉取一次任务状态（首次连接，或要续传的事件已不在日志中）
+"""
+import sys
+import os
+import json
+import time
+import queue
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import setup_logger
+import redis
+
+logger = setup_logger(__name__)
+
+
+# 批量追加事件：分配连续id、写入日志并推送，保证同一用户的事件id与日志顺序一致
+# KEYS: 序号key, 日志key, 频道
+# ARGV: 日志保留条数, 过期时间, 事件JSON...（不含id，均为非空对象，id拼接到开头）
+# 返回: 最后一个事件的id
+PUBLISH_SCRIPT = """
+local seq = 0
+for i = 3, #ARGV do
+    seq = redis.call('INCR', KEYS[1])
+    local message = '{"id": ' .. seq .. ', ' .. string.sub(ARGV[i], 2)
+    redis.call('RPUSH', KEYS[2], message)
+    redis.call('PUBLISH', KEYS[3], message)
+end
+redis.call('LTRIM', KEYS[2], -tonumber(ARGV[1]), -1)
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return seq
+"""
+
+# 订阅连接重建后通知各SSE连接从日志补齐（重建期间的事件只在日志中）
+RESYNC = object()
+
+
+class _EventHub:
+    """进程内的订阅分发器：一个订阅连接，按用户分发给本进程的SSE连接"""
+
+    PATTERN = 'taskevents:user:*:channel'
+    # 每个SSE连接最多缓存的未发送事件数，超出后丢弃（客户端根据id不连续从日志补齐）
+    LISTENER_QUEUE_SIZE = 1000
+
+    def __init__(self, pubsub_client: redis.Redis):
+        self.pubsub_client = pubsub_client
+        self._listeners: Dict[int, List[queue.Queue]] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, user_id: int) -> queue.Queue:
+        """登记一个SSE连接，没有订阅线程时启动"""
+        listener = queue.Queue(maxsize=self.LISTENER_QUEUE_SIZE)
+        with self._lock:
+            self._listeners.setdefault(user_id, []).append(listener)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='task-event-hub', daemon=True)
+                self._thread.start()
+        return listener
+
+    def unregister(self, user_id: int, listener: queue.Queue):
+        """注销SSE连接"""
+        with self._lock:
+            listeners = self._listeners.get(user_id, [])
+            if listener in listeners:
+                listeners.remove(listener)
+            if not listeners:
+                self._listeners.pop(user_id, None)
+
+    def listener_count(self) -> int:
+        with self._lock:
+            return sum(len(listeners) for listeners in self._listeners.values())
+
+    def _broadcast(self, item, user_id: Optional[int] = None):
+        with self._lock:
+            if user_id is None:
+                targets = [listener for listeners in self._listeners.values() for listener in listeners]
+            else:
+                targets = list(self._listeners.get(user_id, []))
+        for listener in targets:
+            try:
+                listener.put_nowait(item)
+            except queue.Full:
+                pass
+
+    def _run(self):
+        """订阅线程：没有SSE连接时退出，Redis出错时重建订阅"""
+        pubsub = None
+        retry_delay = 1
+        try:
+            while True:
+                with self._lock:
+                    if not self._listeners:
+                        self._thread = None
+                        return
+                try:
+                    if pubsub is None:
+                        pubsub = self.pubsub_client.pubsub(ignore_subscribe_messages=True)
+                        pubsub.psubscribe(self.PATTERN)
+                        # 订阅建立前发布的事件只在日志中
+                        self._broadcast(RESYNC)
+                        retry_delay = 1
+                    message = pubsub.get_message(timeout=1)
+                    if message is None:
+                        continue
+                    channel = message['channel']
+                    user_id = int(channel.split(':')[2])
+                    self._broadcast(message['data'], user_id)
+                except Exception as e:
+                    logger.warning(f"任务事件订阅中断，{retry_delay}秒后重建: {e}")
+                    if pubsub is not None:
+                        try:
+                            pubsub.close()
+                        except Exception:
+                            pass
+                        pubsub = None
+                    time.sleep(retry_delay)
+                    retry_delay = min(retry_delay * 2, 30)
+        finally:
+            if pubsub is not None:
+                pubsub.close()
+
+
+class TaskEventStream:
+    """发布任务状态事件的写入与订阅"""
+
+    KEY_PREFIX = 'taskevents:user:'
+    # Redis出错后暂停写入的时间(秒)，避免每次状态更新都等待连接超时
+    REDIS_RETRY_INTERVAL = 30
+
+    def __init__(self, redis_client: Optional[redis.Redis], pubsub_client: Optional[redis.Redis] = None,
+                 log_size: int = 200, ttl: int = 86400):
+        """
+        初始化事件流
+
+        Args:
+            redis_client: Redis客户端（decode_responses=True），为None时不推送
+            pubsub_client: 订阅用的Redis客户端（订阅期间一直占用连接），默认与redis_client相同
+            log_size: 每个用户保留的最近事件数（断线超过这么多事件后需要重新拉取）
+            ttl: 事件日志和序号的保留时间(秒)
+        """
+        self.redis = redis_client
+        self.log_size = log_size
+        self.ttl = ttl
+        self._redis_down_until = 0.0
+        self._publish_script = redis_client.register_script(PUBLISH_SCRIPT) if redis_client is not None else None
+        self._hub = _EventHub(pubsub_client or redis_client) if redis_client is not None else None
+
+    def _key(self, user_id: int, name: str) -> str:
+        return f"{self.KEY_PREFIX}{user_id}:{name}"
+
+    @staticmethod
+    def task_event(task_id: str, status: str, **fields) -> Dict:
+        """构造任务状态事件（忽略值为None的字段）"""
+        event = {'type': 'task', 'task_id': task_id, 'status': status}
+        event.update({key: value for key, value in fields.items() if value is not None})
+        return event
+
+    def publish(self, user_id: int, events: List[Dict]) -> Optional[int]:
+        """
+        推送用户的任务事件（尽力而为，失败不影响任务状态更新）
+
+        Args:
+            user_id: 用户ID
+            events: 事件列表（不含id）
+
+        Returns:
+            最后一个事件的id，未推送时返回None
+        """
+        if not events or self.redis is None or time.time() < self._redis_down_until:
+            return None
+        try:
+            return self._publish_script(
+                keys=[self._key(user_id, 'seq'), self._key(user_id, 'log'), self._key(user_id, 'channel')],
+                args=[self.log_size, self.ttl] + [json.dumps(event, ensure_ascii=False, default=str)
+                                                  for event in events]
+            )
+        except Exception as e:
+            logger.warning(f"推送任务事件失败，{self.REDIS_RETRY_INTERVAL}秒内不推送: {e}")
+            self._redis_down_until = time.time() + self.REDIS_RETRY_INTERVAL
+            return None
+
+    def publish_many(self, events_by_user: Dict[int, List[Dict]]):
+        """按用户推送多组事件"""
+        for user_id, events in events_by_user.items():
+            self.publish(user_id, events)
+
+    def events_since(self, user_id: int, last_id: int) -> Tuple[List[Dict], int]:
+        """
+        获取日志中id大于last_id的事件
+
+        Returns:
+            (事件列表, 当前最新事件id)
+        """
+        pipe = self.redis.pipeline()
+        pipe.get(self._key(user_id, 'seq'))
+        pipe.lrange(self._key(user_id, 'log'), 0, -1)
+        latest, messages = pipe.execute()
+        events = [event for event in (json.loads(message) for message in messages) if event['id'] > last_id]
+        return events, int(latest or 0)
+
+    def listen(self, user_id: int, last_id: int = 0, keepalive: float = 15) -> Iterator[Optional[Dict]]:
+        """
+        按顺序产出用户的任务事件：先补齐last_id之后的事件，再实时推送
+
+        首次连接（last_id为0）或要续传的事件已不在日志中时，先产出sync事件，客户端收到后重新拉取一次任务状态
+
+        Args:
+            user_id: 用户ID
+            last_id: 客户端已收到的最后一个事件id（断线重连时使用）
+            keepalive: 无事件时每隔多少秒产出一次None（用于发送SSE心跳）
+
+        Yields:
+            事件字典，或None（心跳）
+        """
+        listener = self._hub.register(user_id)
+        try:
+            pending = RESYNC
+            while True:
+                if pending is RESYNC:
+                    pending, latest = self.events_since(user_id, last_id)
+                    # 首次连接，或续传点之后的事件不完整（日志已截断或过期、序号被重置）
+                    complete = 0 < last_id <= latest and (
+                        last_id == latest or (pending and pending[0]['id'] == last_id + 1))
+                    if not complete:
+                        last_id = latest
+                        pending = []
+                        yield {'id': latest, 'type': 'sync'}
+
+                for event in pending:
+                    if event['id'] <= last_id:
+                        continue
+                    last_id = event['id']
+                    yield event
+
+                try:
+                    item = listener.get(timeout=keepalive)
+                except queue.Empty:
+                    yield None
+                    pending = []
+                    continue
+                if item is RESYNC:
+                    pending = RESYNC
+                    continue
+                event = json.loads(item)
+                # 中间有事件未收到（订阅重建或本地队列溢出）时从日志补齐
+                pending = RESYNC if event['id'] > last_id + 1 else [event]
+        finally:
+            self._hub.unregister(user_id, listener)
+
+    def get_stats(self) -> Dict:
+        """当前进程的SSE连接数"""
+        return {
+            'enabled': self.redis is not None,
+            'listeners': self._hub.listener_count() if self._hub is not None else 0
+        }
+
+
+# 全局事件流实例
+_event_stream = None
+_event_stream_lock = threading.Lock()
+
+
+def get_task_event_stream(config=None) -> TaskEventStream:
+    """
+    获取全局任务事件流实例(单例模式)
+
+    Args:
+        config: 配置对象（首次创建时读取参数）
+
+    Returns:
+        TaskEventStream实例
+    """
+    global _event_stream
+
+    if _event_stream is None:
+        with _event_stream_lock:
+            if _event_stream is None:
+                if config is None:
+                    from config import get_config
+                    config = get_config()
+                from config import get_redis_client
+                _event_stream = TaskEventStream(
+                    get_redis_client('cache', config),
+                    pubsub_client=get_redis_client('pubsub', config),
+                    log_size=getattr(config, 'PUBLISH_TASK_EVENT_LOG_SIZE', 200)
+                )
+
+    return _event_stream
@@ -9,21 +9,91 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from logger_config import setup_logger, log_service_call
 import uuid
+import time
+import hashlib
 from typing import Dict, List, Optional
-from datetime import datetime
+from datetime import datetime, timedelta
 import redis
 from rq import Queue
 from rq.job import Job
 
+from sqlalchemy import and_, or_, func
+from sqlalchemy.exc import IntegrityError
 from models import PublishTask, get_db_session
 from services.user_rate_limiter import get_rate_limiter
+from services.duplicate_index import get_duplicate_index
+from services.fair_scheduler import get_fair_scheduler
+from services.task_stats_cache import get_task_stats_cache
+from services.task_events import TaskEventStream, get_task_event_stream
+from config import get_config, get_redis_client
 
 logger = setup_logger(__name__)
 
+# 任务状态（统计时没有任务的状态计为0）
+TASK_STATUSES = ('pending', 'queued', 'running', 'success', 'failed', 'cancelled')
+# 尚未结束的任务状态（不允许直接删除）
+ACTIVE_TASK_STATUSES = ('pending', 'queued', 'running')
+
+
+def publish_content_hash(title: str, content: str) -> str:
+    """发布任务的内容哈希（幂等创建）：标题和正文去掉首尾空白、连续空白合并为一个空格后计算SHA-256"""
+    normalized = ' '.join((title or '').split()) + '\n' + ' '.join((content or '').split())
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def parse_schedule_options(data: Dict) -> Dict:
+    """
+    解析请求中的定时发布参数: scheduled_at(ISO时间，带时区时转为本地时间)、priority、spread_minutes
+
+    Args:
+        data: 请求JSON
+
+    Returns:
+        create_publish_task / create_batch_tasks 的关键字参数（未提供的参数不包含）
+
+    Raises:
+        ValueError: 参数格式错误或超出范围
+    """
+    max_days = getattr(get_config(), 'PUBLISH_MAX_SCHEDULE_DAYS', 30)
+    options = {}
+
+    if data.get('scheduled_at'):
+        try:
+            scheduled_at = datetime.fromisoformat(str(data['scheduled_at']).replace('Z', '+00:00'))
+        except ValueError:
+            raise ValueError('scheduled_at 格式错误，应为ISO时间，如 2024-01-01T09:30:00')
+        if scheduled_at.tzinfo is not None:
+            scheduled_at = scheduled_at.astimezone().replace(tzinfo=None)
+        if scheduled_at > datetime.now() + timedelta(days=max_days):
+            raise ValueError(f'定时发布时间不能晚于{max_days}天后')
+        options['scheduled_at'] = scheduled_at
+
+    if data.get('priority') is not None:
+        try:
+            options['priority'] = int(data['priority'])
+        except (TypeError, ValueError):
+            raise ValueError('priority 必须是整数')
+
+    if data.get('spread_minutes') is not None:
+        try:
+            spread_minutes = float(data['spread_minutes'])
+        except (TypeError, ValueError):
+            raise ValueError('spread_minutes 必须是数字')
+        if not 0 <= spread_minutes <= max_days * 24 * 60:
+            raise ValueError(f'spread_minutes 必须在0到{max_days * 24 * 60}之间')
+        options['spread_minutes'] = spread_minutes
+
+    return options
+
 
 class TaskQueueManager:
     """任务队列管理器"""
 
+    # 幂等键: 用户ID, 平台, 内容哈希 -> 任务ID
+    IDEMPOTENCY_KEY = 'publish:idem:{}:{}:{}'
+    # 幂等键被占用超过该秒数仍没有任务记录时，视为占用的请求已失败
+    IDEMPOTENCY_CLAIM_GRACE = 30
+
     def __init__(self, redis_client: redis.Redis = None):
         """
         初始化任务队列管理器
@@ -32,21 +102,26 @@ class TaskQueueManager:
             redis_client: Redis客户端实例
         """
         if redis_client is None:
-            # 使用默认Redis连接
-            self.redis = redis.Redis(
-                host='localhost',
-                port=6379,
-                db=0,
-                decode_responses=False  # RQ需要bytes模式
-            )
+            # 使用共享的队列连接池（RQ需要bytes模式）
+            self.redis = get_redis_client('queue')
         else:
             self.redis = redis_client
 
         # 创建默认队列
         self.default_queue = Queue('default', connection=self.redis)
+        # 内容生成队列（与发布任务分开，避免长耗时的LLM调用阻塞发布）
+        self.generation_queue = Queue('generation', connection=self.redis)
 
         # 获取限流器
         self.rate_limiter = get_rate_limiter()
+        # 近似重复索引
+        self.duplicate_index = get_duplicate_index(get_config())
+        # 按用户公平调度的子队列
+        self.scheduler = get_fair_scheduler(self.redis, get_config())
+        # 用户任务状态统计缓存
+        self.stats_cache = get_task_stats_cache(get_config())
+        # 任务状态事件推送（SSE）
+        self.events = get_task_event_stream(get_config())
 
         logger.info("任务队列管理器初始化完成")
 
@@ -61,9 +136,72 @@ class TaskQueueManager:
             RQ Queue实例
         """
         # 使用default队列，RQ Worker默认监听此队列
-        # 如需用户隔离，可以通过任务参数区分
+        # 用户之间的公平性由公平调度子队列在分发时保证
         return Queue('default', connection=self.redis)
 
+    def enqueue_generation_job(self, user_id: int, kind: str, data: Dict) -> Dict:
+        """
+        提交后台内容生成任务（分析/文章生成），由监听generation队列的Worker执行
+
+        Args:
+            user_id: 用户ID
+            kind: 任务类型 analysis / articles
+            data: 原接口的请求参数
+
+        Returns:
+            {'success': bool, 'job_id': str, 'error': str}
+        """
+        from services.generation_jobs import (
+            get_generation_job_store, execute_analysis_job, execute_article_generation_job
+        )
+
+        funcs = {
+            'analysis': execute_analysis_job,
+            'articles': execute_article_generation_job
+        }
+        if kind not in funcs:
+            return {'success': False, 'error': f'不支持的任务类型: {kind}'}
+
+        job_id = str(uuid.uuid4())
+        try:
+            get_generation_job_store().create(job_id, user_id, kind)
+            self.generation_queue.enqueue(
+                funcs[kind],
+                args=(job_id, user_id, data),
+                job_id=job_id,
+                job_timeout='15m',
+                result_ttl=3600,
+                failure_ttl=86400
+            )
+            logger.info(f"生成任务已提交: {job_id} ({kind}, 用户 {user_id})")
+            return {'success': True, 'job_id': job_id}
+
+        except Exception as e:
+            logger.error(f"提交生成任务失败: {e}", exc_info=True)
+            return {'success': False, 'error': str(e)}
+
+    def find_duplicates(self, article_content: str, platform: str, user_id: int) -> List[Dict]:
+        """
+        查找同平台已发布的近似重复文章（检测失败时不拦截发布）
+
+        其他用户发布的近似内容同样计入，但只返回相似度，不返回对方的标题和ID
+
+        Args:
+            article_content: 文章内容
+            platform: 发布平台
+            user_id: 发布用户ID
+
+        Returns:
+            近似重复的发布记录列表
+        """
+        if self.duplicate_index.mode == 'off':
+            return []
+        try:
+            duplicates = self.duplicate_index.find_similar(article_content, platform=platform)
+            return self.duplicate_index.redact_foreign(duplicates, user_id)
+        except Exception as e:
+            logger.warning(f'近似重复检查失败，跳过: {e}')
+            return []
 
     @log_service_call("创建发布任务")
     def create_publish_task(
@@ -72,7 +210,10 @@ class TaskQueueManager:
         article_title: str,
         article_content: str,
         platform: str = 'zhihu',
-        article_id: Optional[int] = None
+        article_id: Optional[int] = None,
+        allow_duplicate: bool = False,
+        scheduled_at: Optional[datetime] = None,
+        priority: int = 0
     ) -> Dict:
         """
         创建发布任务
@@ -83,6 +224,10 @@ class TaskQueueManager:
             article_content: 文章内容
             platform: 发布平台
             article_id: 文章ID(可选)
+            allow_duplicate: 跳过近似重复检查（用户确认后重新提交）
+            scheduled_at: 定时发布时间（本地时间，为空时立即发布；配置了 PUBLISH_BATCH_INTERVAL 时
+                会排在该用户同平台已排期任务之后）
+            priority: 优先级，大于0的任务插到队首且不自动错开
 
         Returns:
             任务信息字典
@@ -90,187 +235,509 @@ class TaskQueueManager:
         logger.info(f'[发布流程-队列] 创建发布任务: user={user_id}, title={article_title[:30]}, platform={platform}')
 
         try:
-            # 1. 检查限流
-            logger.debug(f'[发布流程-队列] 检查用户 {user_id} 的限流状态')
-            if not self.rate_limiter.acquire(user_id):
-                stats = self.rate_limiter.get_user_stats(user_id)
-                logger.warning(f'[发布流程-队列] 用户 {user_id} 触发限流: {stats}')
-                return {
+            return self._create_publish_tasks(user_id, [{
+                'title': article_title,
+                'content': article_content,
+                'article_id': article_id,
+                'allow_duplicate': allow_duplicate
+            }], platform, scheduled_at=scheduled_at, priority=priority)[0]
+
+        except Exception as e:
+            logger.error(f"创建任务失败: {e}", exc_info=True)
+            return {
+                'success': False,
+                'error': '创建任务失败',
+                'message': str(e)
+            }
+
+    @log_service_call("批量创建任务")
+    def create_batch_tasks(
+        self,
+        user_id: int,
+        articles: List[Dict],
+        platform: str = 'zhihu',
+        allow_duplicate: bool = False,
+        scheduled_at: Optional[datetime] = None,
+        priority: int = 0,
+        spread_minutes: Optional[float] = None
+    ) -> Dict:
+        """
+        批量创建发布任务（一次限流预留、一次数据库事务、一次Redis管道入队）
+
+        Args:
+            user_id: 用户ID
+            articles: 文章列表 [{'title': '', 'content': '', 'article_id': 1}, ...]
+            platform: 发布平台
+            allow_duplicate: 跳过近似重复检查
+            scheduled_at: 第一篇的发布时间（本地时间，为空时从现在开始）
+            priority: 优先级，大于0的任务插到队首
+            spread_minutes: 把这批任务均匀分布在从 scheduled_at 开始的这段时间(分钟)内发布；
+                不指定时按 PUBLISH_BATCH_INTERVAL 自动错开
+
+        Returns:
+            批量创建结果
+        """
+        logger.info(f'[发布流程-队列] 批量创建发布任务: user={user_id}, count={len(articles)}, platform={platform}')
+
+        try:
+            task_results = self._create_publish_tasks(user_id, [
+                dict(article, allow_duplicate=allow_duplicate or bool(article.get('allow_duplicate')))
+                for article in articles
+            ], platform, scheduled_at=scheduled_at, priority=priority, spread_minutes=spread_minutes)
+        except Exception as e:
+            logger.error(f"批量创建任务失败: {e}", exc_info=True)
+            task_results = [{
+                'success': False,
+                'error': '创建任务失败',
+                'message': str(e)
+            } for _ in articles]
+
+        success_count = sum(1 for result in task_results if result['success'])
+        failed_count = len(task_results) - success_count
+
+        return {
+            'success': failed_count == 0,
+            'total': len(articles),
+            'success_count': success_count,
+            'failed_count': failed_count,
+            'results': [{
+                'article_title': article.get('title', '')[:50],
+                'result': result
+            } for article, result in zip(articles, task_results)]
+        }
+
+    def _create_publish_tasks(self, user_id: int, articles: List[Dict], platform: str,
+                              scheduled_at: Optional[datetime] = None, priority: int = 0,
+                              spread_minutes: Optional[float] = None) -> List[Dict]:
+        """
+        创建一组发布任务，返回与articles一一对应的结果
+
+        流程: 幂等检查 -> 近似重复检查 -> 计算发布时间 -> 一次预留N个限流名额 -> 一次事务批量插入任务记录 ->
+        到期的任务进入公平调度子队列(或一次管道直接入RQ队列)，未到期的进入定时索引。
+        超出限流名额的文章返回限流错误，与逐个创建时的结果一致；相同内容的重复提交返回已有任务
+
+        Args:
+            user_id: 用户ID
+            articles: [{'title', 'content', 'article_id', 'allow_duplicate'}, ...]
+            platform: 发布平台
+            scheduled_at: 定时发布时间
+            priority: 优先级
+            spread_minutes: 分布发布的时间窗口(分钟)
+
+        Returns:
+            每篇文章的任务结果
+        """
+        results: List[Optional[Dict]] = [None] * len(articles)
+
+        # 1. 幂等检查：相同内容的任务仍在进行中或刚发布成功时返回已有任务，同一批中相同内容只创建一次
+        hashes = [publish_content_hash(article.get('title', ''), article.get('content', '')) for article in articles]
+        first_index = {}
+        for index, content_hash in enumerate(hashes):
+            first_index.setdefault(content_hash, index)
+        task_ids = {content_hash: str(uuid.uuid4()) for content_hash in first_index}
+        existing, claimed = self._claim_idempotency(user_id, platform, task_ids)
+        for content_hash, task in existing.items():
+            logger.info(f'[发布流程-队列] 相同内容的任务已存在, 返回已有任务: {task["task_id"]}')
+            results[first_index[content_hash]] = self._existing_task_result(task)
+
+        try:
+            self._create_new_tasks(user_id, articles, platform, results, [
+                index for index in first_index.values() if results[index] is None
+            ], hashes, task_ids, scheduled_at, priority, spread_minutes)
+        except Exception:
+            self._release_idempotency(user_id, platform, claimed)
+            raise
+
+        # 同一批中重复的文章返回同一个任务
+        for index, content_hash in enumerate(hashes):
+            first = results[first_index[content_hash]]
+            if index != first_index[content_hash]:
+                results[index] = self._existing_task_result(first) if first['success'] else first
+
+        # 没有创建成功的内容释放幂等键，允许重新提交
+        self._release_idempotency(user_id, platform, [
+            content_hash for content_hash in claimed
+            if results[first_index[content_hash]].get('task_id') != task_ids[content_hash]
+            or not results[first_index[content_hash]]['success']
+        ])
+        return results
+
+    def _create_new_tasks(self, user_id: int, articles: List[Dict], platform: str, results: List[Optional[Dict]],
+                          indexes: List[int], hashes: List[str], task_ids: Dict[str, str],
+                          scheduled_at: Optional[datetime], priority: int, spread_minutes: Optional[float]):
+        """
+        创建幂等检查后需要新建的任务，结果写入results
+
+        Args:
+            indexes: 需要新建任务的文章下标
+            hashes: 每篇文章的内容哈希
+            task_ids: 内容哈希 -> 新任务ID
+        """
+        # 2. 近似重复检查（在限流前进行，被拒绝的任务不占用限流名额）
+        for index in indexes:
+            article = articles[index]
+            if article.get('allow_duplicate'):
+                continue
+            duplicates = self.find_duplicates(article.get('content', ''), platform, user_id)
+            if duplicates:
+                logger.warning(f'[发布流程-队列] 内容与已发布文章近似重复: {duplicates[0]}')
+                if self.duplicate_index.mode == 'block':
+                    closest = duplicates[0]
+                    source = f'《{closest["title"]}》' if closest['own'] else '其他用户已发布的文章'
+                    results[index] = {
+                        'success': False,
+                        'error': '内容与已发布文章高度相似',
+                        'message': f'与{source}相似度 {closest["similarity"]:.0%}，确认发布请设置 allow_duplicate',
+                        'duplicates': duplicates
+                    }
+        pending = [index for index in indexes if results[index] is None]
+        if not pending:
+            return
+
+        # 3. 计算发布时间（递增），前due_count个任务立即发布
+        publish_times = self._plan_publish_times(user_id, platform, len(pending), scheduled_at, priority,
+                                                 spread_minutes)
+        now = datetime.now()
+        due_count = sum(1 for publish_time in publish_times if publish_time is None or publish_time <= now)
+
+        # 4. 一次预留限流名额（公平调度时并发上限在分发时控制，这里只检查速率；
+        #    定时任务到期入RQ队列时才占用并发名额）
+        fair = self.scheduler.enabled
+        logger.debug(f'[发布流程-队列] 检查用户 {user_id} 的限流状态, 申请 {len(pending)} 个名额')
+        granted = self.rate_limiter.acquire_many(user_id, due_count, check_concurrency=not fair)
+        if granted == due_count and len(pending) > due_count:
+            granted += self.rate_limiter.acquire_many(user_id, len(pending) - due_count, check_concurrency=False)
+        if granted < len(pending):
+            stats = self.rate_limiter.get_user_stats(user_id)
+            logger.warning(f'[发布流程-队列] 用户 {user_id} 触发限流: {stats}')
+            for index in pending[granted:]:
+                results[index] = {
                     'success': False,
                     'error': '超过限流限制',
-                    'message': f'当前并发任务: {stats["concurrent_tasks"]}/{stats["max_concurrent_tasks"]}, '
-                              f'最近1分钟任务数: {stats["tasks_in_last_minute"]}/{stats["max_tasks_per_minute"]}',
+                    'message': f'当前并发任务: {stats.get("concurrent_tasks")}/{stats.get("max_concurrent_tasks")}, '
+                               f'最近1分钟任务数: {stats.get("tasks_in_last_minute")}/{stats.get("max_tasks_per_minute")}',
                     'stats': stats
                 }
+            pending = pending[:granted]
+        if not pending:
+            return
+        due_count = min(due_count, len(pending))
+        reserved = 0 if fair else due_count
+
+        # 5. 一次事务批量插入任务记录
+        rows = [{
+            'task_id': task_ids[hashes[index]],
+            'content_hash': hashes[index],
+            'user_id': user_id,
+            'article_id': articles[index].get('article_id'),
+            'article_title': articles[index].get('title', ''),
+            'article_content': articles[index].get('content', ''),
+            'platform': platform,
+            'status': 'queued',
+            'scheduled_at': publish_time,
+            'priority': priority
+        } for index, publish_time in zip(pending, publish_times)]
+
+        db = get_db_session()
+        try:
+            weight = self._get_user_weight(db, user_id) if fair else 1
+            try:
+                db.execute(PublishTask.__table__.insert(), rows)
+            except IntegrityError:
+                # 并发的相同请求已创建了任务（Redis不可用时只有唯一索引把关）：返回已有任务，其余重新插入
+                db.rollback()
+                active = self._find_active_tasks(db, user_id, platform, [row['content_hash'] for row in rows])
+                kept = [position for position, row in enumerate(rows) if row['content_hash'] not in active]
+                for position, row in enumerate(rows):
+                    if row['content_hash'] in active:
+                        results[pending[position]] = self._existing_task_result(active[row['content_hash']])
+                removed_due = sum(1 for position in range(due_count) if position not in kept)
+                due_count -= removed_due
+                if not fair:
+                    self.rate_limiter.release_many(user_id, removed_due)
+                    reserved = due_count
+                pending = [pending[position] for position in kept]
+                rows = [rows[position] for position in kept]
+                if not rows:
+                    return
+                db.execute(PublishTask.__table__.insert(), rows)
+            ids = dict(db.query(PublishTask.task_id, PublishTask.id).filter(
+                PublishTask.task_id.in_([row['task_id'] for row in rows])
+            ).all())
+            db.commit()
+            self.stats_cache.invalidate([user_id])
+            self.events.publish(user_id, [TaskEventStream.task_event(row['task_id'], 'queued') for row in rows])
+            tasks = [{
+                'task_id': row['task_id'],
+                'task_db_id': ids[row['task_id']],
+                'priority': priority,
+                'scheduled_at': row['scheduled_at'].timestamp() if row['scheduled_at'] else None
+            } for row in rows]
+            logger.info(f'[发布流程-队列] 数据库记录创建成功: {len(tasks)} 个任务')
 
-            logger.debug(f'[发布流程-队列] 限流检查通过，开始创建任务')
+        except Exception as e:
+            db.rollback()
+            logger.error(f"[发布流程-队列] 创建任务数据库记录失败: {e}", exc_info=True)
+            # 释放限流令牌
+            self.rate_limiter.release_many(user_id, reserved)
+            for index in pending:
+                results[index] = {
+                    'success': False,
+                    'error': '创建任务失败',
+                    'message': str(e)
+                }
+            return
+        finally:
+            db.close()
+
+        # 6. 入队：未到期的任务进入定时索引；到期的任务在公平调度时进入用户子队列并触发分发，否则一次管道直接入RQ队列
+        due_tasks, later_tasks = tasks[:due_count], tasks[due_count:]
+        try:
+            if later_tasks:
+                self.scheduler.schedule(user_id, later_tasks, weight)
+            if due_tasks and fair:
+                self.scheduler.submit(user_id, due_tasks, weight)
+            elif due_tasks:
+                self._enqueue_jobs(due_tasks)
+            logger.info(f"[发布流程-队列] {len(tasks)} 个任务已入队 (定时 {len(later_tasks)} 个), "
+                        f"user={user_id}, fair={fair}")
 
-            # 2. 生成任务ID
-            task_id = str(uuid.uuid4())
-            logger.info(f'[发布流程-队列] 生成任务ID: {task_id}')
+        except Exception as e:
+            logger.error(f"[发布流程-队列] 创建RQ任务失败: {e}", exc_info=True)
+            for task in later_tasks:
+                try:
+                    self.scheduler.unschedule(task['task_id'])
+                except Exception:
+                    pass
 
-            # 3. 创建数据库记录
-            logger.debug(f'[发布流程-队列] 创建任务数据库记录')
+            # 更新数据库状态为失败
             db = get_db_session()
             try:
-                db_task = PublishTask(
-                    task_id=task_id,
-                    user_id=user_id,
-                    article_id=article_id,
-                    article_title=article_title,
-                    article_content=article_content,
-                    platform=platform,
-                    status='pending'
-                )
-                db.add(db_task)
+                db.query(PublishTask).filter(
+                    PublishTask.task_id.in_([task['task_id'] for task in tasks])
+                ).update({
+                    'status': 'failed',
+                    'error_message': f"入队失败: {str(e)}"
+                }, synchronize_session=False)
                 db.commit()
-                db.refresh(db_task)
+                self.stats_cache.invalidate([user_id])
+                self.events.publish(user_id, [
+                    TaskEventStream.task_event(task['task_id'], 'failed', error_message=f"入队失败: {str(e)}")
+                    for task in tasks
+                ])
+                logger.warning(f'[发布流程-队列] 任务状态更新为 failed')
+            except Exception as update_error:
+                db.rollback()
+                logger.error(f"[发布流程-队列] 更新任务状态失败: {update_error}")
+            finally:
+                db.close()
 
-                task_db_id = db_task.id
-                logger.info(f'[发布流程-队列] 数据库记录创建成功: DB_ID={task_db_id}, TaskID={task_id}')
+            # 释放限流令牌
+            self.rate_limiter.release_many(user_id, reserved)
 
-            except Exception as e:
-                db.rollback()
-                logger.error(f"[发布流程-队列] 创建任务数据库记录失败: {e}", exc_info=True)
-                # 释放限流令牌
-                self.rate_limiter.release(user_id)
-                return {
+            for index in pending:
+                results[index] = {
                     'success': False,
-                    'error': '创建任务失败',
+                    'error': '任务入队失败',
                     'message': str(e)
                 }
-            finally:
-                db.close()
+            return
 
-            # 4. 创建RQ任务
-            try:
-                queue = self.get_user_queue(user_id)
-                logger.info(f'[发布流程-队列] 准备将任务加入队列: {queue.name}')
-
-                # 导入worker函数
-                from services.publish_worker import execute_publish_task
-
-                job = queue.enqueue(
-                    execute_publish_task,
-                    task_db_id=task_db_id,
-                    job_id=task_id,
-                    job_timeout='10m',  # 任务超时时间10分钟
-                    result_ttl=3600,  # 结果保留1小时
-                    failure_ttl=86400  # 失败记录保留24小时
-                )
+        if fair and due_tasks:
+            self.dispatch_pending()
 
-                logger.info(f'[发布流程-队列] RQ任务已入队: job_id={job.id}, queue={queue.name}')
+        for index, row in zip(pending, rows):
+            results[index] = {
+                'success': True,
+                'task_id': row['task_id'],
+                'status': 'queued',
+                'message': '任务已创建并入队'
+            }
+            if row['scheduled_at'] and row['scheduled_at'] > now:
+                results[index]['scheduled_at'] = row['scheduled_at'].isoformat()
+                results[index]['message'] = f"任务已创建，将于 {row['scheduled_at']:%Y-%m-%d %H:%M:%S} 发布"
 
-                # 5. 更新任务状态为已入队
-                db = get_db_session()
-                try:
-                    db_task = db.query(PublishTask).filter(
-                        PublishTask.id == task_db_id
-                    ).first()
-
-                    if db_task:
-                        db_task.status = 'queued'
-                        db.commit()
-                        logger.debug(f'[发布流程-队列] 任务状态更新为 queued')
-                except Exception as e:
-                    logger.error(f"[发布流程-队列] 更新任务状态失败: {e}")
-                    db.rollback()
-                finally:
-                    db.close()
+    def _claim_idempotency(self, user_id: int, platform: str, task_ids: Dict[str, str]):
+        """
+        幂等检查：相同内容的任务仍在进行中、或在 PUBLISH_IDEMPOTENCY_TTL 内发布成功时返回已有任务；
+        其余内容用 SET NX 占用幂等键（值为新任务ID），并发的相同请求只有一个能创建。
+        Redis不可用时只做数据库检查，由未结束任务的唯一索引兜底
 
-                logger.info(f"[发布流程-队列] 任务创建成功: {task_id}, user={user_id}, queue={queue.name}")
+        Args:
+            user_id: 用户ID
+            platform: 发布平台
+            task_ids: 内容哈希 -> 新任务ID
 
-                return {
-                    'success': True,
-                    'task_id': task_id,
-                    'status': 'queued',
-                    'message': '任务已创建并入队'
-                }
+        Returns:
+            ({内容哈希: {'task_id', 'status'}} 已有任务, [占用了幂等键的内容哈希])
+        """
+        ttl = getattr(get_config(), 'PUBLISH_IDEMPOTENCY_TTL', 600)
+        db = get_db_session()
+        try:
+            existing = {}
+            for row in db.query(PublishTask.content_hash, PublishTask.task_id, PublishTask.status).filter(
+                PublishTask.user_id == user_id,
+                PublishTask.platform == platform,
+                PublishTask.content_hash.in_(list(task_ids)),
+                or_(PublishTask.status.in_(ACTIVE_TASK_STATUSES),
+                    and_(PublishTask.status == 'success',
+                         PublishTask.completed_at >= datetime.now() - timedelta(seconds=ttl)))
+            ).all():
+                existing.setdefault(row.content_hash, {'task_id': row.task_id, 'status': row.status})
+            remaining = [content_hash for content_hash in task_ids if content_hash not in existing]
+            if not remaining:
+                return existing, []
+
+            try:
+                keys = {content_hash: self.IDEMPOTENCY_KEY.format(user_id, platform, content_hash)
+                        for content_hash in remaining}
+                pipe = self.redis.pipeline(transaction=False)
+                for content_hash in remaining:
+                    pipe.set(keys[content_hash], task_ids[content_hash], nx=True, ex=ttl)
+                acquired = pipe.execute()
+                claimed = [content_hash for content_hash, ok in zip(remaining, acquired) if ok]
+                contested = [content_hash for content_hash, ok in zip(remaining, acquired) if not ok]
+                if not contested:
+                    return existing, claimed
+
+                # 幂等键已被占用：占用的任务已结束（失败/取消），或占用后迟迟没有任务记录（请求失败）时接管
+                pipe = self.redis.pipeline(transaction=False)
+                for content_hash in contested:
+                    pipe.get(keys[content_hash])
+                    pipe.ttl(keys[content_hash])
+                values = pipe.execute()
+                holders = {content_hash: ((values[i * 2] or b'').decode(), values[i * 2 + 1])
+                           for i, content_hash in enumerate(contested)}
+                statuses = dict(db.query(PublishTask.task_id, PublishTask.status).filter(
+                    PublishTask.task_id.in_([holder for holder, _ in holders.values()])
+                ).all())
+                takeover = []
+                for content_hash, (holder, remaining_ttl) in holders.items():
+                    status = statuses.get(holder)
+                    if status in ('failed', 'cancelled') or not holder or (
+                            status is None and ttl - remaining_ttl > self.IDEMPOTENCY_CLAIM_GRACE):
+                        takeover.append(content_hash)
+                    else:
+                        existing[content_hash] = {'task_id': holder, 'status': status or 'queued'}
+                if takeover:
+                    pipe = self.redis.pipeline(transaction=False)
+                    for content_hash in takeover:
+                        pipe.set(keys[content_hash], task_ids[content_hash], ex=ttl)
+                    pipe.execute()
+                return existing, claimed + takeover
 
             except Exception as e:
-                logger.error(f"[发布流程-队列] 创建RQ任务失败: {e}", exc_info=True)
+                logger.warning(f'[发布流程-队列] 幂等键检查失败，只依赖数据库唯一索引: {e}')
+                return existing, []
+        finally:
+            db.close()
+
+    def _release_idempotency(self, user_id: int, platform: str, content_hashes: List[str]):
+        """释放没有创建成功的内容的幂等键"""
+        if not content_hashes:
+            return
+        try:
+            self.redis.delete(*[self.IDEMPOTENCY_KEY.format(user_id, platform, content_hash)
+                                for content_hash in content_hashes])
+        except Exception as e:
+            logger.warning(f'[发布流程-队列] 释放幂等键失败: {e}')
+
+    @staticmethod
+    def _find_active_tasks(db, user_id: int, platform: str, content_hashes: List[str]) -> Dict[str, Dict]:
+        """按内容哈希查找未结束的任务 {内容哈希: {'task_id', 'status'}}"""
+        return {row.content_hash: {'task_id': row.task_id, 'status': row.status}
+                for row in db.query(PublishTask.content_hash, PublishTask.task_id, PublishTask.status).filter(
+                    PublishTask.user_id == user_id,
+                    PublishTask.platform == platform,
+                    PublishTask.status.in_(ACTIVE_TASK_STATUSES),
+                    PublishTask.content_hash.in_(content_hashes)
+                ).all()}
+
+    @staticmethod
+    def _existing_task_result(task: Dict) -> Dict:
+        """重复提交时返回的已有任务"""
+        return {
+            'success': True,
+            'task_id': task['task_id'],
+            'status': task['status'],
+            'duplicate_request': True,
+            'message': '相同内容的任务已提交，返回已有任务'
+        }
+
+    def _plan_publish_times(self, user_id: int, platform: str, count: int, scheduled_at: Optional[datetime],
+                            priority: int, spread_minutes: Optional[float]) -> List[Optional[datetime]]:
+        """
+        计算一组任务的发布时间（递增）
 
-                # 更新数据库状态为失败
+        - 指定 spread_minutes 时，第一篇在 scheduled_at（默认现在）发布，其余均匀分布到窗口结束
+        - 否则配置了 PUBLISH_BATCH_INTERVAL 且不是优先任务时，按间隔错开，并排在该用户同平台已排期任务之后
+        - 否则都在 scheduled_at 发布；未指定时间的立即发布（发布时间为None）
+
+        Args:
+            user_id: 用户ID
+            platform: 发布平台
+            count: 任务数
+            scheduled_at: 定时发布时间
+            priority: 优先级
+            spread_minutes: 分布发布的时间窗口(分钟)
+
+        Returns:
+            每个任务的发布时间
+        """
+        now = datetime.now()
+        start = max(scheduled_at, now) if scheduled_at else now
+        if spread_minutes:
+            interval = spread_minutes * 60 / (count - 1) if count > 1 else 0
+        else:
+            interval = getattr(get_config(), 'PUBLISH_BATCH_INTERVAL', 0) if priority <= 0 else 0
+            if interval:
                 db = get_db_session()
                 try:
-                    db_task = db.query(PublishTask).filter(
-                        PublishTask.id == task_db_id
-                    ).first()
-                    if db_task:
-                        db_task.status = 'failed'
-                        db_task.error_message = f"入队失败: {str(e)}"
-                        db.commit()
-                        logger.warning(f'[发布流程-队列] 任务状态更新为 failed')
+                    last = db.query(func.max(PublishTask.scheduled_at)).filter(
+                        PublishTask.user_id == user_id,
+                        PublishTask.platform == platform,
+                        PublishTask.status.in_(ACTIVE_TASK_STATUSES)
+                    ).scalar()
                 finally:
                     db.close()
+                if last:
+                    start = max(start, last + timedelta(seconds=interval))
 
-                # 释放限流令牌
-                self.rate_limiter.release(user_id)
-
-                return {
-                    'success': False,
-                    'error': '任务入队失败',
-                    'message': str(e)
-                }
-
-        except Exception as e:
-            logger.error(f"创建任务失败: {e}", exc_info=True)
-            return {
-                'success': False,
-                'error': '创建任务失败',
-                'message': str(e)
-            }
-
+        if not interval and start == now:
+            return [None] * count
+        return [start + timedelta(seconds=interval * index) for index in range(count)]
 
-    @log_service_call("批量创建任务")
-    def create_batch_tasks(
-        self,
-        user_id: int,
-        articles: List[Dict],
-        platform: str = 'zhihu'
-    ) -> Dict:
+    def _enqueue_jobs(self, tasks: List[Dict]):
         """
-        批量创建发布任务
+        通过一次Redis管道把任务直接加入RQ队列（未启用公平调度时），优先任务放在队首
 
         Args:
-            user_id: 用户ID
-            articles: 文章列表 [{'title': '', 'content': '', 'article_id': 1}, ...]
-            platform: 发布平台
-
-        Returns:
-            批量创建结果
+            tasks: [{'task_id': str, 'task_db_id': int, 'priority': int(可选)}, ...]
         """
-        results = []
-        success_count = 0
-        failed_count = 0
-
-        for article in articles:
-            result = self.create_publish_task(
-                user_id=user_id,
-                article_title=article.get('title', ''),
-                article_content=article.get('content', ''),
-                platform=platform,
-                article_id=article.get('article_id')
-            )
+        queue = self.get_user_queue(None)
+        pipe = self.redis.pipeline()
+        queue.enqueue_many(self.scheduler.prepare_jobs(tasks), pipeline=pipe)
+        pipe.execute()
 
-            if result['success']:
-                success_count += 1
-            else:
-                failed_count += 1
+    def _get_user_weight(self, db, user_id: int) -> float:
+        """按用户角色获取公平调度权重"""
+        from models import User
 
-            results.append({
-                'article_title': article.get('title', '')[:50],
-                'result': result
-            })
+        row = db.query(User.role).filter(User.id == user_id).first()
+        return self.scheduler.weight_for_role(row[0] if row else None)
 
-        return {
-            'success': failed_count == 0,
-            'total': len(articles),
-            'success_count': success_count,
-            'failed_count': failed_count,
-            'results': results
-        }
+    def dispatch_pending(self) -> Dict:
+        """
+        释放到期的定时任务，并把公平调度子队列中的任务分发到RQ队列（出错时不影响调用方）
 
+        Returns:
+            {'success': bool, 'dispatched': int, 'error': str}
+        """
+        try:
+            return self.scheduler.dispatch()
+        except Exception as e:
+            logger.error(f"分发发布任务失败: {e}", exc_info=True)
+            return {'success': False, 'dispatched': 0, 'error': str(e)}
 
     @log_service_call("查询任务状态")
     def get_task_status(self, task_id: str) -> Optional[Dict]:
@@ -307,7 +774,8 @@ class TaskQueueManager:
         user_id: int,
         status: Optional[str] = None,
         limit: int = 20,
-        offset: int = 0
+        offset: int = 0,
+        cursor: Optional[str] = None
     ) -> Dict:
         """
         获取用户的任务列表
@@ -316,10 +784,11 @@ class TaskQueueManager:
             user_id: 用户ID
             status: 任务状态过滤
             limit: 返回数量限制
-            offset: 偏移量
+            offset: 偏移量（未提供cursor时使用，兼容旧接口）
+            cursor: 翻页游标（上一页返回的next_cursor），按 id 倒序定位（id随创建递增，与创建时间顺序一致）
 
         Returns:
-            任务列表和统计信息
+            任务列表、统计信息和下一页游标
         """
         try:
             db = get_db_session()
@@ -331,43 +800,34 @@ class TaskQueueManager:
                 if status:
                     query = query.filter(PublishTask.status == status)
 
-                # 统计总数
-                total = query.count()
-
-                # 获取任务列表
-                tasks = query.order_by(
-                    PublishTask.created_at.desc()
-                ).limit(limit).offset(offset).all()
-
-                # 统计各状态任务数
-                stats = {
-                    'pending': db.query(PublishTask).filter(
-                        PublishTask.user_id == user_id,
-                        PublishTask.status == 'pending'
-                    ).count(),
-                    'queued': db.query(PublishTask).filter(
-                        PublishTask.user_id == user_id,
-                        PublishTask.status == 'queued'
-                    ).count(),
-                    'running': db.query(PublishTask).filter(
-                        PublishTask.user_id == user_id,
-                        PublishTask.status == 'running'
-                    ).count(),
-                    'success': db.query(PublishTask).filter(
-                        PublishTask.user_id == user_id,
-                        PublishTask.status == 'success'
-                    ).count(),
-                    'failed': db.query(PublishTask).filter(
-                        PublishTask.user_id == user_id,
-                        PublishTask.status == 'failed'
-                    ).count(),
-                }
+                if cursor:
+                    try:
+                        task_db_id = self._decode_cursor(cursor)
+                    except ValueError:
+                        return {
+                            'success': False,
+                            'error': f'无效的翻页游标: {cursor}'
+                        }
+                    # 只按id定位：created_at 由数据库默认值写入，精度只到秒，同一秒内的任务无法用它区分
+                    query = query.filter(PublishTask.id < task_db_id)
+                elif offset:
+                    query = query.offset(offset)
+
+                # 多取一条判断是否还有下一页
+                tasks = query.order_by(PublishTask.id.desc()).limit(limit + 1).all()
+                has_more = len(tasks) > limit
+                tasks = tasks[:limit]
+
+                # 各状态任务数（一次GROUP BY，短时缓存）
+                stats = self.get_user_task_stats(user_id, db)
+                total = stats.get(status, 0) if status else sum(stats.values())
 
                 return {
                     'success': True,
                     'total': total,
                     'tasks': [task.to_dict() for task in tasks],
-                    'stats': stats
+                    'stats': stats,
+                    'next_cursor': self._encode_cursor(tasks[-1]) if has_more else None
                 }
 
             finally:
@@ -380,6 +840,48 @@ class TaskQueueManager:
                 'error': str(e)
             }
 
+    def get_user_task_stats(self, user_id: int, db=None) -> Dict:
+        """
+        获取用户各状态的任务数（状态变化时缓存失效）
+
+        Args:
+            user_id: 用户ID
+            db: 数据库会话（可选，未提供时自行创建）
+
+        Returns:
+            {'pending': n, 'queued': n, 'running': n, 'success': n, 'failed': n, 'cancelled': n}
+        """
+        stats, gen = self.stats_cache.get(user_id)
+        if stats is not None:
+            return stats
+
+        session = db or get_db_session()
+        try:
+            stats = dict.fromkeys(TASK_STATUSES, 0)
+            stats.update(session.query(
+                PublishTask.status, func.count()
+            ).filter(
+                PublishTask.user_id == user_id
+            ).group_by(PublishTask.status).all())
+        finally:
+            if db is None:
+                session.close()
+
+        self.stats_cache.set(user_id, stats, gen)
+        return stats
+
+    @staticmethod
+    def _encode_cursor(task: PublishTask) -> str:
+        """生成翻页游标"""
+        return str(task.id)
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> int:
+        """解析翻页游标（任务数据库ID），格式错误时抛出ValueError"""
+        task_db_id = int(cursor)
+        if task_db_id <= 0:
+            raise ValueError(cursor)
+        return task_db_id
 
     @log_service_call("取消任务")
     def cancel_task(self, task_id: str, user_id: int) -> Dict:
@@ -414,20 +916,38 @@ class TaskQueueManager:
                         'error': f'任务状态为{task.status}，无法取消'
                     }
 
+                # 还在定时索引或公平调度子队列中的任务直接移除，未占用在途名额
+                in_sub_queue = False
+                if task.scheduled_at:
+                    try:
+                        in_sub_queue = self.scheduler.unschedule(task_id)
+                    except Exception as e:
+                        logger.warning(f"从定时索引移除任务失败: {e}")
+                if self.scheduler.enabled and not in_sub_queue:
+                    try:
+                        in_sub_queue = self.scheduler.remove(user_id, task_id)
+                    except Exception as e:
+                        logger.warning(f"从调度子队列移除任务失败: {e}")
+
                 # 尝试取消RQ任务
-                try:
-                    job = Job.fetch(task_id, connection=self.redis)
-                    job.cancel()
-                except Exception as e:
-                    logger.warning(f"取消RQ任务失败: {e}")
+                if not in_sub_queue:
+                    try:
+                        job = Job.fetch(task_id, connection=self.redis)
+                        job.cancel()
+                    except Exception as e:
+                        logger.warning(f"取消RQ任务失败: {e}")
 
                 # 更新数据库状态
                 task.status = 'cancelled'
                 task.completed_at = datetime.now()
                 db.commit()
+                self.stats_cache.invalidate([user_id])
+                self.events.publish(user_id, [TaskEventStream.task_event(task_id, 'cancelled')])
 
-                # 释放限流令牌
-                self.rate_limiter.release(user_id)
+                # 释放限流令牌，空出的在途名额分发给排队的任务
+                if not in_sub_queue:
+                    self.rate_limiter.release(user_id)
+                    self.dispatch_pending()
 
                 logger.info(f"任务已取消: {task_id}")
 
@@ -446,7 +966,6 @@ class TaskQueueManager:
                 'error': str(e)
             }
 
-
     @log_service_call("重试任务")
     def retry_task(self, task_id: str, user_id: int) -> Dict:
         """
@@ -491,21 +1010,30 @@ class TaskQueueManager:
                 task.retry_count += 1
                 task.status = 'pending'
                 task.error_message = None
-                db.commit()
-
-                # 重新入队
-                queue = self.get_user_queue(user_id)
-                from services.publish_worker import execute_publish_task
+                try:
+                    db.commit()
+                except IntegrityError:
+                    # 相同内容的新任务正在进行中（未结束任务的内容唯一索引）
+                    db.rollback()
+                    return {
+                        'success': False,
+                        'error': '相同内容的任务正在进行中，无法重试'
+                    }
 
-                job = queue.enqueue(
-                    execute_publish_task,
-                    task_db_id=task.id,
-                    job_id=task_id,
-                    job_timeout='10m'
-                )
+                # 重新入队（立即发布，保留优先级）
+                queued_task = {'task_id': task_id, 'task_db_id': task.id, 'priority': task.priority or 0}
+                if self.scheduler.enabled:
+                    self.scheduler.submit(user_id, [queued_task], self._get_user_weight(db, user_id))
+                else:
+                    self._enqueue_jobs([queued_task])
 
                 task.status = 'queued'
                 db.commit()
+                self.stats_cache.invalidate([user_id])
+                self.events.publish(user_id, [TaskEventStream.task_event(task_id, 'queued')])
+
+                if self.scheduler.enabled:
+                    self.dispatch_pending()
 
                 logger.info(f"任务重试: {task_id}, 第{task.retry_count}次")
 
@@ -538,11 +1066,14 @@ class TaskQueueManager:
                     'count': len(self.default_queue),
                     'failed_count': self.default_queue.failed_job_registry.count
                 },
-                'user_queues': []
+                'fair_scheduling': self.scheduler.enabled,
+                'max_in_flight_per_user': self.scheduler.max_in_flight,
+                # 各用户子队列的排队数、在途数、最早任务已等待时间和平均等待时间
+                'user_queues': self.scheduler.get_user_queue_stats(),
+                # 尚未到发布时间的定时任务
+                'scheduled_tasks': self.scheduler.get_scheduled_stats()
             }
 
-            # 获取所有用户队列
-            # 这里简化处理，实际可以扫描Redis获取所有队列
             return stats
 
         except Exception as e:
@@ -551,6 +1082,9 @@ class TaskQueueManager:
                 'error': str(e)
             }
 
+    # 批量删除时每批的任务数（同时受SQLite单条语句参数个数限制）
+    DELETE_BATCH_SIZE = 500
+
     def clear_tasks(
         self,
         user_id: int,
@@ -558,7 +1092,7 @@ class TaskQueueManager:
         status_filter: Optional[List[str]] = None
     ) -> Dict:
         """
-        清理任务（批量删除）
+        清理任务（分批删除：每批一条DELETE，对应的RQ任务数据用一次管道删除）
 
         Args:
             user_id: 用户ID（用于权限验证）
@@ -568,187 +1102,298 @@ class TaskQueueManager:
         Returns:
             清理结果
         """
+        if not task_ids and not status_filter:
+            return {
+                'success': False,
+                'error': '必须指定task_ids或status_filter参数'
+            }
+
         try:
-            db = get_db_session()
-            try:
-                deleted_count = 0
-                failed_count = 0
-                errors = []
+            # 情况1: 清理指定的任务ID列表
+            if task_ids:
+                result = self._delete_listed_tasks(user_id, task_ids)
+            # 情况2: 根据状态过滤批量清理
+            else:
+                result = self._delete_matching_tasks(
+                    [PublishTask.user_id == user_id],
+                    PublishTask.status.in_(status_filter)
+                )
 
-                # 情况1: 清理指定的任务ID列表
-                if task_ids:
-                    for task_id in task_ids:
-                        try:
-                            task = db.query(PublishTask).filter(
-                                PublishTask.task_id == task_id,
-                                PublishTask.user_id == user_id
-                            ).first()
-
-                            if not task:
-                                errors.append(f"任务 {task_id} 不存在或无权限")
-                                failed_count += 1
-                                continue
-
-                            # 不允许删除正在运行的任务
-                            if task.status in ['pending', 'queued', 'running']:
-                                errors.append(f"任务 {task_id} 状态为 {task.status}，无法删除，请先取消")
-                                failed_count += 1
-                                continue
-
-                            # 尝试从Redis中清理RQ任务（如果存在）
-                            try:
-                                job = Job.fetch(task_id, connection=self.redis)
-                                job.delete()
-                            except Exception as e:
-                                logger.debug(f"清理RQ任务失败（可能已不存在）: {e}")
-
-                            # 删除数据库记录
-                            db.delete(task)
-                            deleted_count += 1
+            deleted_count = result['deleted']
+            failed_count = result['failed']
+            errors = result['errors']
+            if deleted_count:
+                self.stats_cache.invalidate([user_id])
 
-                        except Exception as e:
-                            logger.error(f"删除任务 {task_id} 失败: {e}", exc_info=True)
-                            errors.append(f"删除任务 {task_id} 失败: {str(e)}")
-                            failed_count += 1
+            logger.info(f"清理任务完成: user={user_id}, 删除={deleted_count}, 失败={failed_count}, "
+                        f"RQ任务清理={result['redis_cleaned']}")
 
-                # 情况2: 根据状态过滤批量清理
-                elif status_filter:
-                    query = db.query(PublishTask).filter(
-                        PublishTask.user_id == user_id,
-                        PublishTask.status.in_(status_filter)
-                    )
+            return {
+                'success': True,
+                'deleted_count': deleted_count,
+                'failed_count': failed_count,
+                'errors': errors if errors else None,
+                'message': f'成功清理 {deleted_count} 个任务' + (f'，{failed_count} 个失败' if failed_count > 0 else '')
+            }
 
-                    tasks_to_delete = query.all()
+        except Exception as e:
+            logger.error(f"清理任务失败: {e}", exc_info=True)
+            return {
+                'success': False,
+                'error': '清理任务失败',
+                'message': str(e)
+            }
 
-                    for task in tasks_to_delete:
-                        try:
-                            # 尝试从Redis中清理RQ任务
-                            try:
-                                job = Job.fetch(task.task_id, connection=self.redis)
-                                job.delete()
-                            except Exception as e:
-                                logger.debug(f"清理RQ任务失败（可能已不存在）: {e}")
+    def _delete_listed_tasks(self, user_id: int, task_ids: List[str]) -> Dict:
+        """
+        分批删除用户指定的任务：每批一次查询状态、一条DELETE，不存在/无权限/未结束的任务计入失败
 
-                            # 删除数据库记录
-                            db.delete(task)
-                            deleted_count += 1
+        Returns:
+            {'deleted', 'failed', 'redis_cleaned', 'errors', 'user_ids'}
+        """
+        result = {'deleted': 0, 'failed': 0, 'redis_cleaned': 0, 'errors': [], 'user_ids': set()}
+        task_ids = list(dict.fromkeys(task_ids))
 
-                        except Exception as e:
-                            logger.error(f"删除任务失败: {e}", exc_info=True)
-                            failed_count += 1
+        for offset in range(0, len(task_ids), self.DELETE_BATCH_SIZE):
+            chunk = task_ids[offset:offset + self.DELETE_BATCH_SIZE]
+            db = get_db_session()
+            try:
+                rows = db.query(
+                    PublishTask.id, PublishTask.task_id, PublishTask.user_id, PublishTask.status
+                ).filter(
+                    PublishTask.task_id.in_(chunk),
+                    PublishTask.user_id == user_id
+                ).all()
+                found = {row.task_id: row for row in rows}
+
+                deletable = []
+                for task_id in chunk:
+                    row = found.get(task_id)
+                    if row is None:
+                        result['errors'].append(f"任务 {task_id} 不存在或无权限")
+                    elif row.status in ACTIVE_TASK_STATUSES:
+                        # 不允许删除正在运行的任务
+                        result['errors'].append(f"任务 {task_id} 状态为 {row.status}，无法删除，请先取消")
+                    else:
+                        deletable.append(row)
+                result['failed'] += len(chunk) - len(deletable)
+                if not deletable:
+                    continue
 
-                else:
-                    return {
-                        'success': False,
-                        'error': '必须指定task_ids或status_filter参数'
-                    }
+                try:
+                    deleted = self._delete_task_rows(db, deletable, PublishTask.status.notin_(ACTIVE_TASK_STATUSES))
+                    db.commit()
+                except Exception as e:
+                    db.rollback()
+                    logger.error(f"删除任务失败: {e}", exc_info=True)
+                    result['errors'].append(f"删除 {len(deletable)} 个任务失败: {str(e)}")
+                    result['failed'] += len(deletable)
+                    continue
+            finally:
+                db.close()
 
-                # 提交更改
-                db.commit()
+            # 查询后又被重新入队的任务不删除
+            deleted_ids = {row.id for row in deleted}
+            for row in deletable:
+                if row.id not in deleted_ids:
+                    result['errors'].append(f"任务 {row.task_id} 状态已变化，无法删除")
+                    result['failed'] += 1
+            self._record_deleted(result, deleted)
 
-                logger.info(f"清理任务完成: user={user_id}, 删除={deleted_count}, 失败={failed_count}")
+        return result
 
-                return {
-                    'success': True,
-                    'deleted_count': deleted_count,
-                    'failed_count': failed_count,
-                    'errors': errors if errors else None,
-                    'message': f'成功清理 {deleted_count} 个任务' + (f'，{failed_count} 个失败' if failed_count > 0 else '')
-                }
+    def _delete_matching_tasks(self, conditions: List, status_condition) -> Dict:
+        """
+        分批删除符合条件的任务：按ID顺序每批只查询 id/task_id/user_id，一条DELETE删除并提交，
+        再用一次管道删除对应的RQ任务数据。任务不会整体加载为ORM对象
 
-            except Exception as e:
-                db.rollback()
-                logger.error(f"清理任务失败: {e}", exc_info=True)
-                return {
-                    'success': False,
-                    'error': '清理任务失败',
-                    'message': str(e)
-                }
+        Args:
+            conditions: 过滤条件列表
+            status_condition: 状态条件（查询和删除时都会检查，查询后状态变化的任务不删除）
+
+        Returns:
+            {'deleted', 'failed', 'redis_cleaned', 'errors', 'user_ids'}
+        """
+        result = {'deleted': 0, 'failed': 0, 'redis_cleaned': 0, 'errors': [], 'user_ids': set()}
+        last_id = 0
+
+        while True:
+            db = get_db_session()
+            try:
+                rows = db.query(PublishTask.id, PublishTask.task_id, PublishTask.user_id).filter(
+                    *conditions,
+                    status_condition,
+                    PublishTask.id > last_id
+                ).order_by(PublishTask.id).limit(self.DELETE_BATCH_SIZE).all()
+                if not rows:
+                    break
+                last_id = rows[-1].id
+
+                try:
+                    deleted = self._delete_task_rows(db, rows, status_condition)
+                    db.commit()
+                except Exception as e:
+                    db.rollback()
+                    logger.error(f"删除任务失败 (id {rows[0].id}-{rows[-1].id}): {e}", exc_info=True)
+                    result['errors'].append(f"删除 {len(rows)} 个任务失败: {str(e)}")
+                    result['failed'] += len(rows)
+                    deleted = []
             finally:
                 db.close()
 
-        except Exception as e:
-            logger.error(f"清理任务失败: {e}", exc_info=True)
-            return {
-                'success': False,
-                'error': '清理任务失败',
-                'message': str(e)
-            }
+            self._record_deleted(result, deleted)
+            if len(rows) < self.DELETE_BATCH_SIZE:
+                break
 
+        return result
 
-    @log_service_call("同步任务状态")
-    def sync_task_status_with_redis(self) -> Dict:
+    @staticmethod
+    def _delete_task_rows(db, rows: List, status_condition) -> List:
         """
-        同步数据库任务状态与Redis中的RQ任务状态
-        处理那些在数据库中标记为queued/running但实际上已在Redis中失败或消失的任务
+        一条DELETE删除给定ID中仍满足状态条件的任务
+
+        Returns:
+            实际删除的行
+        """
+        ids = [row.id for row in rows]
+        deleted = db.query(PublishTask).filter(
+            PublishTask.id.in_(ids),
+            status_condition
+        ).delete(synchronize_session=False)
+        if deleted == len(ids):
+            return rows
+
+        remaining = {row_id for (row_id,) in db.query(PublishTask.id).filter(PublishTask.id.in_(ids))}
+        return [row for row in rows if row.id not in remaining]
+
+    def _record_deleted(self, result: Dict, deleted: List):
+        """累加删除结果，并清理已删除任务的RQ任务数据"""
+        if not deleted:
+            return
+        result['deleted'] += len(deleted)
+        result['user_ids'].update(row.user_id for row in deleted)
+        result['redis_cleaned'] += self._delete_rq_jobs([row.task_id for row in deleted])
+
+    def _delete_rq_jobs(self, task_ids: List[str]) -> int:
+        """
+        一次管道读取并删除任务对应的RQ任务数据（不存在的跳过）
 
         Returns:
-            同步结果
+            删除的RQ任务数
         """
         try:
-            db = get_db_session()
-            try:
-                synced_count = 0
-                error_count = 0
+            jobs = [job for job in Job.fetch_many(task_ids, connection=self.redis) if job is not None]
+            if jobs:
+                with self.redis.pipeline() as pipe:
+                    for job in jobs:
+                        job.delete(pipeline=pipe)
+                    pipe.execute()
+            return len(jobs)
+        except Exception as e:
+            logger.debug(f"清理RQ任务失败（可能已不存在）: {e}")
+            return 0
 
-                # 查找所有queued或running状态的任务
-                stuck_tasks = db.query(PublishTask).filter(
-                    PublishTask.status.in_(['queued', 'running'])
-                ).all()
+    # 增量同步的游标（上次检查到的任务ID）
+    SYNC_CURSOR_KEY = 'tasksync:cursor'
+    # RQ中找不到的任务，创建超过该时间(秒)仍为queued/running时标记为失败
+    SYNC_LOST_TASK_AGE = 3600
 
-                logger.info(f"[任务同步] 发现 {len(stuck_tasks)} 个待检查任务")
+    @log_service_call("同步任务状态")
+    def sync_task_status_with_redis(self, incremental: bool = False, batch_size: int = None,
+                                    max_batches: int = None) -> Dict:
+        """
+        同步数据库任务状态与Redis中的RQ任务状态
+        处理那些在数据库中标记为queued/running但实际上已在Redis中失败、完成或消失的任务
 
-                for task in stuck_tasks:
-                    try:
-                        # 检查Redis中的任务状态
-                        try:
-                            job = Job.fetch(task.task_id, connection=self.redis)
-                            job_status = job.get_status()
-
-                            # 如果RQ任务已失败
-                            if job_status == 'failed':
-                                task.status = 'failed'
-                                task.error_message = '任务执行失败(RQ)'
-                                task.completed_at = datetime.now()
-                                synced_count += 1
-                                logger.info(f"[任务同步] 任务 {task.task_id} 状态同步: queued/running -> failed")
-
-                            # 如果RQ任务已完成但数据库未更新
-                            elif job_status == 'finished':
-                                task.status = 'success'
-                                task.completed_at = datetime.now()
-                                synced_count += 1
-                                logger.info(f"[任务同步] 任务 {task.task_id} 状态同步: queued/running -> success")
+        按任务ID分批处理：每批一次 Job.fetch_many（管道）读取RQ任务，再按目标状态各执行一次批量UPDATE，
+        每批单独提交。增量模式从上次的游标继续，最多处理 max_batches 批，适合每分钟运行；
+        扫描到末尾后游标归零，下次从头开始
 
-                        except Exception as e:
-                            # 任务在Redis中不存在，可能已被清理
-                            # 检查任务创建时间，如果超过1小时还在queued/running，标记为失败
-                            if task.created_at:
-                                age_hours = (datetime.now() - task.created_at).total_seconds() / 3600
-                                if age_hours > 1:
-                                    task.status = 'failed'
-                                    task.error_message = '任务超时或Worker异常'
-                                    task.completed_at = datetime.now()
-                                    synced_count += 1
-                                    logger.info(f"[任务同步] 任务 {task.task_id} 超时标记为失败 (已等待 {age_hours:.1f} 小时)")
+        Args:
+            incremental: 是否从上次的游标继续（False时从头完整扫描一遍，不影响游标）
+            batch_size: 每批任务数，默认 PUBLISH_SYNC_BATCH_SIZE
+            max_batches: 本次最多处理的批数，默认增量模式为 PUBLISH_SYNC_MAX_BATCHES，完整扫描不限
 
-                    except Exception as e:
-                        logger.error(f"[任务同步] 处理任务 {task.task_id} 失败: {e}")
-                        error_count += 1
+        Returns:
+            同步结果（含各类计数和耗时）
+        """
+        config = get_config()
+        batch_size = batch_size or getattr(config, 'PUBLISH_SYNC_BATCH_SIZE', 500)
+        if max_batches is None and incremental:
+            max_batches = getattr(config, 'PUBLISH_SYNC_MAX_BATCHES', 20)
+
+        began = time.perf_counter()
+        counts = {'checked': 0, 'failed': 0, 'success': 0, 'lost': 0}
+        timings = {'db_ms': 0.0, 'redis_ms': 0.0}
+        batches = 0
+        error_count = 0
+        sweep_completed = False
 
-                db.commit()
+        try:
+            cursor = self._load_sync_cursor() if incremental else 0
+            start_cursor = cursor
 
-                logger.info(f"[任务同步] 完成: 同步 {synced_count} 个, 错误 {error_count} 个")
+            while max_batches is None or batches < max_batches:
+                step = time.perf_counter()
+                db = get_db_session()
+                try:
+                    rows = db.query(
+                        PublishTask.id, PublishTask.task_id, PublishTask.user_id, PublishTask.created_at,
+                        PublishTask.scheduled_at
+                    ).filter(
+                        PublishTask.status.in_(['queued', 'running']),
+                        PublishTask.id > cursor
+                    ).order_by(PublishTask.id).limit(batch_size).all()
+                    timings['db_ms'] += (time.perf_counter() - step) * 1000
+
+                    if rows:
+                        try:
+                            batch_counts = self._sync_batch(db, rows, timings)
+                            for key, value in batch_counts.items():
+                                counts[key] += value
+                        except Exception as e:
+                            db.rollback()
+                            logger.error(f"[任务同步] 处理任务批次 (id {rows[0].id}-{rows[-1].id}) 失败: {e}",
+                                         exc_info=True)
+                            error_count += len(rows)
+                finally:
+                    db.close()
 
-                return {
-                    'success': True,
-                    'synced_count': synced_count,
-                    'error_count': error_count,
-                    'message': f'同步了 {synced_count} 个任务状态'
-                }
+                if rows:
+                    batches += 1
+                    cursor = rows[-1].id
+                    counts['checked'] += len(rows)
+                if len(rows) < batch_size:
+                    sweep_completed = True
+                    cursor = 0
+                    break
+
+            if incremental:
+                self._save_sync_cursor(cursor)
+
+            synced_count = counts['failed'] + counts['success'] + counts['lost']
+            duration_ms = (time.perf_counter() - began) * 1000
+            logger.info(f"[任务同步] 完成: 检查 {counts['checked']} 个 ({batches} 批, 游标 {start_cursor} -> {cursor}), "
+                        f"同步 {synced_count} 个 (失败 {counts['failed']}, 成功 {counts['success']}, "
+                        f"丢失 {counts['lost']}), 错误 {error_count} 个, 耗时 {duration_ms:.0f}ms "
+                        f"(数据库 {timings['db_ms']:.0f}ms, Redis {timings['redis_ms']:.0f}ms)")
 
-            finally:
-                db.close()
+            return {
+                'success': True,
+                'checked_count': counts['checked'],
+                'synced_count': synced_count,
+                'failed_count': counts['failed'],
+                'finished_count': counts['success'],
+                'lost_count': counts['lost'],
+                'error_count': error_count,
+                'batches': batches,
+                'cursor': cursor,
+                'sweep_completed': sweep_completed,
+                'duration_ms': round(duration_ms, 1),
+                'db_ms': round(timings['db_ms'], 1),
+                'redis_ms': round(timings['redis_ms'], 1),
+                'message': f'同步了 {synced_count} 个任务状态'
+            }
 
         except Exception as e:
             logger.error(f"[任务同步] 失败: {e}", exc_info=True)
@@ -757,6 +1402,105 @@ class TaskQueueManager:
                 'error': str(e)
             }
 
+    def _sync_batch(self, db, rows: List, timings: Dict) -> Dict:
+        """
+        同步一批任务：一次管道读取RQ任务，按目标状态批量更新并提交
+
+        Args:
+            db: 数据库会话
+            rows: (id, task_id, user_id, created_at, scheduled_at) 列表
+            timings: 累加数据库/Redis耗时的字典
+
+        Returns:
+            {'failed', 'success', 'lost'} 各类同步数量
+        """
+        step = time.perf_counter()
+        jobs = Job.fetch_many([row.task_id for row in rows], connection=self.redis)
+
+        # RQ中不存在的任务：还在定时索引或公平调度子队列中的不算丢失
+        missing = [row for row, job in zip(rows, jobs) if job is None]
+        waiting = self.scheduler.scheduled_task_ids(row.task_id for row in missing if row.scheduled_at)
+        if missing and self.scheduler.enabled:
+            waiting |= self.scheduler.waiting_task_ids({row.user_id for row in missing})
+        timings['redis_ms'] += (time.perf_counter() - step) * 1000
+
+        now = datetime.now()
+        targets = {'failed': [], 'success': [], 'lost': []}
+        for row, job in zip(rows, jobs):
+            if job is None:
+                if row.task_id in waiting or not row.created_at:
+                    continue
+                # 定时任务从发布时间开始计算
+                if (now - max(row.created_at, row.scheduled_at or row.created_at)).total_seconds() > \
+                        self.SYNC_LOST_TASK_AGE:
+                    targets['lost'].append(row)
+                continue
+            job_status = job.get_status(refresh=False)
+            if job_status == 'failed':
+                targets['failed'].append(row)
+            elif job_status == 'finished':
+                targets['success'].append(row)
+
+        values = {
+            'failed': {'status': 'failed', 'error_message': '任务执行失败(RQ)', 'completed_at': now},
+            'success': {'status': 'success', 'completed_at': now},
+            'lost': {'status': 'failed', 'error_message': '任务超时或Worker异常', 'completed_at': now},
+        }
+
+        step = time.perf_counter()
+        changed = {kind: self._bulk_update_status(db, targets[kind], values[kind]) for kind in targets}
+        db.commit()
+        timings['db_ms'] += (time.perf_counter() - step) * 1000
+
+        # 提交后使统计缓存失效并推送状态变化
+        events = {}
+        for kind, changed_rows in changed.items():
+            for row in changed_rows:
+                events.setdefault(row.user_id, []).append(TaskEventStream.task_event(
+                    row.task_id, values[kind]['status'], error_message=values[kind].get('error_message')))
+            if changed_rows:
+                logger.info(f"[任务同步] {len(changed_rows)} 个任务状态同步为 {values[kind]['status']}"
+                            f"{' (超时)' if kind == 'lost' else ''}")
+        if events:
+            self.stats_cache.invalidate(events.keys())
+            self.events.publish_many(events)
+
+        return {kind: len(changed_rows) for kind, changed_rows in changed.items()}
+
+    @staticmethod
+    def _bulk_update_status(db, rows: List, values: Dict) -> List:
+        """
+        批量更新仍为queued/running的任务（读取后已被Worker更新的任务不覆盖）
+
+        Returns:
+            实际被更新的行
+        """
+        if not rows:
+            return []
+        ids = [row.id for row in rows]
+        updated = db.query(PublishTask).filter(
+            PublishTask.id.in_(ids),
+            PublishTask.status.in_(['queued', 'running'])
+        ).update(values, synchronize_session=False)
+        if updated == len(ids):
+            return rows
+
+        # 部分任务在读取后状态已变化，按本次写入的完成时间找出实际更新的任务
+        updated_ids = {row_id for (row_id,) in db.query(PublishTask.id).filter(
+            PublishTask.id.in_(ids),
+            PublishTask.status == values['status'],
+            PublishTask.completed_at == values['completed_at']
+        )}
+        return [row for row in rows if row.id in updated_ids]
+
+    def _load_sync_cursor(self) -> int:
+        """读取增量同步游标"""
+        return int(self.redis.get(self.SYNC_CURSOR_KEY) or 0)
+
+    def _save_sync_cursor(self, cursor: int):
+        """保存增量同步游标"""
+        self.redis.set(self.SYNC_CURSOR_KEY, cursor, ex=7 * 86400)
+
     @log_service_call("清理过期任务")
     def cleanup_expired_tasks(
         self,
@@ -779,50 +1523,27 @@ class TaskQueueManager:
             status_filter = ['success', 'failed', 'cancelled']
 
         try:
-            db = get_db_session()
-            try:
-                cutoff_date = datetime.now() - timedelta(days=max_age_days)
-
-                # 查找过期任务
-                expired_tasks = db.query(PublishTask).filter(
-                    PublishTask.status.in_(status_filter),
-                    PublishTask.created_at < cutoff_date
-                ).all()
-
-                deleted_count = 0
-                redis_cleaned = 0
+            cutoff_date = datetime.now() - timedelta(days=max_age_days)
 
-                for task in expired_tasks:
-                    try:
-                        # 尝试清理Redis中的任务数据
-                        try:
-                            job = Job.fetch(task.task_id, connection=self.redis)
-                            job.delete()
-                            redis_cleaned += 1
-                        except:
-                            pass  # 任务可能已不在Redis中
-
-                        # 删除数据库记录
-                        db.delete(task)
-                        deleted_count += 1
-
-                    except Exception as e:
-                        logger.error(f"[清理任务] 删除任务 {task.task_id} 失败: {e}")
-
-                db.commit()
-
-                logger.info(f"[清理任务] 完成: 删除 {deleted_count} 个过期任务, Redis清理 {redis_cleaned} 个")
+            result = self._delete_matching_tasks(
+                [PublishTask.created_at < cutoff_date],
+                PublishTask.status.in_(status_filter)
+            )
+            deleted_count = result['deleted']
+            redis_cleaned = result['redis_cleaned']
+            self.stats_cache.invalidate(result['user_ids'])
 
-                return {
-                    'success': True,
-                    'deleted_count': deleted_count,
-                    'redis_cleaned': redis_cleaned,
-                    'cutoff_date': cutoff_date.isoformat(),
-                    'message': f'清理了 {deleted_count} 个超过 {max_age_days} 天的任务'
-                }
+            logger.info(f"[清理任务] 完成: 删除 {deleted_count} 个过期任务, Redis清理 {redis_cleaned} 个"
+                        + (f", 失败 {result['failed']} 个" if result['failed'] else ''))
 
-            finally:
-                db.close()
+            return {
+                'success': True,
+                'deleted_count': deleted_count,
+                'failed_count': result['failed'],
+                'redis_cleaned': redis_cleaned,
+                'cutoff_date': cutoff_date.isoformat(),
+                'message': f'清理了 {deleted_count} 个超过 {max_age_days} 天的任务'
+            }
 
         except Exception as e:
             logger.error(f"[清理任务] 失败: {e}", exc_info=True)
@@ -898,6 +1619,8 @@ class TaskQueueManager:
         1. 同步任务状态
         2. 清理Redis失败队列
         3. 清理过期任务（默认7天）
+        4. 写入token用量统计
+        5. 释放到期的定时任务，分发公平调度子队列中的任务（在途名额因Worker异常过期后恢复分发）
 
         Returns:
             维护结果汇总
@@ -915,6 +1638,13 @@ class TaskQueueManager:
         # 3. 清理过期任务
         results['expired_cleanup'] = self.cleanup_expired_tasks(max_age_days=7)
 
+        # 4. 把Redis中累加的token用量写入数据库
+        from services.token_accounting import get_token_accountant
+        results['token_usage_flush'] = get_token_accountant().flush()
+
+        # 5. 释放到期的定时任务，分发公平调度子队列中的任务
+        results['fair_dispatch'] = self.dispatch_pending()
+
         logger.info("[维护任务] ========== 维护任务执行完成 ==========")
 
         return {
@@ -952,3 +1682,14 @@ def run_scheduled_maintenance():
     """
     manager = get_task_manager()
     return manager.run_maintenance()
+
+
+def run_task_status_sync():
+    """
+    增量任务状态同步的入口函数（供RQ Scheduler或cron每分钟调用）
+    同时释放到期的定时任务（Worker未以 --with-scheduler 运行时，定时任务最多延迟一分钟发布）
+    """
+    manager = get_task_manager()
+    result = manager.sync_task_status_with_redis(incremental=True)
+    result['fair_dispatch'] = manager.dispatch_pending()
+    return result
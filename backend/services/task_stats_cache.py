@@ -0,0 +1,152 @@
+"""
+用户任务状态统计缓存
+前端频繁轮询任务列表，各状态的任务数在Redis中缓存几秒；任务状态变化时递增用户的统计版本号，
+旧版本的缓存随即失效（计算期间发生的状态变化不会被写回的旧结果覆盖）
+
+Redis结构:
+    taskstats:user:{user_id}      {"gen": 版本号, "stats": {...}} JSON，短TTL
+    taskstats:user:{user_id}:gen  统计版本号，状态变化时INCR
+"""
+import sys
+import os
+import json
+import time
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import setup_logger
+import redis
+
+logger = setup_logger(__name__)
+
+
+class TaskStatsCache:
+    """用户任务状态统计缓存"""
+
+    KEY_PREFIX = 'taskstats:user:'
+    # 版本号保留时间(秒)，远大于缓存TTL即可
+    GEN_TTL = 86400
+    # Redis出错后暂停访问的时间(秒)，避免每次轮询都等待连接超时
+    REDIS_RETRY_INTERVAL = 30
+
+    def __init__(self, redis_client: Optional[redis.Redis] = None, ttl: int = 5):
+        """
+        初始化缓存
+
+        Args:
+            redis_client: Redis客户端（decode_responses=True），为None时不缓存
+            ttl: 缓存时间(秒)，0表示不缓存
+        """
+        self.redis = redis_client
+        self.ttl = ttl
+        self._redis_down_until = 0.0
+
+    def _stats_key(self, user_id: int) -> str:
+        return f"{self.KEY_PREFIX}{user_id}"
+
+    def _gen_key(self, user_id: int) -> str:
+        return f"{self.KEY_PREFIX}{user_id}:gen"
+
+    def _redis_available(self) -> bool:
+        return self.redis is not None and self.ttl > 0 and time.time() >= self._redis_down_until
+
+    def _mark_redis_error(self, action: str, error: Exception):
+        logger.warning(f"{action}失败，{self.REDIS_RETRY_INTERVAL}秒内不使用统计缓存: {error}")
+        self._redis_down_until = time.time() + self.REDIS_RETRY_INTERVAL
+
+    def get(self, user_id: int) -> Tuple[Optional[Dict], Optional[str]]:
+        """
+        读取用户的任务统计
+
+        Args:
+            user_id: 用户ID
+
+        Returns:
+            (统计字典或None, 当前版本号)；版本号在写回时传给set，Redis不可用时为None
+        """
+        if not self._redis_available():
+            return None, None
+        try:
+            pipe = self.redis.pipeline()
+            pipe.get(self._gen_key(user_id))
+            pipe.get(self._stats_key(user_id))
+            gen, cached = pipe.execute()
+        except Exception as e:
+            self._mark_redis_error('读取任务统计缓存', e)
+            return None, None
+
+        gen = gen or '0'
+        if cached:
+            cached = json.loads(cached)
+            if cached.get('gen') == gen:
+                return cached['stats'], gen
+        return None, gen
+
+    def set(self, user_id: int, stats: Dict, gen: Optional[str]):
+        """
+        写回统计结果（只在读取到版本号时写回）
+
+        Args:
+            user_id: 用户ID
+            stats: 统计字典
+            gen: get返回的版本号
+        """
+        if gen is None or not self._redis_available():
+            return
+        try:
+            self.redis.set(self._stats_key(user_id), json.dumps({'gen': gen, 'stats': stats}), ex=self.ttl)
+        except Exception as e:
+            self._mark_redis_error('写入任务统计缓存', e)
+
+    def invalidate(self, user_ids: Iterable[int]):
+        """
+        任务状态变化后使用户的统计缓存失效
+
+        Args:
+            user_ids: 用户ID列表
+        """
+        user_ids = {user_id for user_id in user_ids if user_id is not None}
+        if not user_ids or not self._redis_available():
+            return
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for user_id in user_ids:
+                pipe.incr(self._gen_key(user_id))
+                pipe.expire(self._gen_key(user_id), self.GEN_TTL)
+            pipe.execute()
+        except Exception as e:
+            self._mark_redis_error('清除任务统计缓存', e)
+
+
+# 全局缓存实例
+_stats_cache = None
+_stats_cache_lock = threading.Lock()
+
+
+def get_task_stats_cache(config=None) -> TaskStatsCache:
+    """
+    获取全局任务统计缓存实例(单例模式)
+
+    Args:
+        config: 配置对象（首次创建时读取缓存时间）
+
+    Returns:
+        TaskStatsCache实例
+    """
+    global _stats_cache
+
+    if _stats_cache is None:
+        with _stats_cache_lock:
+            if _stats_cache is None:
+                if config is None:
+                    from config import get_config
+                    config = get_config()
+                from config import get_redis_client
+                redis_client = get_redis_client('cache', config)
+                _stats_cache = TaskStatsCache(
+                    redis_client=redis_client,
+                    ttl=getattr(config, 'PUBLISH_TASK_STATS_CACHE_TTL', 5)
+                )
+
+    return _stats_cache
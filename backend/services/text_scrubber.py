@@ -0,0 +1,211 @@
+"""
+文章清理模块
+移除Markdown格式和AI生成痕迹；正则预编译，AI套话一次扫描定位、只在附近逐个替换，结果与整篇按列表顺序逐个替换一致
+"""
+import re
+from typing import Dict, Iterable, List, Sequence
+
+# AI生成常用套话和模式（按列表顺序逐个移除）
+AI_PHRASES = [
+    # 开头套话
+    '综上所述', '总的来说', '总而言之', '总结起来',
+    '值得一提的是', '需要指出的是', '需要注意的是', '值得注意的是',
+    '众所周知', '不言而喻', '显而易见',
+    # 过渡词
+    '首先，', '其次，', '再次，', '最后，', '此外，', '另外，',
+    '因此，', '所以，', '然而，', '但是，', '不过，',
+    '与此同时，', '同时，', '进一步地，', '更重要的是，',
+    # AI常用表达
+    '让我们', '我们可以看到', '我们需要', '我们应该',
+    '在这个过程中', '在这种情况下', '在此基础上',
+    '从某种程度上说', '从本质上讲', '归根结底',
+    '毫无疑问', '毋庸置疑', '不可否认',
+    '换句话说', '也就是说', '具体来说',
+    # 结尾套话
+    '希望本文对您有所帮助', '希望这篇文章能够帮助到你',
+    '以上就是', '如有疑问，欢迎',
+    '感谢阅读', '欢迎在评论区留言', '欢迎留言讨论',
+]
+
+# Markdown清理规则: (触发字符串, 正则, 替换)，按顺序执行；文本中不含任何触发字符串时跳过该规则
+_MARKDOWN_RULES = [
+    # 标题
+    (('#',), re.compile(r'#{1,6}\s+'), ''),
+    # 粗体和斜体，保留内容
+    (('*',), re.compile(r'\*\*([^*]+)\*\*'), r'\1'),
+    (('*',), re.compile(r'\*([^*]+)\*'), r'\1'),
+    (('_',), re.compile(r'__([^_]+)__'), r'\1'),
+    (('_',), re.compile(r'_([^_]+)_'), r'\1'),
+    # 列表符号
+    (('-', '*', '+'), re.compile(r'^\s*[-*+]\s+', re.MULTILINE), ''),
+    (('.',), re.compile(r'^\s*\d+\.\s+', re.MULTILINE), ''),
+    # 链接保留文字，图片移除
+    (('](',), re.compile(r'\[([^\]]+)\]\([^)]+\)'), r'\1'),
+    (('![',), re.compile(r'!\[([^\]]*)\]\([^)]+\)'), ''),
+    # 代码块和行内代码
+    (('```',), re.compile(r'```[\s\S]*?```'), ''),
+    (('`',), re.compile(r'`([^`]+)`'), r'\1'),
+    # 引用和分割线
+    (('>',), re.compile(r'^\s*>\s+', re.MULTILINE), ''),
+    (('-', '*', '_'), re.compile(r'^[-*_]{3,}\s*$', re.MULTILINE), ''),
+]
+
+_MULTI_NEWLINE = re.compile(r'\n{3,}')
+
+
+def _related(a: str, b: str) -> bool:
+    """两个短语的出现能否重叠（一个包含另一个，或一个的结尾是另一个的开头）"""
+    return a in b or b in a or any(a[-k:] == b[:k] or b[-k:] == a[:k] for k in range(1, min(len(a), len(b))))
+
+
+def _independent_phrases(phrases: List[str]) -> set:
+    """与其他短语、以及与自身的另一次出现都不会重叠的短语"""
+    return {
+        phrase for index, phrase in enumerate(phrases)
+        if not any(_related(phrase, other) for other in phrases[:index] + phrases[index + 1:])
+        and not any(phrase[-k:] == phrase[:k] for k in range(1, len(phrase)))
+    }
+
+
+class TextScrubber:
+    """Markdown/AI痕迹清理器"""
+
+    def __init__(self, phrases: Sequence[str] = AI_PHRASES):
+        # 空字符串替换不改变文本
+        self.phrases = [phrase for phrase in phrases if phrase]
+        self._phrase_matcher = re.compile('|'.join(re.escape(p) for p in self.phrases)) if self.phrases else None
+        # 删除一个短语可能影响的前后文长度
+        self._context = max((len(p) for p in self.phrases), default=1) - 1
+        # 首字 -> 短语下标
+        self._by_first_char: Dict[str, List[int]] = {}
+        for index, phrase in enumerate(self.phrases):
+            self._by_first_char.setdefault(phrase[0], []).append(index)
+        self._independent = _independent_phrases(self.phrases)
+
+    def scrub(self, text: str) -> str:
+        """
+        清理单篇文本
+
+        Args:
+            text: 原始文本
+
+        Returns:
+            清理后的文本
+        """
+        for triggers, pattern, replacement in _MARKDOWN_RULES:
+            if any(t in text for t in triggers):
+                text = pattern.sub(replacement, text)
+
+        if self._phrase_matcher is not None:
+            text = self._remove_phrases(text)
+
+        if '\n\n\n' in text:
+            text = _MULTI_NEWLINE.sub('\n\n', text)
+
+        # 移除行首行尾多余空格
+        return '\n'.join(line.strip() for line in text.split('\n')).strip()
+
+    def _remove_phrases(self, text: str) -> str:
+        """
+        一次扫描定位全部短语，只在短语附近按列表顺序逐个替换
+
+        删除短语只影响前后 context（最长短语长度-1）个字符内是否拼成新短语、重叠短语谁先被删除，
+        相距超过 2*context 的短语互不影响。扫描把可能相互影响的短语归为一组逐组处理，
+        结果与整篇按列表顺序逐个替换一致
+        """
+        pieces = []
+        position = 0
+        spans = []
+        independent = True
+        for match in self._phrase_matcher.finditer(text):
+            if spans and match.start() - spans[-1][1] > 2 * self._context:
+                position = self._remove_group(text, spans, independent, position, pieces)
+                if position < 0:
+                    return self._replace_in_order(text)
+                spans = []
+                independent = True
+            spans.append(match.span())
+            independent = independent and match.group() in self._independent
+        if not spans:
+            return text
+        position = self._remove_group(text, spans, independent, position, pieces)
+        if position < 0:
+            return self._replace_in_order(text)
+        pieces.append(text[position:])
+        return ''.join(pieces)
+
+    def _remove_group(self, text: str, spans: List, independent: bool, position: int, pieces: List[str]) -> int:
+        """
+        移除一组相邻短语，处理 [首个短语起点-context, 末个短语终点+context) 这段文本并追加到pieces
+
+        组内短语都与其他短语无重叠、无包含关系时，逐个替换中途拼出的新短语在全部删除后也一定存在，
+        删除后不含短语即可直接删除；否则对这段文本按列表顺序逐个替换，替换波及边缘的 context 个字符时
+        影响可能继续向外扩散，返回-1由调用方整篇逐个替换
+
+        Returns:
+            已处理到的位置，或-1
+        """
+        start, end = spans[0][0], spans[-1][1]
+        low = max(0, start - self._context)
+        high = min(len(text), end + self._context)
+        if independent:
+            window = text[low:start] + ''.join(
+                text[prev_end:next_start] for (_, prev_end), (next_start, _) in zip(spans, spans[1:])
+            ) + text[end:high]
+            if not self._phrase_matcher.search(window):
+                pieces.append(text[position:low])
+                pieces.append(window)
+                return high
+
+        window = text[low:high]
+        # 替换只会删除字符，首字不在这段文本中的短语不可能出现
+        for index in sorted(index for char in set(window).intersection(self._by_first_char)
+                            for index in self._by_first_char[char]):
+            phrase = self.phrases[index]
+            first = window.find(phrase)
+            if first < 0:
+                continue
+            if first < start - low or window.rfind(phrase) + len(phrase) > len(window) - (high - end):
+                return -1
+            window = window.replace(phrase, '')
+        pieces.append(text[position:low])
+        pieces.append(window)
+        return high
+
+    def _replace_in_order(self, text: str) -> str:
+        """整篇按列表顺序逐个替换"""
+        for phrase in self.phrases:
+            text = text.replace(phrase, '')
+        return text
+
+    def scrub_many(self, texts: Iterable[str]) -> List[str]:
+        """
+        批量清理（批量重新生成、历史文章清理使用），重复文本只处理一次
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            与输入顺序一致的清理结果
+        """
+        done: Dict[str, str] = {}
+        results = []
+        for text in texts:
+            if text not in done:
+                done[text] = self.scrub(text)
+            results.append(done[text])
+        return results
+
+
+# 默认清理器（使用内置AI套话列表）
+_default_scrubber = TextScrubber()
+
+
+def scrub_text(text: str) -> str:
+    """使用默认清理器清理单篇文本"""
+    return _default_scrubber.scrub(text)
+
+
+def scrub_many(texts: Iterable[str]) -> List[str]:
+    """使用默认清理器批量清理文本"""
+    return _default_scrubber.scrub_many(texts)
@@ -0,0 +1,339 @@
+"""
+LLM token用量统计与预算控制
+每次调用的prompt/completion token按 用户/服务商/模型/提示词模板 聚合：先在Redis中累加，
+定期批量写入数据库；调用前检查用户和全站的每日预算
+"""
+import sys
+import os
+import time
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, timedelta
+from typing import Dict, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import setup_logger
+import redis
+
+logger = setup_logger(__name__)
+
+# 当前调用的归属（用户、提示词模板），由路由/后台任务设置，经执行器传递到工作线程
+_usage_scope: ContextVar = ContextVar('token_usage_scope', default={})
+
+
+@contextmanager
+def usage_scope(user_id: Optional[int] = None, template: Optional[str] = None):
+    """
+    设置当前上下文内LLM调用的归属，未指定的字段沿用外层设置
+
+    Args:
+        user_id: 用户ID
+        template: 提示词模板标识，如 article_prompt:3
+    """
+    scope = dict(_usage_scope.get())
+    if user_id is not None:
+        scope['user_id'] = user_id
+    if template is not None:
+        scope['template'] = template
+    token = _usage_scope.set(scope)
+    try:
+        yield
+    finally:
+        _usage_scope.reset(token)
+
+
+def current_usage_scope() -> Dict:
+    """获取当前上下文的调用归属"""
+    return _usage_scope.get()
+
+
+class TokenBudgetExceeded(Exception):
+    """超出每日token预算"""
+
+
+class TokenAccountant:
+    """
+    token用量记账器
+
+    Redis结构:
+        tokens:pending              Hash  待写入数据库的增量，字段为 日期|用户|服务商|模型|模板|p/c/n
+        tokens:daily:{日期}:user:{id}  当日用户累计token（预算检查用）
+        tokens:daily:{日期}:global     当日全站累计token
+    Redis不可用时在进程内累加，下次flush直接写入数据库
+    """
+
+    PENDING_KEY = 'tokens:pending'
+    DAILY_KEY = 'tokens:daily:{day}:{scope}'
+    # Redis出错后暂停访问的时间(秒)
+    REDIS_RETRY_INTERVAL = 30
+
+    def __init__(self, redis_client: Optional[redis.Redis] = None,
+                 user_daily_budget: int = 0, global_daily_budget: int = 0):
+        """
+        初始化记账器
+
+        Args:
+            redis_client: Redis客户端（decode_responses=True），为None时只在进程内累加
+            user_daily_budget: 每个用户每日token上限，0表示不限制
+            global_daily_budget: 全站每日token上限，0表示不限制
+        """
+        self.redis = redis_client
+        self.user_daily_budget = user_daily_budget
+        self.global_daily_budget = global_daily_budget
+
+        self._redis_down_until = 0.0
+        self._lock = threading.Lock()
+        self._local_pending = Counter()
+        self._local_daily = Counter()
+
+    def _redis_available(self) -> bool:
+        return self.redis is not None and time.time() >= self._redis_down_until
+
+    def _mark_redis_error(self, action: str, error: Exception):
+        logger.warning(f"{action}失败，{self.REDIS_RETRY_INTERVAL}秒内只在进程内统计: {error}")
+        self._redis_down_until = time.time() + self.REDIS_RETRY_INTERVAL
+
+    def _daily_key(self, scope: str, day: Optional[str] = None) -> str:
+        return self.DAILY_KEY.format(day=day or date.today().isoformat(), scope=scope)
+
+    def get_daily_usage(self, scope: str) -> int:
+        """
+        获取当日累计token
+
+        Args:
+            scope: user:{id} 或 global
+        """
+        key = self._daily_key(scope)
+        with self._lock:
+            used = self._local_daily[key]
+        if self._redis_available():
+            try:
+                used += int(self.redis.get(key) or 0)
+            except Exception as e:
+                self._mark_redis_error('读取每日token用量', e)
+        return used
+
+    def check_budget(self, user_id: Optional[int] = None):
+        """
+        调用前检查每日预算（检查与扣减不是原子操作，并发调用可能小幅超出预算）
+
+        Args:
+            user_id: 用户ID，None时只检查全站预算
+
+        Raises:
+            TokenBudgetExceeded: 已超出预算
+        """
+        if self.global_daily_budget and self.get_daily_usage('global') >= self.global_daily_budget:
+            raise TokenBudgetExceeded('今日AI调用额度已用完，请明天再试')
+        if user_id is not None and self.user_daily_budget and \
+                self.get_daily_usage(f'user:{user_id}') >= self.user_daily_budget:
+            raise TokenBudgetExceeded('您今日的AI调用额度已用完，请明天再试')
+
+    def record(self, provider: str, model: str, usage: Optional[Dict]):
+        """
+        记录一次调用的token用量（归属取自当前usage_scope）
+
+        Args:
+            provider: 服务商
+            model: 模型
+            usage: 响应中的usage块
+        """
+        usage = usage or {}
+        prompt_tokens = int(usage.get('prompt_tokens') or 0)
+        completion_tokens = int(usage.get('completion_tokens') or 0)
+        total = prompt_tokens + completion_tokens
+        scope = current_usage_scope()
+        user_id = scope.get('user_id')
+        day = date.today().isoformat()
+        field = f"{day}|{user_id or 0}|{provider}|{model}|{scope.get('template') or ''}"
+        increments = {f'{field}|p': prompt_tokens, f'{field}|c': completion_tokens, f'{field}|n': 1}
+        daily_keys = [self._daily_key('global', day)]
+        if user_id is not None:
+            daily_keys.append(self._daily_key(f'user:{user_id}', day))
+
+        if self._redis_available():
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                for name, amount in increments.items():
+                    pipe.hincrby(self.PENDING_KEY, name, amount)
+                for key in daily_keys:
+                    pipe.incrby(key, total)
+                    pipe.expire(key, 2 * 24 * 3600)
+                pipe.execute()
+                return
+            except Exception as e:
+                self._mark_redis_error('记录token用量', e)
+
+        with self._lock:
+            self._local_pending.update(increments)
+            for key in daily_keys:
+                self._local_daily[key] += total
+
+    def _take_pending(self) -> Counter:
+        """取出全部待写入的增量（Redis中的通过RENAME原子取出，避免多进程重复写入）"""
+        with self._lock:
+            pending = self._local_pending
+            self._local_pending = Counter()
+        if self._redis_available():
+            flushing_key = f"tokens:flushing:{os.getpid()}:{time.time()}"
+            try:
+                pipe = self.redis.pipeline(transaction=True)
+                pipe.rename(self.PENDING_KEY, flushing_key)
+                pipe.hgetall(flushing_key)
+                pipe.delete(flushing_key)
+                renamed, values, _ = pipe.execute(raise_on_error=False)
+                # 没有待写入数据（或已被其他进程取走）时RENAME报错，其余命令结果为空
+                if not isinstance(renamed, Exception):
+                    pending.update({k: int(v) for k, v in values.items()})
+            except Exception as e:
+                self._mark_redis_error('读取待写入token用量', e)
+        return pending
+
+    def flush(self) -> Dict:
+        """
+        把累加的用量批量写入数据库
+
+        Returns:
+            {'success': bool, 'rows': 写入的聚合行数, 'error': str}
+        """
+        from models import TokenUsage, get_db_session
+
+        pending = self._take_pending()
+        if not pending:
+            return {'success': True, 'rows': 0}
+
+        rows: Dict[tuple, Dict] = {}
+        for name, amount in pending.items():
+            parts = name.split('|')
+            if len(parts) != 6:
+                continue
+            day, user_id, provider, model, template, kind = parts
+            row = rows.setdefault((day, int(user_id), provider, model, template), Counter())
+            row[kind] += amount
+
+        session = get_db_session()
+        try:
+            for (day, user_id, provider, model, template), counts in rows.items():
+                record = session.query(TokenUsage).filter_by(
+                    date=day, user_id=user_id, provider=provider, model=model, template=template
+                ).first()
+                if record is None:
+                    record = TokenUsage(date=day, user_id=user_id, provider=provider, model=model,
+                                        template=template, prompt_tokens=0, completion_tokens=0, calls=0)
+                    session.add(record)
+                record.prompt_tokens += counts['p']
+                record.completion_tokens += counts['c']
+                record.calls += counts['n']
+            session.commit()
+            logger.info(f"token用量已写入数据库: {len(rows)} 行")
+            return {'success': True, 'rows': len(rows)}
+        except Exception as e:
+            session.rollback()
+            # 写入失败时放回待写入队列，下次重试
+            with self._lock:
+                self._local_pending.update(pending)
+            logger.error(f"写入token用量失败: {e}", exc_info=True)
+            return {'success': False, 'rows': 0, 'error': str(e)}
+        finally:
+            session.close()
+
+    def get_stats(self, days: int = 7) -> Dict:
+        """
+        获取token用量统计（按用户、模型、提示词模板聚合，先flush再查询）
+
+        Args:
+            days: 统计最近几天（含今天）
+
+        Returns:
+            统计字典
+        """
+        from sqlalchemy import func
+        from models import TokenUsage, get_db_session
+
+        self.flush()
+        since = (date.today() - timedelta(days=days - 1)).isoformat()
+        session = get_db_session()
+        try:
+            def aggregate(*columns):
+                query = session.query(
+                    *columns,
+                    func.sum(TokenUsage.prompt_tokens),
+                    func.sum(TokenUsage.completion_tokens),
+                    func.sum(TokenUsage.calls)
+                ).filter(TokenUsage.date >= since).group_by(*columns)
+                items = []
+                for row in query.all():
+                    *keys, prompt_tokens, completion_tokens, calls = row
+                    item = {column.key: value for column, value in zip(columns, keys)}
+                    item.update({
+                        'prompt_tokens': prompt_tokens or 0,
+                        'completion_tokens': completion_tokens or 0,
+                        'total_tokens': (prompt_tokens or 0) + (completion_tokens or 0),
+                        'calls': calls or 0
+                    })
+                    items.append(item)
+                return sorted(items, key=lambda item: item['total_tokens'], reverse=True)
+
+            return {
+                'since': since,
+                'budgets': {
+                    'user_daily': self.user_daily_budget,
+                    'global_daily': self.global_daily_budget,
+                    'global_used_today': self.get_daily_usage('global')
+                },
+                'by_day': aggregate(TokenUsage.date),
+                'by_user': aggregate(TokenUsage.user_id),
+                'by_model': aggregate(TokenUsage.provider, TokenUsage.model),
+                'by_template': aggregate(TokenUsage.template)
+            }
+        finally:
+            session.close()
+
+
+# 全局记账器实例
+_accountant = None
+_accountant_lock = threading.Lock()
+
+
+def _flush_periodically(accountant: TokenAccountant, interval: int):
+    while True:
+        time.sleep(interval)
+        try:
+            accountant.flush()
+        except Exception as e:
+            logger.error(f"定期写入token用量失败: {e}", exc_info=True)
+
+
+def get_token_accountant(config=None) -> TokenAccountant:
+    """
+    获取全局token记账器实例(单例模式)，首次创建时启动定期写库线程
+
+    Args:
+        config: 配置对象（首次创建时读取预算参数，未提供时使用全局配置）
+
+    Returns:
+        TokenAccountant实例
+    """
+    global _accountant
+
+    if _accountant is None:
+        with _accountant_lock:
+            if _accountant is None:
+                from config import get_redis_client
+                if config is None:
+                    from config import get_config
+                    config = get_config()
+                redis_client = get_redis_client('cache', config)
+                _accountant = TokenAccountant(
+                    redis_client=redis_client,
+                    user_daily_budget=getattr(config, 'TOKEN_DAILY_BUDGET_PER_USER', 0),
+                    global_daily_budget=getattr(config, 'TOKEN_DAILY_BUDGET_GLOBAL', 0)
+                )
+                interval = getattr(config, 'TOKEN_USAGE_FLUSH_INTERVAL', 60)
+                if interval > 0:
+                    threading.Thread(target=_flush_periodically, args=(_accountant, interval),
+                                     name='token-usage-flusher', daemon=True).start()
+
+    return _accountant
@@ -4,12 +4,70 @@
 """
 import logging
 import time
+import uuid
 from typing import Optional
 import redis
 
 logger = logging.getLogger(__name__)
 
 
+# 滑动窗口 + 并发计数的原子检查与占用，一次往返完成
+# KEYS: 并发计数key, 窗口key
+# ARGV: 当前时间, 窗口大小, 每窗口上限, 并发上限(-1不检查), 申请数量, 窗口成员前缀, 并发计数过期时间
+# 返回: {获得数量, 申请前并发数, 申请前窗口内请求数, 速率受限时距最早记录出窗的毫秒数}
+ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local max_rate = tonumber(ARGV[3])
+local max_concurrent = tonumber(ARGV[4])
+local count = tonumber(ARGV[5])
+
+redis.call('ZREMRANGEBYSCORE', KEYS[2], 0, now - window)
+local rate = redis.call('ZCARD', KEYS[2])
+local concurrent = tonumber(redis.call('GET', KEYS[1]) or '0')
+
+local granted = math.min(count, max_rate - rate)
+if max_concurrent >= 0 then
+    granted = math.min(granted, max_concurrent - concurrent)
+end
+if granted < 0 then
+    granted = 0
+end
+
+if granted > 0 then
+    local members = {}
+    for i = 1, granted do
+        table.insert(members, ARGV[1])
+        table.insert(members, ARGV[6] .. ':' .. i)
+    end
+    redis.call('ZADD', KEYS[2], unpack(members))
+    redis.call('EXPIRE', KEYS[2], window * 2)
+    if max_concurrent >= 0 then
+        redis.call('INCRBY', KEYS[1], granted)
+        redis.call('EXPIRE', KEYS[1], ARGV[7])
+    end
+end
+
+local retry_after = 0
+if granted < count and rate + granted >= max_rate then
+    local oldest = redis.call('ZRANGE', KEYS[2], 0, 0, 'WITHSCORES')
+    if oldest[2] then
+        retry_after = math.ceil((tonumber(oldest[2]) + window - now) * 1000)
+    end
+end
+return {granted, concurrent, rate, retry_after}
+"""
+
+# 归还并发名额（不会减到0以下），返回归还后的并发数
+RELEASE_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+if current <= 0 then
+    return -1
+end
+return redis.call('DECRBY', KEYS[1], math.min(tonumber(ARGV[1]), current))
+"""
+
+
 class UserRateLimiter:
     """用户级别限流器"""
 
@@ -26,6 +84,17 @@ class UserRateLimiter:
         self.max_concurrent_tasks = 10  # 每用户最多10个并发任务
         self.max_tasks_per_minute = 20  # 每用户每分钟最多20个新任务
         self.window_size = 60  # 滑动窗口大小(秒)
+        self.concurrent_ttl = 3600  # 并发计数过期时间(秒)，防止计数器永久存在
+
+        # 检查和占用在Redis端原子完成（EVALSHA，一次往返）
+        self._acquire_script = redis_client.register_script(ACQUIRE_SCRIPT)
+        self._release_script = redis_client.register_script(RELEASE_SCRIPT)
+        # 因速率超限被拒绝的用户在窗口内最早的记录出窗前一定仍被拒绝，本地记住（最多 local_block_ttl 秒），
+        # 不必再访问Redis: 用户ID -> (到期时间, 并发数, 窗口内请求数)。
+        # 管理员重置只清除当前进程的记录，其他进程最多在 local_block_ttl 秒后恢复
+        self.local_block_ttl = 1.0
+        self.local_block_max_users = 1024
+        self._rate_blocked = {}
 
         logger.info(f"用户限流器初始化: concurrent={self.max_concurrent_tasks}, rate={self.max_tasks_per_minute}/min")
 
@@ -37,6 +106,47 @@ class UserRateLimiter:
         """获取速率限制的Redis key"""
         return f"ratelimit:user:{user_id}:rate"
 
+    def _reserve(self, user_id: int, count: int, check_concurrency: bool) -> tuple[int, int, int]:
+        """
+        原子地检查并占用名额
+
+        Args:
+            user_id: 用户ID
+            count: 申请数量
+            check_concurrency: 是否检查并占用并发名额
+
+        Returns:
+            (获得数量, 申请前并发数, 申请前窗口内请求数)
+        """
+        now = time.time()
+        blocked = self._rate_blocked.get(user_id)
+        if blocked and blocked[0] > now:
+            logger.debug(f"用户{user_id}仍在速率限制期内，本地拒绝")
+            return 0, blocked[1], blocked[2]
+
+        granted, concurrent_count, rate_count, retry_after_ms = self._acquire_script(
+            keys=[self._get_concurrent_key(user_id), self._get_rate_key(user_id)],
+            args=[now, self.window_size, self.max_tasks_per_minute,
+                  self.max_concurrent_tasks if check_concurrency else -1,
+                  count, f"{now}:{uuid.uuid4().hex[:8]}", self.concurrent_ttl]
+        )
+        if retry_after_ms > 0:
+            self._remember_block(user_id, now + min(retry_after_ms / 1000, self.local_block_ttl),
+                                 concurrent_count + granted, rate_count + granted)
+        else:
+            self._rate_blocked.pop(user_id, None)
+        return granted, concurrent_count, rate_count
+
+    def _remember_block(self, user_id: int, until: float, concurrent_count: int, rate_count: int):
+        """记住用户的速率限制期，记录数超过上限时先清除已过期的记录"""
+        if len(self._rate_blocked) >= self.local_block_max_users:
+            now = time.time()
+            for expired in [uid for uid, blocked in list(self._rate_blocked.items()) if blocked[0] <= now]:
+                self._rate_blocked.pop(expired, None)
+            if len(self._rate_blocked) >= self.local_block_max_users:
+                return
+        self._rate_blocked[user_id] = (until, concurrent_count, rate_count)
+
     def check_concurrent_limit(self, user_id: int) -> tuple[bool, int]:
         """
         检查用户当前并发任务数是否超限
@@ -63,7 +173,7 @@ class UserRateLimiter:
 
     def check_rate_limit(self, user_id: int) -> tuple[bool, int]:
         """
-        检查用户速率限制(滑动窗口算法)
+        检查用户速率限制(滑动窗口算法)，允许时占用一个窗口名额
 
         Args:
             user_id: 用户ID
@@ -72,29 +182,10 @@ class UserRateLimiter:
             (是否允许, 当前窗口内的请求数)
         """
         try:
-            key = self._get_rate_key(user_id)
-            current_time = time.time()
-            window_start = current_time - self.window_size
-
-            # 使用有序集合实现滑动窗口
-            # 1. 移除窗口外的旧记录
-            self.redis.zremrangebyscore(key, 0, window_start)
-
-            # 2. 统计当前窗口内的请求数
-            current_count = self.redis.zcard(key)
-
-            # 3. 检查是否超限
-            allowed = current_count < self.max_tasks_per_minute
-
-            logger.debug(f"用户{user_id}速率检查: {current_count}/{self.max_tasks_per_minute}, 允许={allowed}")
-
-            if allowed:
-                # 4. 如果允许，添加当前请求到窗口
-                self.redis.zadd(key, {str(current_time): current_time})
-                # 5. 设置过期时间(窗口大小的2倍，确保清理)
-                self.redis.expire(key, self.window_size * 2)
-
-            return allowed, current_count
+            granted, _, rate_count = self._reserve(user_id, 1, check_concurrency=False)
+            allowed = granted == 1
+            logger.debug(f"用户{user_id}速率检查: {rate_count}/{self.max_tasks_per_minute}, 允许={allowed}")
+            return allowed, rate_count
 
         except Exception as e:
             logger.error(f"检查速率限制失败: {e}", exc_info=True)
@@ -111,26 +202,37 @@ class UserRateLimiter:
         Returns:
             是否允许执行任务
         """
-        # 1. 检查并发限制
-        concurrent_allowed, concurrent_count = self.check_concurrent_limit(user_id)
-        if not concurrent_allowed:
-            logger.warning(f"用户{user_id}超过并发限制: {concurrent_count}/{self.max_concurrent_tasks}")
-            return False
-
-        # 2. 检查速率限制
-        rate_allowed, rate_count = self.check_rate_limit(user_id)
-        if not rate_allowed:
-            logger.warning(f"用户{user_id}超过速率限制: {rate_count}/{self.max_tasks_per_minute}")
-            return False
-
-        # 3. 增加并发计数
-        key = self._get_concurrent_key(user_id)
-        self.redis.incr(key)
-        # 设置过期时间(1小时)，防止计数器永久存在
-        self.redis.expire(key, 3600)
-
-        logger.info(f"用户{user_id}获取令牌成功, 当前并发:{concurrent_count + 1}")
-        return True
+        return self.acquire_many(user_id, 1) == 1
+
+    def acquire_many(self, user_id: int, count: int, check_concurrency: bool = True) -> int:
+        """
+        一次预留多个令牌(批量创建任务)，检查和占用在一个Lua脚本中原子完成
+
+        Args:
+            user_id: 用户ID
+            count: 需要的令牌数
+            check_concurrency: 是否检查并占用并发名额（公平调度模式下并发在分发时控制）
+
+        Returns:
+            实际获得的令牌数(0~count)，按顺序分配给前面的任务
+        """
+        if count <= 0:
+            return 0
+
+        try:
+            granted, concurrent_count, rate_count = self._reserve(user_id, count, check_concurrency)
+        except Exception as e:
+            logger.error(f"获取令牌失败: {e}", exc_info=True)
+            # 出错时允许通过，避免影响正常业务
+            return count
+
+        if granted < count:
+            logger.warning(f"用户{user_id}申请{count}个令牌, 只获得{granted}个 "
+                           f"(并发:{concurrent_count}/{self.max_concurrent_tasks}, "
+                           f"速率:{rate_count}/{self.max_tasks_per_minute})")
+        else:
+            logger.info(f"用户{user_id}获取令牌成功: {granted}个, 当前并发:{concurrent_count + granted}")
+        return granted
 
     def release(self, user_id: int):
         """
@@ -139,15 +241,25 @@ class UserRateLimiter:
         Args:
             user_id: 用户ID
         """
-        try:
-            key = self._get_concurrent_key(user_id)
-            current = int(self.redis.get(key) or 0)
+        self.release_many(user_id, 1)
 
-            if current > 0:
-                new_count = self.redis.decr(key)
-                logger.debug(f"用户{user_id}释放令牌, 当前并发:{new_count}")
-            else:
+    def release_many(self, user_id: int, count: int):
+        """
+        释放多个令牌(批量创建失败时归还预留的并发名额)
+
+        Args:
+            user_id: 用户ID
+            count: 释放的令牌数
+        """
+        if count <= 0:
+            return
+
+        try:
+            new_count = self._release_script(keys=[self._get_concurrent_key(user_id)], args=[count])
+            if new_count < 0:
                 logger.warning(f"用户{user_id}尝试释放令牌，但计数已为0")
+            else:
+                logger.debug(f"用户{user_id}释放{count}个令牌, 当前并发:{new_count}")
 
         except Exception as e:
             logger.error(f"释放令牌失败: {e}", exc_info=True)
@@ -205,6 +317,7 @@ class UserRateLimiter:
 
             self.redis.delete(concurrent_key)
             self.redis.delete(rate_key)
+            self._rate_blocked.pop(user_id, None)
 
             logger.info(f"已重置用户{user_id}的限流计数器")
 
@@ -258,13 +371,9 @@ def get_rate_limiter(redis_client: redis.Redis = None) -> UserRateLimiter:
     global _rate_limiter, _limiter_lock
 
     if redis_client is None:
-        # 使用默认Redis连接
-        redis_client = redis.Redis(
-            host='localhost',
-            port=6379,
-            db=0,
-            decode_responses=True
-        )
+        # 使用共享的缓存连接池
+        from config import get_redis_client
+        redis_client = get_redis_client('cache')
 
     if _rate_limiter is None:
         import threading
@@ -0,0 +1,389 @@
+"""
+RQ Worker自动伸缩
+按队列积压、最早任务的等待时间在上下限之间启动或退出 rq worker 进程：高峰期积压时扩容，
+空闲时逐个缩容，不让Chrome整夜空转。主机CPU或可用内存紧张时不再扩容（每个发布任务都要启动浏览器）。
+
+缩容只向Worker发送一次SIGTERM（RQ的warm shutdown：执行完当前任务再退出），正在进行的浏览器发布不会被中断；
+超过排空时间仍未退出才强制结束。
+
+Redis结构:
+    rq:autoscaler:status:{hostname}     当前状态与指标(JSON)，每次检查时更新，进程退出后过期
+    rq:autoscaler:decisions:{hostname}  最近的伸缩决策(JSON List，保留最近DECISION_LOG_SIZE条)
+"""
+import sys
+import os
+import json
+import math
+import time
+import signal
+import socket
+import subprocess
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+STATUS_KEY_PREFIX = 'rq:autoscaler:status:'
+DECISIONS_KEY_PREFIX = 'rq:autoscaler:decisions:'
+
+
+class ManagedWorker:
+    """自动伸缩启动的一个 rq worker 进程"""
+
+    def __init__(self, name: str, process: subprocess.Popen):
+        self.name = name
+        self.process = process
+        self.started_at = time.time()
+        self.draining_since: Optional[float] = None
+        self.busy = False
+
+
+class WorkerAutoscaler:
+    """按队列深度伸缩本机的 rq worker 进程"""
+
+    # 每次检查最多新增的Worker数（每个Worker启动时要加载应用，避免一次拉起过多进程）
+    MAX_SCALE_UP_STEP = 2
+    DECISION_LOG_SIZE = 100
+
+    def __init__(self, connection, redis_url: str, queues: List[str], worker_class: str = 'rq.worker.SimpleWorker',
+                 min_workers: int = 1, max_workers: int = 6, jobs_per_worker: int = 2, max_job_wait: int = 60,
+                 interval: int = 10, scale_down_delay: int = 300, max_cpu_percent: float = 85,
+                 min_free_memory_mb: int = 1024, drain_timeout: int = 900, log_dir: Optional[str] = None,
+                 status_client=None):
+        """
+        初始化自动伸缩
+
+        Args:
+            connection: RQ使用的Redis连接（bytes模式）
+            redis_url: 传给 rq worker 的Redis地址
+            queues: Worker监听的队列
+            worker_class: Worker类
+            min_workers / max_workers: Worker数上下限
+            jobs_per_worker: 每个空闲Worker对应的排队任务数
+            max_job_wait: 最早排队的任务等待超过该时间(秒)时多扩容一个Worker
+            interval: 检查间隔(秒)
+            scale_down_delay: 需求持续低于现有Worker数该时间(秒)后才缩容一个
+            max_cpu_percent: CPU使用率超过该值时不扩容
+            min_free_memory_mb: 可用内存低于该值(MB)时不扩容
+            drain_timeout: 缩容时等待Worker完成当前任务的最长时间(秒)
+            log_dir: Worker日志目录
+            status_client: 写入状态和决策的Redis客户端（decode_responses=True），为None时只写日志
+        """
+        self.connection = connection
+        self.redis_url = redis_url
+        self.queues = queues
+        self.worker_class = worker_class
+        self.min_workers = max(0, min_workers)
+        self.max_workers = max(self.min_workers, max_workers)
+        self.jobs_per_worker = max(1, jobs_per_worker)
+        self.max_job_wait = max_job_wait
+        self.interval = interval
+        self.scale_down_delay = scale_down_delay
+        self.max_cpu_percent = max_cpu_percent
+        self.min_free_memory_mb = min_free_memory_mb
+        self.drain_timeout = drain_timeout
+        self.log_dir = log_dir
+        self.status_client = status_client
+        self.hostname = socket.gethostname()
+        self.workers: Dict[str, ManagedWorker] = {}
+        self.stats = {'spawned': 0, 'retired': 0, 'crashed': 0, 'killed': 0}
+        self._sequence = 0
+        self._low_demand_since: Optional[float] = None
+        self._stop = threading.Event()
+
+    @property
+    def active_workers(self) -> List[ManagedWorker]:
+        """未在排空的Worker"""
+        return [worker for worker in self.workers.values() if worker.draining_since is None]
+
+    def collect_metrics(self) -> Dict:
+        """
+        采集伸缩依据：排队任务数、最早排队任务的等待时间、忙碌的Worker数、主机CPU与可用内存
+
+        Returns:
+            {'queued', 'oldest_wait', 'busy', 'cpu_percent', 'free_memory_mb'}
+        """
+        import psutil
+        from rq import Queue
+        from rq.job import Job
+        from rq.worker import Worker
+
+        queued = 0
+        head_ids = []
+        for name in self.queues:
+            queue = Queue(name, connection=self.connection)
+            queued += queue.count
+            head_ids.extend(queue.get_job_ids(0, 0))
+
+        oldest_wait = 0.0
+        now = datetime.now(timezone.utc)
+        for job in Job.fetch_many(head_ids, connection=self.connection) if head_ids else []:
+            if job is not None and job.enqueued_at is not None:
+                oldest_wait = max(oldest_wait, (now - job.enqueued_at).total_seconds())
+
+        for worker in self.workers.values():
+            rq_worker = Worker.find_by_key(Worker.redis_worker_namespace_prefix + worker.name,
+                                           connection=self.connection)
+            worker.busy = rq_worker is not None and rq_worker.get_state() == 'busy'
+
+        return {
+            'queued': queued,
+            'oldest_wait': round(oldest_wait, 1),
+            'busy': sum(1 for worker in self.active_workers if worker.busy),
+            'cpu_percent': psutil.cpu_percent(interval=None),
+            'free_memory_mb': psutil.virtual_memory().available // (1024 * 1024)
+        }
+
+    def decide(self, metrics: Dict, current: int, now: Optional[float] = None) -> Dict:
+        """
+        根据指标计算目标Worker数
+
+        需求 = 忙碌Worker数 + 排队任务数/每Worker任务数（向上取整），最早任务等待过久时再加一；
+        扩容每次最多 MAX_SCALE_UP_STEP 个，主机资源紧张时暂停；缩容在需求持续偏低 scale_down_delay 秒后每次减一个；
+        低于下限时立即补齐（Worker异常退出）
+
+        Args:
+            metrics: collect_metrics 的结果
+            current: 当前未排空的Worker数
+            now: 当前时间戳（测试用）
+
+        Returns:
+            {'action': 'scale_up'/'scale_down'/'hold', 'current', 'target', 'desired', 'reason'}
+        """
+        now = time.time() if now is None else now
+        demand = metrics['busy'] + math.ceil(metrics['queued'] / self.jobs_per_worker)
+        if metrics['queued'] and metrics['oldest_wait'] > self.max_job_wait:
+            demand += 1
+        desired = min(self.max_workers, max(self.min_workers, demand))
+
+        def decision(action, target, reason):
+            return {'action': action, 'current': current, 'target': target, 'desired': desired, 'reason': reason}
+
+        if desired >= current:
+            self._low_demand_since = None
+        if current < self.min_workers:
+            return decision('scale_up', self.min_workers, f'Worker数低于下限 {self.min_workers}')
+        if desired > current:
+            if metrics['cpu_percent'] > self.max_cpu_percent:
+                return decision('hold', current, f"CPU使用率 {metrics['cpu_percent']}% 超过 {self.max_cpu_percent}%，暂不扩容")
+            if metrics['free_memory_mb'] < self.min_free_memory_mb:
+                return decision('hold', current,
+                                f"可用内存 {metrics['free_memory_mb']}MB 低于 {self.min_free_memory_mb}MB，暂不扩容")
+            return decision('scale_up', min(desired, current + self.MAX_SCALE_UP_STEP),
+                            f"排队 {metrics['queued']} 个，最早等待 {metrics['oldest_wait']}秒，忙碌 {metrics['busy']} 个")
+        if desired < current:
+            if self._low_demand_since is None:
+                self._low_demand_since = now
+            if now - self._low_demand_since < self.scale_down_delay:
+                return decision('hold', current, f'需求 {desired} 个，等待持续 {self.scale_down_delay}秒后缩容')
+            # 再缩容一个需要重新等待
+            self._low_demand_since = now
+            return decision('scale_down', current - 1,
+                            f'需求持续 {self.scale_down_delay}秒低于现有Worker数（需求 {desired} 个）')
+        return decision('hold', current, '')
+
+    def spawn(self) -> ManagedWorker:
+        """启动一个 rq worker 进程"""
+        self._sequence += 1
+        name = f"auto-{self.hostname}-{os.getpid()}-{self._sequence}"
+        command = [sys.executable, '-m', 'rq.cli', 'worker', *self.queues,
+                   '--url', self.redis_url, '--name', name,
+                   '--worker-class', self.worker_class, '--with-scheduler']
+        backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        if self.log_dir:
+            os.makedirs(self.log_dir, exist_ok=True)
+        log_file = (open(os.path.join(self.log_dir, f'rq-{name}.log'), 'ab')
+                    if self.log_dir else subprocess.DEVNULL)
+        try:
+            process = subprocess.Popen(command, cwd=backend_dir, stdout=log_file, stderr=subprocess.STDOUT,
+                                       env=dict(os.environ, PYTHONPATH=backend_dir))
+        finally:
+            if log_file is not subprocess.DEVNULL:
+                log_file.close()
+        worker = ManagedWorker(name, process)
+        self.workers[name] = worker
+        self.stats['spawned'] += 1
+        logger.info(f"启动Worker: {name} (pid={process.pid})")
+        return worker
+
+    def drain(self, worker: ManagedWorker):
+        """让Worker执行完当前任务后退出（只发送一次SIGTERM，第二次会中断正在执行的任务）"""
+        if worker.draining_since is not None:
+            return
+        worker.draining_since = time.time()
+        logger.info(f"排空Worker: {worker.name} (pid={worker.process.pid}, {'执行任务中' if worker.busy else '空闲'})")
+        try:
+            worker.process.send_signal(signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def reap(self):
+        """回收已退出的Worker；排空超时的强制结束"""
+        now = time.time()
+        for name, worker in list(self.workers.items()):
+            returncode = worker.process.poll()
+            if returncode is None:
+                if worker.draining_since is not None and now - worker.draining_since > self.drain_timeout:
+                    logger.warning(f"Worker排空超过 {self.drain_timeout}秒，强制结束: {name}")
+                    worker.process.kill()
+                    self.stats['killed'] += 1
+                continue
+            del self.workers[name]
+            if worker.draining_since is not None:
+                self.stats['retired'] += 1
+                logger.info(f"Worker已退出: {name}, 运行 {now - worker.started_at:.0f}秒")
+            else:
+                self.stats['crashed'] += 1
+                logger.error(f"Worker意外退出: {name} (返回码 {returncode})")
+
+    def apply(self, decision: Dict):
+        """按决策启动或排空Worker（优先排空空闲的、最晚启动的Worker）"""
+        current = len(self.active_workers)
+        for _ in range(decision['target'] - current):
+            self.spawn()
+        if decision['target'] < current:
+            candidates = sorted(self.active_workers, key=lambda worker: (worker.busy, -worker.started_at))
+            for worker in candidates[:current - decision['target']]:
+                self.drain(worker)
+
+    def step(self) -> Dict:
+        """执行一次检查：回收、采集指标、决策、执行并导出"""
+        self.reap()
+        metrics = self.collect_metrics()
+        decision = self.decide(metrics, len(self.active_workers))
+        self.apply(decision)
+        decision.update(metrics)
+        decision['time'] = datetime.now().isoformat(timespec='seconds')
+        self.export(decision)
+        return decision
+
+    def export(self, decision: Dict):
+        """导出状态和伸缩决策（日志，以及Redis供管理后台查看；写Redis失败时忽略）"""
+        if decision['action'] != 'hold':
+            logger.info(f"伸缩决策: {decision['action']} {decision['current']} -> {decision['target']}, "
+                        f"原因: {decision['reason']}")
+        elif decision['reason']:
+            logger.debug(f"伸缩决策: 保持 {decision['current']} 个, {decision['reason']}")
+        if self.status_client is None:
+            return
+        status = self.get_status()
+        status['last_decision'] = decision
+        try:
+            pipe = self.status_client.pipeline()
+            pipe.set(f"{STATUS_KEY_PREFIX}{self.hostname}", json.dumps(status, ensure_ascii=False),
+                     ex=self.interval * 3)
+            if decision['action'] != 'hold':
+                decisions_key = f"{DECISIONS_KEY_PREFIX}{self.hostname}"
+                pipe.lpush(decisions_key, json.dumps(decision, ensure_ascii=False))
+                pipe.ltrim(decisions_key, 0, self.DECISION_LOG_SIZE - 1)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"导出伸缩状态失败: {e}")
+
+    def get_status(self) -> Dict:
+        """当前管理的Worker与累计统计"""
+        now = time.time()
+        return {
+            'host': self.hostname,
+            'pid': os.getpid(),
+            'min_workers': self.min_workers,
+            'max_workers': self.max_workers,
+            'workers': [{
+                'name': worker.name,
+                'pid': worker.process.pid,
+                'busy': worker.busy,
+                'draining': worker.draining_since is not None,
+                'uptime_seconds': round(now - worker.started_at)
+            } for worker in self.workers.values()],
+            **self.stats
+        }
+
+    def run(self):
+        """持续伸缩，收到SIGTERM/SIGINT后排空所有Worker再退出"""
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: self._stop.set())
+        logger.info(f"Worker自动伸缩启动: {self.min_workers}-{self.max_workers} 个, 队列: {' '.join(self.queues)}")
+
+        while not self._stop.is_set():
+            try:
+                self.step()
+            except Exception as e:
+                logger.error(f"自动伸缩检查失败: {e}", exc_info=True)
+            self._stop.wait(self.interval)
+
+        self.shutdown()
+
+    def shutdown(self):
+        """排空所有Worker，等待执行中的任务完成（最长drain_timeout秒）"""
+        logger.info(f"停止自动伸缩，排空 {len(self.workers)} 个Worker")
+        for worker in list(self.workers.values()):
+            self.drain(worker)
+        while self.workers:
+            self.reap()
+            time.sleep(1)
+        logger.info("所有Worker已退出")
+
+
+def get_autoscaler_status(redis_client) -> List[Dict]:
+    """
+    汇总各主机自动伸缩上报的状态和最近的伸缩决策
+
+    Args:
+        redis_client: Redis客户端（decode_responses=True）
+
+    Returns:
+        [{'host', 'workers', 'spawned', 'retired', ..., 'last_decision', 'recent_decisions'}, ...]
+    """
+    statuses = []
+    for key in redis_client.scan_iter(match=f"{STATUS_KEY_PREFIX}*", count=100):
+        raw = redis_client.get(key)
+        if not raw:
+            continue
+        status = json.loads(raw)
+        decisions = redis_client.lrange(f"{DECISIONS_KEY_PREFIX}{status['host']}", 0, 19)
+        status['recent_decisions'] = [json.loads(decision) for decision in decisions]
+        statuses.append(status)
+    return sorted(statuses, key=lambda status: status['host'])
+
+
+def create_autoscaler(config=None, **overrides) -> WorkerAutoscaler:
+    """
+    按配置创建自动伸缩
+
+    Args:
+        config: 配置对象
+        overrides: 覆盖配置的参数（如 min_workers、max_workers）
+
+    Returns:
+        WorkerAutoscaler实例
+    """
+    if config is None:
+        from config import get_config
+        config = get_config()
+    from config import get_redis_client, _redis_setting
+
+    options = {
+        'queues': getattr(config, 'RQ_WORKER_QUEUES', ['default']),
+        'worker_class': getattr(config, 'RQ_WORKER_CLASS', 'rq.worker.SimpleWorker'),
+        'min_workers': getattr(config, 'RQ_AUTOSCALE_MIN_WORKERS', 1),
+        'max_workers': getattr(config, 'RQ_AUTOSCALE_MAX_WORKERS', 6),
+        'jobs_per_worker': getattr(config, 'RQ_AUTOSCALE_JOBS_PER_WORKER', 2),
+        'max_job_wait': getattr(config, 'RQ_AUTOSCALE_MAX_JOB_WAIT', 60),
+        'interval': getattr(config, 'RQ_AUTOSCALE_INTERVAL', 10),
+        'scale_down_delay': getattr(config, 'RQ_AUTOSCALE_SCALE_DOWN_DELAY', 300),
+        'max_cpu_percent': getattr(config, 'RQ_AUTOSCALE_MAX_CPU_PERCENT', 85),
+        'min_free_memory_mb': getattr(config, 'RQ_AUTOSCALE_MIN_FREE_MEMORY_MB', 1024),
+        'drain_timeout': getattr(config, 'RQ_AUTOSCALE_DRAIN_TIMEOUT', 900),
+        'log_dir': getattr(config, 'LOGS_FOLDER', None),
+    }
+    options.update({key: value for key, value in overrides.items() if value is not None})
+    return WorkerAutoscaler(
+        get_redis_client('queue', config),
+        _redis_setting(config, 'REDIS_URL'),
+        status_client=get_redis_client('cache', config),
+        **options
+    )
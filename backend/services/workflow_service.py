@@ -11,6 +11,8 @@ from logger_config import setup_logger, log_service_call
 from datetime import datetime
 from typing import Dict, List, Optional
 from models import Workflow, Article, get_db_session
+from services.article_prefetch import get_article_prefetcher, DRAFT_PARAM_KEYS
+from services.duplicate_index import get_duplicate_index
 
 logger = setup_logger(__name__)
 
@@ -67,6 +69,12 @@ class WorkflowService:
                 if not workflow:
                     raise ValueError(f'Workflow not found: {workflow_id}')
 
+                # 分析内容或模板变化时预生成的文章草稿失效
+                drafts_stale = any(
+                    key in DRAFT_PARAM_KEYS and hasattr(workflow, key) and getattr(workflow, key) != value
+                    for key, value in data.items()
+                )
+
                 # 更新字段
                 for key, value in data.items():
                     if hasattr(workflow, key):
@@ -79,6 +87,9 @@ class WorkflowService:
             db.commit()
             logger.info(f'Workflow saved: {workflow.id}')
 
+            if workflow_id and drafts_stale:
+                self.invalidate_article_drafts(workflow.id)
+
             return {
                 'success': True,
                 'workflow': workflow.to_dict()
@@ -92,6 +103,19 @@ class WorkflowService:
             db.close()
 
 
+    def invalidate_article_drafts(self, workflow_id: int):
+        """
+        淘汰工作流的预生成文章草稿
+
+        Args:
+            workflow_id: 工作流ID
+        """
+        try:
+            get_article_prefetcher().evict(workflow_id)
+        except Exception as e:
+            logger.warning(f'Failed to evict article drafts for workflow {workflow_id}: {e}')
+
+
     @log_service_call("保存文章")
     def save_articles(self, user_id: int, workflow_id: int,
                      articles: List[Dict]) -> List[Dict]:
@@ -117,7 +141,11 @@ class WorkflowService:
             if not workflow:
                 raise ValueError(f'Workflow not found: {workflow_id}')
 
-            # 删除旧文章
+            # 删除旧文章（批量删除不触发ORM事件，先删除对应的内容指纹）
+            try:
+                get_duplicate_index().remove_workflow_articles(db, workflow_id)
+            except Exception as e:
+                logger.warning(f'Failed to remove fingerprints for workflow {workflow_id}: {e}')
             db.query(Article).filter_by(workflow_id=workflow_id).delete()
 
             # 保存新文章
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流式文章生成测试
+使用本地SSE桩服务验证 AIService.stream_articles 的事件和最终结果，以及流式生成不占用共享执行器
+"""
+import sys
+import os
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 设置UTF-8编码输出
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加backend目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.ai_service import AIService, ArticleStreamAssembler, remove_markdown_and_ai_traces
+from services.llm_executor import LLMExecutor
+
+ARTICLE_TEXT = "标题：聊聊**测试公司**\n正文：\n## 第一段\n综上所述，这家公司不错。\n\n- 第二段内容\n"
+
+
+class _StreamHandler(BaseHTTPRequestHandler):
+    """按小块推送SSE的chat completions桩"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        json.loads(self.rfile.read(length))
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        for i in range(0, len(ARTICLE_TEXT), 3):
+            chunk = {'choices': [{'delta': {'content': ARTICLE_TEXT[i:i + 3]}}]}
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+class _SlowStreamHandler(_StreamHandler):
+    """先推送一块内容，再等待 release 事件后结束的流"""
+    release = threading.Event()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        chunk = {'choices': [{'delta': {'content': ARTICLE_TEXT}}]}
+        self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+        self.wfile.flush()
+        self.release.wait(5)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+
+class _StubConfig:
+    DEFAULT_AI_PROVIDER = 'qianwen'
+    QIANWEN_API_KEY = 'test'
+    QIANWEN_API_BASE = ''
+    QIANWEN_CHAT_URL = ''
+    QIANWEN_MODEL = 'qwen-plus'
+
+
+def test_assembler_paragraphs():
+    """测试组装器按行解析标题并增量清理段落"""
+    print("测试 1: 增量段落清理...")
+    assembler = ArticleStreamAssembler()
+    events = []
+    for i in range(0, len(ARTICLE_TEXT), 2):
+        events.extend(assembler.feed(ARTICLE_TEXT[i:i + 2]))
+    events.extend(assembler.finish())
+
+    assert events[0] == {'type': 'title', 'title': '聊聊**测试公司**'}
+    paragraphs = [e['text'] for e in events if e['type'] == 'paragraph']
+    assert paragraphs == ['第一段', '，这家公司不错。', '第二段内容'], paragraphs
+    assert assembler.content == ARTICLE_TEXT
+    print("  ✓ 标题和段落事件正确")
+
+
+def test_stream_articles_matches_sync_parse():
+    """测试流式生成的最终文章与同步解析结果一致"""
+    print("\n测试 2: 流式生成最终结果...")
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _StreamHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        config = _StubConfig()
+        config.QIANWEN_CHAT_URL = f'http://127.0.0.1:{server.server_port}/chat/completions'
+        service = AIService(config)
+        specs = service.build_article_specs('测试公司', '分析结果', article_count=2)
+
+        events = list(service.stream_articles('测试公司', specs))
+        articles = {e['index']: e['article'] for e in events if e['type'] == 'article'}
+        assert sorted(articles) == [0, 1]
+        assert not [e for e in events if e['type'] == 'error']
+
+        title, body = service._parse_article(ARTICLE_TEXT.strip())
+        expected = remove_markdown_and_ai_traces(body)
+        assert articles[0]['title'] == title
+        assert articles[0]['content'] == expected
+        assert articles[1]['type'] == specs[1]['angle']
+        print(f"  ✓ 共 {len(events)} 个事件，最终文章与同步解析一致")
+    finally:
+        server.shutdown()
+
+
+def test_streams_do_not_block_shared_executor():
+    """测试进行中的流式生成运行在独立线程池，共享执行器仍可立即执行其他任务"""
+    print("\n测试 3: 流式生成使用独立线程池...")
+    _SlowStreamHandler.release.clear()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _SlowStreamHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        config = _StubConfig()
+        config.QIANWEN_CHAT_URL = f'http://127.0.0.1:{server.server_port}/chat/completions'
+        service = AIService(config)
+        service.executor = LLMExecutor(max_workers=1)
+        service.stream_executor = LLMExecutor(max_workers=2, name='llm-stream-test')
+        specs = service.build_article_specs('测试公司', '分析结果', article_count=2)
+
+        stream = service.stream_articles('测试公司', specs)
+        first = next(stream)
+        assert first['type'] == 'start'
+        deadline = time.time() + 2
+        while service.stream_executor.get_stats()['running'] < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        assert service.stream_executor.get_stats()['running'] == 2
+        # 两篇文章的流都未结束时，共享执行器（只有1个线程）仍能立即执行任务
+        start = time.perf_counter()
+        assert service.executor.submit(lambda: 'ok').result(timeout=1) == 'ok'
+        assert time.perf_counter() - start < 0.5
+
+        _SlowStreamHandler.release.set()
+        events = [first] + list(stream)
+        assert len([e for e in events if e['type'] == 'article']) == 2
+        assert service.executor.get_stats()['submitted'] == 1
+        assert service.stream_executor.get_stats()['completed'] == 2
+        print("  ✓ 2篇文章的流在独立线程池中进行，共享执行器未被占用")
+    finally:
+        _SlowStreamHandler.release.set()
+        server.shutdown()
+
+
+def main():
+    """运行所有测试"""
+    print("=" * 60)
+    print("  流式文章生成测试")
+    print("=" * 60)
+
+    tests = [test_assembler_paragraphs, test_stream_articles_matches_sync_parse,
+             test_streams_do_not_block_shared_executor]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            print(f"  ❌ 测试失败: {e}")
+            failed += 1
+
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    exit(main())
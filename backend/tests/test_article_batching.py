@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量文章生成策略测试
+使用本地桩服务验证JSON结构化输出解析、单篇回退和策略统计
+"""
+import sys
+import os
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 设置UTF-8编码输出
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加backend目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.ai_service import AIService, article_listener, get_article_strategy_stats
+from services.llm_cache import LLMResponseCache
+
+BODY = '这是一段足够长的正文内容，用来模拟真实文章。' * 20
+
+
+def _start_stub(behavior):
+    """
+    启动桩服务：批量请求返回JSON，单篇请求返回"标题/正文"格式
+
+    Args:
+        behavior: {'bad_index': 批量结果中正文过短的文章序号}
+    """
+    calls = {'batch': 0, 'single': 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length))
+            prompt = payload['messages'][-1]['content']
+            prompt_tokens = len(prompt)
+            if '"articles"' in prompt:
+                calls['batch'] += 1
+                count = int(prompt.split('请按下面')[1].split('个角度')[0])
+                articles = [{'angle': f'角度{i}', 'title': f'批量标题{i}',
+                             'content': '短' if i == behavior.get('bad_index') else BODY}
+                            for i in range(count)]
+                content = '```json\n' + json.dumps({'articles': articles}, ensure_ascii=False) + '\n```'
+            else:
+                calls['single'] += 1
+                content = f'标题：单篇标题\n正文：\n{BODY}'
+            body = json.dumps({
+                'choices': [{'message': {'content': content}}],
+                'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': len(content)}
+            }).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, calls
+
+
+def _make_service(port):
+    class StubConfig:
+        DEFAULT_AI_PROVIDER = 'qianwen'
+        QIANWEN_API_KEY = 'test'
+        QIANWEN_API_BASE = ''
+        QIANWEN_CHAT_URL = f'http://127.0.0.1:{port}/chat/completions'
+        QIANWEN_MODEL = 'qwen-plus'
+        ARTICLE_BATCH_SIZE = 3
+
+    service = AIService(StubConfig())
+    service.cache = LLMResponseCache(None)
+    return service
+
+
+def test_parse_truncated_output():
+    """测试输出被截断时保留完整的文章"""
+    print("测试 1: 截断输出解析...")
+    service = _make_service(0)
+    content = '{"articles": [{"title": "A", "content": "甲"}, {"title": "B", "content": "乙"}, {"title": "C", "con'
+    items = service._parse_batch_articles(content)
+    assert [item['title'] for item in items] == ['A', 'B']
+    assert service._parse_batch_articles('不是JSON') == []
+    print("  ✓ 截断前的2篇文章被保留，非JSON输出返回空列表")
+
+
+def test_batched_generation():
+    """测试一次调用生成多篇文章"""
+    print("\n测试 2: 批量生成...")
+    server, calls = _start_stub({})
+    try:
+        service = _make_service(server.server_port)
+        articles = service.generate_articles('测试公司', '分析' * 500, article_count=3, strategy='batched')
+        assert len(articles) == 3
+        assert [a['title'] for a in articles] == ['批量标题0', '批量标题1', '批量标题2']
+        assert [a['type'] for a in articles] == ['技术创新', '行业应用', '用户价值']
+        assert 'index' not in articles[0]
+        assert calls == {'batch': 1, 'single': 0}
+        print("  ✓ 3篇文章只调用1次API")
+    finally:
+        server.shutdown()
+
+
+def test_fallback_on_invalid_article():
+    """测试不合格的文章回退为单篇调用"""
+    print("\n测试 3: 单篇回退...")
+    server, calls = _start_stub({'bad_index': 1})
+    try:
+        service = _make_service(server.server_port)
+        articles = service.generate_articles('测试公司', '分析', article_count=3, strategy='batched')
+        assert [a['title'] for a in articles] == ['批量标题0', '单篇标题', '批量标题2']
+        assert calls == {'batch': 1, 'single': 1}
+        print("  ✓ 正文过短的第2篇单独重新生成，顺序保持不变")
+    finally:
+        server.shutdown()
+
+
+def test_strategy_stats():
+    """测试两种策略的token统计"""
+    print("\n测试 4: 策略统计...")
+    server, _ = _start_stub({})
+    try:
+        service = _make_service(server.server_port)
+        analysis = '分析' * 500
+        service.generate_articles('测试公司', analysis, article_count=3, strategy='fanout')
+        service.generate_articles('测试公司', analysis, article_count=3, strategy='batched')
+        stats = get_article_strategy_stats().get_stats()
+        assert stats['fanout']['calls'] >= 3
+        assert stats['batched']['prompt_tokens_per_article'] < stats['fanout']['prompt_tokens_per_article']
+        print(f"  ✓ 每篇prompt tokens: fanout={stats['fanout']['prompt_tokens_per_article']}, "
+              f"batched={stats['batched']['prompt_tokens_per_article']}")
+    finally:
+        server.shutdown()
+
+def test_article_listener():
+    """测试逐篇通知监听器（后台任务推送部分结果）"""
+    print("\n测试 5: 文章监听器...")
+    server, _ = _start_stub({'bad_index': 2})
+    try:
+        service = _make_service(server.server_port)
+        for strategy in ('fanout', 'batched'):
+            received = []
+            with article_listener(received.append):
+                articles = service.generate_articles('测试公司', '分析', article_count=3, strategy=strategy)
+            assert sorted(a['index'] for a in received) == [0, 1, 2], strategy
+            assert all('index' not in a for a in articles)
+        # 监听器只在上下文内生效，异常不影响生成
+        with article_listener(lambda article: 1 / 0):
+            assert len(service.generate_articles('测试公司', '分析', article_count=2, strategy='fanout')) == 2
+        print("  ✓ 两种策略下每篇文章各通知一次（含回退文章），监听器异常被忽略")
+    finally:
+        server.shutdown()
+
+
+def main():
+    """运行所有测试"""
+    print("=" * 60)
+    print("  批量文章生成策略测试")
+    print("=" * 60)
+
+    tests = [test_parse_truncated_output, test_batched_generation,
+             test_fallback_on_invalid_article, test_strategy_stats, test_article_listener]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            print(f"  ❌ 测试失败: {e}")
+            failed += 1
+
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    exit(main())
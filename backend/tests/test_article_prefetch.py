@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文章预生成测试
+使用进程内存储验证草稿命中、参数变化淘汰、等待生成中的草稿、过期结果丢弃以及中断的预生成
+"""
+import sys
+import os
+import time
+import threading
+
+# 设置UTF-8编码输出
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加backend目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.article_prefetch import ArticlePrefetcher, draft_fingerprint
+
+PARAMS = {'company_name': '测试公司', 'analysis': '分析结果', 'article_count': 3,
+          'article_prompt_id': 5, 'platform_style_prompt_id': None, 'template_id': None, 'strategy': None}
+
+
+def _generator(delay=0.0, gate=None):
+    """返回生成函数和调用计数"""
+    calls = {'count': 0}
+
+    def generate(data):
+        calls['count'] += 1
+        if gate is not None:
+            gate.wait(5)
+        time.sleep(delay)
+        return [{'title': f'{data["company_name"]}文章{i}', 'content': '正文', 'type': '角度'}
+                for i in range(data['article_count'])]
+
+    return generate, calls
+
+
+def test_fingerprint():
+    """测试指纹只取决于生成参数"""
+    print("测试 1: 参数指纹...")
+    request = dict(PARAMS, workflow_id=9, article_count=None, article_prompt_id='5', ai_model='x')
+    assert draft_fingerprint(request) == draft_fingerprint(PARAMS)
+    assert draft_fingerprint(dict(PARAMS, article_prompt_id=6)) != draft_fingerprint(PARAMS)
+    assert draft_fingerprint(dict(PARAMS, analysis='修改后的分析')) != draft_fingerprint(PARAMS)
+    versions = {'article_prompt_id': ['1.0', '2025-01-01T12:00:00']}
+    edited = {'article_prompt_id': ['1.0', '2025-01-02T08:30:00']}
+    assert draft_fingerprint(dict(PARAMS, prompt_versions=versions)) == \
+        draft_fingerprint(dict(PARAMS, prompt_versions=dict(versions)))
+    assert draft_fingerprint(dict(PARAMS, prompt_versions=edited)) != \
+        draft_fingerprint(dict(PARAMS, prompt_versions=versions))
+    print("  ✓ 默认值和ID类型差异不影响指纹，提示词ID、提示词内容（更新时间）或分析变化时指纹不同")
+
+
+def test_hit_and_consume():
+    """测试参数一致时命中草稿，取出后不再命中"""
+    print("\n测试 2: 命中草稿...")
+    prefetcher = ArticlePrefetcher(None)
+    generate, calls = _generator()
+    prefetcher.schedule(1, 10, PARAMS, generate)
+    articles = prefetcher.take(1, 10, dict(PARAMS, workflow_id=10))
+    assert len(articles) == 3 and calls['count'] == 1
+    assert prefetcher.take(1, 10, PARAMS) is None
+    # 其他用户不能取走
+    prefetcher.schedule(1, 11, PARAMS, generate)
+    assert prefetcher.take(2, 11, PARAMS) is None
+    print("  ✓ 草稿命中一次后删除，不同用户不可见")
+
+
+def test_mismatch_evicts():
+    """测试换了提示词时淘汰草稿"""
+    print("\n测试 3: 参数变化淘汰...")
+    prefetcher = ArticlePrefetcher(None)
+    generate, _ = _generator()
+    prefetcher.schedule(1, 20, PARAMS, generate)
+    time.sleep(0.1)
+    assert prefetcher.take(1, 20, dict(PARAMS, article_prompt_id=6)) is None
+    assert prefetcher.take(1, 20, PARAMS) is None
+    stats = prefetcher.get_stats()
+    assert stats['evicted'] == 1 and stats['misses'] == 1
+    print("  ✓ 提示词不一致时草稿被淘汰")
+
+
+def test_wait_for_running_prefetch():
+    """测试生成请求等待生成中的草稿，而不是重复生成"""
+    print("\n测试 4: 等待生成中的草稿...")
+    prefetcher = ArticlePrefetcher(None)
+    generate, calls = _generator(delay=0.5)
+    prefetcher.schedule(1, 30, PARAMS, generate)
+    start = time.time()
+    articles = prefetcher.take(1, 30, PARAMS)
+    assert articles and calls['count'] == 1
+    assert time.time() - start < 2
+    print(f"  ✓ 等待 {time.time() - start:.2f}s 后取得草稿，只生成了1次")
+
+
+def test_evicted_result_discarded():
+    """测试生成期间被淘汰的草稿，完成后结果被丢弃"""
+    print("\n测试 5: 丢弃过期结果...")
+    prefetcher = ArticlePrefetcher(None)
+    gate = threading.Event()
+    generate, _ = _generator(gate=gate)
+    prefetcher.schedule(1, 40, PARAMS, generate)
+    prefetcher.evict(40)
+    gate.set()
+    deadline = time.time() + 5
+    while prefetcher.get_stats()['discarded'] == 0 and time.time() < deadline:
+        time.sleep(0.05)
+    assert prefetcher.get_stats()['discarded'] == 1
+    assert prefetcher.take(1, 40, PARAMS) is None
+    print("  ✓ 淘汰后完成的生成结果不会写回")
+
+
+def test_stale_running_draft():
+    """测试执行进程退出（心跳停止）时不再等待，心跳正常时等待长时间生成"""
+    print("\n测试 6: 中断的预生成...")
+    prefetcher = ArticlePrefetcher(None, stale_after=0.4)
+    jobs = []
+    assert prefetcher.schedule(1, 50, PARAMS, None, enqueue=lambda *args: jobs.append(args))
+    start = time.time()
+    assert prefetcher.take(1, 50, PARAMS) is None
+    assert time.time() - start < 1.5
+    # 投递的任务在草稿被判定中断后才执行，不再调用模型
+    generate, calls = _generator()
+    prefetcher.run(*jobs[0][:3], generate, jobs[0][3])
+    assert calls['count'] == 0 and prefetcher.get_stats()['discarded'] == 1
+    print(f"  ✓ 没有心跳的草稿 {time.time() - start:.2f}s 后判定为中断，之后执行的任务直接丢弃")
+
+    generate, calls = _generator(delay=1.0)
+    prefetcher.schedule(1, 51, PARAMS, generate,
+                        enqueue=lambda key, entry, data, template: threading.Thread(
+                            target=prefetcher.run, args=(key, entry, data, generate, template)).start())
+    articles = prefetcher.take(1, 51, PARAMS)
+    assert articles and calls['count'] == 1
+    print("  ✓ 投递到其他进程执行的预生成定期刷新心跳，生成时间超过stale_after也能取得草稿")
+
+
+def main():
+    """运行所有测试"""
+    print("=" * 60)
+    print("  文章预生成测试")
+    print("=" * 60)
+
+    tests = [test_fingerprint, test_hit_and_consume, test_mismatch_evicts,
+             test_wait_for_running_prefetch, test_evicted_result_discarded, test_stale_running_draft]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            print(f"  ❌ 测试失败: {e}")
+            failed += 1
+
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    exit(main())
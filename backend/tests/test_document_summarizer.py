@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+上传资料摘要测试
+使用本地桩服务验证分块、map-reduce调用次数和按内容哈希缓存
+"""
+import sys
+import os
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 设置UTF-8编码输出
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加backend目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.ai_service import AIService
+from services.llm_cache import LLMResponseCache
+from services.document_summarizer import estimate_tokens, split_into_chunks
+
+PARAGRAPH = '示例科技成立于2015年，主营企业级智能客服系统，服务客户超过3000家。' * 10
+
+
+def _start_stub():
+    """启动桩服务：分块请求返回"要点N"，合并请求返回"简报"，分析请求回显资料"""
+    calls = {'map': 0, 'reduce': 0, 'analyze': 0, 'prompts': []}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length))
+            prompt = payload['messages'][-1]['content']
+            if '部分：' in prompt and '请提炼' in prompt:
+                calls['map'] += 1
+                content = f'要点{calls["map"]}'
+            elif '请合并为一份完整的资料简报' in prompt:
+                calls['reduce'] += 1
+                content = '资料简报'
+            else:
+                calls['analyze'] += 1
+                calls['prompts'].append(prompt)
+                content = '分析结果'
+            body = json.dumps({'choices': [{'message': {'content': content}}]}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, calls
+
+
+def _make_service(port):
+    class StubConfig:
+        DEFAULT_AI_PROVIDER = 'qianwen'
+        QIANWEN_API_KEY = 'test'
+        QIANWEN_API_BASE = ''
+        QIANWEN_CHAT_URL = f'http://127.0.0.1:{port}/chat/completions'
+        QIANWEN_MODEL = 'qwen-plus'
+        UPLOAD_SUMMARY_THRESHOLD_TOKENS = 1000
+        UPLOAD_SUMMARY_CHUNK_TOKENS = 800
+
+    service = AIService(StubConfig())
+    service.cache = LLMResponseCache(None)
+    return service
+
+
+def test_split_into_chunks():
+    """测试分块不超过token预算且不丢内容"""
+    print("测试 1: 分块...")
+    text = '\n'.join([PARAGRAPH] * 20 + ['无标点的超长段落' * 300])
+    chunks = split_into_chunks(text, 800)
+    assert len(chunks) > 1
+    assert all(estimate_tokens(c) <= 800 for c in chunks)
+    assert ''.join(chunks).replace('\n', '') == text.replace('\n', '')
+    assert estimate_tokens('abcd' * 10) == 10
+    print(f"  ✓ {len(text)} 字切分为 {len(chunks)} 块，每块不超过预算")
+
+
+def test_short_text_passthrough():
+    """测试短资料原样使用"""
+    print("\n测试 2: 短资料...")
+    server, calls = _start_stub()
+    try:
+        service = _make_service(server.server_port)
+        service.analyze_company('示例科技', '智能客服', uploaded_text=PARAGRAPH)
+        assert calls['map'] == 0 and calls['reduce'] == 0
+        assert PARAGRAPH in calls['prompts'][0]
+        print("  ✓ 未超过阈值的资料不做摘要")
+    finally:
+        server.shutdown()
+
+
+def test_map_reduce_and_cache():
+    """测试长资料map-reduce，重复分析命中简报缓存"""
+    print("\n测试 3: 长资料摘要和缓存...")
+    server, calls = _start_stub()
+    try:
+        service = _make_service(server.server_port)
+        text = '\n'.join([PARAGRAPH] * 30)
+        chunk_count = len(split_into_chunks(text, 800))
+        service.analyze_company('示例科技', '智能客服', uploaded_text=text)
+        assert calls['map'] == chunk_count
+        assert calls['reduce'] == 1
+        assert '资料简报' in calls['prompts'][0] and PARAGRAPH not in calls['prompts'][0]
+
+        # 同一份资料再次分析（不同描述），不再调用摘要
+        service.analyze_company('示例科技', '换一个描述', uploaded_text=text)
+        assert calls['map'] == chunk_count and calls['reduce'] == 1
+        assert '资料简报' in calls['prompts'][1]
+        print(f"  ✓ {chunk_count} 次分块摘要 + 1 次合并，重复分析命中缓存")
+    finally:
+        server.shutdown()
+
+
+def main():
+    """运行所有测试"""
+    print("=" * 60)
+    print("  上传资料摘要测试")
+    print("=" * 60)
+
+    tests = [test_split_into_chunks, test_short_text_passthrough, test_map_reduce_and_cache]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            print(f"  ❌ 测试失败: {e}")
+            failed += 1
+
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    exit(main())
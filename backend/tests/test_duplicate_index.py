@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+近似重复检测测试
+使用内存SQLite验证SimHash距离、插入时同步建索引、分段查询以及分批回填
+"""
+import sys
+import os
+import time
+import random
+
+# 设置UTF-8编码输出
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加backend目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from models import Base, User, Workflow, Article, PublishHistory, ContentFingerprint
+from services.duplicate_index import DuplicateIndex, simhash, hamming_distance, fingerprint_values
+
+SENTENCES = [
+    '这家公司专注于企业级AI应用，核心产品覆盖智能客服、知识库问答和流程自动化。',
+    '我上个月试用了一下，整体体验比预期好不少，尤其是夜间的自动回复。',
+    '对于中小企业来说，部署成本和维护成本往往比功能本身更重要。',
+    '他们的团队大多来自一线互联网公司，对高并发场景比较有经验。',
+    '客户反馈里提到最多的是响应速度，其次是对行业术语的理解。',
+    '在价格方面，基础版按坐席收费，专业版提供私有化部署选项。',
+    '从行业趋势看，大模型落地最先发生在客服和营销这类高频场景。',
+    '如果只看功能列表很难区分厂商，真正的差距在于交付和服务。',
+]
+
+
+def _article(seed, sentences=30):
+    rng = random.Random(seed)
+    return ''.join(rng.choice(SENTENCES) + f'第{rng.randint(1, 10000)}条。' for _ in range(sentences))
+
+
+def _make_db():
+    engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)
+
+
+def _seed_user(session):
+    user = User(username='dup', email='dup@example.com', password_hash='x')
+    session.add(user)
+    session.flush()
+    workflow = Workflow(user_id=user.id, company_name='测试公司')
+    session.add(workflow)
+    session.flush()
+    return user, workflow
+
+
+def test_simhash_distance():
+    """测试轻微改动距离小，不同文章距离大"""
+    print("测试 1: SimHash距离...")
+    text = _article(1)
+    edited = text.replace('第', '第 ', 3) + '\n\n**补充一句结尾。**'
+    assert hamming_distance(simhash(text), simhash(text)) == 0
+    assert hamming_distance(simhash(text), simhash(edited)) <= 3
+    far = min(hamming_distance(simhash(text), simhash(_article(seed))) for seed in range(2, 30))
+    assert far > 3
+    print(f"  ✓ 改动后距离 {hamming_distance(simhash(text), simhash(edited))}，不同文章最小距离 {far}")
+
+
+def test_index_on_insert():
+    """测试发布成功的记录插入后即可查到，失败记录和短文本不索引"""
+    print("\n测试 2: 插入时建索引...")
+    factory = _make_db()
+    index = DuplicateIndex(session_factory=factory)
+    text = _article(1)
+
+    session = factory()
+    user, workflow = _seed_user(session)
+    user_id = user.id
+    session.add(Article(workflow_id=workflow.id, title='草稿', content=_article(5)))
+    session.add(PublishHistory(user_id=user.id, platform='知乎', status='success',
+                               article_title='已发布', article_content=text))
+    session.add(PublishHistory(user_id=user.id, platform='CSDN', status='failed',
+                               article_title='失败', article_content=_article(6)))
+    session.add(PublishHistory(user_id=user.id, platform='知乎', status='success',
+                               article_title='短', article_content='太短'))
+    session.commit()
+    session.close()
+
+    session = factory()
+    rows = {(row.source, row.platform, row.user_id) for row in session.query(ContentFingerprint)}
+    session.close()
+    assert rows == {('article', None, user_id), ('publish', 'zhihu', user_id)}
+
+    matches = index.find_similar(text.replace('。', '.', 2), platform='zhihu')
+    assert len(matches) == 1 and matches[0]['title'] == '已发布'
+    assert not index.find_similar(text, platform='csdn')
+    assert not index.find_similar(_article(6), platform='csdn')
+    assert index.find_similar(_article(5), sources=('article',))[0]['title'] == '草稿'
+    print("  ✓ 只索引成功发布的记录，平台名统一为代码，按平台过滤生效")
+
+    assert not index.find_similar(text, platform='zhihu', user_id=user_id + 1)
+    redacted = index.redact_foreign(matches, user_id + 1)
+    assert redacted == [{'platform': 'zhihu', 'distance': matches[0]['distance'],
+                         'similarity': matches[0]['similarity'], 'own': False}]
+    assert index.redact_foreign(matches, user_id)[0]['title'] == '已发布'
+    print("  ✓ 按用户过滤生效，其他用户的记录不返回标题和ID")
+
+
+def test_remove_workflow_articles():
+    """测试批量删除文章前删除其指纹"""
+    print("\n测试 3: 删除文章指纹...")
+    factory = _make_db()
+    index = DuplicateIndex(session_factory=factory)
+    session = factory()
+    _, workflow = _seed_user(session)
+    session.add(Article(workflow_id=workflow.id, title='旧文章', content=_article(7)))
+    session.commit()
+    index.remove_workflow_articles(session, workflow.id)
+    session.query(Article).filter_by(workflow_id=workflow.id).delete()
+    session.commit()
+    assert session.query(ContentFingerprint).count() == 0
+    session.close()
+    print("  ✓ 工作流文章重新生成后旧指纹不再命中")
+
+
+def test_backfill_and_lookup_speed():
+    """测试分批回填（跳过已索引记录）以及大索引下的查询耗时"""
+    print("\n测试 4: 回填与查询耗时...")
+    factory = _make_db()
+    index = DuplicateIndex(session_factory=factory)
+    session = factory()
+    user, _ = _seed_user(session)
+    session.commit()
+
+    # 绕过ORM事件直接写入，模拟上线前已有的发布历史
+    rows = [{'user_id': user.id, 'platform': '知乎', 'status': 'success',
+             'article_title': f'历史{i}', 'article_content': _article(100 + i)} for i in range(120)]
+    session.execute(PublishHistory.__table__.insert(), rows)
+    session.commit()
+    session.close()
+
+    batches = []
+    result = index.backfill(batch_size=50, progress=batches.append)
+    assert result['success'] and result['publish'] == 120 and len(batches) == 3
+    again = index.backfill(batch_size=50)
+    assert again['publish'] == 0 and again['skipped'] == 120
+
+    # 补充随机指纹扩大索引规模
+    session = factory()
+    rng = random.Random(0)
+    session.execute(ContentFingerprint.__table__.insert(), [
+        dict(fingerprint_values('publish', 100000 + i, 1, 'zhihu', '', 'x' * 60),
+             simhash=rng.randint(-2 ** 63, 2 ** 63 - 1), band0=rng.randint(0, 65535), band1=rng.randint(0, 65535),
+             band2=rng.randint(0, 65535), band3=rng.randint(0, 65535))
+        for i in range(20000)
+    ])
+    session.commit()
+    session.close()
+
+    matches = index.find_similar(_article(150), platform='zhihu')
+    assert matches and matches[0]['title'] == '历史50'
+    value = simhash(_article(150))
+    start = time.perf_counter()
+    for _ in range(100):
+        index.lookup(value, platform='zhihu')
+    elapsed = (time.perf_counter() - start) / 100
+    print(f"  ✓ 回填120条分3批，重复执行全部跳过；2万条指纹中分段查询 {elapsed * 1000:.2f}ms")
+
+
+def main():
+    """运行所有测试"""
+    print("=" * 60)
+    print("  近似重复检测测试")
+    print("=" * 60)
+
+    tests = [test_simhash_distance, test_index_on_insert, test_remove_workflow_articles,
+             test_backfill_and_lookup_speed]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            print(f"  ❌ 测试失败: {e}")
+            failed += 1
+
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+公平调度与批量创建测试
+验证批量创建任务时限流名额不足的部分失败、入队失败时任务记录标记为失败、并发插入冲突时返回已有任务；
+以及公平调度的按权重分发顺序、分发时的在途上限、投递失败放回子队列和定时任务释放。
+调度器测试需要Redis（TEST_REDIS_URL，默认 redis://127.0.0.1:6379/15，测试前清空该库），不可用时跳过
+"""
+import sys
+import os
+import json
+import time
+import unittest
+
+# 设置UTF-8编码输出
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加backend目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import redis
+from redis.backoff import NoBackoff
+from redis.retry import Retry
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+import models
+from models import PublishTask
+from services.fair_scheduler import FairScheduler, IN_FLIGHT_KEY
+from services.task_events import TaskEventStream
+from services.task_queue_manager import TaskQueueManager, publish_content_hash
+from services.task_stats_cache import TaskStatsCache
+
+TEST_REDIS_URL = os.environ.get('TEST_REDIS_URL', 'redis://127.0.0.1:6379/15')
+
+
+class FakeRateLimiter:
+    """按剩余名额批准申请的限流器"""
+
+    def __init__(self, grants):
+        self.grants = grants
+        self.released = 0
+
+    def acquire_many(self, user_id, count, check_concurrency=True):
+        granted = min(count, self.grants)
+        self.grants -= granted
+        return granted
+
+    def release_many(self, user_id, count):
+        self.released += count
+
+    def get_user_stats(self, user_id):
+        return {'concurrent_tasks': 3, 'max_concurrent_tasks': 3,
+                'tasks_in_last_minute': 2, 'max_tasks_per_minute': 10}
+
+
+def _require_redis():
+    """连接测试用Redis并清空，不可用时跳过"""
+    client = redis.Redis.from_url(TEST_REDIS_URL, socket_connect_timeout=0.5, socket_timeout=2)
+    try:
+        client.ping()
+    except redis.RedisError as e:
+        raise unittest.SkipTest(f'Redis不可用: {e}')
+    client.flushdb()
+    return client
+
+
+def _make_manager(grants=100):
+    """创建绑定内存数据库的任务管理器（连接不可达的Redis，不启用公平调度，入队记录到 manager.enqueued）"""
+    engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+    PublishTask.__table__.create(bind=engine)
+    models.SessionLocal.configure(bind=engine)
+
+    client = redis.Redis(host='127.0.0.1', port=1, socket_connect_timeout=0.2, socket_timeout=0.2,
+                         retry=Retry(NoBackoff(), 0))
+    manager = TaskQueueManager(client)
+    manager.rate_limiter = FakeRateLimiter(grants)
+    manager.scheduler = FairScheduler(client, enabled=False)
+    manager.stats_cache = TaskStatsCache(None)
+    manager.events = TaskEventStream(None)
+    manager.enqueued = []
+    manager._enqueue_jobs = manager.enqueued.extend
+    return manager, engine
+
+
+def _articles(count):
+    return [{'title': f'标题{i}', 'content': f'正文{i}', 'article_id': i, 'allow_duplicate': True}
+            for i in range(count)]
+
+
+def _statuses(engine):
+    with engine.connect() as conn:
+        return dict(conn.execute(text('SELECT task_id, status FROM publish_tasks')).all())
+
+
+def _tasks(prefix, count):
+    return [{'task_id': f'{prefix}{i}', 'task_db_id': i + 1} for i in range(count)]
+
+
+def test_partial_rate_limit():
+    """测试限流名额不足时只创建获批的任务，其余返回限流错误"""
+    print("测试 1: 限流名额不足...")
+    manager, engine = _make_manager(grants=2)
+    result = manager.create_batch_tasks(1, _articles(4))
+    assert (result['success'], result['success_count'], result['failed_count']) == (False, 2, 2)
+    outcomes = [item['result'] for item in result['results']]
+    assert all(outcome['success'] for outcome in outcomes[:2])
+    assert all(outcome['error'] == '超过限流限制' and outcome['stats']['max_concurrent_tasks'] == 3
+               for outcome in outcomes[2:])
+    assert sorted(_statuses(engine)) == sorted(outcome['task_id'] for outcome in outcomes[:2])
+    assert [task['task_id'] for task in manager.enqueued] == [outcome['task_id'] for outcome in outcomes[:2]]
+    print("  ✓ 前2篇创建并入队，后2篇返回限流错误且没有任务记录")
+
+
+def test_enqueue_failure_marks_failed():
+    """测试入队失败时任务记录标记为失败并归还限流名额"""
+    print("\n测试 2: 入队失败...")
+    manager, engine = _make_manager()
+
+    def broken_enqueue(tasks):
+        raise redis.ConnectionError('连接被拒绝')
+
+    manager._enqueue_jobs = broken_enqueue
+    result = manager.create_batch_tasks(1, _articles(3))
+    assert result['failed_count'] == 3
+    assert all(item['result']['error'] == '任务入队失败' for item in result['results'])
+    assert list(_statuses(engine).values()) == ['failed'] * 3
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT error_message FROM publish_tasks")).scalar().startswith('入队失败')
+    assert manager.rate_limiter.released == 3
+    print("  ✓ 3个任务标记为failed，归还3个限流名额")
+
+
+def test_concurrent_insert_conflict():
+    """测试并发请求已插入相同内容的任务时，返回已有任务并重新插入其余任务"""
+    print("\n测试 3: 并发插入冲突...")
+    manager, engine = _make_manager()
+    articles = _articles(3)
+    plan = manager._plan_publish_times
+
+    def plan_after_concurrent_insert(*args):
+        # 幂等检查之后、插入之前，另一个请求创建了第2篇的任务
+        with engine.begin() as conn:
+            conn.execute(PublishTask.__table__.insert(), {
+                'task_id': 'concurrent', 'user_id': 1, 'platform': 'zhihu', 'status': 'queued',
+                'content_hash': publish_content_hash(articles[1]['title'], articles[1]['content'])
+            })
+        return plan(*args)
+
+    manager._plan_publish_times = plan_after_concurrent_insert
+    result = manager.create_batch_tasks(1, articles)
+    outcomes = [item['result'] for item in result['results']]
+    assert result['success'] and all(outcome['success'] for outcome in outcomes)
+    assert outcomes[1]['task_id'] == 'concurrent' and outcomes[1]['duplicate_request']
+    assert len(_statuses(engine)) == 3
+    assert [task['task_id'] for task in manager.enqueued] == [outcomes[0]['task_id'], outcomes[2]['task_id']]
+    assert manager.rate_limiter.released == 1
+    print("  ✓ 第2篇返回已有任务并归还名额，其余2篇重新插入后入队")
+
+
+def test_weighted_dispatch_order():
+    """测试按权重轮流分发，新加入的用户从当前虚拟时间开始"""
+    print("\n测试 4: 按权重分发...")
+    client = _require_redis()
+    scheduler = FairScheduler(client, max_in_flight=100, enabled=True)
+    scheduler.submit(1, _tasks('a', 6), weight=2)
+    scheduler.submit(2, _tasks('b', 6), weight=1)
+
+    picked = scheduler._pick(9)
+    assert [user_id for user_id, _ in picked] == [1, 2, 1, 1, 2, 1, 1, 2, 1]
+    assert [item['task_id'] for user_id, item in picked if user_id == 1] == [f'a{i}' for i in range(6)]
+    assert client.zscore('fairq:active', 1) is None
+    print("  ✓ 权重2的用户分到2倍的任务，子队列内先进先出，队列空后移出活跃集合")
+
+    # 用户2已用到虚拟时间3，新用户以已分发任务的最大虚拟时间2.5加入，不能攒积分
+    scheduler.submit(3, _tasks('c', 2))
+    assert client.zscore('fairq:active', 3) == 2.5
+    assert [user_id for user_id, _ in scheduler._pick(3)] == [3, 2, 3]
+    print("  ✓ 新用户从当前虚拟时间开始排队")
+
+
+def test_in_flight_cap():
+    """测试分发时每个用户的在途任务数不超过上限，名额释放后继续分发"""
+    print("\n测试 5: 在途上限...")
+    client = _require_redis()
+    scheduler = FairScheduler(client, max_in_flight=2, enabled=True)
+    scheduler.submit(1, _tasks('a', 5))
+    scheduler.submit(2, _tasks('b', 1))
+
+    result = scheduler.dispatch(max_jobs=10)
+    assert (result['success'], result['dispatched']) == (True, 3)
+    assert sorted(scheduler.queue.job_ids) == ['a0', 'a1', 'b0']
+    assert int(client.get(IN_FLIGHT_KEY.format(1))) == 2
+    assert client.llen('fairq:user:1') == 3 and client.zscore('fairq:active', 1) is not None
+    assert scheduler.dispatch()['dispatched'] == 0
+    print("  ✓ 用户1达到上限2后停止分发，剩余3个任务留在子队列")
+
+    client.decr(IN_FLIGHT_KEY.format(1))
+    assert scheduler.dispatch()['dispatched'] == 1
+    assert scheduler.queue.job_ids[-1] == 'a2'
+    stats = {item['user_id']: item for item in scheduler.get_user_queue_stats()}
+    assert (stats[1]['depth'], stats[1]['in_flight'], stats[1]['dispatched']) == (2, 2, 3)
+    print("  ✓ Worker释放名额后继续分发下一个任务")
+
+
+def test_requeue_on_enqueue_failure():
+    """测试投递到RQ队列失败时任务按原顺序放回子队列并归还在途名额"""
+    print("\n测试 6: 投递失败放回子队列...")
+    client = _require_redis()
+    scheduler = FairScheduler(client, max_in_flight=5, enabled=True)
+    scheduler.submit(1, _tasks('a', 3))
+
+    def broken_enqueue_many(*args, **kwargs):
+        raise redis.ConnectionError('连接被拒绝')
+
+    scheduler.queue.enqueue_many = broken_enqueue_many
+    result = scheduler.dispatch()
+    assert not result['success'] and result['dispatched'] == 0
+    assert [json.loads(raw)['task_id'] for raw in client.lrange('fairq:user:1', 0, -1)] == ['a0', 'a1', 'a2']
+    assert int(client.get(IN_FLIGHT_KEY.format(1))) == 0
+    assert client.zscore('fairq:active', 1) is not None
+    print("  ✓ 3个任务按原顺序回到队首，在途计数归零，用户仍在活跃集合中")
+
+
+def test_release_due():
+    """测试到期的定时任务进入子队列（或直接入RQ队列），未到期的留在定时索引"""
+    print("\n测试 7: 定时任务释放...")
+    client = _require_redis()
+    now = time.time()
+    scheduler = FairScheduler(client, enabled=True)
+    scheduler.schedule(1, [{'task_id': 'due', 'task_db_id': 1, 'scheduled_at': now - 5},
+                           {'task_id': 'later', 'task_db_id': 2, 'scheduled_at': now + 3600}])
+    assert scheduler.release_due() == 1
+    assert [json.loads(raw)['task_id'] for raw in client.lrange('fairq:user:1', 0, -1)] == ['due']
+    assert scheduler.scheduled_task_ids(['due', 'later']) == {'later'}
+    print("  ✓ 到期任务进入用户子队列，未到期任务留在定时索引")
+
+    direct = FairScheduler(client, enabled=False)
+    direct.schedule(2, [{'task_id': 'due2', 'task_db_id': 3, 'scheduled_at': now - 1}])
+    result = direct.dispatch()
+    assert (result['dispatched'], result['released']) == (1, 1)
+    assert 'due2' in direct.queue.job_ids
+    assert int(client.get(IN_FLIGHT_KEY.format(2))) == 1
+    print("  ✓ 未启用公平调度时到期任务直接入RQ队列并占用在途名额")
+
+
+def main():
+    """运行所有测试"""
+    print("=" * 60)
+    print("  公平调度与批量创建测试")
+    print("=" * 60)
+
+    tests = [test_partial_rate_limit, test_enqueue_failure_marks_failed, test_concurrent_insert_conflict,
+             test_weighted_dispatch_order, test_in_flight_cap, test_requeue_on_enqueue_failure, test_release_due]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except unittest.SkipTest as e:
+            print(f"  ⚠ 跳过: {e}")
+        except Exception as e:
+            print(f"  ❌ 测试失败: {e}")
+            failed += 1
+
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM响应缓存测试
+验证缓存键、LRU淘汰、TTL和 _call_api 的缓存命中
+"""
+import sys
+import os
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 设置UTF-8编码输出
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加backend目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.llm_cache import LLMResponseCache, LocalLRUCache
+
+
+class _CountingHandler(BaseHTTPRequestHandler):
+    """记录请求次数的chat completions桩"""
+    protocol_version = 'HTTP/1.1'
+    calls = 0
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        _CountingHandler.calls += 1
+        body = json.dumps({
+            'choices': [{'message': {'content': f'分析结果{_CountingHandler.calls}'}}],
+            'usage': {'prompt_tokens': 100, 'completion_tokens': 50, 'total_tokens': 150}
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _StubConfig:
+    DEFAULT_AI_PROVIDER = 'qianwen'
+    QIANWEN_API_KEY = 'test'
+    QIANWEN_API_BASE = ''
+    QIANWEN_CHAT_URL = ''
+    QIANWEN_MODEL = 'qwen-plus'
+
+
+def test_cache_key():
+    """测试缓存键对请求参数敏感"""
+    print("测试 1: 缓存键...")
+    messages = [{'role': 'user', 'content': '你好'}]
+    key = LLMResponseCache.make_key('qianwen', 'qwen-plus', messages, 0.7, 2000)
+    assert key == LLMResponseCache.make_key('qianwen', 'qwen-plus', list(messages), 0.7, 2000)
+    assert key != LLMResponseCache.make_key('qianwen', 'qwen-plus', messages, 0.8, 2000)
+    assert key != LLMResponseCache.make_key('zhipu', 'qwen-plus', messages, 0.7, 2000)
+    print("  ✓ 相同请求键一致，参数变化键不同")
+
+
+def test_lru_and_ttl():
+    """测试LRU淘汰和过期"""
+    print("\n测试 2: LRU淘汰和TTL...")
+    lru = LocalLRUCache(maxsize=2)
+    lru.set('a', {'content': 'A'}, 60)
+    lru.set('b', {'content': 'B'}, 60)
+    assert lru.get('a')['content'] == 'A'  # a 变为最近使用
+    lru.set('c', {'content': 'C'}, 60)     # 淘汰 b
+    assert lru.get('b') is None
+    assert lru.get('a') is not None and lru.get('c') is not None
+
+    lru.set('d', {'content': 'D'}, 1)
+    lru._data['d'] = (time.time() - 1, lru._data['d'][1])
+    assert lru.get('d') is None
+    print("  ✓ 最久未使用的条目被淘汰，过期条目不返回")
+
+
+def test_ttl_policy():
+    """测试按场景和温度决定是否缓存"""
+    print("\n测试 3: 缓存策略...")
+    cache = LLMResponseCache(None, ttls={'analysis': 600}, max_temperature=0.75)
+    assert cache.get_ttl('analysis', 0.7) == 600
+    assert cache.get_ttl(None, 0.7) == 0
+    assert cache.get_ttl('analysis', 0.9) == 0
+    assert cache.get_ttl('unknown', 0.5) == 0
+    print("  ✓ 未声明场景和高温度调用不缓存")
+
+
+def test_call_api_cache_hit():
+    """测试 analyze_company 重复调用命中缓存"""
+    print("\n测试 4: analyze_company 缓存命中...")
+    from services.ai_service import AIService
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _CountingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        config = _StubConfig()
+        config.QIANWEN_CHAT_URL = f'http://127.0.0.1:{server.server_port}/chat/completions'
+        service = AIService(config)
+        service.cache = LLMResponseCache(None, ttls={'analysis': 600})
+        _CountingHandler.calls = 0
+
+        first = service.analyze_company('测试公司', '描述')
+        second = service.analyze_company('测试公司', '描述')
+        third = service.analyze_company('另一家公司', '描述')
+
+        assert first == second
+        assert third != first
+        assert _CountingHandler.calls == 2
+
+        stats = service.cache.get_stats()['process']
+        assert stats['local_hits'] == 1
+        assert stats['misses'] == 2
+        assert stats['tokens_saved'] == 150
+        print(f"  ✓ 3次调用只请求2次API，统计: {stats}")
+    finally:
+        server.shutdown()
+
+
+def main():
+    """运行所有测试"""
+    print("=" * 60)
+    print("  LLM响应缓存测试")
+    print("=" * 60)
+
+    tests = [test_cache_key, test_lru_and_ttl, test_ttl_policy, test_call_api_cache_hit]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            print(f"  ❌ 测试失败: {e}")
+            failed += 1
+
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    exit(main())
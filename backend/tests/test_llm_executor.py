@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM并发执行器测试
+验证线程数上限、排队指标、全局许可的降级行为，以及文章生成复用共享执行器
+"""
+import sys
+import os
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 设置UTF-8编码输出
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加backend目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import redis
+from services.llm_executor import LLMExecutor, RedisSemaphore
+
+
+class _ArticleHandler(BaseHTTPRequestHandler):
+    """固定延迟返回文章的chat completions桩"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        time.sleep(0.05)
+        body = json.dumps({'choices': [{'message': {'content': '标题：测试标题\n正文：\n测试正文'}}]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_bounded_workers_and_metrics():
+    """测试线程数上限和排队指标"""
+    print("测试 1: 有界线程池和排队指标...")
+    executor = LLMExecutor(max_workers=2, max_pending=10)
+    lock = threading.Lock()
+    state = {'running': 0, 'peak': 0}
+
+    def work():
+        with lock:
+            state['running'] += 1
+            state['peak'] = max(state['peak'], state['running'])
+        time.sleep(0.05)
+        with lock:
+            state['running'] -= 1
+
+    futures = [executor.submit(work) for _ in range(6)]
+    time.sleep(0.01)
+    assert executor.get_stats()['queue_depth'] == 4
+    for future in futures:
+        future.result()
+
+    stats = executor.get_stats()
+    assert state['peak'] == 2
+    assert stats['completed'] == 6 and stats['queue_depth'] == 0
+    assert stats['max_wait_ms'] >= 80
+    print(f"  ✓ 最大并发 {state['peak']}，最长排队 {stats['max_wait_ms']}ms")
+
+
+def test_backpressure():
+    """测试超过排队上限时提交被拒绝"""
+    print("\n测试 2: 背压...")
+    executor = LLMExecutor(max_workers=1, max_pending=2, acquire_timeout=0.05)
+    release = threading.Event()
+    executor.submit(release.wait)
+    executor.submit(release.wait)
+    try:
+        executor.submit(release.wait)
+        raise AssertionError('应抛出RuntimeError')
+    except RuntimeError as e:
+        assert '已满' in str(e)
+    finally:
+        release.set()
+    print("  ✓ 排队名额耗尽时提交超时失败")
+
+
+def test_semaphore_fail_open():
+    """测试Redis不可用时全局许可放行"""
+    print("\n测试 3: Redis不可用时放行...")
+    client = redis.Redis(host='127.0.0.1', port=1, socket_connect_timeout=0.2, socket_timeout=0.2)
+    semaphore = RedisSemaphore(client, {'qianwen': 1})
+    executor = LLMExecutor(max_workers=1, semaphore=semaphore)
+
+    with executor.provider_slot('qianwen'):
+        pass
+    start = time.perf_counter()
+    with executor.provider_slot('qianwen'):
+        pass
+    # 第二次直接跳过Redis，不再等待连接超时
+    assert time.perf_counter() - start < 0.1
+    assert semaphore.acquire('zhipu') == ''
+    print("  ✓ 获取许可失败时降级放行，并在退避期内跳过Redis")
+
+
+def test_generate_articles_uses_shared_executor():
+    """测试 generate_articles 在共享执行器上运行"""
+    print("\n测试 4: generate_articles 复用共享执行器...")
+    from services.ai_service import AIService
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _ArticleHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        class StubConfig:
+            DEFAULT_AI_PROVIDER = 'qianwen'
+            QIANWEN_API_KEY = 'test'
+            QIANWEN_API_BASE = ''
+            QIANWEN_CHAT_URL = f'http://127.0.0.1:{server.server_port}/chat/completions'
+            QIANWEN_MODEL = 'qwen-plus'
+
+        service = AIService(StubConfig())
+        service.executor = LLMExecutor(max_workers=2)
+        articles = service.generate_articles('测试公司', '分析', article_count=4)
+        assert len(articles) == 4
+        assert all(a['title'] == '测试标题' for a in articles)
+
+        # 4篇文章只有2个工作线程，后两篇需要排队
+        stats = service.executor.get_stats()
+        assert stats['completed'] == 4
+        assert stats['max_wait_ms'] >= 40
+        print(f"  ✓ 4篇文章由2个共享线程完成，最长排队 {stats['max_wait_ms']}ms")
+    finally:
+        server.shutdown()
+
+
+def main():
+    """运行所有测试"""
+    print("=" * 60)
+    print("  LLM并发执行器测试")
+    print("=" * 60)
+
+    tests = [test_bounded_workers_and_metrics, test_backpressure,
+             test_semaphore_fail_open, test_generate_articles_uses_shared_executor]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            print(f"  ❌ 测试失败: {e}")
+            failed += 1
+
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    exit(main())
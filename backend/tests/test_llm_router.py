@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM服务商路由测试
+使用两个本地桩服务模拟千问/智谱，验证故障切换、熔断、对冲请求，以及用量归属实际返回结果的服务商
+"""
+import sys
+import os
+import json
+import time
+import threading
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 设置UTF-8编码输出
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加backend目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.llm_router import ProviderRouter, CircuitBreaker
+from services.llm_cache import LLMResponseCache
+from services.token_accounting import TokenAccountant, usage_scope
+
+
+def _start_stub(name, behavior):
+    """
+    启动桩服务
+
+    Args:
+        name: 返回内容中的服务商名称
+        behavior: {'delay': 秒, 'status': HTTP状态码}，可在测试中修改
+    """
+    calls = {'count': 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            self.rfile.read(length)
+            calls['count'] += 1
+            time.sleep(behavior.get('delay', 0))
+            status = behavior.get('status', 200)
+            body = json.dumps({'choices': [{'message': {'content': name}}],
+                               'usage': {'prompt_tokens': 10, 'completion_tokens': 5}}).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, calls
+
+
+def _make_service(qianwen_port, zhipu_port, router):
+    from services.ai_service import AIService
+
+    class StubConfig:
+        DEFAULT_AI_PROVIDER = 'qianwen'
+        QIANWEN_API_KEY = 'q'
+        QIANWEN_API_BASE = ''
+        QIANWEN_CHAT_URL = f'http://127.0.0.1:{qianwen_port}/chat/completions'
+        QIANWEN_MODEL = 'qwen-plus'
+        ZHIPU_API_KEY = 'z'
+        ZHIPU_API_BASE = ''
+        ZHIPU_CHAT_URL = f'http://127.0.0.1:{zhipu_port}/chat/completions'
+        ZHIPU_MODEL = 'glm-4-flash'
+
+    service = AIService(StubConfig())
+    service.cache = LLMResponseCache(None)
+    service.accountant = TokenAccountant(None)
+    service.router = router
+    return service
+
+
+def _calls_by_model(accountant):
+    """按 服务商/模型 汇总记录的调用次数"""
+    calls = {}
+    for field, amount in accountant._take_pending().items():
+        _, _, provider, model, _, kind = field.split('|')
+        if kind == 'n':
+            calls[f'{provider}/{model}'] = calls.get(f'{provider}/{model}', 0) + amount
+    return calls
+
+
+def test_circuit_breaker_states():
+    """测试熔断器状态转换"""
+    print("测试 1: 熔断器状态...")
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    print("  ✓ closed -> open -> half_open -> closed")
+
+
+def test_failover_and_breaker():
+    """测试首选服务商5xx时切换并熔断"""
+    print("\n测试 2: 故障切换和熔断...")
+    qianwen_behavior = {'status': 503}
+    qianwen, qianwen_calls = _start_stub('qianwen', qianwen_behavior)
+    zhipu, zhipu_calls = _start_stub('zhipu', {})
+    try:
+        router = ProviderRouter(failure_threshold=2, reset_timeout=60)
+        service = _make_service(qianwen.server_port, zhipu.server_port, router)
+        messages = [{'role': 'user', 'content': 'hi'}]
+
+        for _ in range(4):
+            assert service._call_api(messages) == 'zhipu'
+
+        # 前2次请求千问失败后熔断，之后直接走智谱
+        assert qianwen_calls['count'] == 2
+        assert zhipu_calls['count'] == 4
+        stats = router.get_stats()
+        assert stats['breakers']['qianwen']['state'] == 'open'
+        assert stats['counters']['failovers'] == 2
+        print(f"  ✓ 千问只被调用 {qianwen_calls['count']} 次，熔断后请求全部走智谱")
+
+        assert _calls_by_model(service.accountant) == {'zhipu/glm-4-flash': 4}
+        service.cache = LLMResponseCache(None, ttls={'analysis': 60})
+        service._call_api(messages, temperature=0.2, cache_scope='analysis')
+        requested = service.cache.get(LLMResponseCache.make_key('qianwen', 'qwen-plus', messages, 0.2, 2000))
+        assert requested['content'] == 'zhipu' and requested['served_by'] == 'zhipu/glm-4-flash'
+        assert service.cache.get(LLMResponseCache.make_key('zhipu', 'glm-4-flash', messages, 0.2, 2000))
+        # 相同请求再次调用直接命中请求模型的缓存，不再调用和计费
+        assert service._call_api(messages, temperature=0.2, cache_scope='analysis') == 'zhipu'
+        assert zhipu_calls['count'] == 5
+        assert _calls_by_model(service.accountant) == {'zhipu/glm-4-flash': 1}
+        print("  ✓ 用量归属实际返回结果的智谱模型，缓存写入请求模型（标记实际模型）和智谱模型，再次请求命中缓存")
+    finally:
+        qianwen.shutdown()
+        zhipu.shutdown()
+
+
+def test_client_error_not_failover():
+    """测试4xx请求错误不切换服务商"""
+    print("\n测试 3: 4xx不切换...")
+    qianwen, _ = _start_stub('qianwen', {'status': 400})
+    zhipu, zhipu_calls = _start_stub('zhipu', {})
+    try:
+        router = ProviderRouter(failure_threshold=1, reset_timeout=60)
+        service = _make_service(qianwen.server_port, zhipu.server_port, router)
+        try:
+            service._call_api([{'role': 'user', 'content': 'hi'}])
+            raise AssertionError('应抛出HTTPError')
+        except Exception as e:
+            assert '400' in str(e)
+        assert zhipu_calls['count'] == 0
+        assert router.get_stats()['breakers']['qianwen']['state'] == 'closed'
+        print("  ✓ 4xx直接抛出，熔断器保持关闭")
+    finally:
+        qianwen.shutdown()
+        zhipu.shutdown()
+
+
+def test_hedged_request():
+    """测试首选超过p95时对冲到第二个服务商"""
+    print("\n测试 4: 对冲请求...")
+    qianwen_behavior = {'delay': 0.01}
+    qianwen, _ = _start_stub('qianwen', qianwen_behavior)
+    zhipu, zhipu_calls = _start_stub('zhipu', {})
+    try:
+        router = ProviderRouter(hedge_enabled=True, hedge_min_samples=5)
+        service = _make_service(qianwen.server_port, zhipu.server_port, router)
+        messages = [{'role': 'user', 'content': 'hi'}]
+
+        # 积累首选服务商的延迟样本
+        for _ in range(5):
+            assert service._call_api(messages) == 'qianwen'
+
+        qianwen_behavior['delay'] = 0.5
+        service.accountant._take_pending()
+        start = time.perf_counter()
+        with usage_scope(user_id=7):
+            assert service._call_api(messages) == 'zhipu'
+        elapsed = time.perf_counter() - start
+
+        stats = router.get_stats()['counters']
+        assert stats['hedges'] == 1 and stats['hedge_wins'] == 1
+        assert zhipu_calls['count'] == 1
+        assert elapsed < 0.4
+        print(f"  ✓ 首选变慢后对冲请求获胜，耗时 {elapsed * 1000:.0f}ms")
+
+        # 落败的千问请求完成后同样计入用户7的用量
+        deadline = time.time() + 2
+        while service.accountant.get_daily_usage('user:7') < 30 and time.time() < deadline:
+            time.sleep(0.05)
+        assert service.accountant.get_daily_usage('user:7') == 30
+        day = date.today().isoformat()
+        pending = service.accountant._take_pending()
+        assert pending[f'{day}|7|zhipu|glm-4-flash||n'] == 1 and pending[f'{day}|7|qianwen|qwen-plus||n'] == 1
+        print("  ✓ 获胜和落败的请求分别按各自的模型计入发起用户的用量")
+    finally:
+        qianwen.shutdown()
+        zhipu.shutdown()
+
+
+def main():
+    """运行所有测试"""
+    print("=" * 60)
+    print("  LLM服务商路由测试")
+    print("=" * 60)
+
+    tests = [test_circuit_breaker_states, test_failover_and_breaker,
+             test_client_error_not_failover, test_hedged_request]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            print(f"  ❌ 测试失败: {e}")
+            failed += 1
+
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM桩服务与生成基准脚本冒烟测试
+验证 scripts/llm_stub_server.py 的普通/流式/批量响应、故障注入和统计接口，
+并以每场景1次操作运行 scripts/benchmark_generation.py，避免脚本随服务层改动悄悄失效
+"""
+import sys
+import os
+import json
+import tempfile
+import subprocess
+
+# 设置UTF-8编码输出
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加backend目录和scripts目录到路径
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'scripts'))
+
+import requests
+from llm_stub_server import LLMStubServer
+
+
+def _chat(stub, stream=False, content='介绍一下这家公司'):
+    return requests.post(stub.chat_url, stream=stream, timeout=5, json={
+        'model': 'qwen-plus',
+        'messages': [{'role': 'user', 'content': content}],
+        'stream': stream,
+        'stream_options': {'include_usage': True}
+    })
+
+
+def _stream_events(response):
+    return [line[len(b'data: '):] for line in response.iter_lines() if line.startswith(b'data: ')]
+
+
+def test_stub_responses():
+    """测试普通、批量和流式响应，以及统计接口"""
+    print("测试 1: 桩服务响应...")
+    stub = LLMStubServer(latency_ms=0, latency_dist='fixed', completion_chars=100, stream_chunk_ms=0).start()
+    try:
+        body = _chat(stub).json()
+        content = body['choices'][0]['message']['content']
+        assert content.startswith('标题：') and '\n正文：\n' in content
+        assert body['usage']['total_tokens'] == body['usage']['prompt_tokens'] + body['usage']['completion_tokens']
+        print("  ✓ 普通请求返回“标题/正文”格式和usage")
+
+        body = _chat(stub, content='请按 "articles" 数组返回，共3项').json()
+        articles = json.loads(body['choices'][0]['message']['content'])['articles']
+        assert len(articles) == 3 and all(article['content'] for article in articles)
+        print("  ✓ 批量生成请求返回3篇文章的JSON")
+
+        events = _stream_events(_chat(stub, stream=True))
+        assert events[-1] == b'[DONE]'
+        chunks = [json.loads(event) for event in events[:-1]]
+        assert ''.join(c['choices'][0]['delta']['content'] for c in chunks if c['choices']) == content
+        assert chunks[-1]['usage'] == _chat(stub).json()['usage']
+        print(f"  ✓ 流式请求分 {len(chunks) - 1} 块推送，拼接结果与普通请求一致，最后一块带usage")
+
+        stats = requests.get(f'{stub.base_url.rsplit("/v1", 1)[0]}/stats', timeout=5).json()
+        assert (stats['requests'], stats['streamed'], stats['status']) == (4, 1, {'200': 4})
+        stub.reset_stats()
+        assert stub.get_stats()['requests'] == 0
+        print("  ✓ /stats 统计请求数和状态码，可以清空")
+    finally:
+        stub.stop()
+
+
+def test_fault_injection():
+    """测试注入错误状态码和流式中途断开"""
+    print("\n测试 2: 故障注入...")
+    stub = LLMStubServer(latency_ms=0, latency_dist='fixed', completion_chars=100, stream_chunk_ms=0,
+                         error_rate=1.0, error_codes=[429]).start()
+    try:
+        response = _chat(stub)
+        assert response.status_code == 429 and response.headers['Retry-After'] == '1'
+        stub.error_rate, stub.truncate_rate = 0.0, 1.0
+        assert _chat(stub).status_code == 200
+        events = _stream_events(_chat(stub, stream=True))
+        assert events and b'[DONE]' not in events
+        assert stub.get_stats()['injected'] == {'error': 1, 'truncate': 1}
+        print("  ✓ 错误率1时返回429和Retry-After，截断只作用于流式响应")
+    finally:
+        stub.stop()
+
+
+def test_benchmark_one_iteration():
+    """测试生成基准脚本在进程内桩服务上每个场景运行1次"""
+    print("\n测试 3: 生成基准脚本...")
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, 'bench.json')
+        result = subprocess.run(
+            [sys.executable, os.path.join('scripts', 'benchmark_generation.py'),
+             '--concurrency', '1', '--requests', '1', '--article-count', '2',
+             '--latency-ms', '0', '--latency-dist', 'fixed', '--stream-chunk-ms', '0',
+             '--completion-chars', '100', '--json', output],
+            cwd=BACKEND_DIR, capture_output=True, text=True, encoding='utf-8', errors='replace', timeout=120
+        )
+        assert result.returncode == 0, result.stderr[-2000:]
+        with open(output, encoding='utf-8') as f:
+            results = {r['scenario']: r for r in json.load(f)['results']}
+
+    assert sorted(results) == ['analyze', 'articles', 'stream', 'v2']
+    for name, r in results.items():
+        assert (r['ok'], r['errors']) == (1, {}), (name, r['errors'])
+        assert r['llm_requests'] >= 1
+    assert results['stream']['executor']['tasks'] == 2
+    print(f"  ✓ {len(results)} 个场景各完成1次，共 {sum(r['llm_requests'] for r in results.values())} 次LLM请求")
+
+
+def main():
+    """运行所有测试"""
+    print("=" * 60)
+    print("  LLM桩服务与生成基准脚本冒烟测试")
+    print("=" * 60)
+
+    tests = [test_stub_responses, test_fault_injection, test_benchmark_one_iteration]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            print(f"  ❌ 测试失败: {e}")
+            failed += 1
+
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    exit(main())
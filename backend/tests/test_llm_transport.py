@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM传输层测试
+使用本地HTTP服务验证连接池复用和指标统计
+"""
+import sys
+import os
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 设置UTF-8编码输出
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加backend目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.llm_transport import LLMTransport
+
+
+class _ChatHandler(BaseHTTPRequestHandler):
+    """返回固定chat completion结果的处理器（HTTP/1.1，支持keep-alive）"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        body = json.dumps({'choices': [{'message': {'content': 'ok'}}]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _start_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _ChatHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_connection_reuse():
+    """测试同一主机的连续请求复用连接"""
+    print("测试 1: 连接复用...")
+    server = _start_server()
+    transport = LLMTransport(pool_maxsize=2, keepalive_seconds=60)
+    transport.metrics.reset()
+    url = f'http://127.0.0.1:{server.server_port}/chat/completions'
+    try:
+        for _ in range(5):
+            response = transport.post(url, json={'messages': []}, timeout=5)
+            assert response.json()['choices'][0]['message']['content'] == 'ok'
+
+        stats = transport.get_stats()['hosts']['127.0.0.1']
+        print(f"  统计: {stats}")
+        assert stats['requests'] == 5
+        assert stats['pool_misses'] == 1
+        assert stats['pool_hits'] == 4
+        print("  ✓ 5次请求只建立1个连接")
+    finally:
+        transport.close()
+        server.shutdown()
+
+
+def test_idle_reset():
+    """测试空闲超时后重建连接"""
+    print("\n测试 2: 空闲超时重置...")
+    server = _start_server()
+    transport = LLMTransport(pool_maxsize=2, keepalive_seconds=0)
+    transport.metrics.reset()
+    url = f'http://127.0.0.1:{server.server_port}/chat/completions'
+    try:
+        transport.post(url, json={}, timeout=5)
+        transport._last_used[f'127.0.0.1:{server.server_port}'] -= 1
+        transport.post(url, json={}, timeout=5)
+
+        stats = transport.get_stats()['hosts']['127.0.0.1']
+        assert stats['idle_resets'] == 1
+        assert stats['pool_misses'] == 2
+        print("  ✓ 空闲超时后连接池被重置")
+    finally:
+        transport.close()
+        server.shutdown()
+
+
+def main():
+    """运行所有测试"""
+    print("=" * 60)
+    print("  LLM传输层测试")
+    print("=" * 60)
+
+    tests = [test_connection_reuse, test_idle_reset]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            print(f"  ❌ 测试失败: {e}")
+            failed += 1
+
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    exit(main())
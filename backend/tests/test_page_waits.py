@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+页面等待测试
+验证等待元素出现（多个备选定位符、无效定位符不影响其余定位符）、DOM条件与网络空闲、URL变化，
+Selenium WebDriver 的兼容，以及步骤计时
+"""
+import sys
+import os
+import time
+
+# 设置UTF-8编码输出
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加backend目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.page_waits import (
+    StepTimer, wait_for_dom, wait_for_element, wait_for_page_ready, wait_for_url_change, wait_until
+)
+
+
+class FakePage:
+    """模拟 ChromiumPage：元素和URL在第 ready_after 次查询后出现"""
+
+    def __init__(self, ready_after=3):
+        self.ready_after = ready_after
+        self.calls = 0
+        self.url = 'https://zhuanlan.zhihu.com/write'
+        self.scripts = []
+
+    def ele(self, locator, timeout=None):
+        if locator.startswith('css:div[role="dialog"] button:has-text'):
+            raise ValueError('无效的选择器')
+        self.calls += 1
+        if locator == 'css:.editor' and self.calls >= self.ready_after:
+            return 'editor'
+        return None
+
+    def run_js(self, script):
+        self.scripts.append(script)
+        return len(self.scripts) >= self.ready_after
+
+
+class FakeDriver:
+    """模拟 Selenium WebDriver"""
+
+    current_url = 'https://www.csdn.net'
+
+    def find_elements(self, by, value):
+        return ['title'] if (by, value) == ('css selector', '#txtTitle') else []
+
+    def execute_script(self, script):
+        return True
+
+
+def test_wait_for_element():
+    """测试等待元素出现"""
+    print("测试 1: 等待元素...")
+    page = FakePage(ready_after=5)
+    began = time.monotonic()
+    element = wait_for_element(page, ['css:div[role="dialog"] button:has-text("发布")', 'css:.missing', 'css:.editor'],
+                               timeout=5)
+    assert element == 'editor'
+    assert time.monotonic() - began < 2
+    print("  ✓ 元素出现后立即返回，无效定位符不影响其余定位符")
+
+    began = time.monotonic()
+    assert wait_for_element(FakePage(), 'css:.missing', timeout=0.5) is None
+    assert 0.4 < time.monotonic() - began < 1.5
+    assert wait_for_element(FakePage(ready_after=1), 'css:.editor', timeout=0) == 'editor'
+    print("  ✓ 超时返回None，timeout=0时只检查一次")
+
+    assert wait_for_element(FakeDriver(), 'css:#txtTitle', timeout=0) == 'title'
+    print("  ✓ 支持Selenium WebDriver")
+
+
+def test_wait_for_conditions():
+    """测试DOM条件、网络空闲、URL变化和自定义条件"""
+    print("\n测试 2: 页面条件...")
+    page = FakePage(ready_after=3)
+    assert wait_for_dom(page, "return window.ready;", timeout=5)
+    assert len(page.scripts) == 3
+
+    page = FakePage(ready_after=2)
+    assert wait_for_page_ready(page, timeout=5, quiet_ms=300)
+    assert "document.readyState" in page.scripts[0] and ">= 300" in page.scripts[0]
+    assert not wait_for_page_ready(FakePage(ready_after=100), timeout=0.3)
+    assert wait_for_page_ready(FakeDriver(), timeout=1)
+    print("  ✓ DOM条件与网络空闲")
+
+    page = FakePage()
+    assert wait_for_url_change(page, page.url, timeout=0.3) is None
+    page.url = 'https://zhuanlan.zhihu.com/p/123'
+    assert wait_for_url_change(page, 'https://zhuanlan.zhihu.com/write', timeout=1,
+                               condition=lambda url: '/p/' in url) == page.url
+    print("  ✓ URL变化")
+
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RuntimeError('元素已失效')
+        return 'done'
+
+    assert wait_until(flaky, timeout=5, interval=0.01) == 'done'
+    print("  ✓ 条件检查抛出异常时继续等待")
+
+
+def test_step_timer():
+    """测试步骤计时"""
+    print("\n测试 3: 步骤计时...")
+    timer = StepTimer('zhihu')
+    with timer.step('打开创作页'):
+        time.sleep(0.05)
+    try:
+        with timer.step('输入标题'):
+            raise ValueError('未找到标题输入框')
+    except ValueError:
+        pass
+
+    timings = timer.to_dict()
+    assert [step['step'] for step in timings['steps']] == ['打开创作页', '输入标题']
+    assert timings['steps'][0]['seconds'] >= 0.05
+    assert timings['total_seconds'] >= timings['steps'][0]['seconds']
+    assert timer.summary().startswith('打开创作页 ')
+    print("  ✓ 记录各步骤耗时（步骤出错时也记录）")
+
+
+def main():
+    """运行所有测试"""
+    print("=" * 60)
+    print("  页面等待测试")
+    print("=" * 60)
+
+    tests = [test_wait_for_element, test_wait_for_conditions, test_step_timer]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            print(f"  ❌ 测试失败: {e}")
+            failed += 1
+
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+提示词模板引擎测试
+验证变量替换、条件块、未定义占位符清理和编译缓存
+"""
+import sys
+import os
+
+# 设置UTF-8编码输出
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加backend目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.prompt_template_engine import PromptTemplateEngine, template_cache_key
+
+
+def test_variables():
+    """测试双/单大括号变量和未定义占位符"""
+    print("测试 1: 变量替换...")
+    engine = PromptTemplateEngine()
+    result = engine.render('  为{{company_name}}写{angle}文章，{{unknown}}{missing}结束 {{ spaced }}  ',
+                           {'company_name': '测试公司', 'angle': '技术', 'empty': None})
+    assert result == '为测试公司写技术文章，结束 {{ spaced }}'
+    assert engine.render('{{year}}', {}).isdigit()
+    print("  ✓ 变量替换、未定义占位符清理与旧渲染器一致")
+
+
+def test_conditions():
+    """测试条件块"""
+    print("\n测试 2: 条件块...")
+    engine = PromptTemplateEngine()
+    template = '开头{% if uploaded_text %}资料：{{uploaded_text}}{%endif%}结尾'
+    assert engine.render(template, {'uploaded_text': '文档'}) == '开头资料：文档结尾'
+    assert engine.render(template, {'uploaded_text': ''}) == '开头结尾'
+    assert engine.render(template, {}) == '开头结尾'
+
+    nested = '{% if a %}A{% if b %}B{% endif %}C{% endif %}'
+    assert engine.render(nested, {'a': 1, 'b': 0}) == 'AC'
+    assert engine.render(nested, {'a': 1, 'b': 1}) == 'ABC'
+
+    # 未闭合的if和多余的endif按字面量保留
+    assert engine.render('{% if a %}x{{a}}', {'a': 'v'}) == '{% if a %}xv'
+    assert engine.render('x{% endif %}', {}) == 'x{% endif %}'
+    print("  ✓ 条件块、嵌套和不完整标记处理正确")
+
+
+def test_value_not_rescanned():
+    """测试变量值中的占位符不会被再次替换"""
+    print("\n测试 3: 变量值不被二次解析...")
+    engine = PromptTemplateEngine()
+    result = engine.render('{{analysis}}', {'analysis': '代码示例 {value} 和 {{name}}', 'name': 'x'})
+    assert result == '代码示例 {value} 和 {{name}}'
+    print("  ✓ 变量值原样输出")
+
+
+def test_compile_cache():
+    """测试按id和版本缓存，内容变化时重新编译"""
+    print("\n测试 4: 编译缓存...")
+    engine = PromptTemplateEngine(maxsize=2)
+    prompt = {'id': 7, 'version': '1.0', 'user_template': '你好{{name}}'}
+    key = template_cache_key('article_prompt', prompt, 'user_template')
+    assert key == ('article_prompt', 7, '1.0', 'user_template')
+    assert template_cache_key('article_prompt', {'user_template': 'x'}, 'user_template') is None
+
+    first = engine.compile(prompt['user_template'], key)
+    assert engine.compile(prompt['user_template'], key) is first
+    assert engine.render('再见{{name}}', {'name': 'A'}, key) == '再见A'
+    assert engine.get_stats() == {'size': 1, 'hits': 1, 'misses': 2}
+
+    engine.compile('a', ('x',))
+    engine.compile('b', ('y',))
+    assert engine.get_stats()['size'] == 2
+    print("  ✓ 命中缓存，编辑未升版本时重新编译，LRU容量生效")
+
+
+def main():
+    """运行所有测试"""
+    print("=" * 60)
+    print("  提示词模板引擎测试")
+    print("=" * 60)
+
+    tests = [test_variables, test_conditions, test_value_not_rescanned, test_compile_cache]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            print(f"  ❌ 测试失败: {e}")
+            failed += 1
+
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+发布任务幂等创建测试
+验证内容哈希的归一化、未结束任务的内容唯一索引，以及重复提交返回已有任务
+"""
+import sys
+import os
+
+# 设置UTF-8编码输出
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加backend目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import redis
+from redis.backoff import NoBackoff
+from redis.retry import Retry
+from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.pool import StaticPool
+import models
+from models import PublishTask
+from services.task_queue_manager import TaskQueueManager, publish_content_hash
+from services.task_stats_cache import TaskStatsCache
+
+CONTENT_HASH = publish_content_hash('标题', '正文内容')
+
+
+def _make_engine():
+    """创建内存数据库，写入一个进行中的任务"""
+    engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+    PublishTask.__table__.create(bind=engine)
+    models.SessionLocal.configure(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(PublishTask.__table__.insert(), [
+            {'task_id': 'running', 'user_id': 1, 'platform': 'zhihu', 'status': 'running',
+             'content_hash': CONTENT_HASH}
+        ])
+    return engine
+
+
+def test_content_hash_normalization():
+    """测试首尾空白和连续空白不影响内容哈希"""
+    print("测试 1: 内容哈希归一化...")
+    assert publish_content_hash(' 标题 ', '正文\n\n内容 ') == publish_content_hash('标题', '正文 内容')
+    assert publish_content_hash('标题', '正文内容') != publish_content_hash('标题', '正文 内容')
+    assert publish_content_hash('标题一', '正文') != publish_content_hash('标题', '一正文')
+    print("  ✓ 空白差异被忽略，标题和正文分开计算")
+
+
+def test_unique_index_on_active_tasks():
+    """测试相同内容的未结束任务只能有一个，任务结束后可以再创建"""
+    print("\n测试 2: 未结束任务的内容唯一索引...")
+    engine = _make_engine()
+    row = {'task_id': 'again', 'user_id': 1, 'platform': 'zhihu', 'status': 'queued', 'content_hash': CONTENT_HASH}
+    try:
+        with engine.begin() as conn:
+            conn.execute(PublishTask.__table__.insert(), [row])
+        raise AssertionError('相同内容的第二个未结束任务应被唯一索引拒绝')
+    except IntegrityError:
+        pass
+    with engine.begin() as conn:
+        # 其他平台、以及原任务结束后都可以创建
+        conn.execute(PublishTask.__table__.insert(), [dict(row, task_id='other', platform='csdn')])
+        conn.execute(PublishTask.__table__.update().where(PublishTask.task_id == 'running').values(status='failed'))
+        conn.execute(PublishTask.__table__.insert(), [row])
+    print("  ✓ 唯一索引只约束同一用户同一平台的未结束任务")
+
+
+def test_duplicate_request_returns_existing_task():
+    """测试重复提交（含同一批中的重复文章）返回已有任务，Redis不可用时由数据库检查"""
+    print("\n测试 3: 重复提交返回已有任务...")
+    _make_engine()
+    client = redis.Redis(host='127.0.0.1', port=1, socket_connect_timeout=0.2, socket_timeout=0.2,
+                         retry=Retry(NoBackoff(), 0))
+    manager = TaskQueueManager(client)
+    manager.stats_cache = TaskStatsCache(None)
+
+    result = manager.create_publish_task(1, '标题 ', ' 正文内容')
+    assert result['success'] and result['task_id'] == 'running' and result['duplicate_request']
+
+    batch = manager.create_batch_tasks(1, [{'title': '标题', 'content': '正文内容'}] * 2)
+    assert batch['success_count'] == 2
+    assert [item['result']['task_id'] for item in batch['results']] == ['running', 'running']
+
+    db = models.get_db_session()
+    try:
+        assert db.query(PublishTask).count() == 1
+    finally:
+        db.close()
+    print("  ✓ 没有创建新任务")
+
+
+def main():
+    """运行所有测试"""
+    print("=" * 60)
+    print("  发布任务幂等创建测试")
+    print("=" * 60)
+
+    tests = [test_content_hash_normalization, test_unique_index_on_active_tasks,
+             test_duplicate_request_returns_existing_task]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            print(f"  ❌ 测试失败: {e}")
+            failed += 1
+
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    exit(main())
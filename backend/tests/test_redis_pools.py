@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Redis连接池测试
+验证按用途共享的连接池（URL配置、bytes/字符串模式、单例）以及Redis不可用时连接被归还、不泄漏
+"""
+import sys
+import os
+
+# 设置UTF-8编码输出
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加backend目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import redis
+import config as config_module
+from config import Config, get_redis_client, get_redis_pool, get_redis_pool_stats
+
+
+class UnreachableRedisConfig(Config):
+    """指向不可达地址的配置，只用于测试"""
+    REDIS_URL = 'redis://127.0.0.1:1/3'
+    REDIS_CONNECT_TIMEOUT = 0.2
+    REDIS_POOL_TIMEOUT = 0.2
+
+
+def setup_function():
+    """每个测试使用新的连接池"""
+    config_module._redis_pools.clear()
+
+
+def teardown_module():
+    """清理测试创建的连接池"""
+    config_module._redis_pools.clear()
+
+
+def test_pools_by_purpose():
+    """测试不同用途使用不同连接池，同一用途共享"""
+    print("测试 1: 按用途共享连接池...")
+    queue = get_redis_client('queue', UnreachableRedisConfig)
+    cache = get_redis_client('cache', UnreachableRedisConfig)
+    assert queue.connection_pool is not cache.connection_pool
+    assert get_redis_client('cache').connection_pool is cache.connection_pool
+    assert isinstance(cache.connection_pool, redis.BlockingConnectionPool)
+    assert queue.connection_pool.connection_kwargs['decode_responses'] is False
+    assert cache.connection_pool.connection_kwargs['decode_responses'] is True
+    assert cache.connection_pool.connection_kwargs['db'] == 3
+    assert cache.connection_pool.max_connections == Config.REDIS_POOLS['cache']['max_connections']
+    print("  ✓ queue为bytes模式，cache为字符串模式，URL中的db生效")
+
+
+def test_unknown_purpose():
+    """测试未知用途抛出ValueError"""
+    print("\n测试 2: 未知用途...")
+    try:
+        get_redis_pool('unknown', UnreachableRedisConfig)
+    except ValueError:
+        print("  ✓ 未知用途被拒绝")
+        return
+    raise AssertionError('未知用途应抛出ValueError')
+
+
+def test_failed_connections_released():
+    """测试Redis不可用时连接被归还，统计中没有占用的连接"""
+    print("\n测试 3: 连接失败后的连接池统计...")
+    client = get_redis_client('cache', UnreachableRedisConfig)
+    for _ in range(3):
+        try:
+            client.get('key')
+        except redis.ConnectionError:
+            pass
+    stats = get_redis_pool_stats()['cache']
+    assert stats['in_use'] == 0 and stats['utilization'] == 0
+    assert stats['address'] == '127.0.0.1:1/3'
+    print(f"  ✓ 连接池统计: {stats}")
+
+
+def main():
+    """运行所有测试"""
+    print("=" * 60)
+    print("  Redis连接池测试")
+    print("=" * 60)
+
+    tests = [test_pools_by_purpose, test_unknown_purpose, test_failed_connections_released]
+    failed = 0
+    for test in tests:
+        setup_function()
+        try:
+            test()
+        except Exception as e:
+            print(f"  ❌ 测试失败: {e}")
+            failed += 1
+    teardown_module()
+
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+定时/优先发布测试
+验证批量任务的发布时间计算（按窗口均匀分布、按间隔排在已排期任务之后）、请求参数解析以及优先任务的入队顺序
+"""
+import sys
+import os
+from datetime import datetime, timedelta
+
+# 设置UTF-8编码输出
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加backend目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import redis
+from redis.backoff import NoBackoff
+from redis.retry import Retry
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+import models
+from config import get_config
+from models import PublishTask
+from services.fair_scheduler import FairScheduler
+from services.task_queue_manager import TaskQueueManager, parse_schedule_options
+
+
+def _make_manager(scheduled_times=()):
+    """创建内存数据库（写入已排期的任务）和连接不可达Redis的任务管理器"""
+    engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+    PublishTask.__table__.create(bind=engine)
+    models.SessionLocal.configure(bind=engine)
+    if scheduled_times:
+        with engine.begin() as conn:
+            conn.execute(PublishTask.__table__.insert(), [
+                {'task_id': f't{i}', 'user_id': 1, 'platform': 'zhihu', 'status': 'queued', 'scheduled_at': when}
+                for i, when in enumerate(scheduled_times)
+            ])
+    client = redis.Redis(host='127.0.0.1', port=1, socket_connect_timeout=0.2, socket_timeout=0.2,
+                         retry=Retry(NoBackoff(), 0))
+    return TaskQueueManager(client)
+
+
+def test_plan_publish_times():
+    """测试按窗口均匀分布，以及按间隔排在已排期任务之后"""
+    print("测试 1: 发布时间计算...")
+    later = datetime.now() + timedelta(hours=2)
+    manager = _make_manager([later])
+
+    assert manager._plan_publish_times(1, 'zhihu', 3, None, 0, None) == [None] * 3
+    times = manager._plan_publish_times(1, 'zhihu', 4, later, 0, 60)
+    assert [when - later for when in times] == [timedelta(minutes=minutes) for minutes in (0, 20, 40, 60)]
+    print("  ✓ 一批任务均匀分布在60分钟窗口内")
+
+    config = get_config()
+    original = getattr(config, 'PUBLISH_BATCH_INTERVAL', 0)
+    config.PUBLISH_BATCH_INTERVAL = 600
+    try:
+        times = manager._plan_publish_times(1, 'zhihu', 2, None, 0, None)
+        assert times == [later + timedelta(minutes=10), later + timedelta(minutes=20)]
+        # 其他平台不受影响，第一篇立即发布
+        times = manager._plan_publish_times(1, 'toutiao', 2, None, 0, None)
+        assert times[1] - times[0] == timedelta(minutes=10) and times[0] <= datetime.now()
+        # 优先任务不自动错开
+        assert manager._plan_publish_times(1, 'zhihu', 2, None, 1, None) == [None, None]
+    finally:
+        config.PUBLISH_BATCH_INTERVAL = original
+    print("  ✓ 按间隔错开并排在已排期任务之后，优先任务不错开")
+
+
+def test_parse_schedule_options():
+    """测试定时发布参数解析和校验"""
+    print("\n测试 2: 请求参数解析...")
+    tomorrow = (datetime.now() + timedelta(days=1)).replace(microsecond=0)
+    options = parse_schedule_options({'scheduled_at': tomorrow.isoformat(), 'priority': '2'})
+    assert options == {'scheduled_at': tomorrow, 'priority': 2}
+    assert parse_schedule_options({}) == {}
+    for data in ({'scheduled_at': 'tomorrow'}, {'priority': 'high'}, {'spread_minutes': -5},
+                 {'scheduled_at': (datetime.now() + timedelta(days=365)).isoformat()}):
+        try:
+            parse_schedule_options(data)
+        except ValueError:
+            continue
+        raise AssertionError(f'参数应被拒绝: {data}')
+    print("  ✓ 格式错误和超出范围的参数被拒绝")
+
+
+def test_priority_jobs_at_front():
+    """测试优先任务放在RQ队列队首，优先级高的在最前"""
+    print("\n测试 3: 优先任务入队顺序...")
+    jobs = FairScheduler.prepare_jobs([
+        {'task_id': 'normal', 'task_db_id': 1},
+        {'task_id': 'urgent', 'task_db_id': 2, 'priority': 9},
+        {'task_id': 'high', 'task_db_id': 3, 'priority': 1},
+    ])
+    # 队首任务逐个插到最前，最后入队的排在最前
+    assert [(job.job_id, job.at_front) for job in jobs] == [('normal', False), ('high', True), ('urgent', True)]
+    print("  ✓ 入队后顺序为 urgent, high, normal")
+
+
+def main():
+    """运行所有测试"""
+    print("=" * 60)
+    print("  定时/优先发布测试")
+    print("=" * 60)
+
+    tests = [test_plan_publish_times, test_parse_schedule_options, test_priority_jobs_at_front]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            print(f"  ❌ 测试失败: {e}")
+            failed += 1
+
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    exit(main())
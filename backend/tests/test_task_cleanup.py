@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+任务批量清理测试
+使用内存SQLite验证分批删除的删除/失败计数与逐个删除时一致，Redis不可用时不影响数据库清理
+"""
+import sys
+import os
+from datetime import datetime, timedelta
+
+# 设置UTF-8编码输出
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加backend目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import redis
+from redis.backoff import NoBackoff
+from redis.retry import Retry
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+import models
+from models import PublishTask
+from services.task_queue_manager import TaskQueueManager
+from services.task_stats_cache import TaskStatsCache
+
+STATUSES = ['success', 'failed', 'cancelled', 'queued']
+
+
+def _make_manager(rows: int = 40):
+    """创建绑定内存数据库的任务管理器：任务 t{i} 属于用户 1 + i % 2，一半创建于10天前"""
+    engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+    PublishTask.__table__.create(bind=engine)
+    models.SessionLocal.configure(bind=engine)
+    old = datetime.now() - timedelta(days=10)
+    with engine.begin() as conn:
+        conn.execute(PublishTask.__table__.insert(), [
+            {'task_id': f't{i}', 'user_id': 1 + i % 2, 'platform': 'zhihu', 'status': STATUSES[i % 4],
+             'created_at': old if i < rows // 2 else datetime.now()}
+            for i in range(rows)
+        ])
+
+    # RQ任务数据清理失败时不影响数据库删除
+    client = redis.Redis(host='127.0.0.1', port=1, socket_connect_timeout=0.2, socket_timeout=0.2,
+                         retry=Retry(NoBackoff(), 0))
+    manager = TaskQueueManager(client)
+    manager.stats_cache = TaskStatsCache(None)
+    manager.DELETE_BATCH_SIZE = 3
+    return manager, engine
+
+
+def _count(engine, where: str) -> int:
+    with engine.connect() as conn:
+        return conn.execute(text(f'SELECT COUNT(*) FROM publish_tasks WHERE {where}')).scalar()
+
+
+def test_clear_listed_tasks():
+    """测试按任务ID清理：不存在、无权限、未结束的任务计入失败"""
+    print("测试 1: 按任务ID清理...")
+    manager, engine = _make_manager()
+    # 用户1的任务是偶数编号：t0 success, t2 cancelled, t4 success, t6 cancelled；t1属于用户2，t3不在列表中
+    task_ids = ['t0', 't1', 't2', 't4', 't6', 't8', 'missing', 't0']
+    result = manager.clear_tasks(1, task_ids=task_ids)
+    assert result['success']
+    assert result['deleted_count'] == 5 and result['failed_count'] == 2
+    assert any('t1' in error for error in result['errors']) and any('missing' in error for error in result['errors'])
+    assert _count(engine, "task_id IN ('t0', 't2', 't4', 't6', 't8')") == 0
+    assert _count(engine, "task_id = 't1'") == 1
+
+    # t3属于用户2，状态为queued
+    active = manager.clear_tasks(2, task_ids=['t3', 't1'])
+    assert active['deleted_count'] == 1 and active['failed_count'] == 1 and '请先取消' in active['errors'][0]
+    print(f"  ✓ 删除 {result['deleted_count']} 个，失败 {result['failed_count']} 个")
+
+
+def test_clear_by_status_and_expired():
+    """测试按状态清理和过期清理分批删除全部符合条件的任务"""
+    print("\n测试 2: 按状态和过期时间清理...")
+    manager, engine = _make_manager()
+    result = manager.clear_tasks(2, status_filter=['failed'])
+    assert result['deleted_count'] == 10 and result['failed_count'] == 0
+    assert _count(engine, "user_id = 2 AND status = 'failed'") == 0
+
+    expired = manager.cleanup_expired_tasks(max_age_days=7)
+    assert expired['success'] and expired['deleted_count'] == 10 and expired['redis_cleaned'] == 0
+    assert _count(engine, "status = 'queued'") == 10
+    assert _count(engine, '1 = 1') == 20
+    print(f"  ✓ 按状态删除 {result['deleted_count']} 个，过期删除 {expired['deleted_count']} 个")
+
+
+def teardown_module():
+    """恢复默认数据库绑定"""
+    models.SessionLocal.configure(bind=models.engine)
+
+
+def main():
+    """运行所有测试"""
+    print("=" * 60)
+    print("  任务批量清理测试")
+    print("=" * 60)
+
+    tests = [test_clear_listed_tasks, test_clear_by_status_and_expired]
+    failed = 0
+    try:
+        for test in tests:
+            try:
+                test()
+            except Exception as e:
+                print(f"  ❌ 测试失败: {e}")
+                failed += 1
+    finally:
+        models.SessionLocal.configure(bind=models.engine)
+
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    exit(main())
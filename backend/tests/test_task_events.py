@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+任务状态事件测试
+验证事件构造、Redis不可用时推送直接跳过、不影响任务状态更新，以及每个进程的SSE连接数上限
+"""
+import sys
+import os
+import time
+
+# 设置UTF-8编码输出
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加backend目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import redis
+from flask import Response
+from services.task_events import TaskEventStream
+from services.sse_connections import SSEConnectionLimiter
+
+
+def test_task_event():
+    """测试事件只包含有值的字段"""
+    print("测试 1: 事件构造...")
+    event = TaskEventStream.task_event('t1', 'failed', progress=None, error_message='超时')
+    assert event == {'type': 'task', 'task_id': 't1', 'status': 'failed', 'error_message': '超时'}
+    print("  ✓ 值为None的字段不推送")
+
+
+def test_publish_degrades():
+    """测试Redis不可用时推送失败不抛异常，并在退避期内跳过Redis"""
+    print("\n测试 2: 推送降级...")
+    assert TaskEventStream(None).publish(1, [TaskEventStream.task_event('t1', 'queued')]) is None
+
+    client = redis.Redis(host='127.0.0.1', port=1, socket_connect_timeout=0.2, socket_timeout=0.2)
+    stream = TaskEventStream(client)
+    assert stream.publish(1, [TaskEventStream.task_event('t1', 'queued')]) is None
+    assert stream._redis_down_until > time.time()
+
+    began = time.time()
+    stream.publish(1, [TaskEventStream.task_event('t1', 'running')])
+    assert time.time() - began < 0.1
+    assert stream.get_stats() == {'enabled': True, 'listeners': 0}
+    print("  ✓ Redis不可用时跳过推送")
+
+
+def test_sse_connection_limit():
+    """测试SSE连接数达到上限时拒绝，响应关闭后释放名额"""
+    print("\n测试 3: SSE连接数上限...")
+    limiter = SSEConnectionLimiter(max_streams=2)
+    responses = []
+    for _ in range(2):
+        assert limiter.try_acquire()
+        responses.append(limiter.attach(Response(iter(['data: 1\n\n']), mimetype='text/event-stream')))
+    assert not limiter.try_acquire()
+    assert limiter.get_stats() == {'active': 2, 'max': 2, 'rejected': 1}
+
+    responses[0].close()
+    responses[0].close()
+    assert limiter.get_stats()['active'] == 1
+    assert limiter.try_acquire()
+    print("  ✓ 超出上限时拒绝，客户端断开（响应关闭）后名额释放且只释放一次")
+
+
+def main():
+    """运行所有测试"""
+    print("=" * 60)
+    print("  任务状态事件测试")
+    print("=" * 60)
+
+    tests = [test_task_event, test_publish_degrades, test_sse_connection_limit]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            print(f"  ❌ 测试失败: {e}")
+            failed += 1
+
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    exit(main())
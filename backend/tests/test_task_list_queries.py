@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+任务列表查询测试
+使用内存SQLite验证状态统计、游标翻页（含同一时刻创建的任务、数据库默认创建时间）以及统计缓存降级
+"""
+import sys
+import os
+from datetime import datetime, timedelta
+
+# 设置UTF-8编码输出
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加backend目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import redis
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+import models
+from models import PublishTask
+from services.task_queue_manager import TaskQueueManager
+from services.task_stats_cache import TaskStatsCache
+
+STATUSES = ['success', 'failed', 'queued', 'cancelled']
+
+
+def _make_manager():
+    """创建绑定内存数据库的任务管理器，写入用户1的50个任务和用户2的3个任务"""
+    engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+    PublishTask.__table__.create(bind=engine)
+    models.SessionLocal.configure(bind=engine)
+
+    base = datetime(2025, 1, 1, 12, 0, 0)
+    rows = []
+    for i in range(50):
+        # 每3个任务创建时间相同，验证游标按id区分
+        rows.append({'task_id': f't{i}', 'user_id': 1, 'platform': 'zhihu', 'status': STATUSES[i % 4],
+                     'created_at': base + timedelta(seconds=i // 3)})
+    rows += [{'task_id': f'u{i}', 'user_id': 2, 'platform': 'zhihu', 'status': 'success',
+              'created_at': base} for i in range(3)]
+    with engine.begin() as conn:
+        conn.execute(PublishTask.__table__.insert(), rows)
+
+    manager = TaskQueueManager()
+    manager.stats_cache = TaskStatsCache(None)
+    return manager
+
+
+def test_stats_group_by():
+    """测试一次GROUP BY得到各状态任务数"""
+    print("测试 1: 状态统计...")
+    manager = _make_manager()
+    result = manager.get_user_tasks(1, limit=5)
+    assert result['success']
+    assert result['stats'] == {'pending': 0, 'queued': 12, 'running': 0, 'success': 13, 'failed': 13, 'cancelled': 12}
+    assert result['total'] == 50
+    assert manager.get_user_tasks(1, status='failed', limit=5)['total'] == 13
+    print("  ✓ 统计包含所有状态，总数由统计求和得到")
+
+
+def test_keyset_pagination():
+    """测试游标翻页与OFFSET翻页结果一致且不重复"""
+    print("\n测试 2: 游标翻页...")
+    manager = _make_manager()
+    seen, cursor, pages = [], None, 0
+    while True:
+        result = manager.get_user_tasks(1, limit=7, cursor=cursor)
+        seen += [task['id'] for task in result['tasks']]
+        pages += 1
+        cursor = result['next_cursor']
+        if not cursor:
+            break
+    by_offset = [task['id'] for task in manager.get_user_tasks(1, limit=50)['tasks']]
+    assert seen == by_offset and len(set(seen)) == 50 and pages == 8
+    filtered = manager.get_user_tasks(1, status='failed', limit=10)
+    rest = manager.get_user_tasks(1, status='failed', limit=10, cursor=filtered['next_cursor'])
+    assert len(filtered['tasks']) + len(rest['tasks']) == 13 and rest['next_cursor'] is None
+    print(f"  ✓ {pages} 页覆盖全部 50 个任务，同一时刻的任务不重不漏")
+
+
+def test_pagination_with_server_default_created_at():
+    """测试created_at由数据库默认值写入（精度只到秒）时翻页不重复"""
+    print("\n测试 3: 数据库默认创建时间...")
+    engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+    PublishTask.__table__.create(bind=engine)
+    models.SessionLocal.configure(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(PublishTask.__table__.insert(),
+                     [{'task_id': f's{i}', 'user_id': 1, 'platform': 'zhihu', 'status': 'success'}
+                      for i in range(10)])
+
+    manager = TaskQueueManager()
+    manager.stats_cache = TaskStatsCache(None)
+    seen, cursor = [], None
+    for _ in range(10):
+        result = manager.get_user_tasks(1, limit=3, cursor=cursor)
+        seen += [task['id'] for task in result['tasks']]
+        cursor = result['next_cursor']
+        if not cursor:
+            break
+    assert seen == list(range(10, 0, -1)) and cursor is None
+    print("  ✓ 同一秒创建的10个任务分4页返回，不重不漏")
+
+
+def test_invalid_cursor():
+    """测试非法游标返回错误"""
+    print("\n测试 4: 非法游标...")
+    manager = _make_manager()
+    for cursor in ('bad-cursor', '0', '-3', '2025-01-01T12:00:00.123456_8'):
+        result = manager.get_user_tasks(1, cursor=cursor)
+        assert result['success'] is False, cursor
+    print("  ✓ 游标格式错误时返回失败")
+
+
+def test_stats_cache_degrades():
+    """测试Redis不可用时统计缓存直接放行，并在退避期内跳过Redis"""
+    print("\n测试 5: 统计缓存降级...")
+    client = redis.Redis(host='127.0.0.1', port=1, socket_connect_timeout=0.2, socket_timeout=0.2)
+    cache = TaskStatsCache(client, ttl=5)
+    assert cache.get(1) == (None, None)
+    assert not cache._redis_available()
+    cache.invalidate([1])
+    cache.set(1, {'success': 1}, '1')
+    print("  ✓ Redis不可用时不缓存，也不影响查询")
+
+
+def teardown_module():
+    """恢复默认数据库绑定"""
+    models.SessionLocal.configure(bind=models.engine)
+
+
+def main():
+    """运行所有测试"""
+    print("=" * 60)
+    print("  任务列表查询测试")
+    print("=" * 60)
+
+    tests = [test_stats_group_by, test_keyset_pagination, test_pagination_with_server_default_created_at,
+             test_invalid_cursor, test_stats_cache_degrades]
+    failed = 0
+    try:
+        for test in tests:
+            try:
+                test()
+            except Exception as e:
+                print(f"  ❌ 测试失败: {e}")
+                failed += 1
+    finally:
+        models.SessionLocal.configure(bind=models.engine)
+
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+任务状态同步测试
+使用内存SQLite验证批量状态更新不覆盖已被Worker更新的任务，以及Redis不可用时按批计入错误；
+增量游标和丢失任务判定需要Redis（TEST_REDIS_URL，默认 redis://127.0.0.1:6379/15，测试前清空该库），不可用时跳过
+"""
+import sys
+import os
+import unittest
+from datetime import datetime, timedelta
+
+# 设置UTF-8编码输出
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加backend目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import redis
+from redis.backoff import NoBackoff
+from redis.retry import Retry
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+import models
+from models import PublishTask
+from services.fair_scheduler import FairScheduler
+from services.task_events import TaskEventStream
+from services.task_queue_manager import TaskQueueManager
+from services.task_stats_cache import TaskStatsCache
+
+TEST_REDIS_URL = os.environ.get('TEST_REDIS_URL', 'redis://127.0.0.1:6379/15')
+
+
+def _make_engine(statuses, **columns):
+    """创建内存数据库并按给定状态写入任务 t0, t1, ...（columns 为各任务的其他字段列表）"""
+    engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+    PublishTask.__table__.create(bind=engine)
+    models.SessionLocal.configure(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(PublishTask.__table__.insert(), [
+            dict({'task_id': f't{i}', 'user_id': 1, 'platform': 'zhihu', 'status': status},
+                 **{name: values[i] for name, values in columns.items()})
+            for i, status in enumerate(statuses)
+        ])
+    return engine
+
+
+def _require_redis():
+    """连接测试用Redis并清空，不可用时跳过"""
+    client = redis.Redis.from_url(TEST_REDIS_URL, socket_connect_timeout=0.5, socket_timeout=2)
+    try:
+        client.ping()
+    except redis.RedisError as e:
+        raise unittest.SkipTest(f'Redis不可用: {e}')
+    client.flushdb()
+    return client
+
+
+def _make_manager(client, fair_scheduling=False):
+    manager = TaskQueueManager(client)
+    manager.scheduler = FairScheduler(client, enabled=fair_scheduling)
+    manager.stats_cache = TaskStatsCache(None)
+    manager.events = TaskEventStream(None)
+    return manager
+
+
+def test_bulk_update_skips_changed_tasks():
+    """测试批量更新只修改仍为queued/running的任务，并返回实际更新的行"""
+    print("测试 1: 批量状态更新...")
+    _make_engine(['queued', 'running', 'queued'])
+    db = models.get_db_session()
+    try:
+        rows = db.query(PublishTask.id, PublishTask.task_id, PublishTask.user_id, PublishTask.created_at).all()
+        # 读取后Worker已把t1更新为success
+        db.query(PublishTask).filter(PublishTask.task_id == 't1').update({'status': 'success'})
+        values = {'status': 'failed', 'error_message': '任务执行失败(RQ)', 'completed_at': datetime.now()}
+        changed = TaskQueueManager._bulk_update_status(db, rows, values)
+        db.commit()
+        assert [row.task_id for row in changed] == ['t0', 't2']
+        statuses = dict(db.query(PublishTask.task_id, PublishTask.status).all())
+        assert statuses == {'t0': 'failed', 't1': 'success', 't2': 'failed'}
+    finally:
+        db.close()
+    print("  ✓ 已被Worker更新的任务不被覆盖")
+
+
+def test_sync_counts_errors_when_redis_down():
+    """测试Redis不可用时按批计入错误，数据库状态不变"""
+    print("\n测试 2: Redis不可用时的同步...")
+    _make_engine(['queued'] * 5 + ['success'])
+    # 不重试，避免每批都等待重试退避
+    client = redis.Redis(host='127.0.0.1', port=1, socket_connect_timeout=0.2, socket_timeout=0.2,
+                         retry=Retry(NoBackoff(), 0))
+    manager = TaskQueueManager(client)
+    manager.stats_cache = TaskStatsCache(None)
+    result = manager.sync_task_status_with_redis(batch_size=2)
+    assert result['success']
+    assert result['checked_count'] == 5 and result['error_count'] == 5 and result['synced_count'] == 0
+    assert result['batches'] == 3 and result['sweep_completed']
+    db = models.get_db_session()
+    try:
+        assert db.query(PublishTask).filter(PublishTask.status == 'queued').count() == 5
+    finally:
+        db.close()
+    print(f"  ✓ {result['batches']} 批全部计入错误，耗时 {result['duration_ms']}ms")
+
+
+def test_incremental_cursor():
+    """测试增量同步从 tasksync:cursor 继续、最多处理max_batches批、扫描到末尾后游标归零"""
+    print("\n测试 3: 增量同步游标...")
+    client = _require_redis()
+    # 刚创建的任务在RQ中不存在也不算丢失，多次同步状态不变
+    _make_engine(['queued', 'running', 'success', 'queued', 'queued', 'running', 'queued', 'queued'])
+    manager = _make_manager(client)
+    client.set(TaskQueueManager.SYNC_CURSOR_KEY, 2)
+
+    result = manager.sync_task_status_with_redis(incremental=True, batch_size=2, max_batches=2)
+    assert (result['checked_count'], result['batches'], result['cursor']) == (4, 2, 7)
+    assert not result['sweep_completed'] and result['synced_count'] == 0
+    assert int(client.get(TaskQueueManager.SYNC_CURSOR_KEY)) == 7
+    print("  ✓ 从游标2继续，处理2批(id 4-7)后停止，游标保存为7")
+
+    result = manager.sync_task_status_with_redis(incremental=True, batch_size=2, max_batches=2)
+    assert (result['checked_count'], result['batches'], result['cursor']) == (1, 1, 0)
+    assert result['sweep_completed']
+    assert int(client.get(TaskQueueManager.SYNC_CURSOR_KEY)) == 0
+
+    result = manager.sync_task_status_with_redis(incremental=True, batch_size=2, max_batches=1)
+    assert (result['checked_count'], result['cursor']) == (2, 2)
+    print("  ✓ 扫描到末尾后游标归零，下次从头开始")
+
+    result = manager.sync_task_status_with_redis(batch_size=2)
+    assert result['checked_count'] == 7 and result['sweep_completed']
+    assert int(client.get(TaskQueueManager.SYNC_CURSOR_KEY)) == 2
+    print("  ✓ 完整扫描处理全部7个任务，不影响增量游标")
+
+
+def test_lost_task_rule():
+    """测试RQ中不存在的任务：定时索引或公平调度子队列中的不算丢失，定时任务从发布时间计算等待时长"""
+    print("\n测试 4: 丢失任务判定...")
+    client = _require_redis()
+    now = datetime.now()
+    old = now - timedelta(hours=2)
+    _make_engine(['queued'] * 6,
+                 created_at=[old, old, old, old, now - timedelta(minutes=10), old],
+                 scheduled_at=[None, now - timedelta(minutes=10), old, None, None, now - timedelta(hours=3)])
+    manager = _make_manager(client, fair_scheduling=True)
+    # t2 已到发布时间但还在定时索引中（尚未释放），t3 在公平调度子队列中等待分发
+    manager.scheduler.schedule(1, [{'task_id': 't2', 'task_db_id': 3, 'scheduled_at': old.timestamp()}])
+    manager.scheduler.submit(1, [{'task_id': 't3', 'task_db_id': 4}])
+
+    result = manager.sync_task_status_with_redis()
+    assert result['success'] and result['checked_count'] == 6
+    assert result['lost_count'] == 2 and result['synced_count'] == 2
+
+    db = models.get_db_session()
+    try:
+        tasks = {task.task_id: task for task in db.query(PublishTask).all()}
+    finally:
+        db.close()
+    assert [task_id for task_id, task in sorted(tasks.items()) if task.status == 'failed'] == ['t0', 't5']
+    assert tasks['t0'].error_message == '任务超时或Worker异常'
+    print("  ✓ 创建2小时的t0、发布时间早于创建时间的t5标记为丢失")
+    print("  ✓ 10分钟前到发布时间的t1、定时索引中的t2、子队列中的t3、刚创建的t4保持queued")
+
+
+def teardown_module():
+    """恢复默认数据库绑定"""
+    models.SessionLocal.configure(bind=models.engine)
+
+
+def main():
+    """运行所有测试"""
+    print("=" * 60)
+    print("  任务状态同步测试")
+    print("=" * 60)
+
+    tests = [test_bulk_update_skips_changed_tasks, test_sync_counts_errors_when_redis_down,
+             test_incremental_cursor, test_lost_task_rule]
+    failed = 0
+    try:
+        for test in tests:
+            try:
+                test()
+            except unittest.SkipTest as e:
+                print(f"  ⚠ 跳过: {e}")
+            except Exception as e:
+                print(f"  ❌ 测试失败: {e}")
+                failed += 1
+    finally:
+        models.SessionLocal.configure(bind=models.engine)
+
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文章清理器测试
+以旧版 remove_markdown_and_ai_traces（逐条正则 + 逐个 str.replace）为基准，验证输出一致
+"""
+import sys
+import os
+import re
+import random
+
+# 设置UTF-8编码输出
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加backend目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.text_scrubber import AI_PHRASES, TextScrubber, scrub_many, scrub_text
+
+
+def legacy_scrub(text):
+    """旧版实现（基准）"""
+    text = re.sub(r'#{1,6}\s+', '', text)
+    text = re.sub(r'\*\*([^*]+)\*\*', r'\1', text)
+    text = re.sub(r'\*([^*]+)\*', r'\1', text)
+    text = re.sub(r'__([^_]+)__', r'\1', text)
+    text = re.sub(r'_([^_]+)_', r'\1', text)
+    text = re.sub(r'^\s*[-*+]\s+', '', text, flags=re.MULTILINE)
+    text = re.sub(r'^\s*\d+\.\s+', '', text, flags=re.MULTILINE)
+    text = re.sub(r'\[([^\]]+)\]\([^)]+\)', r'\1', text)
+    text = re.sub(r'!\[([^\]]*)\]\([^)]+\)', '', text)
+    text = re.sub(r'```[\s\S]*?```', '', text)
+    text = re.sub(r'`([^`]+)`', r'\1', text)
+    text = re.sub(r'^\s*>\s+', '', text, flags=re.MULTILINE)
+    text = re.sub(r'^[-*_]{3,}\s*$', '', text, flags=re.MULTILINE)
+    for phrase in AI_PHRASES:
+        text = text.replace(phrase, '')
+    text = re.sub(r'\n{3,}', '\n\n', text)
+    text = '\n'.join(line.strip() for line in text.split('\n'))
+    return text.strip()
+
+
+SAMPLE = '''# 标题：**AI客服**真的有用吗
+
+## 背景
+首先，我们需要了解*客服*行业的痛点。综上所述，__人工成本__很高。
+
+- 响应慢
+* 夜间无人值守
++ 培训成本高
+1. 第一点
+2. 第二点
+
+> 引用一段用户的话
+---
+***
+
+访问[官网](https://example.com)了解更多，![配图](a.png)
+```python
+print("code")
+```
+使用 `pip install` 安装。snake_case_name 保持原样？
+
+
+
+我们需要指出的是，与此同时，效率提升了。希望本文对您有所帮助！感谢阅读
+'''
+
+# 随机文本的词表（含套话的前后片段，删除套话后可能拼出新的套话）
+FRAGMENTS = sorted({p[:i] for p in AI_PHRASES for i in range(1, len(p))} |
+                   {p[i:] for p in AI_PHRASES for i in range(1, len(p))})
+WORDS = ['公司', '产品', '客户', '服务', '效率', '成本', '体验', '数据', '团队', '市场',
+         '，', '。', '\n', '\n\n', '  ', '#', '## ', '**', '*', '_', '`', '- ', '1. ', '> ',
+         '[链接](http://a.b)', '![图](x.png)', '```', '---', '　']
+
+
+def test_sample_equivalence():
+    """测试Markdown和套话样例输出一致"""
+    print("测试 1: 样例输出一致...")
+    assert scrub_text(SAMPLE) == legacy_scrub(SAMPLE)
+    assert scrub_text('') == legacy_scrub('') == ''
+    print("  ✓ 样例清理结果与旧实现一致")
+
+
+def test_overlapping_phrases():
+    """测试重叠套话按列表优先级移除"""
+    print("\n测试 2: 重叠套话...")
+    checked = 0
+    for a in AI_PHRASES:
+        for b in AI_PHRASES:
+            for k in range(1, min(len(a), len(b))):
+                if a[-k:] == b[:k]:
+                    text = f'前文{a}{b[k:]}后文'
+                    assert scrub_text(text) == legacy_scrub(text), text
+                    checked += 1
+            if a != b and b in a:
+                text = f'前文{a}后文'
+                assert scrub_text(text) == legacy_scrub(text), text
+                checked += 1
+    # 删除套话后拼出的新套话按列表顺序处理：靠后的被移除，靠前的保留
+    for text in ('总综上所述的来说', '综上总的来说所述'):
+        assert scrub_text(text) == legacy_scrub(text), text
+    assert scrub_text('综上总的来说所述') == '综上所述'
+    print(f"  ✓ {checked} 组重叠组合结果一致")
+
+
+def test_random_equivalence():
+    """测试随机文本输出一致"""
+    print("\n测试 3: 随机文本...")
+    rng = random.Random(20241018)
+    vocabulary = WORDS + AI_PHRASES + FRAGMENTS
+    for _ in range(2000):
+        text = ''.join(rng.choice(vocabulary) for _ in range(rng.randint(0, 60)))
+        assert scrub_text(text) == legacy_scrub(text), repr(text)
+    print("  ✓ 2000 段随机文本结果一致")
+
+
+def test_custom_phrase_equivalence():
+    """测试相互重叠、包含的自定义短语表与按列表顺序逐个替换一致"""
+    print("\n测试 4: 自定义短语表...")
+    rng = random.Random(20241019)
+    for _ in range(300):
+        phrases = list(dict.fromkeys(''.join(rng.choice('abc') for _ in range(rng.randint(1, 4)))
+                                     for _ in range(rng.randint(1, 6))))
+        scrubber = TextScrubber(phrases)
+        for _ in range(50):
+            text = ''.join(rng.choice('abcd ') for _ in range(rng.randint(0, 30)))
+            expected = text
+            for phrase in phrases:
+                expected = expected.replace(phrase, '')
+            assert scrubber.scrub(text) == expected.strip(), (phrases, text)
+    print("  ✓ 300 组短语表 × 50 段文本结果一致")
+
+
+def test_scrub_many():
+    """测试批量接口"""
+    print("\n测试 5: 批量清理...")
+    texts = [SAMPLE, '**粗体**', SAMPLE, '']
+    assert scrub_many(texts) == [legacy_scrub(t) for t in texts]
+    custom = TextScrubber(['广告'])
+    assert custom.scrub_many(['这是广告', '首先，']) == ['这是', '首先，']
+    print("  ✓ 批量结果与逐篇结果一致，支持自定义短语表")
+
+
+def main():
+    """运行所有测试"""
+    print("=" * 60)
+    print("  文章清理器测试")
+    print("=" * 60)
+
+    tests = [test_sample_equivalence, test_overlapping_phrases, test_random_equivalence, test_custom_phrase_equivalence,
+             test_scrub_many]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            print(f"  ❌ 测试失败: {e}")
+            failed += 1
+
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+token用量统计测试
+使用本地桩服务验证用量归属（经执行器传递到工作线程）和每日预算拦截
+"""
+import sys
+import os
+import json
+import time
+import threading
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 设置UTF-8编码输出
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加backend目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.ai_service import AIService
+from services.llm_cache import LLMResponseCache
+import services.token_accounting as token_accounting
+from config import get_config
+from services.token_accounting import TokenAccountant, TokenBudgetExceeded, usage_scope, current_usage_scope
+
+BODY = '这是一段足够长的正文内容，用来模拟真实文章。' * 20
+
+
+def _start_stub():
+    """启动桩服务：每次调用返回固定usage（prompt 100，completion 50）"""
+    calls = {'count': 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            self.rfile.read(length)
+            calls['count'] += 1
+            body = json.dumps({
+                'choices': [{'message': {'content': f'标题：测试标题\n正文：\n{BODY}'}}],
+                'usage': {'prompt_tokens': 100, 'completion_tokens': 50, 'total_tokens': 150}
+            }).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, calls
+
+
+def _make_service(port, accountant):
+    class StubConfig:
+        DEFAULT_AI_PROVIDER = 'qianwen'
+        QIANWEN_API_KEY = 'test'
+        QIANWEN_API_BASE = ''
+        QIANWEN_CHAT_URL = f'http://127.0.0.1:{port}/chat/completions'
+        QIANWEN_MODEL = 'qwen-plus'
+
+    service = AIService(StubConfig())
+    service.cache = LLMResponseCache(None)
+    service.accountant = accountant
+    return service
+
+
+def test_usage_scope():
+    """测试归属上下文嵌套"""
+    print("测试 1: 归属上下文...")
+    assert current_usage_scope() == {}
+    with usage_scope(user_id=7):
+        with usage_scope(template='article_prompt:3'):
+            assert current_usage_scope() == {'user_id': 7, 'template': 'article_prompt:3'}
+        assert current_usage_scope() == {'user_id': 7}
+    assert current_usage_scope() == {}
+    print("  ✓ 内层沿用外层字段，退出后恢复")
+
+
+def test_attribution_across_executor():
+    """测试并行生成的每次调用都归属到发起请求的用户和模板"""
+    print("\n测试 2: 并行调用的用量归属...")
+    server, calls = _start_stub()
+    try:
+        accountant = TokenAccountant(None)
+        service = _make_service(server.server_port, accountant)
+        with usage_scope(user_id=7, template='prompt_template:2'):
+            service.generate_articles('测试公司', '分析', article_count=3, strategy='fanout')
+        service.analyze_company('测试公司', '描述')
+
+        day = date.today().isoformat()
+        pending = accountant._take_pending()
+        assert pending[f'{day}|7|qianwen|qwen-plus|prompt_template:2|n'] == 3
+        assert pending[f'{day}|7|qianwen|qwen-plus|prompt_template:2|p'] == 300
+        assert pending[f'{day}|7|qianwen|qwen-plus|prompt_template:2|c'] == 150
+        assert pending[f'{day}|0|qianwen|qwen-plus||n'] == 1
+        assert accountant.get_daily_usage('user:7') == 450
+        assert accountant.get_daily_usage('global') == 600
+        assert not accountant._take_pending()
+        print("  ✓ 执行器线程中的3次调用归属到用户7，无归属调用记为用户0")
+    finally:
+        server.shutdown()
+
+
+def test_budget_enforcement():
+    """测试超出每日预算后拒绝调用"""
+    print("\n测试 3: 每日预算...")
+    server, calls = _start_stub()
+    try:
+        accountant = TokenAccountant(None, user_daily_budget=200)
+        service = _make_service(server.server_port, accountant)
+        with usage_scope(user_id=8):
+            service.analyze_company('测试公司', '描述')
+            service.analyze_company('测试公司', '描述2')
+            try:
+                service.analyze_company('测试公司', '描述3')
+                assert False, '应超出预算'
+            except TokenBudgetExceeded:
+                pass
+        assert calls['count'] == 2
+        # 其他用户不受影响
+        with usage_scope(user_id=9):
+            service.analyze_company('测试公司', '描述4')
+        assert calls['count'] == 3
+        print("  ✓ 用户8用满200 tokens后调用被拒绝且未发出请求，用户9正常")
+    finally:
+        server.shutdown()
+
+
+def test_singleton_without_config():
+    """测试不传配置创建的全局记账器同样读取全局配置中的预算"""
+    print("\n测试 4: 全局记账器的预算...")
+    config_class = get_config()
+    saved = (token_accounting._accountant, config_class.TOKEN_DAILY_BUDGET_PER_USER,
+             config_class.TOKEN_USAGE_FLUSH_INTERVAL)
+    token_accounting._accountant = None
+    config_class.TOKEN_DAILY_BUDGET_PER_USER = 100
+    config_class.TOKEN_USAGE_FLUSH_INTERVAL = 0
+    try:
+        accountant = token_accounting.get_token_accountant()
+        assert accountant.user_daily_budget == 100
+        assert token_accounting.get_token_accountant(config_class) is accountant
+        # Redis不可用时在进程内累计，同样参与预算检查
+        accountant.redis = None
+        user_id = int(time.time() * 1000)
+        with usage_scope(user_id=user_id):
+            accountant.record('qianwen', 'qwen-plus', {'prompt_tokens': 80, 'completion_tokens': 40})
+        try:
+            accountant.check_budget(user_id)
+            assert False, '应超出预算'
+        except TokenBudgetExceeded:
+            pass
+        print("  ✓ 未传配置时按全局配置的每日预算拦截")
+    finally:
+        token_accounting._accountant, config_class.TOKEN_DAILY_BUDGET_PER_USER, \
+            config_class.TOKEN_USAGE_FLUSH_INTERVAL = saved
+
+
+def main():
+    """运行所有测试"""
+    print("=" * 60)
+    print("  token用量统计测试")
+    print("=" * 60)
+
+    tests = [test_usage_scope, test_attribution_across_executor, test_budget_enforcement,
+             test_singleton_without_config]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            print(f"  ❌ 测试失败: {e}")
+            failed += 1
+
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+用户限流器测试
+验证批量申请的部分批准、滑动窗口与并发名额的原子占用、名额归还，以及本地速率限制记录的有效期。
+需要Redis（TEST_REDIS_URL，默认 redis://127.0.0.1:6379/15，测试前清空该库），不可用时跳过
+"""
+import sys
+import os
+import time
+import threading
+import unittest
+
+# 设置UTF-8编码输出
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加backend目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import redis
+from services.user_rate_limiter import UserRateLimiter
+
+TEST_REDIS_URL = os.environ.get('TEST_REDIS_URL', 'redis://127.0.0.1:6379/15')
+
+
+def _require_redis():
+    """连接测试用Redis并清空，不可用时跳过"""
+    client = redis.Redis.from_url(TEST_REDIS_URL, socket_connect_timeout=0.5, socket_timeout=2)
+    try:
+        client.ping()
+    except redis.RedisError as e:
+        raise unittest.SkipTest(f'Redis不可用: {e}')
+    client.flushdb()
+    return client
+
+
+def _make_limiter(client, max_concurrent=100, max_rate=100):
+    limiter = UserRateLimiter(client)
+    limiter.max_concurrent_tasks = max_concurrent
+    limiter.max_tasks_per_minute = max_rate
+    return limiter
+
+
+def test_partial_grants():
+    """测试批量申请超出速率或并发上限时按剩余名额部分批准"""
+    print("测试 1: 部分批准...")
+    client = _require_redis()
+    limiter = _make_limiter(client, max_rate=5)
+    assert limiter.acquire_many(1, 3) == 3
+    assert limiter.acquire_many(1, 4) == 2
+    assert limiter.acquire_many(1, 1) == 0
+    stats = limiter.get_user_stats(1)
+    assert (stats['tasks_in_last_minute'], stats['concurrent_tasks']) == (5, 5)
+    print("  ✓ 每分钟上限5: 申请3得3，再申请4得2，之后被拒绝")
+
+    limiter = _make_limiter(client, max_concurrent=3)
+    assert limiter.acquire_many(2, 5) == 3
+    assert limiter.acquire_many(2, 5, check_concurrency=False) == 5
+    assert int(client.get(limiter._get_concurrent_key(2))) == 3
+    print("  ✓ 并发上限3: 申请5得3；不检查并发时只占用速率名额")
+
+
+def test_release():
+    """测试归还并发名额后可以再次申请，计数不会减到0以下"""
+    print("\n测试 2: 归还名额...")
+    client = _require_redis()
+    limiter = _make_limiter(client, max_concurrent=3)
+    assert limiter.acquire_many(1, 3) == 3
+    limiter.release_many(1, 2)
+    assert limiter.acquire_many(1, 5) == 2
+    limiter.release(1)
+    limiter.release_many(1, 10)
+    assert int(client.get(limiter._get_concurrent_key(1))) == 0
+    limiter.release(1)
+    assert int(client.get(limiter._get_concurrent_key(1))) == 0
+    print("  ✓ 归还2个后再获得2个，多归还时计数停在0")
+
+
+def test_atomic_under_contention():
+    """测试多线程同时申请时窗口和并发名额都不会超发"""
+    print("\n测试 3: 并发申请...")
+    client = _require_redis()
+    limiter = _make_limiter(client, max_concurrent=5, max_rate=7)
+    results = []
+    barrier = threading.Barrier(20)
+
+    def worker(user_id, check_concurrency):
+        barrier.wait()
+        results.append((user_id, limiter.acquire_many(user_id, 1, check_concurrency=check_concurrency)))
+
+    for user_id, check_concurrency in ((1, True), (2, False)):
+        threads = [threading.Thread(target=worker, args=(user_id, check_concurrency)) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        barrier.reset()
+
+    assert sum(granted for user_id, granted in results if user_id == 1) == 5
+    assert int(client.get(limiter._get_concurrent_key(1))) == 5
+    assert sum(granted for user_id, granted in results if user_id == 2) == 7
+    assert client.zcard(limiter._get_rate_key(2)) == 7
+    print("  ✓ 20个线程同时申请: 并发上限5只批准5个，速率上限7只批准7个")
+
+
+def test_local_block():
+    """测试本地速率限制记录返回真实计数、有效期有上限，其他进程重置后最多等待一个有效期"""
+    print("\n测试 4: 本地速率限制记录...")
+    client = _require_redis()
+    limiter = _make_limiter(client, max_rate=2)
+    limiter.local_block_ttl = 0.3
+    other_process = _make_limiter(client, max_rate=2)
+
+    assert limiter.acquire_many(1, 3) == 2
+    assert limiter._reserve(1, 1, True) == (0, 2, 2)
+    # 另一个进程重置后，本地记录最多再拒绝 local_block_ttl 秒
+    other_process.reset_user_limits(1)
+    assert not limiter.acquire(1)
+    time.sleep(0.35)
+    assert limiter.acquire(1)
+    assert 1 not in limiter._rate_blocked
+    print("  ✓ 本地拒绝时返回最近一次的并发数和窗口计数，重置后0.3秒内恢复")
+
+    limiter.local_block_max_users = 2
+    for user_id in (11, 12, 13):
+        limiter.acquire_many(user_id, 3)
+    assert sorted(limiter._rate_blocked) == [11, 12]
+    print("  ✓ 本地记录数有上限")
+
+
+def main():
+    """运行所有测试"""
+    print("=" * 60)
+    print("  用户限流器测试")
+    print("=" * 60)
+
+    tests = [test_partial_grants, test_release, test_atomic_under_contention, test_local_block]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except unittest.SkipTest as e:
+            print(f"  ⚠ 跳过: {e}")
+        except Exception as e:
+            print(f"  ❌ 测试失败: {e}")
+            failed += 1
+
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    exit(main())
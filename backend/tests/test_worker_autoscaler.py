@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Worker自动伸缩与浏览器会话复用测试
+验证伸缩决策（扩容步长、资源紧张时暂停、延迟缩容、低于下限补齐）、缩容时只排空空闲Worker，
+以及浏览器会话的复用、健康检查失败重建、用满/过期/发布失败后回收，和fork模式下用完即关闭
+"""
+import sys
+import os
+import time
+import signal
+
+# 设置UTF-8编码输出
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加backend目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rq
+from rq.worker import Worker
+from services.browser_sessions import BrowserSessionManager
+from services.worker_autoscaler import ManagedWorker, WorkerAutoscaler
+
+
+class FakeProcess:
+    """记录收到的信号的子进程"""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.signals = []
+        self.returncode = None
+
+    def send_signal(self, signum):
+        self.signals.append(signum)
+
+    def poll(self):
+        return self.returncode
+
+    def kill(self):
+        self.signals.append(signal.SIGKILL)
+
+
+class FakeBrowser:
+    """可控制健康检查结果的浏览器"""
+
+    def __init__(self):
+        self.healthy = True
+        self.closed = False
+
+    def check_session(self):
+        return self.healthy
+
+    def close(self):
+        self.closed = True
+
+
+def _pooled_manager(**kwargs):
+    """可复用会话的会话池，以及记录已启动浏览器的opener"""
+    manager = BrowserSessionManager(**dict({'max_uses': 20, 'max_age': 3600, 'max_idle': 600}, **kwargs))
+    manager._reuse_supported = True
+    opened = []
+
+    def opener():
+        opened.append(FakeBrowser())
+        return opened[-1], None
+
+    return manager, opened, opener
+
+
+def _metrics(queued=0, busy=0, oldest_wait=0, cpu_percent=10, free_memory_mb=8192):
+    return {'queued': queued, 'busy': busy, 'oldest_wait': oldest_wait,
+            'cpu_percent': cpu_percent, 'free_memory_mb': free_memory_mb}
+
+
+def test_decide():
+    """测试伸缩决策"""
+    print("测试 1: 伸缩决策...")
+    autoscaler = WorkerAutoscaler(None, 'redis://', ['default'], min_workers=1, max_workers=6,
+                                  jobs_per_worker=2, max_job_wait=60, scale_down_delay=300)
+
+    decision = autoscaler.decide(_metrics(queued=10, busy=2), current=2, now=0)
+    assert (decision['action'], decision['desired'], decision['target']) == ('scale_up', 6, 4)
+    print("  ✓ 积压时扩容，每次最多新增2个")
+
+    decision = autoscaler.decide(_metrics(queued=1, busy=1, oldest_wait=120), current=2, now=0)
+    assert (decision['action'], decision['target']) == ('scale_up', 3)
+    print("  ✓ 最早任务等待过久时多扩容一个")
+
+    decision = autoscaler.decide(_metrics(queued=10, cpu_percent=95), current=2, now=0)
+    assert (decision['action'], decision['target']) == ('hold', 2)
+    decision = autoscaler.decide(_metrics(queued=10, free_memory_mb=512), current=2, now=0)
+    assert (decision['action'], decision['target']) == ('hold', 2)
+    print("  ✓ CPU或内存紧张时不扩容")
+
+    assert autoscaler.decide(_metrics(), current=3, now=0)['action'] == 'hold'
+    assert autoscaler.decide(_metrics(), current=3, now=200)['action'] == 'hold'
+    decision = autoscaler.decide(_metrics(), current=3, now=300)
+    assert (decision['action'], decision['target']) == ('scale_down', 2)
+    assert autoscaler.decide(_metrics(), current=2, now=310)['action'] == 'hold'
+    # 需求回升后重新计时
+    autoscaler.decide(_metrics(queued=4), current=2, now=400)
+    assert autoscaler.decide(_metrics(), current=2, now=650)['action'] == 'hold'
+    print("  ✓ 需求持续偏低后才缩容，每次一个")
+
+    decision = autoscaler.decide(_metrics(cpu_percent=99), current=0, now=0)
+    assert (decision['action'], decision['target']) == ('scale_up', 1)
+    print("  ✓ 低于下限时立即补齐")
+
+
+def test_drain_and_reap():
+    """测试缩容只排空空闲Worker，以及退出Worker的回收"""
+    print("\n测试 2: 排空与回收...")
+    autoscaler = WorkerAutoscaler(None, 'redis://', ['default'], drain_timeout=900)
+    for pid, busy in ((1, True), (2, False), (3, True)):
+        worker = ManagedWorker(f'w{pid}', FakeProcess(pid))
+        worker.busy = busy
+        autoscaler.workers[worker.name] = worker
+
+    autoscaler.apply({'target': 2})
+    assert autoscaler.workers['w2'].process.signals == [signal.SIGTERM]
+    assert not autoscaler.workers['w1'].process.signals and not autoscaler.workers['w3'].process.signals
+    # 已在排空的Worker不会再收到信号（第二次SIGTERM会中断执行中的任务）
+    autoscaler.drain(autoscaler.workers['w2'])
+    assert autoscaler.workers['w2'].process.signals == [signal.SIGTERM]
+    assert len(autoscaler.active_workers) == 2
+    print("  ✓ 缩容时只向空闲Worker发送一次SIGTERM")
+
+    autoscaler.workers['w2'].process.returncode = 0
+    autoscaler.workers['w3'].process.returncode = 1
+    autoscaler.reap()
+    assert list(autoscaler.workers) == ['w1']
+    assert (autoscaler.stats['retired'], autoscaler.stats['crashed']) == (1, 1)
+    print("  ✓ 排空退出计为退役，意外退出计为崩溃")
+
+
+def test_browser_session_reuse():
+    """测试浏览器会话复用、健康检查失败重建和用满后回收"""
+    print("\n测试 3: 浏览器会话复用...")
+    manager = BrowserSessionManager(max_uses=3, max_age=3600, max_idle=600)
+    manager._reuse_supported = True
+    opened = []
+
+    def opener():
+        opened.append(FakeBrowser())
+        return opened[-1], None
+
+    session, error = manager.acquire('zhihu', 'alice', opener)
+    assert error is None and not session.reused
+    manager.release(session)
+    session, _ = manager.acquire('zhihu', 'alice', opener)
+    assert session.reused and len(opened) == 1
+    manager.release(session)
+    print("  ✓ 同一账号的后续任务复用已登录的浏览器")
+
+    opened[0].healthy = False
+    session, _ = manager.acquire('zhihu', 'alice', opener)
+    assert not session.reused and len(opened) == 2 and opened[0].closed
+    print("  ✓ 健康检查失败时关闭并重新启动")
+
+    for _ in range(2):
+        manager.release(session)
+        session, _ = manager.acquire('zhihu', 'alice', opener)
+    manager.release(session)
+    assert opened[1].closed and not manager.get_stats()['sessions']
+    print("  ✓ 用满max_uses次后关闭")
+
+    session, _ = manager.acquire('zhihu', 'bob', opener)
+    manager.release(session, healthy=False)
+    assert opened[2].closed
+    assert manager.get_stats()['created'] == 3 and manager.get_stats()['reused'] == 3
+
+    manager._reuse_supported = False
+    session, _ = manager.acquire('zhihu', 'bob', opener)
+    manager.release(session)
+    assert opened[3].closed
+    print("  ✓ 发布失败或Worker会fork时用完即关闭")
+
+
+def test_health_check_failure_recycles():
+    """测试复用前健康检查失败时关闭旧浏览器，新启动的会话放回池中继续复用"""
+    print("\n测试 4: 健康检查失败...")
+    manager, opened, opener = _pooled_manager()
+    session, _ = manager.acquire('zhihu', 'alice', opener)
+    manager.release(session)
+
+    opened[0].healthy = False
+    session, error = manager.acquire('zhihu', 'alice', opener)
+    assert error is None and not session.reused
+    assert opened[0].closed and not opened[1].closed
+    stats = manager.get_stats()
+    assert (stats['health_check_failed'], stats['recycled'], stats['created']) == (1, 1, 2)
+
+    manager.release(session)
+    session, _ = manager.acquire('zhihu', 'alice', opener)
+    assert session.reused and session.browser is opened[1] and len(opened) == 2
+    manager.release(session)
+    manager.close_all()
+    print("  ✓ 旧浏览器关闭，重新启动的会话被后续任务复用")
+
+
+def test_max_uses_and_max_age():
+    """测试会话用满max_uses次、存在超过max_age或空闲超过max_idle后关闭重建"""
+    print("\n测试 5: 用满和过期...")
+    manager, opened, opener = _pooled_manager(max_uses=2)
+    for _ in range(2):
+        session, _ = manager.acquire('zhihu', 'alice', opener)
+        manager.release(session)
+    assert opened[0].closed and not manager.get_stats()['sessions']
+    session, _ = manager.acquire('zhihu', 'alice', opener)
+    assert not session.reused and len(opened) == 2
+    manager.release(session)
+    manager.close_all()
+    print("  ✓ 第2次任务结束后关闭，第3次任务重新启动")
+
+    manager, opened, opener = _pooled_manager(max_age=60)
+    session, _ = manager.acquire('zhihu', 'alice', opener)
+    manager.release(session)
+    session.created_at = time.time() - 61
+    session, _ = manager.acquire('zhihu', 'alice', opener)
+    assert opened[0].closed and not session.reused and len(opened) == 2
+    # 任务执行期间超过max_age，归还时直接关闭
+    session.created_at = time.time() - 61
+    manager.release(session)
+    assert opened[1].closed and not manager.get_stats()['sessions']
+    print("  ✓ 超过max_age的会话在复用前或归还时关闭")
+
+    manager, opened, opener = _pooled_manager(max_idle=60)
+    session, _ = manager.acquire('zhihu', 'alice', opener)
+    manager.release(session)
+    session.last_used = time.time() - 61
+    session, _ = manager.acquire('zhihu', 'alice', opener)
+    assert opened[0].closed and not session.reused
+    manager.release(session)
+    assert manager.get_stats()['recycled'] == 1
+    manager.close_all()
+    print("  ✓ 空闲超过max_idle的会话不再复用")
+
+
+def test_release_unhealthy():
+    """测试发布失败后归还的会话被关闭并移出池，不影响其他账号的会话"""
+    print("\n测试 6: 发布失败后关闭...")
+    manager, opened, opener = _pooled_manager()
+    alice, _ = manager.acquire('zhihu', 'alice', opener)
+    bob, _ = manager.acquire('zhihu', 'bob', opener)
+    manager.release(alice, healthy=False)
+    manager.release(bob)
+    assert opened[0].closed and not opened[1].closed
+    assert [s['account'] for s in manager.get_stats()['sessions']] == ['bob']
+
+    alice, _ = manager.acquire('zhihu', 'alice', opener)
+    assert not alice.reused and len(opened) == 3
+    manager.release(alice)
+    manager.close_all()
+    assert all(browser.closed for browser in opened)
+    print("  ✓ 失败的会话关闭，下次任务重新启动")
+
+
+def test_forked_worker_closes_every_job():
+    """测试任务在fork出的子进程中执行（RQ登记的Worker不是当前进程）时，每个任务结束都关闭浏览器"""
+    print("\n测试 7: fork模式不复用...")
+
+    class FakeJob:
+        worker_name = 'worker-1'
+        connection = None
+
+    class FakeWorker:
+        pid = os.getpid() + 1
+
+    original_get_current_job, original_find_by_key = rq.get_current_job, Worker.find_by_key
+    rq.get_current_job = lambda: FakeJob()
+    Worker.find_by_key = classmethod(lambda cls, key, connection=None: FakeWorker())
+    try:
+        manager = BrowserSessionManager(max_uses=20)
+        opened = []
+
+        def opener():
+            opened.append(FakeBrowser())
+            return opened[-1], None
+
+        for _ in range(3):
+            session, _ = manager.acquire('zhihu', 'alice', opener)
+            assert not session.reused
+            manager.release(session)
+            assert opened[-1].closed
+        stats = manager.get_stats()
+        assert not manager.reuse_supported() and not stats['enabled']
+        assert len(opened) == 3 and not stats['sessions'] and manager._reaper is None
+        print("  ✓ 3个任务启动3次浏览器，每次用完即关闭")
+
+        FakeWorker.pid = os.getpid()
+        manager = BrowserSessionManager(max_uses=20)
+        session, _ = manager.acquire('zhihu', 'alice', opener)
+        manager.release(session)
+        assert manager.reuse_supported() and not opened[-1].closed
+        manager.close_all()
+        print("  ✓ Worker就是当前进程（SimpleWorker）时保留会话")
+    finally:
+        rq.get_current_job, Worker.find_by_key = original_get_current_job, original_find_by_key
+
+
+def main():
+    """运行所有测试"""
+    print("=" * 60)
+    print("  Worker自动伸缩与浏览器会话复用测试")
+    print("=" * 60)
+
+    tests = [test_decide, test_drain_and_reap, test_browser_session_reuse, test_health_check_failure_recycles,
+             test_max_uses_and_max_age, test_release_unhealthy, test_forked_worker_closes_every_job]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            print(f"  ❌ 测试失败: {e}")
+            failed += 1
+
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    exit(main())
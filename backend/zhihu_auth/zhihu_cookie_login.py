@@ -8,6 +8,7 @@ import os
 import json
 import logging
 from DrissionPage import ChromiumPage, ChromiumOptions
+from services.page_waits import wait_for_page_ready
 
 logger = logging.getLogger(__name__)
 
@@ -106,8 +107,8 @@ class ZhihuCookieLogin:
     def verify_login(self):
         """验证是否已登录"""
         try:
-            import time
-            time.sleep(2)
+            # 等待刷新后的页面加载完成再检查登录标识
+            wait_for_page_ready(self.driver, timeout=8)
 
             page_html = self.driver.html
             # 检查登录标识
@@ -17,6 +17,8 @@ from DrissionPage import ChromiumPage, ChromiumOptions
 BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, BACKEND_DIR)
 
+from services.page_waits import wait_for_element, wait_for_page_ready, wait_until
+
 
 def setup_password_login_logger():
     """为密码登录模块设置日志"""
@@ -78,6 +80,19 @@ logger = setup_password_login_logger()
 class ZhihuPasswordLogin:
     """知乎密码登录类 - 支持验证码自动识别"""
 
+    USERNAME_INPUT_SELECTORS = [
+        'input[name="username"]',
+        'input[placeholder*="手机号"]',
+        'input[placeholder*="邮箱"]',
+        '.SignFlow-account input',
+        'input.Input',
+    ]
+    PASSWORD_INPUT_SELECTORS = [
+        'input[type="password"]',
+        'input[name="password"]',
+        '.SignFlow-password input',
+    ]
+
     def __init__(self, cookies_dir=None):
         """
         初始化密码登录
@@ -407,7 +422,7 @@ class ZhihuPasswordLogin:
             logger.info('='*50)
 
             # 首先等待页面加载
-            time.sleep(3)
+            wait_for_page_ready(self.driver, timeout=10)
 
             # 应用反检测JS
             self._apply_stealth_js()
@@ -444,21 +459,14 @@ class ZhihuPasswordLogin:
                     '.slider-btn',
                 ]
 
-                for selector in slide_selectors:
-                    try:
-                        slide_element = self.driver.ele(selector, timeout=2)
-                        if slide_element:
-                            logger.info(f'找到滑块元素: {selector}')
-                            success, msg = self._handle_yidun_slide_captcha()
-                            if success:
-                                captcha_handled = True
-                                break
-                    except:
-                        continue
+                slide_element = wait_for_element(self.driver, slide_selectors, timeout=3)
+                if slide_element:
+                    logger.info('找到滑块元素')
+                    success, msg = self._handle_yidun_slide_captcha()
+                    captcha_handled = success
 
                 if captcha_handled:
-                    time.sleep(3)
-                    if 'unhuman' not in self.driver.url:
+                    if self._wait_unhuman_passed(timeout=5):
                         logger.info('✓ 滑块验证通过')
                         return True
                     else:
@@ -472,38 +480,29 @@ class ZhihuPasswordLogin:
                     '[class*="yidun"][class*="bg"]',
                 ]
 
-                for selector in click_selectors:
-                    try:
-                        click_element = self.driver.ele(selector, timeout=2)
-                        if click_element:
-                            logger.info(f'找到点选验证码: {selector}')
-                            # 尝试点选验证码
-                            success, msg = self._handle_click_captcha(click_element)
-                            if success:
-                                captcha_handled = True
-                                break
-                    except:
-                        continue
+                click_element = wait_for_element(self.driver, click_selectors, timeout=2)
+                if click_element:
+                    logger.info('找到点选验证码')
+                    # 尝试点选验证码
+                    success, msg = self._handle_click_captcha(click_element)
+                    captcha_handled = success
 
                 if captcha_handled:
-                    time.sleep(3)
-                    if 'unhuman' not in self.driver.url:
+                    if self._wait_unhuman_passed(timeout=5):
                         logger.info('✓ 点选验证通过')
                         return True
 
                 # 3. 尝试简单等待（有时验证会自动通过）
                 logger.info('等待验证自动完成...')
-                for _ in range(5):
-                    time.sleep(2)
-                    if 'unhuman' not in self.driver.url:
-                        logger.info('✓ 验证自动通过')
-                        return True
+                if self._wait_unhuman_passed(timeout=10):
+                    logger.info('✓ 验证自动通过')
+                    return True
 
                 # 4. 尝试刷新页面重试
                 if retry < max_retries - 1:
                     logger.info('刷新页面重试...')
                     self.driver.refresh()
-                    time.sleep(3)
+                    wait_for_page_ready(self.driver, timeout=10)
                     self._apply_stealth_js()
 
             logger.error('人机验证失败，服务器IP可能被知乎限制')
@@ -514,6 +513,11 @@ class ZhihuPasswordLogin:
             logger.error(f'处理人机验证失败: {e}', exc_info=True)
             return False
 
+    def _wait_unhuman_passed(self, timeout):
+        """等待离开人机验证页面，超时返回False"""
+        return bool(wait_until(lambda: 'unhuman' not in self.driver.url, timeout=timeout, interval=0.5,
+                               description='离开人机验证页面'))
+
     def _handle_yidun_slide_captcha(self):
         """
         专门处理网易易盾滑块验证码
@@ -524,9 +528,6 @@ class ZhihuPasswordLogin:
         try:
             logger.info('开始处理网易易盾滑块验证码...')
 
-            # 等待验证码完全加载
-            time.sleep(2)
-
             # 获取滑块和背景图
             bg_selectors = [
                 '.yidun_bg-img img',
@@ -548,44 +549,21 @@ class ZhihuPasswordLogin:
                 '[class*="yidun"][class*="slider"]',
             ]
 
-            bg_img = None
-            slide_img = None
-            slider_btn = None
-
-            # 查找背景图
-            for selector in bg_selectors:
-                try:
-                    bg_img = self.driver.ele(selector, timeout=2)
-                    if bg_img:
-                        logger.info(f'找到背景图: {selector}')
-                        break
-                except:
-                    continue
-
-            # 查找滑块图
-            for selector in slide_selectors:
-                try:
-                    slide_img = self.driver.ele(selector, timeout=2)
-                    if slide_img:
-                        logger.info(f'找到滑块图: {selector}')
-                        break
-                except:
-                    continue
-
-            # 查找滑块按钮
-            for selector in slider_btn_selectors:
-                try:
-                    slider_btn = self.driver.ele(selector, timeout=2)
-                    if slider_btn:
-                        logger.info(f'找到滑块按钮: {selector}')
-                        break
-                except:
-                    continue
+            # 等待验证码完全加载（滑块按钮可见），再查找背景图和滑块图
+            slider_btn = wait_for_element(self.driver, slider_btn_selectors, timeout=5, displayed=True)
+            if slider_btn:
+                logger.info('找到滑块按钮')
+            bg_img = wait_for_element(self.driver, bg_selectors, timeout=2)
+            if bg_img:
+                logger.info('找到背景图')
+            slide_img = wait_for_element(self.driver, slide_selectors, timeout=2)
+            if slide_img:
+                logger.info('找到滑块图')
 
             if not slider_btn:
                 logger.warning('未找到滑块按钮，尝试简单滑动')
                 # 尝试找任何可滑动的元素
-                slider_btn = self.driver.ele('.yidun_slider', timeout=2)
+                slider_btn = wait_for_element(self.driver, '.yidun_slider', timeout=0)
                 if not slider_btn:
                     return False, '未找到滑块元素'
 
@@ -645,20 +623,16 @@ class ZhihuPasswordLogin:
                 success, msg = self._perform_human_like_slide(slider_btn, distance)
 
                 if success:
-                    time.sleep(2)
-                    # 检查是否通过
-                    if 'unhuman' not in self.driver.url:
+                    # 等待验证结果：离开人机验证页面，或出现成功提示
+                    def passed():
+                        if 'unhuman' not in self.driver.url:
+                            return True
+                        tip = wait_for_element(self.driver, '.yidun_tips__text', timeout=0)
+                        return tip and '成功' in tip.text
+
+                    if wait_until(passed, timeout=3, description='滑动验证结果'):
                         return True, '滑动验证通过'
 
-                    # 检查是否有成功提示
-                    try:
-                        success_indicator = self.driver.ele('.yidun_tips__text', timeout=1)
-                        if success_indicator and '成功' in success_indicator.text:
-                            time.sleep(2)
-                            return True, '滑动验证通过'
-                    except:
-                        pass
-
                 # 等待后重试
                 time.sleep(1)
 
@@ -703,10 +677,10 @@ class ZhihuPasswordLogin:
                 current_x += move_x
                 time.sleep(delay)
 
-            # 释放
+            # 释放，等待验证请求返回
             time.sleep(random.uniform(0.05, 0.1))
             actions.release()
-            time.sleep(0.5)
+            wait_for_page_ready(self.driver, timeout=3, quiet_ms=300)
 
             logger.info(f'✓ 人类样式滑动完成，实际滑动: {current_x}px')
             return True, '滑动完成'
@@ -768,7 +742,7 @@ class ZhihuPasswordLogin:
 
     def _detect_captcha(self):
         """
-        检测页面是否有验证码
+        检测页面当前是否有验证码（不等待，需要等待时由调用方轮询）
 
         Returns:
             (has_captcha, captcha_type, captcha_element)
@@ -785,7 +759,7 @@ class ZhihuPasswordLogin:
 
             for selector in image_captcha_selectors:
                 try:
-                    captcha_img = self.driver.ele(selector, timeout=1)
+                    captcha_img = wait_for_element(self.driver, selector, timeout=0)
                     if captcha_img:
                         logger.info(f'检测到图片验证码: {selector}')
                         return True, 'image', captcha_img
@@ -803,7 +777,7 @@ class ZhihuPasswordLogin:
 
             for selector in slide_captcha_selectors:
                 try:
-                    slide_element = self.driver.ele(selector, timeout=1)
+                    slide_element = wait_for_element(self.driver, selector, timeout=0)
                     if slide_element:
                         logger.info(f'检测到滑块验证码: {selector}')
                         return True, 'slide', slide_element
@@ -819,7 +793,7 @@ class ZhihuPasswordLogin:
 
             for selector in click_captcha_selectors:
                 try:
-                    click_element = self.driver.ele(selector, timeout=1)
+                    click_element = wait_for_element(self.driver, selector, timeout=0)
                     if click_element:
                         logger.info(f'检测到点选验证码: {selector}')
                         return True, 'click', click_element
@@ -1018,9 +992,9 @@ class ZhihuPasswordLogin:
                 moved += step
                 time.sleep(random.uniform(0.01, 0.03))
 
-            # 释放
+            # 释放，等待验证请求返回
             actions.release()
-            time.sleep(1)
+            wait_for_page_ready(self.driver, timeout=3, quiet_ms=300)
 
             logger.info(f'✓ 简单滑动完成，滑动距离: {distance}px')
             return True, '滑动完成'
@@ -1064,9 +1038,9 @@ class ZhihuPasswordLogin:
             time.sleep(0.05)
             actions.move(-3, 0)
 
-            # 释放
+            # 释放，等待验证请求返回
             actions.release()
-            time.sleep(1)
+            wait_for_page_ready(self.driver, timeout=3, quiet_ms=300)
 
             logger.info(f'✓ 精确滑动完成，目标距离: {distance}px')
             return True, '滑动完成'
@@ -1109,15 +1083,8 @@ class ZhihuPasswordLogin:
 
             # 获取提示文字
             hint_selectors = ['.yidun_tips__text', '.geetest_tip_content', '[class*="tip"]']
-            hint_text = ''
-            for selector in hint_selectors:
-                try:
-                    hint_element = self.driver.ele(selector, timeout=1)
-                    if hint_element:
-                        hint_text = hint_element.text
-                        break
-                except:
-                    continue
+            hint_element = wait_for_element(self.driver, hint_selectors, timeout=1)
+            hint_text = hint_element.text if hint_element else ''
 
             # 调用点选识别API
             success, coordinates, data = self.captcha_service.recognize_click(
@@ -1135,7 +1102,8 @@ class ZhihuPasswordLogin:
                 click_element.click(x, y)
                 time.sleep(0.3)
 
-            time.sleep(1)
+            # 等待验证请求返回
+            wait_for_page_ready(self.driver, timeout=3, quiet_ms=300)
             return True, '点选完成'
 
         except Exception as e:
@@ -1169,7 +1137,7 @@ class ZhihuPasswordLogin:
                     logger.info('刷新页面重新开始登录流程...')
                     try:
                         self.driver.refresh()
-                        time.sleep(3)
+                        wait_for_page_ready(self.driver, timeout=10)
                     except:
                         pass
 
@@ -1184,7 +1152,7 @@ class ZhihuPasswordLogin:
                 # 先访问知乎首页，建立session
                 logger.info('[步骤2/7] 访问知乎首页建立session...')
                 self.driver.get('https://www.zhihu.com/')
-                time.sleep(2)
+                wait_for_page_ready(self.driver, timeout=10)
                 logger.info(f'  当前URL: {self.driver.url}')
 
                 # 应用反检测JS
@@ -1194,7 +1162,7 @@ class ZhihuPasswordLogin:
                 # 访问登录页面
                 logger.info('[步骤4/7] 访问知乎登录页面...')
                 self.driver.get(self.login_url)
-                time.sleep(3)
+                wait_for_page_ready(self.driver, timeout=10)
 
                 # 检查是否被重定向到人机验证页面
                 current_url = self.driver.url
@@ -1210,7 +1178,7 @@ class ZhihuPasswordLogin:
                     logger.info('✓ 人机验证通过，重新访问登录页')
                     # 重新访问登录页
                     self.driver.get(self.login_url)
-                    time.sleep(3)
+                    wait_for_page_ready(self.driver, timeout=10)
                     logger.info(f'  当前URL: {self.driver.url}')
 
                 # 切换到密码登录
@@ -1242,7 +1210,7 @@ class ZhihuPasswordLogin:
 
                 # 等待页面响应
                 logger.info('等待页面响应...')
-                time.sleep(3)
+                self._wait_login_response()
                 logger.info(f'  当前URL: {self.driver.url}')
 
                 # 处理验证码（带重试）
@@ -1271,20 +1239,20 @@ class ZhihuPasswordLogin:
                         captcha_retry += 1
                         # 刷新验证码
                         self._refresh_captcha()
-                        time.sleep(2)
+                        wait_for_page_ready(self.driver, timeout=3, quiet_ms=300)
                         continue
 
                     logger.info('✓ 验证码处理成功，重新点击登录')
-                    # 验证码处理成功，重新点击登录
-                    time.sleep(1)
+                    # 验证码处理成功（等待验证请求返回），重新点击登录
+                    wait_for_page_ready(self.driver, timeout=3, quiet_ms=300)
                     self._click_login_button()
-                    time.sleep(3)
+                    self._wait_login_response()
 
                     captcha_retry += 1
 
                 # 等待登录完成
                 logger.info('等待登录完成...')
-                time.sleep(3)
+                wait_until(self.verify_login, timeout=5, interval=0.5, description='登录完成')
 
                 # 验证登录
                 logger.info('验证登录状态...')
@@ -1327,7 +1295,7 @@ class ZhihuPasswordLogin:
                 try:
                     logger.info('登录异常，尝试刷新页面...')
                     self.driver.refresh()
-                    time.sleep(2)
+                    wait_for_page_ready(self.driver, timeout=10)
                 except:
                     pass
                 continue
@@ -1348,16 +1316,19 @@ class ZhihuPasswordLogin:
             ]
 
             for selector in error_selectors:
-                try:
-                    error_element = self.driver.ele(selector, timeout=1)
-                    if error_element and error_element.text:
-                        return error_element.text.strip()
-                except:
-                    continue
+                error_element = wait_for_element(self.driver, selector, timeout=0)
+                if error_element and error_element.text:
+                    return error_element.text.strip()
             return None
         except:
             return None
 
+    def _wait_login_response(self, timeout=10):
+        """点击登录后等待页面响应：登录成功跳转、出现验证码或错误提示"""
+        return wait_until(
+            lambda: self.verify_login() or self._detect_captcha()[0] or self._get_login_error_message(),
+            timeout=timeout, interval=0.5, description='登录响应')
+
     def _switch_to_password_login(self):
         """切换到密码登录标签"""
         try:
@@ -1368,64 +1339,37 @@ class ZhihuPasswordLogin:
                 'div[role="tab"]:has-text("密码登录")',
             ]
 
-            for selector in password_tab_selectors:
-                try:
-                    tab = self.driver.ele(selector, timeout=2)
-                    if tab:
-                        logger.info(f'找到密码登录标签: {selector}')
-                        tab.click()
-                        time.sleep(2)
-                        return True
-                except:
-                    continue
-            return False
+            tab = wait_for_element(self.driver, password_tab_selectors, timeout=5)
+            if not tab:
+                return False
+            logger.info('找到密码登录标签')
+            tab.click()
+            # 等待密码输入框出现
+            wait_for_element(self.driver, self.PASSWORD_INPUT_SELECTORS, timeout=3, displayed=True)
+            return True
         except Exception as e:
             logger.warning(f'切换密码登录标签失败: {e}')
             return False
 
     def _input_username(self, username):
         """输入用户名"""
-        username_input_selectors = [
-            'input[name="username"]',
-            'input[placeholder*="手机号"]',
-            'input[placeholder*="邮箱"]',
-            '.SignFlow-account input',
-            'input.Input',
-        ]
-
-        for selector in username_input_selectors:
-            try:
-                username_input = self.driver.ele(selector, timeout=2)
-                if username_input:
-                    logger.info(f'找到用户名输入框: {selector}')
-                    username_input.clear()
-                    username_input.input(username)
-                    time.sleep(0.5)
-                    return True
-            except:
-                continue
-        return False
+        username_input = wait_for_element(self.driver, self.USERNAME_INPUT_SELECTORS, timeout=5)
+        if not username_input:
+            return False
+        logger.info('找到用户名输入框')
+        username_input.clear()
+        username_input.input(username)
+        return True
 
     def _input_password(self, password):
         """输入密码"""
-        password_input_selectors = [
-            'input[type="password"]',
-            'input[name="password"]',
-            '.SignFlow-password input',
-        ]
-
-        for selector in password_input_selectors:
-            try:
-                password_input = self.driver.ele(selector, timeout=2)
-                if password_input:
-                    logger.info(f'找到密码输入框: {selector}')
-                    password_input.clear()
-                    password_input.input(password)
-                    time.sleep(0.5)
-                    return True
-            except:
-                continue
-        return False
+        password_input = wait_for_element(self.driver, self.PASSWORD_INPUT_SELECTORS, timeout=5)
+        if not password_input:
+            return False
+        logger.info('找到密码输入框')
+        password_input.clear()
+        password_input.input(password)
+        return True
 
     def _click_login_button(self):
         """点击登录按钮"""
@@ -1436,17 +1380,12 @@ class ZhihuPasswordLogin:
             'button.Button--primary',
         ]
 
-        for selector in login_btn_selectors:
-            try:
-                login_btn = self.driver.ele(selector, timeout=2)
-                if login_btn:
-                    logger.info(f'找到登录按钮: {selector}')
-                    login_btn.click()
-                    logger.info('✓ 点击登录按钮')
-                    return True
-            except:
-                continue
-        return False
+        login_btn = wait_for_element(self.driver, login_btn_selectors, timeout=5)
+        if not login_btn:
+            return False
+        login_btn.click()
+        logger.info('✓ 点击登录按钮')
+        return True
 
     def _refresh_captcha(self):
         """刷新验证码"""
@@ -1458,16 +1397,12 @@ class ZhihuPasswordLogin:
                 '[class*="refresh"]',
             ]
 
-            for selector in refresh_selectors:
-                try:
-                    refresh_btn = self.driver.ele(selector, timeout=1)
-                    if refresh_btn:
-                        refresh_btn.click()
-                        logger.info('✓ 已刷新验证码')
-                        return True
-                except:
-                    continue
-            return False
+            refresh_btn = wait_for_element(self.driver, refresh_selectors, timeout=1)
+            if not refresh_btn:
+                return False
+            refresh_btn.click()
+            logger.info('✓ 已刷新验证码')
+            return True
         except:
             return False
 
@@ -4,7 +4,6 @@
 知乎自动发帖模块（增强版）
 支持Cookie登录和自动密码登录fallback
 """
-import time
 import logging
 import json
 import os
@@ -15,6 +14,10 @@ from logging.handlers import RotatingFileHandler
 BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, BACKEND_DIR)
 
+from services.page_waits import (
+    StepTimer, wait_for_dom, wait_for_element, wait_for_page_ready, wait_until
+)
+
 def setup_zhihu_logger():
     """为知乎模块设置日志，确保日志写入到logs目录"""
     zhihu_logger = logging.getLogger(__name__)
@@ -71,6 +74,20 @@ def setup_zhihu_logger():
 # 初始化logger
 logger = setup_zhihu_logger()
 
+# 登录后页面中出现的标识（与 verify_login 一致）
+LOGIN_INDICATORS = ['我的主页', '退出登录', '个人中心', '创作中心']
+LOGIN_INDICATOR_JS = "const html = document.documentElement.outerHTML; return %s.some(text => html.includes(text));" % (
+    json.dumps(LOGIN_INDICATORS, ensure_ascii=False))
+
+# 编辑器获得焦点（点击后可以输入）
+EDITOR_FOCUSED_JS = "return !!(document.activeElement && document.activeElement.isContentEditable);"
+
+
+def _is_published_url(url):
+    """是否为已发布的文章页：包含/p/，且不是编辑或写作页面"""
+    return '/p/' in url and '/edit' not in url and 'write' not in url
+
+
 class ZhihuAutoPost:
     """知乎自动发帖"""
 
@@ -79,8 +96,12 @@ class ZhihuAutoPost:
         self.page = None
         self.is_logged_in = False
 
-    def init_browser(self):
-        """初始化浏览器（增强反检测版本）"""
+    def init_browser(self, auto_port=False):
+        """初始化浏览器（增强反检测版本）
+
+        Args:
+            auto_port: 使用独立的调试端口和用户目录（同一进程保留多个账号的浏览器时，避免接管同一个Chrome）
+        """
         try:
             from DrissionPage import ChromiumPage, ChromiumOptions
             import random
@@ -152,6 +173,9 @@ class ZhihuAutoPost:
             else:
                 co.headless(False)  # 可见模式,方便调试
 
+            if auto_port:
+                co.auto_port()
+
             self.page = ChromiumPage(addr_or_opts=co)
 
             # ========== 注入反检测JavaScript ==========
@@ -312,7 +336,6 @@ class ZhihuAutoPost:
 
             # 先访问知乎主页
             self.page.get('https://www.zhihu.com')
-            time.sleep(1)
 
             # 每次页面加载后注入反检测JS
             self._apply_stealth_js()
@@ -326,9 +349,9 @@ class ZhihuAutoPost:
 
             logger.info(f"✓ Cookie加载完成,共{len(cookies)}个")
 
-            # 刷新页面验证登录状态
+            # 刷新页面，等待登录后的页面渲染出登录标识再验证
             self.page.refresh()
-            time.sleep(2)
+            wait_for_dom(self.page, LOGIN_INDICATOR_JS, timeout=8)
 
             return self.verify_login()
 
@@ -409,9 +432,7 @@ class ZhihuAutoPost:
             page_html = self.page.html
 
             # 检查登录标识
-            login_indicators = ['我的主页', '退出登录', '个人中心', '创作中心']
-
-            for indicator in login_indicators:
+            for indicator in LOGIN_INDICATORS:
                 if indicator in page_html:
                     self.is_logged_in = True
                     logger.info(f"✓✓ 登录验证成功,检测到: {indicator}")
@@ -424,7 +445,18 @@ class ZhihuAutoPost:
             logger.error(f"✗ 登录验证失败: {e}")
             return False
 
-    def create_article(self, title, content, topics=None, draft=False):
+    def check_session(self):
+        """检查复用的浏览器是否可用且仍为登录状态（打开知乎主页验证）"""
+        try:
+            self.page.get('https://www.zhihu.com')
+            self._apply_stealth_js()
+            wait_for_dom(self.page, LOGIN_INDICATOR_JS, timeout=8)
+            return self.verify_login()
+        except Exception as e:
+            logger.warning(f"⚠ 浏览器会话检查失败: {e}")
+            return False
+
+    def create_article(self, title, content, topics=None, draft=False, timer=None):
         """创建文章
 
         Args:
@@ -432,117 +464,111 @@ class ZhihuAutoPost:
             content: 文章内容(支持HTML或Markdown)
             topics: 话题列表,如 ['Python', '编程']
             draft: 是否保存为草稿(True)或直接发布(False)
+            timer: 记录各步骤耗时的StepTimer（可选）
         """
+        timer = timer or StepTimer('zhihu')
         try:
             if not self.is_logged_in:
                 logger.error("未登录,无法发帖")
                 return {'success': False, 'message': '未登录'}
 
             # 访问创作页面
-            logger.info("正在进入创作页面...")
-            self.page.get('https://zhuanlan.zhihu.com/write')
-            time.sleep(2)
+            with timer.step('打开创作页'):
+                logger.info("正在进入创作页面...")
+                write_url = 'https://zhuanlan.zhihu.com/write'
+                self.page.get(write_url)
 
-            # 每次页面加载后注入反检测JS
-            self._apply_stealth_js()
-            time.sleep(1)
+                # 每次页面加载后注入反检测JS
+                self._apply_stealth_js()
 
-            # 等待编辑器加载
-            logger.info("等待编辑器加载...")
-            time.sleep(2)
+                # 等待编辑器加载（标题输入框出现）
+                logger.info("等待编辑器加载...")
+                title_input = wait_for_element(
+                    self.page, ['css:.WriteIndex-titleInput', 'css:textarea[placeholder*="标题"]'], timeout=15)
 
             # 输入标题
-            logger.info("正在输入标题...")
-            try:
-                title_input = self.page.ele('css:.WriteIndex-titleInput', timeout=5)
-                if title_input:
-                    title_input.clear()
-                    title_input.input(title)
-                    logger.info(f"✓ 标题已输入: {title[:30]}...")
-                else:
-                    # 备用选择器
-                    title_input = self.page.ele('css:textarea[placeholder*="标题"]', timeout=3)
+            with timer.step('输入标题'):
+                logger.info("正在输入标题...")
+                try:
                     if title_input:
                         title_input.clear()
                         title_input.input(title)
-                        logger.info(f"✓ 标题已输入(备用方法): {title[:30]}...")
-            except Exception as e:
-                logger.error(f"✗ 标题输入失败: {e}")
-                return {'success': False, 'message': f'标题输入失败: {e}'}
-
-            time.sleep(1)
+                        logger.info(f"✓ 标题已输入: {title[:30]}...")
+                    else:
+                        logger.warning("⚠ 未找到标题输入框")
+                except Exception as e:
+                    logger.error(f"✗ 标题输入失败: {e}")
+                    return {'success': False, 'message': f'标题输入失败: {e}'}
 
             # 输入正文内容
-            logger.info("正在输入正文...")
-            try:
-                # 尝试多种编辑器定位方式
-                editor_selectors = [
-                    'css:.public-DraftEditor-content',
-                    'css:[contenteditable="true"]',
-                    'css:.notranslate',
-                    'css:[data-text="true"]'
-                ]
-
-                editor = None
-                for selector in editor_selectors:
-                    try:
-                        editor = self.page.ele(selector, timeout=2)
-                        if editor:
-                            logger.info(f"✓ 找到编辑器: {selector}")
-                            break
-                    except:
-                        continue
-
-                if editor:
-                    # 点击编辑器激活
-                    editor.click()
-                    time.sleep(0.5)
-
-                    # 输入内容 - 一次性输入完整内容，避免被覆盖
-                    logger.info(f"准备输入内容，长度: {len(content)} 字符")
-                    editor.input(content, clear=True)
-                    time.sleep(1)
-
-                    # 验证内容是否输入成功
-                    paragraphs = content.split('\n\n')
-                    logger.info(f"✓ 正文已输入,共{len(paragraphs)}段")
-                else:
-                    logger.error("✗ 未找到编辑器元素")
-                    return {'success': False, 'message': '未找到编辑器'}
+            with timer.step('输入正文'):
+                logger.info("正在输入正文...")
+                try:
+                    # 尝试多种编辑器定位方式
+                    editor_selectors = [
+                        'css:.public-DraftEditor-content',
+                        'css:[contenteditable="true"]',
+                        'css:.notranslate',
+                        'css:[data-text="true"]'
+                    ]
+
+                    editor = wait_for_element(self.page, editor_selectors, timeout=10)
+
+                    if editor:
+                        # 点击编辑器激活，等待获得焦点
+                        editor.click()
+                        wait_for_dom(self.page, EDITOR_FOCUSED_JS, timeout=2)
+
+                        # 输入内容 - 一次性输入完整内容，避免被覆盖
+                        logger.info(f"准备输入内容，长度: {len(content)} 字符")
+                        editor.input(content, clear=True)
+                        wait_until(lambda: editor.text.strip(), timeout=5, description='正文写入编辑器')
+
+                        # 验证内容是否输入成功
+                        paragraphs = content.split('\n\n')
+                        logger.info(f"✓ 正文已输入,共{len(paragraphs)}段")
+                    else:
+                        logger.error("✗ 未找到编辑器元素")
+                        return {'success': False, 'message': '未找到编辑器'}
 
-            except Exception as e:
-                logger.error(f"✗ 正文输入失败: {e}")
-                return {'success': False, 'message': f'正文输入失败: {e}'}
+                except Exception as e:
+                    logger.error(f"✗ 正文输入失败: {e}")
+                    return {'success': False, 'message': f'正文输入失败: {e}'}
 
-            time.sleep(2)
+                # 等待编辑器自动保存的请求完成
+                wait_for_page_ready(self.page, timeout=5)
 
             # 添加话题标签(如果提供)
             if topics:
-                logger.info(f"正在添加话题: {topics}")
-                try:
-                    # 查找话题输入框
-                    topic_input = self.page.ele('css:input[placeholder*="话题"]', timeout=3)
-                    if topic_input:
-                        for topic in topics:
-                            topic_input.input(topic)
-                            time.sleep(0.5)
-                            # 按回车确认
-                            topic_input.input('\n')
-                            time.sleep(0.5)
-                        logger.info(f"✓ 话题已添加: {topics}")
-                except Exception as e:
-                    logger.warning(f"话题添加失败(非关键): {e}")
+                with timer.step('添加话题'):
+                    logger.info(f"正在添加话题: {topics}")
+                    try:
+                        # 查找话题输入框
+                        topic_input = wait_for_element(self.page, 'css:input[placeholder*="话题"]', timeout=3)
+                        if topic_input:
+                            for topic in topics:
+                                topic_input.input(topic)
+                                # 等待话题联想请求返回后按回车确认
+                                wait_for_page_ready(self.page, timeout=2, quiet_ms=300)
+                                topic_input.input('\n')
+                                wait_for_page_ready(self.page, timeout=2, quiet_ms=300)
+                            logger.info(f"✓ 话题已添加: {topics}")
+                    except Exception as e:
+                        logger.warning(f"话题添加失败(非关键): {e}")
 
             # 发布或保存草稿
             if draft:
                 logger.info("正在保存草稿...")
                 try:
-                    save_draft_btn = self.page.ele('text:保存草稿', timeout=3)
+                    with timer.step('保存草稿'):
+                        save_draft_btn = wait_for_element(self.page, 'text:保存草稿', timeout=3)
+                        if save_draft_btn:
+                            save_draft_btn.click()
+                            wait_for_page_ready(self.page, timeout=5)
                     if save_draft_btn:
-                        save_draft_btn.click()
-                        time.sleep(2)
                         logger.info("✓✓ 草稿保存成功")
-                        return {'success': True, 'message': '草稿保存成功', 'type': 'draft'}
+                        return {'success': True, 'message': '草稿保存成功', 'type': 'draft',
+                                'timings': timer.to_dict()}
                 except Exception as e:
                     logger.warning(f"保存草稿按钮未找到: {e}")
             else:
@@ -556,21 +582,54 @@ class ZhihuAutoPost:
                         'css:button[type="submit"]'
                     ]
 
-                    publish_btn = None
-                    for selector in publish_selectors:
-                        try:
-                            publish_btn = self.page.ele(selector, timeout=2)
-                            if publish_btn:
-                                logger.info(f"✓ 找到发布按钮: {selector}")
-                                break
-                        except:
-                            continue
+                    publish_btn = wait_for_element(self.page, publish_selectors, timeout=5)
 
                     if publish_btn:
                         logger.info("步骤3/5: 点击发布按钮...")
-                        publish_btn.click()
-                        logger.info("✓ 已点击发布按钮，等待页面响应...")
-                        time.sleep(8)  # 延长等待时间从3秒到8秒
+                        with timer.step('点击发布'):
+                            publish_btn.click()
+                            logger.info("✓ 已点击发布按钮，等待页面响应...")
+
+                            # 知乎现在显示"发布设置"面板，需要点击面板底部的"发布"按钮；也可能直接跳转到文章页
+                            modal_publish_selectors = [
+                                # 新版知乎发布设置面板中的发布按钮
+                                'css:button.Button--primary.Button--blue',  # 主要按钮样式
+                                'css:.css-1ppjin3 button.Button--primary',  # 发布设置面板底部的主按钮
+                                # 旧版选择器（向后兼容）
+                                'text:发布文章',
+                                'css:.Modal button.Button--primary',
+                                'css:div[role="dialog"] button:has-text("发布")',
+                                'css:.PublishPanel button.Button--primary',
+                            ]
+
+                            # 发布设置面板（出现后再查找面板中的按钮，避免匹配到刚点击的页面发布按钮）
+                            modal_selectors = [
+                                'css:div[role="dialog"]',
+                                'css:.Modal',
+                                'css:.PublishPanel',
+                                'css:.css-1ppjin3',
+                            ]
+
+                            def find_modal_button():
+                                for selector in modal_publish_selectors:
+                                    modal_btn = wait_for_element(self.page, selector, timeout=0)
+                                    # 确保这是发布设置对话框中的按钮
+                                    if modal_btn and '发布' in modal_btn.text:
+                                        logger.info(f"✓ 找到可能的发布按钮: selector='{selector}', "
+                                                    f"text='{modal_btn.text.strip()}'")
+                                        return modal_btn
+                                return None
+
+                            def published_url():
+                                return self.page.url if _is_published_url(self.page.url) else None
+
+                            outcome = wait_until(
+                                lambda: published_url() or wait_for_element(self.page, modal_selectors, timeout=0),
+                                timeout=10, description='发布设置弹窗或文章页')
+                            modal_btn = None
+                            if not isinstance(outcome, str):
+                                modal_btn = wait_until(find_modal_button, timeout=3 if outcome else 0,
+                                                       description='发布设置中的发布按钮')
 
                         # 步骤4/5: 处理发布设置弹窗（重要！）
                         logger.info("步骤4/5: 检查发布设置弹窗...")
@@ -594,131 +653,60 @@ class ZhihuAutoPost:
                         except Exception as e:
                             logger.debug(f"保存调试信息失败: {e}")
 
-                        # 知乎现在显示"发布设置"面板，需要点击面板底部的"发布"按钮
-                        modal_found = False
-                        modal_publish_selectors = [
-                            # 新版知乎发布设置面板中的发布按钮
-                            'css:button.Button--primary.Button--blue',  # 主要按钮样式
-                            'css:.css-1ppjin3 button.Button--primary',  # 发布设置面板底部的主按钮
-                            # 旧版选择器（向后兼容）
-                            'text:发布文章',
-                            'css:.Modal button.Button--primary',
-                            'css:div[role="dialog"] button:has-text("发布")',
-                            'css:.PublishPanel button.Button--primary',
-                        ]
-
-                        for selector in modal_publish_selectors:
-                            try:
-                                modal_btn = self.page.ele(selector, timeout=2)
-                                if modal_btn:
-                                    modal_text = modal_btn.text.strip()
-                                    logger.info(f"✓ 找到可能的发布按钮: selector='{selector}', text='{modal_text}'")
-
-                                    # 确保这是发布设置对话框中的按钮
-                                    if '发布' in modal_text:
-                                        logger.info(f"✓ 确认为发布按钮，准备点击")
-                                        modal_btn.click()
-                                        logger.info("✓ 已点击弹窗中的发布按钮")
-                                        modal_found = True
-                                        time.sleep(8)  # 延长等待时间
-                                        break
-                            except Exception as e:
-                                logger.debug(f"选择器 '{selector}' 未找到元素: {e}")
-                                continue
-
-                        if not modal_found:
+                        if isinstance(outcome, str):
+                            logger.info("✓ 已直接跳转到文章页，无发布设置弹窗")
+                        elif modal_btn:
+                            with timer.step('确认发布'):
+                                logger.info(f"✓ 确认为发布按钮，准备点击")
+                                modal_btn.click()
+                                logger.info("✓ 已点击弹窗中的发布按钮")
+                        else:
                             logger.warning("⚠ 未检测到发布设置弹窗，可能已直接发布或页面结构变化")
 
-                        # 步骤5/5: 验证发布结果(带重试机制)
+                        # 步骤5/5: 验证发布结果（等待跳转到已发布的文章页，最长20秒）
                         logger.info("步骤5/5: 验证发布结果...")
+                        with timer.step('等待发布完成'):
+                            wait_until(published_url, timeout=20, interval=0.5, description='跳转到已发布文章页')
 
-                        # 重试机制: 最多验证2次
-                        max_retries = 2
-                        publish_success = False
-                        current_url = None
+                        current_url = self.page.url
+                        logger.info(f"当前URL: {current_url}")
+
+                        # 判断发布成功的标准
                         success_indicators = []
 
-                        for retry_count in range(max_retries):
-                            if retry_count > 0:
-                                logger.info(f"第{retry_count + 1}次验证(重试 {retry_count})...")
-                                time.sleep(6)  # 重试前额外等待6秒
-                            else:
-                                time.sleep(5)  # 首次验证等待5秒
+                        # 1. URL必须不包含 /edit（关键！）
+                        if '/edit' not in current_url:
+                            success_indicators.append("URL不包含/edit（已退出编辑模式）")
+                        else:
+                            logger.warning("⚠ URL仍然包含/edit，文章可能未真正发布")
 
-                            current_url = self.page.url
-                            logger.info(f"当前URL: {current_url}")
+                        # 2. URL应该包含文章ID
+                        if '/p/' in current_url or '/zhuanlan/' in current_url:
+                            success_indicators.append("URL包含文章路径")
 
-                            # 判断发布成功的标准
-                            success_indicators = []
+                        # 3. URL应该不是write页面
+                        if 'write' not in current_url:
+                            success_indicators.append("URL已离开写作页面")
 
-                            # 1. URL必须不包含 /edit（关键！）
-                            if '/edit' not in current_url:
-                                success_indicators.append("URL不包含/edit（已退出编辑模式）")
-                            else:
-                                logger.warning("⚠ URL仍然包含/edit，文章可能未真正发布")
-
-                            # 2. URL应该包含文章ID
-                            if '/p/' in current_url or '/zhuanlan/' in current_url:
-                                success_indicators.append("URL包含文章路径")
-
-                            # 3. URL应该不是write页面
-                            if 'write' not in current_url:
-                                success_indicators.append("URL已离开写作页面")
-
-                            # 4. 检查页面是否有编辑按钮（发布后的文章页会有编辑按钮）
-                            try:
-                                # 如果能找到"编辑文章"按钮，说明在文章查看页面
-                                edit_btn = self.page.ele('text:编辑文章', timeout=2)
-                                if edit_btn:
-                                    success_indicators.append("找到文章编辑按钮（说明在已发布文章页面）")
-                            except:
-                                pass
-
-                            # 5. 检查是否有发布成功的提示
-                            try:
-                                page_html = self.page.html
-                                if '发布成功' in page_html or '已发布' in page_html:
-                                    success_indicators.append("页面显示发布成功")
-                            except:
-                                pass
-
-                            # 综合判断
-                            logger.info(f"成功指标数量: {len(success_indicators)}")
-                            logger.info(f"成功指标: {success_indicators}")
-
-                            # 关键判断:
-                            # 1. URL不能包含/edit (编辑模式)
-                            # 2. URL必须包含/p/ (已发布文章的标志)
-                            # 3. URL不能是write页面
-                            is_not_edit = '/edit' not in current_url
-                            is_published_url = '/p/' in current_url
-                            is_not_write = 'write' not in current_url
-
-                            if is_not_edit and is_published_url and is_not_write:
-                                logger.info(f"✓ 发布验证成功(第{retry_count + 1}次尝试)")
-                                logger.info(f"  - URL不包含/edit: {is_not_edit}")
-                                logger.info(f"  - URL包含/p/: {is_published_url}")
-                                logger.info(f"  - URL不是write页面: {is_not_write}")
-                                publish_success = True
-                                break
-                            else:
-                                # 详细记录失败原因
-                                fail_reasons = []
-                                if not is_not_edit:
-                                    fail_reasons.append("URL仍包含/edit")
-                                if not is_published_url:
-                                    fail_reasons.append("URL不包含/p/(非已发布文章)")
-                                if not is_not_write:
-                                    fail_reasons.append("URL仍在write页面")
-
-                                if retry_count < max_retries - 1:
-                                    logger.warning(f"⚠ 第{retry_count + 1}次验证失败: {', '.join(fail_reasons)}")
-                                    logger.warning("将进行重试...")
-                                else:
-                                    logger.error(f"✗ 所有重试均失败,文章未真正发布: {', '.join(fail_reasons)}")
-
-                        # 最终判断
-                        if not publish_success:
+                        # 4. 检查页面是否有编辑按钮（发布后的文章页会有编辑按钮）
+                        if wait_for_element(self.page, 'text:编辑文章', timeout=0):
+                            success_indicators.append("找到文章编辑按钮（说明在已发布文章页面）")
+
+                        # 5. 检查是否有发布成功的提示
+                        try:
+                            page_html = self.page.html
+                            if '发布成功' in page_html or '已发布' in page_html:
+                                success_indicators.append("页面显示发布成功")
+                        except:
+                            pass
+
+                        # 综合判断
+                        logger.info(f"成功指标数量: {len(success_indicators)}")
+                        logger.info(f"成功指标: {success_indicators}")
+                        logger.info(f"[发布流程-发布器] 步骤耗时: {timer.summary()}")
+
+                        # 关键判断: URL不能包含/edit、必须包含/p/、不能是write页面
+                        if not _is_published_url(current_url):
                             # 更详细的错误消息
                             if '/edit' in current_url:
                                 error_msg = "文章未真正发布，仍在编辑状态（URL包含/edit）"
@@ -734,7 +722,8 @@ class ZhihuAutoPost:
                             return {
                                 'success': False,
                                 'message': error_msg,
-                                'url': current_url
+                                'url': current_url,
+                                'timings': timer.to_dict()
                             }
 
                         # 发布成功
@@ -743,7 +732,8 @@ class ZhihuAutoPost:
                             'success': True,
                             'message': '文章发布成功',
                             'type': 'published',
-                            'url': current_url
+                            'url': current_url,
+                            'timings': timer.to_dict()
                         }
 
                     else:
@@ -770,81 +760,121 @@ class ZhihuAutoPost:
 
 
 # 便捷函数 - 增强版支持自动登录
-def post_article_to_zhihu(username, title, content, password=None, topics=None, draft=False):
+def open_zhihu_session(username, password=None, auto_port=False):
     """
-    一键发布文章到知乎（增强版 - 支持自动登录）
+    启动浏览器并登录知乎（优先Cookie，失败时使用密码）
 
     Args:
         username: 知乎账号(用于加载Cookie)
-        title: 文章标题
-        content: 文章内容
         password: 密码（可选，当Cookie不存在时使用）
-        topics: 话题列表
-        draft: 是否保存为草稿
+        auto_port: 使用独立的调试端口和用户目录
 
     Returns:
-        {'success': True/False, 'message': '...', 'url': '...'}
+        (已登录的ZhihuAutoPost, None) 或 (None, 失败结果)
     """
-    logger.info("[发布流程-发布器] ========== 知乎发布器开始 ==========")
-    logger.info(f"[发布流程-发布器] 用户名: {username}")
-    logger.info(f"[发布流程-发布器] 文章标题: {title[:50]}")
-    logger.info(f"[发布流程-发布器] 文章长度: {len(content)} 字符")
-    logger.info(f"[发布流程-发布器] 是否草稿: {draft}")
-    logger.info(f"[发布流程-发布器] 是否提供密码: {'是' if password else '否'}")
-
     poster = ZhihuAutoPost()
-
     try:
         # 初始化浏览器
         logger.info("[发布流程-发布器] 步骤1: 初始化浏览器")
-        if not poster.init_browser():
+        if not poster.init_browser(auto_port=auto_port):
             logger.error("[发布流程-发布器] 浏览器初始化失败")
-            return {'success': False, 'message': '浏览器初始化失败'}
+            return None, {'success': False, 'message': '浏览器初始化失败'}
 
         logger.info("[发布流程-发布器] ✓ 浏览器初始化成功")
 
-        # 优先使用Cookie登录，失败则使用密码登录
-        login_success = False
-
-        # 步骤2.1: 尝试Cookie登录
+        # 步骤2.1: 尝试Cookie登录，失败则使用密码登录
         logger.info("=" * 60)
         logger.info("[发布流程-发布器] 步骤2: 尝试Cookie登录")
         logger.info("=" * 60)
 
         if poster.load_cookies(username):
             logger.info("[发布流程-发布器] ✓ Cookie登录成功")
-            login_success = True
-        else:
-            # Cookie登录失败，尝试密码登录
-            logger.warning("[发布流程-发布器] Cookie登录失败或不存在")
+            return poster, None
 
-            if password:
-                logger.info("=" * 60)
-                logger.info("[发布流程-发布器] 步骤2.1: 使用账号密码登录（支持验证码自动识别）")
-                logger.info("=" * 60)
+        # Cookie登录失败，尝试密码登录
+        logger.warning("[发布流程-发布器] Cookie登录失败或不存在")
 
-                if poster.auto_login_with_password(username, password):
-                    logger.info("[发布流程-发布器] ✓✓ 密码登录成功")
-                    login_success = True
-                else:
-                    logger.error("[发布流程-发布器] 密码登录也失败")
-                    return {
-                        'success': False,
-                        'message': '登录失败。Cookie无效且密码登录失败，请检查账号密码是否正确。'
-                    }
-            else:
-                logger.error("[发布流程-发布器] Cookie无效且未配置密码")
-                return {
-                    'success': False,
-                    'message': 'Cookie无效且未配置密码，无法登录。请在账号管理中配置知乎账号密码。'
-                }
+        if not password:
+            logger.error("[发布流程-发布器] Cookie无效且未配置密码")
+            poster.close()
+            return None, {
+                'success': False,
+                'message': 'Cookie无效且未配置密码，无法登录。请在账号管理中配置知乎账号密码。'
+            }
+
+        logger.info("=" * 60)
+        logger.info("[发布流程-发布器] 步骤2.1: 使用账号密码登录（支持验证码自动识别）")
+        logger.info("=" * 60)
+
+        if poster.auto_login_with_password(username, password):
+            logger.info("[发布流程-发布器] ✓✓ 密码登录成功")
+            return poster, None
+
+        logger.error("[发布流程-发布器] 密码登录也失败")
+        poster.close()
+        return None, {
+            'success': False,
+            'message': '登录失败。Cookie无效且密码登录失败，请检查账号密码是否正确。'
+        }
 
+    except Exception as e:
+        logger.error(f"[发布流程-发布器] 登录过程异常: {e}", exc_info=True)
+        poster.close()
+        return None, {
+            'success': False,
+            'error': str(e),
+            'message': f'发布异常: {str(e)}'
+        }
+
+
+def post_article_to_zhihu(username, title, content, password=None, topics=None, draft=False, reuse_session=False):
+    """
+    一键发布文章到知乎（增强版 - 支持自动登录）
+
+    Args:
+        username: 知乎账号(用于加载Cookie)
+        title: 文章标题
+        content: 文章内容
+        password: 密码（可选，当Cookie不存在时使用）
+        topics: 话题列表
+        draft: 是否保存为草稿
+        reuse_session: 从Worker进程的浏览器会话池获取已登录的浏览器，发布成功后保留供后续任务复用
+
+    Returns:
+        {'success': True/False, 'message': '...', 'url': '...', 'timings': {'total_seconds', 'steps'}}
+        复用会话时另含 browser_session: {uses, reused, startup_seconds, saved_seconds, ...}
+    """
+    logger.info("[发布流程-发布器] ========== 知乎发布器开始 ==========")
+    logger.info(f"[发布流程-发布器] 用户名: {username}")
+    logger.info(f"[发布流程-发布器] 文章标题: {title[:50]}")
+    logger.info(f"[发布流程-发布器] 文章长度: {len(content)} 字符")
+    logger.info(f"[发布流程-发布器] 是否草稿: {draft}")
+    logger.info(f"[发布流程-发布器] 是否提供密码: {'是' if password else '否'}")
+
+    timer = StepTimer('zhihu')
+    session = None
+    manager = None
+    with timer.step('启动浏览器并登录'):
+        if reuse_session:
+            from services.browser_sessions import get_browser_session_manager
+            manager = get_browser_session_manager()
+            session, error = manager.acquire(
+                'zhihu', username, lambda: open_zhihu_session(username, password, auto_port=True))
+            poster = session.browser if session else None
+        else:
+            poster, error = open_zhihu_session(username, password)
+    if error is not None:
+        return error
+
+    result = None
+    try:
         # 登录成功，发布文章
         logger.info("=" * 60)
         logger.info("[发布流程-发布器] 步骤3: 开始发布文章到知乎")
         logger.info("=" * 60)
 
-        result = poster.create_article(title, content, topics, draft)
+        result = poster.create_article(title, content, topics, draft, timer=timer)
+        result['timings'] = timer.to_dict()
 
         if result.get('success'):
             logger.info("[发布流程-发布器] ✓✓✓ 文章发布成功!")
@@ -863,5 +893,11 @@ def post_article_to_zhihu(username, title, content, password=None, topics=None,
             'message': f'发布异常: {str(e)}'
         }
     finally:
-        logger.debug("[发布流程-发布器] 关闭浏览器")
-        poster.close()
+        if session is not None:
+            # 发布失败时页面状态未知，关闭浏览器，下次重新启动
+            manager.release(session, healthy=bool(result and result.get('success')))
+            if result is not None:
+                result['browser_session'] = session.to_dict()
+        else:
+            logger.debug("[发布流程-发布器] 关闭浏览器")
+            poster.close()
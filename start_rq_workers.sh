@@ -1,7 +1,8 @@
 #!/bin/bash
 # RQ Worker启动脚本
-# 用法: ./start_rq_workers.sh [worker_count]
-# 默认启动2个worker
+# 用法: ./start_rq_workers.sh [worker_count|auto]
+# 默认启动2个worker；auto 启动自动伸缩进程，按队列积压在
+# RQ_AUTOSCALE_MIN_WORKERS - RQ_AUTOSCALE_MAX_WORKERS 之间增减worker
 
 WORKER_COUNT=${1:-2}
 PROJECT_DIR="$HOME/TOP_N"
@@ -13,19 +14,50 @@ echo "=== 启动RQ Workers ==="
 echo "项目目录: $PROJECT_DIR"
 echo "Worker数量: $WORKER_COUNT"
 
-# 停止现有的Worker
+# 停止现有的Worker（自动伸缩进程收到SIGTERM后会等待Worker执行完当前任务，
+# 最长 RQ_AUTOSCALE_DRAIN_TIMEOUT 秒），等旧进程全部退出后再启动，避免同时运行两个自动伸缩进程
 echo "停止现有的RQ Worker..."
+OLD_PIDS=$(pgrep -f 'scripts/rq_autoscaler.py|rq worker')
+pkill -f 'scripts/rq_autoscaler.py' 2>/dev/null
 pkill -f 'rq worker' 2>/dev/null
-sleep 2
+STOP_TIMEOUT=$(( ${RQ_AUTOSCALE_DRAIN_TIMEOUT:-900} + 30 ))
+WAITED=0
+for pid in $OLD_PIDS; do
+    while kill -0 "$pid" 2>/dev/null; do
+        if [ "$WAITED" -ge "$STOP_TIMEOUT" ]; then
+            echo "进程 $pid 在 ${STOP_TIMEOUT} 秒内未退出，强制结束"
+            kill -9 "$pid" 2>/dev/null
+            break
+        fi
+        if [ $((WAITED % 30)) -eq 0 ]; then
+            echo "等待进程 $pid 退出（已等待 ${WAITED} 秒）..."
+        fi
+        sleep 1
+        WAITED=$((WAITED + 1))
+    done
+done
 
 # 激活虚拟环境并启动Worker
 cd "$BACKEND_DIR" || exit 1
 source "$VENV_DIR/bin/activate"
 
+if [ "$WORKER_COUNT" = "auto" ]; then
+    echo "启动Worker自动伸缩..."
+    PYTHONPATH=. nohup python scripts/rq_autoscaler.py > "$LOG_DIR/rq_autoscaler.log" 2>&1 &
+    sleep 5
+    echo ""
+    echo "=== Worker状态 ==="
+    ps aux | grep -E 'rq_autoscaler|rq.cli worker' | grep -v grep
+    echo ""
+    echo "=== 完成 ==="
+    echo "日志文件: $LOG_DIR/rq_autoscaler.log, Worker日志: $PROJECT_DIR/logs/rq-auto-*.log"
+    exit 0
+fi
+
 for i in $(seq 1 $WORKER_COUNT); do
     echo "启动 worker-$i..."
-    PYTHONPATH=. nohup rq worker default user:1 user:2 user:3 user:4 user:5 \
-        --url redis://localhost:6379/0 \
+    PYTHONPATH=. nohup rq worker default generation user:1 user:2 user:3 user:4 user:5 \
+        --url "${REDIS_URL:-redis://localhost:6379/0}" \
         --name worker-$i \
         --with-scheduler \
         > "$LOG_DIR/rq$i.log" 2>&1 &
@@ -924,6 +924,30 @@ function stopQRLoginPolling() {
     }
 }
 
+// 订阅当前用户的发布任务状态事件（SSE，断线后浏览器自动带上Last-Event-ID续传）
+// onTask(task): 任务状态变化（task_id、status等变化的字段）；onSync(): 需要重新拉取一次任务状态；onUnavailable(): 不支持或推送不可用，应回退为轮询
+function subscribeTaskEvents(onTask, onSync, onUnavailable) {
+    if (!window.EventSource) {
+        onUnavailable();
+        return null;
+    }
+
+    const source = new EventSource('/api/publish_tasks/events');
+    source.addEventListener('task', e => {
+        // id/type 是事件本身的字段，不合并到任务上
+        const { id, type, ...task } = JSON.parse(e.data);
+        onTask(task);
+    });
+    source.addEventListener('sync', () => onSync());
+    source.onerror = () => {
+        // 连接被服务端拒绝（如推送不可用）时浏览器不会重连
+        if (source.readyState === EventSource.CLOSED) {
+            onUnavailable();
+        }
+    };
+    return source;
+}
+
 // 任务监控面板
 function showTaskMonitor(taskResults) {
     // 创建监控面板
@@ -962,12 +986,41 @@ function showTaskMonitor(taskResults) {
 
     // 保存任务ID到全局
     window.monitoringTasks = taskIds;
+    window.monitoredTaskStates = {};
+    window.taskMonitorEventBuffers = [];
 
     // 首次加载任务状态
     refreshTaskMonitor();
 
-    // 自动刷新（每5秒）
-    window.taskMonitorInterval = setInterval(refreshTaskMonitor, 5000);
+    // 状态变化通过事件推送，推送不可用时每5秒轮询
+    window.taskMonitorEvents = subscribeTaskEvents(
+        event => {
+            // 拉取中的快照可能比这个事件旧，记下来在快照赋值后重新应用
+            window.taskMonitorEventBuffers.forEach(buffer => buffer.push(event));
+            const task = window.monitoredTaskStates[event.task_id];
+            if (task) {
+                Object.assign(task, event);
+                renderTaskMonitor();
+            }
+        },
+        refreshTaskMonitor,
+        () => {
+            if (!window.taskMonitorInterval) {
+                window.taskMonitorInterval = setInterval(refreshTaskMonitor, 5000);
+            }
+        }
+    );
+}
+
+function stopTaskMonitorUpdates() {
+    if (window.taskMonitorEvents) {
+        window.taskMonitorEvents.close();
+        window.taskMonitorEvents = null;
+    }
+    if (window.taskMonitorInterval) {
+        clearInterval(window.taskMonitorInterval);
+        window.taskMonitorInterval = null;
+    }
 }
 
 function closeTaskMonitor() {
@@ -975,9 +1028,7 @@ function closeTaskMonitor() {
     if (panel) {
         panel.remove();
     }
-    if (window.taskMonitorInterval) {
-        clearInterval(window.taskMonitorInterval);
-    }
+    stopTaskMonitorUpdates();
 }
 
 async function refreshTaskMonitor() {
@@ -990,6 +1041,9 @@ async function refreshTaskMonitor() {
 
     taskList.innerHTML = '<div style="text-align: center; color: #666;">加载中...</div>';
 
+    // 拉取期间推送的事件可能比快照新，先缓存，快照赋值后按到达顺序重新应用
+    const buffered = [];
+    window.taskMonitorEventBuffers.push(buffered);
     try {
         // 获取所有任务状态
         const tasks = await Promise.all(
@@ -1000,131 +1054,206 @@ async function refreshTaskMonitor() {
             )
         );
 
-        let html = '';
-        let allCompleted = true;
-
+        window.monitoredTaskStates = {};
         tasks.forEach((response, index) => {
-            if (!response.success) {
-                html += `<div style="padding: 10px; margin: 5px 0; border: 1px solid #ccc; border-radius: 5px;">
-                    <div style="color: #666;">任务 ${index + 1}: 获取状态失败</div>
-                </div>`;
-                return;
+            if (response.success) {
+                window.monitoredTaskStates[window.monitoringTasks[index]] = response.task;
             }
+        });
+        buffered.forEach(event => {
+            const task = window.monitoredTaskStates[event.task_id];
+            if (task) {
+                Object.assign(task, event);
+            }
+        });
+        renderTaskMonitor();
 
-            const task = response.task;
-            const statusColors = {
-                'pending': '#f59e0b',
-                'queued': '#3b82f6',
-                'running': '#10b981',
-                'success': '#22c55e',
-                'failed': '#ef4444'
-            };
+    } catch (error) {
+        taskList.innerHTML = `<div style="color: #ef4444;">刷新失败: ${error.message}</div>`;
+    } finally {
+        window.taskMonitorEventBuffers = window.taskMonitorEventBuffers.filter(buffer => buffer !== buffered);
+    }
+}
 
-            const statusTexts = {
-                'pending': '等待中',
-                'queued': '队列中',
-                'running': '发布中',
-                'success': '成功',
-                'failed': '失败'
-            };
+function renderTaskMonitor() {
+    const taskList = document.getElementById('task-list');
+    if (!taskList) return;
 
-            const statusColor = statusColors[task.status] || '#666';
-            const statusText = statusTexts[task.status] || task.status;
+    let html = '';
+    let allCompleted = true;
 
-            if (task.status !== 'success' && task.status !== 'failed') {
-                allCompleted = false;
-            }
+    window.monitoringTasks.forEach((taskId, index) => {
+        const task = window.monitoredTaskStates[taskId];
+        if (!task) {
+            html += `<div style="padding: 10px; margin: 5px 0; border: 1px solid #ccc; border-radius: 5px;">
+                <div style="color: #666;">任务 ${index + 1}: 获取状态失败</div>
+            </div>`;
+            return;
+        }
+
+        const statusColors = {
+            'pending': '#f59e0b',
+            'queued': '#3b82f6',
+            'running': '#10b981',
+            'success': '#22c55e',
+            'failed': '#ef4444'
+        };
+
+        const statusTexts = {
+            'pending': '等待中',
+            'queued': '队列中',
+            'running': '发布中',
+            'success': '成功',
+            'failed': '失败'
+        };
+
+        const statusColor = statusColors[task.status] || '#666';
+        const statusText = statusTexts[task.status] || task.status;
+
+        if (task.status !== 'success' && task.status !== 'failed') {
+            allCompleted = false;
+        }
 
-            const taskTitle = String(task.article_title || '未知标题');
-            const displayTaskTitle = taskTitle.length > 30 ? taskTitle.substring(0, 30) + '...' : taskTitle;
-
-            html += `
-                <div style="padding: 10px; margin: 5px 0; border: 1px solid ${statusColor}; border-radius: 5px; background: ${statusColor}15;">
-                    <div style="font-weight: bold; margin-bottom: 5px;">${displayTaskTitle}</div>
-                    <div style="display: flex; justify-content: space-between; align-items: center;">
-                        <span style="color: ${statusColor}; font-weight: bold;">${statusText}</span>
-                        ${task.progress ? `<span style="color: #666; font-size: 12px;">${task.progress}%</span>` : ''}
-                    </div>
-                    ${task.status === 'success' && task.result_url ? `<div style="margin-top: 5px;"><a href="${task.result_url}" target="_blank" style="color: #3b82f6; font-size: 12px;">查看文章</a></div>` : ''}
-                    ${task.status === 'failed' && task.error_message ? `<div style="margin-top: 5px; color: #ef4444; font-size: 12px;">${task.error_message}</div>` : ''}
+        const taskTitle = String(task.article_title || '未知标题');
+        const displayTaskTitle = taskTitle.length > 30 ? taskTitle.substring(0, 30) + '...' : taskTitle;
+
+        html += `
+            <div style="padding: 10px; margin: 5px 0; border: 1px solid ${statusColor}; border-radius: 5px; background: ${statusColor}15;">
+                <div style="font-weight: bold; margin-bottom: 5px;">${displayTaskTitle}</div>
+                <div style="display: flex; justify-content: space-between; align-items: center;">
+                    <span style="color: ${statusColor}; font-weight: bold;">${statusText}</span>
+                    ${task.progress ? `<span style="color: #666; font-size: 12px;">${task.progress}%</span>` : ''}
                 </div>
-            `;
-        });
+                ${task.status === 'success' && task.result_url ? `<div style="margin-top: 5px;"><a href="${task.result_url}" target="_blank" style="color: #3b82f6; font-size: 12px;">查看文章</a></div>` : ''}
+                ${task.status === 'failed' && task.error_message ? `<div style="margin-top: 5px; color: #ef4444; font-size: 12px;">${task.error_message}</div>` : ''}
+            </div>
+        `;
+    });
 
-        taskList.innerHTML = html;
+    taskList.innerHTML = html;
+
+    // 如果全部完成，停止自动更新
+    if (allCompleted) {
+        stopTaskMonitorUpdates();
+    }
+}
+
+// 查询一组任务的当前状态
+async function fetchTaskStates(taskIds) {
+    const results = [];
+    for (const taskId of taskIds) {
+        try {
+            const response = await fetch(`/api/publish_task/${taskId}`, {
+                credentials: 'include'
+            });
 
-        // 如果全部完成，停止自动刷新
-        if (allCompleted) {
-            if (window.taskMonitorInterval) {
-                clearInterval(window.taskMonitorInterval);
+            if (response.ok) {
+                const data = await response.json();
+                if (data.success && data.task) {
+                    results.push(data.task);
+                } else {
+                    results.push({ task_id: taskId, status: 'unknown', error_message: '获取状态失败' });
+                }
+            } else {
+                results.push({ task_id: taskId, status: 'unknown', error_message: `HTTP ${response.status}` });
             }
+        } catch (error) {
+            console.error(`[发布流程] 获取任务 ${taskId} 状态失败:`, error);
+            results.push({ task_id: taskId, status: 'unknown', error_message: error.message });
         }
-
-    } catch (error) {
-        taskList.innerHTML = `<div style="color: #ef4444;">刷新失败: ${error.message}</div>`;
     }
+    return results;
 }
 
 // 等待任务完成
 async function waitForTasksCompletion(taskIds, timeout = 300000) {
     // 默认超时5分钟（知乎登录验证可能需要较长时间）
     const startTime = Date.now();
-    const pollInterval = 3000; // 每3秒轮询一次
-    const results = [];
+    const pollInterval = 3000; // 推送不可用时每3秒轮询一次
+    const isDone = task => ['success', 'failed'].includes(task.status);
+    let results = [];
+    let needFetch = true;
+    let buffered = null;
+    let wakeUp = null;
+    const notify = () => {
+        if (wakeUp) {
+            wakeUp();
+        }
+    };
 
-    console.log(`[发布流程] 开始轮询 ${taskIds.length} 个任务状态，超时: ${timeout/1000}秒`);
+    console.log(`[发布流程] 开始等待 ${taskIds.length} 个任务完成，超时: ${timeout/1000}秒`);
 
-    while (Date.now() - startTime < timeout) {
-        let allCompleted = true;
-        results.length = 0; // 清空之前的结果
+    // 状态变化通过事件推送；推送不可用时退回轮询
+    let polling = false;
+    const applyEvent = event => {
+        const task = results.find(r => r.task_id === event.task_id);
+        if (task) {
+            Object.assign(task, event);
+        }
+        return Boolean(task);
+    };
+    const source = subscribeTaskEvents(
+        event => {
+            if (buffered) {
+                // 正在拉取状态：快照可能比这个事件旧，等快照赋值后再应用
+                buffered.push(event);
+            } else if (applyEvent(event)) {
+                notify();
+            }
+        },
+        () => {
+            needFetch = true;
+            notify();
+        },
+        () => {
+            polling = true;
+            notify();
+        }
+    );
 
-        for (const taskId of taskIds) {
-            try {
-                const response = await fetch(`/api/publish_task/${taskId}`, {
-                    credentials: 'include'
-                });
+    try {
+        while (Date.now() - startTime < timeout) {
+            if (needFetch || polling) {
+                needFetch = false;
+                buffered = [];
+                try {
+                    results = await fetchTaskStates(taskIds);
+                } finally {
+                    // 按到达顺序重新应用拉取期间推送的事件
+                    buffered.forEach(applyEvent);
+                    buffered = null;
+                }
+            }
 
-                if (response.ok) {
-                    const data = await response.json();
-                    if (data.success && data.task) {
-                        results.push(data.task);
+            // 更新loading提示，显示已用时间
+            const elapsed = Math.floor((Date.now() - startTime) / 1000);
+            const completed = results.filter(isDone).length;
+            const loadingText = document.getElementById('loading-text');
+            if (loadingText) {
+                loadingText.textContent = `发布中... (${completed}/${taskIds.length} 已完成，已用时${elapsed}秒)`;
+            }
 
-                        // 检查是否完成
-                        if (!['success', 'failed'].includes(data.task.status)) {
-                            allCompleted = false;
-                        }
-                    } else {
-                        results.push({ task_id: taskId, status: 'unknown', error_message: '获取状态失败' });
-                    }
-                } else {
-                    results.push({ task_id: taskId, status: 'unknown', error_message: `HTTP ${response.status}` });
-                }
-            } catch (error) {
-                console.error(`[发布流程] 获取任务 ${taskId} 状态失败:`, error);
-                results.push({ task_id: taskId, status: 'unknown', error_message: error.message });
+            if (completed === taskIds.length) {
+                console.log('[发布流程] 所有任务已完成');
+                break;
             }
-        }
 
-        // 更新loading提示，显示已用时间
-        const elapsed = Math.floor((Date.now() - startTime) / 1000);
-        const completed = results.filter(r => ['success', 'failed'].includes(r.status)).length;
-        const loadingText = document.getElementById('loading-text');
-        if (loadingText) {
-            loadingText.textContent = `发布中... (${completed}/${taskIds.length} 已完成，已用时${elapsed}秒)`;
+            // 等待下一个事件（推送模式下每秒刷新一次已用时间）
+            await new Promise(resolve => {
+                wakeUp = resolve;
+                setTimeout(resolve, polling ? pollInterval : 1000);
+            });
+            wakeUp = null;
         }
-
-        if (allCompleted) {
-            console.log('[发布流程] 所有任务已完成');
-            break;
+    } finally {
+        if (source) {
+            source.close();
         }
-
-        // 等待后继续轮询
-        await new Promise(resolve => setTimeout(resolve, pollInterval));
     }
 
     // 超时时记录日志
     if (Date.now() - startTime >= timeout) {
-        console.warn('[发布流程] 轮询超时，返回当前状态');
+        console.warn('[发布流程] 等待超时，返回当前状态');
     }
 
     return results;